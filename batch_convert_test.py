@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 # 导入转换器
 from src.converter import BaseConverter
+from src.converter.assets import ImageResolver, StatCache, save_document
 
 def setup_logging(log_file):
     """配置日志"""
@@ -27,7 +28,7 @@ def setup_logging(log_file):
     )
     return logging.getLogger(__name__)
 
-def convert_file(input_file, output_file, debug=False, logger=None):
+def convert_file(input_file, output_file, debug=False, logger=None, stat_cache=None):
     """
     转换单个 Markdown 文件为 DOCX 文件
     
@@ -36,6 +37,7 @@ def convert_file(input_file, output_file, debug=False, logger=None):
         output_file: 输出文件路径
         debug: 是否启用调试模式
         logger: 日志记录器
+        stat_cache: 批次内共享的文件状态缓存，相同资源目录中的图片只查找一次
     
     Returns:
         bool: 转换是否成功
@@ -56,13 +58,15 @@ def convert_file(input_file, output_file, debug=False, logger=None):
         
         # 创建转换器
         start_time = time.time()
-        converter = BaseConverter(debug=debug)
+        resolver = ImageResolver(base_dir=os.path.dirname(os.path.abspath(input_file)),
+                                 stat_cache=stat_cache)
+        converter = BaseConverter(debug=debug, image_resolver=resolver)
         
         # 转换文档
         doc = converter.convert(content)
         
         # 保存文档
-        doc.save(output_file)
+        save_document(doc, output_file)
         
         end_time = time.time()
         logger.info(f"转换完成，耗时: {end_time - start_time:.2f} 秒")
@@ -143,13 +147,17 @@ def main():
         'files': []
     }
     
+    # 批次内共享的文件状态缓存
+    stat_cache = StatCache()
+    
     # 批量转换
     for md_file in md_files:
         input_path = os.path.join(input_dir, md_file)
         output_path = os.path.join(output_dir, f"{os.path.splitext(md_file)[0]}.docx")
         
         logger.info(f"=" * 80)
-        success = convert_file(input_path, output_path, debug=debug, logger=logger)
+        success = convert_file(input_path, output_path, debug=debug, logger=logger,
+                               stat_cache=stat_cache)
         
         if success:
             results['success'] += 1
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+API 并发吞吐量基准测试
+
+分别启动同步的 Flask 服务和异步的 ASGI 服务（转换在进程池中执行），用指定数量的
+并发客户端持续调用 /api/convert/text，对比吞吐量和延迟。
+
+用法:
+    python benchmarks/bench_api_concurrency.py --clients 200 --requests 2000
+    python benchmarks/bench_api_concurrency.py --server asgi --workers 4
+"""
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import statistics
+import subprocess
+import os
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+API_KEY = 'bench-key'
+
+
+def make_markdown(sections: int) -> str:
+    """生成包含标题、列表、表格、代码和公式的文档"""
+    parts = []
+    for i in range(sections):
+        parts.append('\n'.join([
+            f'## 第 {i} 节',
+            '',
+            f'正文 **加粗** *斜体* `代码` 与公式 $x_{i}^2 + y_{i}^2 = r^2$。',
+            '',
+            '- 列表项一',
+            '- 列表项二',
+            '  1. 嵌套项',
+            '',
+            '| 名称 | 数量 | 说明 |',
+            '| --- | --- | --- |',
+            *[f'| 项目{j} | {j * i} | 描述 |' for j in range(5)],
+            '',
+            '```python',
+            f'def f{i}(x):',
+            '    return x * 2',
+            '```',
+            '',
+        ]))
+    return '\n'.join(parts)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start(server: str, port: int, workers: int) -> subprocess.Popen:
+    """以子进程启动服务并等待健康检查通过"""
+    env = dict(os.environ, API_KEY=API_KEY, MD2DOCX_ENGINE_WORKERS=str(workers))
+    process = subprocess.Popen(
+        [sys.executable, 'run_api.py', '--server', server, '--host', '127.0.0.1', '--port', str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f'http://127.0.0.1:{port}/api/health', timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{server} 服务启动失败")
+
+
+async def load(port: int, markdown: str, clients: int, total: int):
+    """clients 个并发客户端共发送 total 个请求，返回 (耗时, 延迟列表, 失败数)"""
+    url = f'http://127.0.0.1:{port}/api/convert/text'
+    latencies = []
+    failures = 0
+    remaining = total
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(limits=limits, timeout=300) as client:
+        async def worker():
+            nonlocal remaining, failures
+            while remaining > 0:
+                remaining -= 1
+                start_time = time.perf_counter()
+                try:
+                    response = await client.post(url, json={'markdown': markdown},
+                                                 headers={'X-API-Key': API_KEY})
+                    if response.status_code != 200:
+                        failures += 1
+                except httpx.HTTPError:
+                    failures += 1
+                latencies.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        return time.perf_counter() - start_time, latencies, failures
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API 并发吞吐量基准测试')
+    parser.add_argument('--clients', type=int, default=200, help='并发客户端数')
+    parser.add_argument('--requests', type=int, default=2000, help='请求总数')
+    parser.add_argument('--sections', type=int, default=20, help='文档的节数，决定单个文档的转换耗时')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ASGI 服务的转换进程数')
+    parser.add_argument('--server', choices=['flask', 'asgi', 'both'], default='both', help='测试的服务')
+    args = parser.parse_args()
+
+    markdown = make_markdown(args.sections)
+    servers = ['flask', 'asgi'] if args.server == 'both' else [args.server]
+
+    print(f"{args.clients} 个并发客户端，{args.requests} 个请求，文档 {len(markdown)} 字符")
+    print(f"{'服务':<8}{'耗时(s)':>10}{'吞吐(req/s)':>14}{'p50(ms)':>10}{'p99(ms)':>10}{'失败':>6}")
+    for server in servers:
+        port = free_port()
+        process = start(server, port, args.workers)
+        try:
+            elapsed, latencies, failures = asyncio.run(load(port, markdown, args.clients, args.requests))
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{server:<8}{elapsed:>10.2f}{args.requests / elapsed:>14.1f}"
+              f"{statistics.median(latencies) * 1000:>10.0f}{percentile(latencies, 0.99) * 1000:>10.0f}"
+              f"{failures:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+图片缩放基准测试
+
+生成若干张大尺寸截图风格的图片，分别以嵌入原图和按显示尺寸缩小两种方式转换，
+对比输出文件大小和保存耗时。
+
+用法:
+    python benchmarks/bench_image_downscale.py --count 10 --dpi 150
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.converter import BaseConverter
+from src.converter.assets import ImageCache, set_image_cache
+
+
+def make_screenshot(path: str, width: int, height: int, seed: int) -> None:
+    """生成带文字块和噪点的截图风格图片"""
+    img = Image.effect_noise((width, height), 24 + seed % 8).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for y in range(0, height, 40):
+        draw.rectangle([40, y + 8, width - 40 - (y * 7 + seed) % 600, y + 28],
+                       fill=((y + seed) % 255, 90, 160))
+    img.save(path, format='PNG')
+
+
+def run(md_text: str, image_dpi, output: str):
+    converter = BaseConverter(image_dpi=image_dpi)
+    start = time.perf_counter()
+    doc = converter.convert(md_text)
+    convert_time = time.perf_counter() - start
+    start = time.perf_counter()
+    doc.save(output)
+    save_time = time.perf_counter() - start
+    return convert_time, save_time, os.path.getsize(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='图片缩放基准测试')
+    parser.add_argument('--count', type=int, default=10, help='图片数量')
+    parser.add_argument('--width', type=int, default=2880, help='图片宽度')
+    parser.add_argument('--height', type=int, default=1800, help='图片高度')
+    parser.add_argument('--dpi', type=int, default=150, help='目标DPI')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lines = []
+        for i in range(args.count):
+            path = os.path.join(tmp, f'shot{i}.png')
+            make_screenshot(path, args.width, args.height, i)
+            # 交替使用块级图片（指定尺寸）和内联图片
+            if i % 2:
+                lines.append(f'![截图{i}|400x250]({path})')
+            else:
+                lines.append(f'正文 ![截图{i}]({path}) 正文')
+        md_text = '\n\n'.join(lines)
+
+        results = {}
+        for label, dpi in (('原图', None), (f'{args.dpi} DPI', args.dpi)):
+            # 每轮使用新的缓存，保证结果可比
+            set_image_cache(ImageCache(disk_dir=None))
+            results[label] = run(md_text, dpi, os.path.join(tmp, 'out.docx'))
+
+        print(f"{args.count} 张 {args.width}x{args.height} 图片")
+        print(f"{'模式':<10}{'转换(s)':>10}{'保存(s)':>10}{'大小(MB)':>12}")
+        for label, (convert_time, save_time, size) in results.items():
+            print(f"{label:<10}{convert_time:>10.2f}{save_time:>10.2f}{size / 1024 / 1024:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Mermaid 批量渲染基准测试
+
+生成包含若干个不同图表的文档，分别以逐个调用 mmdc 和整个文档一次调用 mmdc
+两种方式渲染，对比总耗时。需要已安装 mermaid-cli（mmdc）。
+
+用法:
+    python benchmarks/bench_mermaid_batch.py --count 10
+"""
+import sys
+import time
+import shutil
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.converter.diagrams import DEFAULT_CONFIG, MmdcRenderer
+
+
+def make_diagram(i: int) -> str:
+    """生成互不相同的流程图"""
+    return '\n'.join([
+        'graph TD',
+        f'  A{i}[开始 {i}] --> B{i}{{判断}}',
+        f'  B{i} -->|是| C{i}[处理]',
+        f'  B{i} -->|否| D{i}[结束]',
+        f'  C{i} --> D{i}',
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mermaid 批量渲染基准测试')
+    parser.add_argument('--count', type=int, default=10, help='图表数量')
+    parser.add_argument('--mmdc', default='mmdc', help='mmdc 可执行文件')
+    args = parser.parse_args()
+
+    if shutil.which(args.mmdc) is None:
+        print(f"找不到 {args.mmdc}，请先安装 @mermaid-js/mermaid-cli")
+        sys.exit(1)
+
+    codes = [make_diagram(i) for i in range(args.count)]
+    renderer = MmdcRenderer(executable=args.mmdc, max_retries=1)
+
+    start = time.perf_counter()
+    single = [renderer.render(code, DEFAULT_CONFIG) for code in codes]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = renderer.render_batch(codes, DEFAULT_CONFIG)
+    batch_time = time.perf_counter() - start
+
+    print(f"{args.count} 个图表")
+    print(f"{'模式':<10}{'耗时(s)':>10}{'成功':>8}")
+    print(f"{'逐个调用':<10}{single_time:>10.2f}{sum(d is not None for d in single):>8}")
+    print(f"{'批量调用':<10}{batch_time:>10.2f}{sum(d is not None for d in batch):>8}")
+    if batch_time:
+        print(f"加速比: {single_time / batch_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,6 @@
 """
 import os
 import argparse
-from src.api import start_server
 
 def main():
     """主函数"""
@@ -15,6 +14,14 @@ def main():
                         help='监听的端口，默认为5000')
     parser.add_argument('--debug', action='store_true', 
                         help='启用调试模式')
+    parser.add_argument('--server', choices=['flask', 'asgi', 'prefork'],
+                        default=os.environ.get('MD2DOCX_SERVER', 'flask'),
+                        help='服务器类型：flask（同步，开发用）、asgi（异步，转换在进程池中执行）'
+                             '或 prefork（生产环境，预热后派生多个工作进程），默认为flask')
+    parser.add_argument('--workers', type=int,
+                        help='prefork模式的工作进程数，默认与CPU核数一致，也可通过环境变量MD2DOCX_WORKERS设置')
+    parser.add_argument('--threads', type=int,
+                        help='prefork模式每个工作进程的线程数，默认为4，也可通过环境变量MD2DOCX_THREADS设置')
     parser.add_argument('--api-key', 
                         help='API密钥，用于鉴权，也可通过环境变量API_KEY设置')
     
@@ -28,10 +35,22 @@ def main():
     if args.api_key:
         os.environ['API_KEY'] = args.api_key
     
+    if args.server == 'asgi':
+        from src.asgi import start_server
+    elif args.server == 'prefork':
+        from src.prefork import start_server
+    else:
+        from src.api import start_server
+    
     print(f"启动API服务在 http://{args.host}:{args.port}")
+    print(f"服务器类型: {args.server}")
     print(f"调试模式: {'启用' if args.debug else '禁用'}")
     print("按 Ctrl+C 停止服务")
-    start_server(host=args.host, port=args.port, debug=args.debug)
+    if args.server == 'prefork':
+        start_server(host=args.host, port=args.port, debug=args.debug,
+                     workers=args.workers, threads=args.threads)
+    else:
+        start_server(host=args.host, port=args.port, debug=args.debug)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -0,0 +1,344 @@
+"""
+准入控制
+
+同步转换接口的每个请求都会占用一个转换名额。同时执行的转换数有全局上限，超出的
+请求在有界队列中按到达顺序等待；队列已满或等待超时时立即返回 503，而不是让线程和
+排队的请求无限增长。
+
+每个 API 密钥还可以限制同时进行（执行中和排队中）的请求数和请求速率（令牌桶），
+超出时返回 429，避免一个批量调用方占满名额、饿死交互式用户。两种拒绝都带有
+Retry-After。
+
+同步服务（每个请求一个线程）使用 acquire，异步服务使用 acquire_async，二者共享
+同一套名额和队列。
+
+异步任务的执行和批量转换中同时转换的其他文件也是转换工作，分别通过 hold 和
+try_hold 占用名额，计入全局并发数和提交者密钥的并发数（不消耗速率令牌）。这类后台
+工作让位于排队中的请求。
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+# 拒绝原因
+RATE_LIMITED = 'rate_limited'
+KEY_CONCURRENCY = 'key_concurrency'
+QUEUE_FULL = 'queue_full'
+QUEUE_TIMEOUT = 'queue_timeout'
+
+
+class AdmissionRejected(Exception):
+    """请求未被接受"""
+
+    def __init__(self, reason: str, status: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """排队等待名额的请求，名额直接移交给队首的请求"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.granted = False
+        self.event = threading.Event()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional[asyncio.Future] = None
+
+    def wake(self) -> None:
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """取出一个令牌，成功时返回 0，否则返回需要等待的秒数"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Admission:
+    """一个已被接受的请求占用的名额，处理完成后调用 release"""
+
+    def __init__(self, controller: 'AdmissionController', key: str):
+        self._controller = controller
+        self._key = key
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self._key)
+
+
+class AdmissionController:
+    """全局并发名额、有界等待队列和按 API 密钥的限额"""
+
+    def __init__(self, max_concurrent: int, max_queued: int = 64, queue_timeout: float = 30,
+                 key_concurrency: int = 0, key_rate: float = 0, key_burst: Optional[float] = None,
+                 retry_after: int = 5, clock: Callable[[], float] = time.monotonic):
+        """初始化准入控制
+
+        Args:
+            max_concurrent: 同时执行的转换数
+            max_queued: 最多排队等待的请求数
+            queue_timeout: 排队等待的最长时间（秒）
+            key_concurrency: 每个密钥同时进行（执行中和排队中）的请求数，0 表示不限制
+            key_rate: 每个密钥每秒的请求数，0 表示不限制
+            key_burst: 每个密钥允许的突发请求数，默认为 max(1, key_rate)
+            retry_after: 队列已满或等待超时时建议的重试间隔（秒）
+            clock: 单调时钟
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.queue_timeout = queue_timeout
+        self.key_concurrency = key_concurrency
+        self.key_rate = key_rate
+        self.key_burst = key_burst if key_burst is not None else max(1.0, key_rate)
+        self.retry_after = retry_after
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._running = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._held: Deque[_Waiter] = deque()
+        self._active: Dict[str, int] = {}
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self.admitted = 0
+        self.rejected = {RATE_LIMITED: 0, KEY_CONCURRENCY: 0, QUEUE_FULL: 0, QUEUE_TIMEOUT: 0}
+
+    def acquire(self, key: str) -> Admission:
+        """获取转换名额，没有空闲名额时阻塞等待
+
+        Args:
+            key: 请求使用的 API 密钥
+
+        Returns:
+            Admission: 占用的名额
+
+        Raises:
+            AdmissionRejected: 超出密钥限额（429）、队列已满或等待超时（503）
+        """
+        waiter = self._enter(key)
+        if waiter is None:
+            return Admission(self, key)
+        waiter.event.wait(self.queue_timeout)
+        return self._after_wait(waiter)
+
+    async def acquire_async(self, key: str) -> Admission:
+        """异步版本的 acquire，排队时不占用线程"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enter(key, loop, future)
+        if waiter is None:
+            return Admission(self, key)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # 客户端断开连接：已经移交的名额立即归还
+            with self._lock:
+                if not waiter.granted:
+                    self._leave_queue_locked(waiter)
+                    raise
+            self._release(key)
+            raise
+        return self._after_wait(waiter)
+
+    def hold(self, key: str) -> Admission:
+        """为后台工作（异步任务的执行）占用名额，没有空闲名额时一直等待
+
+        与 acquire 相同地计入全局并发数和密钥的并发数，但不消耗速率令牌、不会被拒绝；
+        有请求排队或密钥的并发数已满时等待。后台工作的数量由任务队列的调度线程数限制。
+
+        Args:
+            key: 提交工作的 API 密钥
+
+        Returns:
+            Admission: 占用的名额
+        """
+        with self._lock:
+            if self._can_hold_locked(key):
+                self._take_locked(key)
+                return Admission(self, key)
+            waiter = _Waiter(key)
+            self._held.append(waiter)
+        waiter.event.wait()
+        return Admission(self, key)
+
+    def try_hold(self, key: str) -> Optional[Admission]:
+        """不等待地为后台工作（批量转换中的其他文件）占用名额
+
+        Returns:
+            Admission: 占用的名额；有请求排队、没有空闲名额或密钥的并发数已满时为 None
+        """
+        with self._lock:
+            if not self._can_hold_locked(key):
+                return None
+            self._take_locked(key)
+        return Admission(self, key)
+
+    def _can_hold_locked(self, key: str) -> bool:
+        return (not self._waiters and self._running < self.max_concurrent
+                and (self.key_concurrency <= 0 or self._active.get(key, 0) < self.key_concurrency))
+
+    def _take_locked(self, key: str) -> None:
+        self._running += 1
+        self._active[key] = self._active.get(key, 0) + 1
+
+    def _enter(self, key: str, loop=None, future=None) -> Optional[_Waiter]:
+        """检查限额并占用名额；需要排队时返回排队的请求"""
+        with self._lock:
+            if self.key_rate > 0:
+                now = self._clock()
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = _TokenBucket(self.key_rate, self.key_burst, now)
+                wait = bucket.take(now)
+                if wait > 0:
+                    self._reject_locked(RATE_LIMITED, 429, math.ceil(wait), "请求过于频繁")
+            if self.key_concurrency > 0 and self._active.get(key, 0) >= self.key_concurrency:
+                self._reject_locked(KEY_CONCURRENCY, 429, 1,
+                                    f"同一API密钥同时进行的请求已达上限 ({self.key_concurrency})")
+            if self._running < self.max_concurrent:
+                self._running += 1
+                self._active[key] = self._active.get(key, 0) + 1
+                self.admitted += 1
+                return None
+            if len(self._waiters) >= self.max_queued:
+                self._reject_locked(QUEUE_FULL, 503, self.retry_after, "服务繁忙，请稍后重试")
+            waiter = _Waiter(key)
+            waiter.loop, waiter.future = loop, future
+            self._waiters.append(waiter)
+            self._active[key] = self._active.get(key, 0) + 1
+            return waiter
+
+    def _after_wait(self, waiter: _Waiter) -> Admission:
+        with self._lock:
+            if not waiter.granted:
+                self._leave_queue_locked(waiter)
+                self._reject_locked(QUEUE_TIMEOUT, 503, self.retry_after, "排队等待超时，请稍后重试")
+            self.admitted += 1
+        return Admission(self, waiter.key)
+
+    def _reject_locked(self, reason: str, status: int, retry_after: int, message: str) -> None:
+        self.rejected[reason] += 1
+        raise AdmissionRejected(reason, status, max(1, retry_after), message)
+
+    def _leave_queue_locked(self, waiter: _Waiter) -> None:
+        self._waiters.remove(waiter)
+        self._decrement_locked(waiter.key)
+
+    def _decrement_locked(self, key: str) -> None:
+        count = self._active.get(key, 0) - 1
+        if count > 0:
+            self._active[key] = count
+        else:
+            self._active.pop(key, None)
+
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._decrement_locked(key)
+            if self._waiters:
+                # 名额直接移交给队首的请求，执行中的数量不变
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                waiter.wake()
+            else:
+                self._running -= 1
+                self._grant_held_locked()
+
+    def _grant_held_locked(self) -> None:
+        """把空闲的名额交给等待中的后台工作（跳过密钥并发数已满的工作）"""
+        for waiter in list(self._held):
+            if self._running >= self.max_concurrent:
+                break
+            if self._can_hold_locked(waiter.key):
+                self._held.remove(waiter)
+                self._take_locked(waiter.key)
+                waiter.wake()
+
+    def stats(self) -> Dict:
+        """准入控制统计信息"""
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queued': self.max_queued,
+                'running': self._running,
+                'queued': len(self._waiters),
+                'held_waiting': len(self._held),
+                'admitted': self.admitted,
+                'rejected': dict(self.rejected),
+            }
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+_shared_controller: Optional[AdmissionController] = None
+_shared_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """获取进程内共享的准入控制
+
+    通过环境变量配置：
+        MD2DOCX_MAX_CONCURRENT: 同时执行的转换数，默认为转换进程数的 2 倍
+        MD2DOCX_MAX_QUEUED: 最多排队等待的请求数，默认 64
+        MD2DOCX_QUEUE_TIMEOUT: 排队等待的最长时间（秒），默认 30
+        MD2DOCX_KEY_CONCURRENCY: 每个API密钥同时进行的请求数，默认 0（不限制）
+        MD2DOCX_KEY_RATE: 每个API密钥每秒的请求数，默认 0（不限制）
+        MD2DOCX_KEY_BURST: 每个API密钥允许的突发请求数，默认与速率相同（至少 1）
+    """
+    global _shared_controller
+    with _shared_lock:
+        if _shared_controller is None:
+            max_concurrent = int(_env_number('MD2DOCX_MAX_CONCURRENT', 0))
+            if max_concurrent <= 0:
+                from .engine import engine_workers
+
+                max_concurrent = engine_workers() * 2
+            burst = _env_number('MD2DOCX_KEY_BURST', 0) or None
+            _shared_controller = AdmissionController(
+                max_concurrent,
+                max_queued=int(_env_number('MD2DOCX_MAX_QUEUED', 64)),
+                queue_timeout=_env_number('MD2DOCX_QUEUE_TIMEOUT', 30),
+                key_concurrency=int(_env_number('MD2DOCX_KEY_CONCURRENCY', 0)),
+                key_rate=_env_number('MD2DOCX_KEY_RATE', 0),
+                key_burst=burst
+            )
+        return _shared_controller
+
+
+def set_admission_controller(controller: Optional[AdmissionController]) -> None:
+    """替换共享的准入控制（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_controller
+    with _shared_lock:
+        _shared_controller = controller
@@ -2,52 +2,102 @@
 API服务，提供Markdown转Word的Web接口
 """
 import os
-import tempfile
+import threading
 import time
 from pathlib import Path
 import uuid
 import functools
-from flask import Flask, request, send_file, jsonify, make_response
+import json
+from io import BytesIO
+from flask import Flask, Response, g, request, send_file, jsonify, make_response, url_for
+from .admission import AdmissionRejected, get_admission_controller
+from .batch import BatchError, collect_items, iter_batch
 from .converter import BaseConverter
+from .converter.assets import (
+    MarkdownBundle,
+    BundleError,
+    SharedOutput,
+    release_spool,
+    response_memory_limit,
+    serialize_document
+)
+from .converter.diagrams import get_diagram_cache, get_mermaid_renderer, get_render_breaker
+from .converter.metrics import stage
+from .engine import get_engine_pool
+from .jobs import FAILED, SUCCEEDED, QueueFull, get_job_queue, parse_priority
+from .metrics import METRICS_CONTENT_TYPE, record_request, record_sizes, render_metrics
+from .request_body import MARKDOWN_MIMETYPES, BodyError, decode_text, iter_chunks, read_body
+from .response_cache import etag_matches, get_response_cache
+from .singleflight import get_singleflight
 
 app = Flask(__name__)
 
 # 设置上传文件大小限制（默认为16MB）
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
+# 是否提供异步任务接口。任务队列和结果保存在进程内存中，预派生多个工作进程时关闭
+app.config['JOBS_ENABLED'] = True
+
+# 是否提供 /metrics 接口。指标保存在进程内存中，预派生多个工作进程时每次抓取只得到
+# 其中一个进程的数据，因此关闭
+app.config['METRICS_ENABLED'] = True
+
 # 从环境变量获取API密钥，如果未设置则使用默认值（不建议在生产环境中使用默认值）
 API_KEY = os.environ.get('API_KEY', 'md2docx-default-key')
 
+# 其他可用的API密钥（逗号分隔），每个密钥分别计算并发数和请求速率限额
+EXTRA_API_KEYS = frozenset(key.strip() for key in os.environ.get('API_KEYS', '').split(',') if key.strip())
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# 服务是否已完成预热；预热期间健康检查返回 503，负载均衡不会把请求发送到本进程
+_ready = threading.Event()
+_ready.set()
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """按路由模板记录请求数、状态码和耗时"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    start = g.get('request_start')
+    if start is not None:
+        record_request(route, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
+def body_api_key():
+    """从表单或JSON请求体中读取API密钥"""
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        return request.form.get('api_key')
+    # 压缩的请求体由接口自身解压
+    if request.is_json and not request.headers.get('Content-Encoding'):
+        json_data = request.get_json(silent=True)
+        return json_data.get('api_key') if isinstance(json_data, dict) else None
+    return None
+
 def require_api_key(f):
-    """装饰器：要求API密钥验证"""
+    """装饰器：要求API密钥验证
+    
+    依次从请求头、URL参数、表单或JSON请求体中读取密钥。请求头和URL参数中有密钥时
+    不解析请求体。
+    """
     @functools.wraps(f)
     def decorated(*args, **kwargs):
-        # 从请求头获取API密钥（尝试多种可能的大小写形式）
-        key_from_header = (
-            request.headers.get('X-API-Key') or 
-            request.headers.get('X-Api-Key') or 
-            request.headers.get('x-api-key') or
-            request.headers.get('X-API-KEY')
-        )
+        # 请求头名称不区分大小写
+        key_from_header = request.headers.get('X-API-Key')
         
         # 从URL参数获取API密钥
         key_from_url = request.args.get('api_key')
         
-        # 从表单数据获取API密钥
-        key_from_form = request.form.get('api_key') if request.form else None
-        
-        # 从JSON数据获取API密钥
-        json_data = request.get_json(silent=True) or {}
-        key_from_json = json_data.get('api_key')
-        
-        # 检查API密钥是否匹配
-        provided_key = key_from_header or key_from_url or key_from_form or key_from_json
+        # 只有前两者都没有时才解析请求体
+        provided_key = key_from_header or key_from_url or body_api_key()
         
         if app.debug:
             print(f"请求头中的密钥: {key_from_header}")
             print(f"URL参数中的密钥: {key_from_url}")
-            print(f"表单中的密钥: {key_from_form}")
-            print(f"JSON中的密钥: {key_from_json}")
+            print(f"使用的密钥: {provided_key}")
             print(f"当前API环境变量密钥: {API_KEY}")
         
         if not provided_key:
@@ -58,17 +108,123 @@ def require_api_key(f):
             response.headers['WWW-Authenticate'] = 'Bearer'
             return response
         
-        if provided_key != API_KEY:
+        if provided_key != API_KEY and provided_key not in EXTRA_API_KEYS:
             response = make_response(jsonify({
                 "error": "API密钥无效",
                 "status": "unauthorized"
             }), 401)
             response.headers['WWW-Authenticate'] = 'Bearer'
             return response
-            
+        
+        g.api_key = provided_key
+        return f(*args, **kwargs)
+    return decorated
+
+def rejected_response(error):
+    """准入控制拒绝请求时的响应（429 或 503，带 Retry-After）"""
+    response = make_response(jsonify({"error": str(error), "status": error.reason}), error.status)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def require_admission(f):
+    """装饰器：转换接口占用准入控制的名额（需在 require_api_key 之后）
+    
+    名额在接口返回后归还；流式响应的接口可以取走 g.admission，在发送完成后自行归还。
+    """
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            g.admission = get_admission_controller().acquire(g.api_key)
+        except AdmissionRejected as e:
+            return rejected_response(e)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            admission = g.pop('admission', None)
+            if admission is not None:
+                admission.release()
+    return decorated
+
+def require_jobs(f):
+    """装饰器：异步任务接口关闭时返回 501"""
+    @functools.wraps(f)
+    def decorated(*args, **kwargs):
+        if not app.config['JOBS_ENABLED']:
+            return jsonify({
+                "error": "多进程模式下不支持异步任务，请使用单个工作进程或异步服务器",
+                "status": "jobs_disabled"
+            }), 501
         return f(*args, **kwargs)
     return decorated
 
+def parse_image_dpi(value):
+    """解析图片重新采样的目标DPI参数，无效值按未设置处理"""
+    try:
+        dpi = int(value)
+    except (TypeError, ValueError):
+        return None
+    return dpi if dpi > 0 else None
+
+def convert_cached(source, options, download_name, build, bundle=False):
+    """转换并以附件形式返回文档，结果按内容缓存
+    
+    先查找转换结果缓存；未命中时转换，相同内容和选项的并发请求只转换一次，共享
+    同一个结果。文档序列化到内存缓冲区，超过内存上限（MD2DOCX_RESPONSE_MEMORY_MB）
+    时转存到匿名临时文件，这样的结果不缓存，共享它的请求各自从文件中流式读取。
+    图片临时目录在序列化后立即删除，不在临时目录中留下文件。
+    
+    Args:
+        source: 上传的 Markdown 内容（或压缩包）
+        options: 影响转换结果的选项
+        download_name: 下载文件名
+        build: 转换并返回 Document 的函数
+        bundle: source 是否为压缩包
+    """
+    cache = get_response_cache()
+    cache_key = cache.key(source, options)
+    cached = cache.get(cache_key, volatile=cache.volatile(source, bundle=bundle))
+    if cached is not None:
+        return cached_response(cached, download_name)
+    
+    def run():
+        doc = build()
+        try:
+            buffer, size = serialize_document(doc)
+        finally:
+            release_spool(doc)
+        record_sizes(len(source), size)
+        if size > response_memory_limit():
+            return SharedOutput(buffer, size)
+        with buffer:
+            return cache.put(cache_key, buffer.read())
+    
+    return cached_response(get_singleflight().do(cache_key, run), download_name, 'MISS')
+
+def cached_response(item, download_name, status='HIT'):
+    """返回缓存的转换结果，ETag 为内容的 sha256，If-None-Match 匹配时返回 304
+    
+    item 为缓存条目，或保存在临时文件中、不缓存的较大结果（SharedOutput）。
+    """
+    digest = item.digest if isinstance(item, SharedOutput) else item.meta.digest
+    headers = {'ETag': f'"{digest}"', 'X-Cache': status}
+    # Flask 只对 GET/HEAD 做条件处理，转换接口是 POST，这里自行比较
+    if etag_matches(request.headers.get('If-None-Match'), digest):
+        return Response(status=304, headers=headers)
+    if isinstance(item, SharedOutput):
+        body, size = item.open(), item.size
+    else:
+        body, size = BytesIO(item.data), len(item.data)
+    response = send_file(
+        body,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype=DOCX_MIMETYPE,
+        etag=False
+    )
+    response.content_length = size
+    response.headers.update(headers)
+    return response
+
 @app.route('/api/test-auth', methods=['GET'])
 @require_api_key
 def test_auth():
@@ -82,71 +238,111 @@ def test_auth():
 
 @app.route('/api/convert', methods=['POST'])
 @require_api_key
+@require_admission
 def convert_api():
     """接收Markdown文件并转换为DOCX格式
     
     请求格式: multipart/form-data
     参数:
-        - file: Markdown文件
+        - file: Markdown文件，或包含Markdown文件及其图片的zip压缩包
+        - entry: (可选) 压缩包内的Markdown文件路径，默认自动选择
         - debug: (可选) 是否启用调试模式，默认为False
+        - image_dpi: (可选) 按显示尺寸缩小图片的目标DPI，默认嵌入原图
         - api_key: (可选) API密钥，也可通过请求头X-API-Key传递
     
     返回:
         - DOCX文件下载
     """
+    # 解析上传的表单
+    with stage('decode'):
+        file = request.files.get('file')
+    
     # 检查是否有文件上传
-    if 'file' not in request.files:
+    if file is None:
         return jsonify({"error": "未找到上传的文件"}), 400
     
-    file = request.files['file']
-    
     # 检查文件是否为空
     if file.filename == '':
         return jsonify({"error": "未选择文件"}), 400
     
     # 检查文件扩展名
-    if not file.filename.lower().endswith(('.md', '.markdown', '.mdown')):
-        return jsonify({"error": "仅支持Markdown文件格式"}), 400
+    is_bundle = file.filename.lower().endswith('.zip')
+    if not is_bundle and not file.filename.lower().endswith(('.md', '.markdown', '.mdown')):
+        return jsonify({"error": "仅支持Markdown文件或zip压缩包"}), 400
     
     # 获取调试参数
     debug = request.form.get('debug', 'false').lower() == 'true'
+    image_dpi = parse_image_dpi(request.form.get('image_dpi'))
+    
+    if is_bundle:
+        return convert_bundle(file, debug, image_dpi)
     
     try:
-        # 创建临时文件保存上传的Markdown内容
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.md') as temp_input:
-            file.save(temp_input.name)
-        
-        # 创建临时文件用于保存转换后的DOCX
+        # 直接从请求流中读取上传的Markdown内容
+        source = file.stream.read()
         output_filename = f"{Path(file.filename).stem}_{int(time.time())}.docx"
-        temp_output = tempfile.gettempdir() / Path(output_filename)
-        
-        # 读取上传的Markdown文件内容
-        with open(temp_input.name, 'r', encoding='utf-8') as f:
-            content = f.read()
         
-        # 执行转换
-        converter = BaseConverter(debug=debug)
-        doc = converter.convert(content)
+        # 执行转换并返回生成的DOCX文件
+        def build():
+            converter = BaseConverter(debug=debug, image_dpi=image_dpi)
+            return converter.convert(source.decode('utf-8'))
         
-        # 保存为DOCX文件
-        doc.save(temp_output)
+        return convert_cached(source, {'image_dpi': image_dpi}, output_filename, build)
+    
+    except Exception as e:
+        return jsonify({"error": f"转换过程中发生错误: {str(e)}"}), 500
+
+def convert_bundle(file, debug, image_dpi):
+    """转换上传的zip压缩包
+    
+    压缩包直接在内存中打开，不解压到临时目录，图片在转换时按需从成员中读取。
+    """
+    try:
+        output_filename = f"{Path(file.filename).stem}_{int(time.time())}.docx"
+        source = file.stream.read()
+        entry = request.form.get('entry')
         
-        # 删除临时输入文件
-        os.unlink(temp_input.name)
+        def build():
+            with MarkdownBundle(source, entry=entry) as bundle:
+                content = bundle.read_markdown()
+                converter = BaseConverter(debug=debug, image_dpi=image_dpi,
+                                          image_resolver=bundle.resolver())
+                return converter.convert(content)
         
-        # 返回生成的DOCX文件
-        return send_file(
-            temp_output,
-            as_attachment=True,
-            download_name=output_filename,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
+        return convert_cached(source, {'image_dpi': image_dpi, 'entry': entry},
+                              output_filename, build, bundle=True)
     
+    except (BundleError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"压缩包无效: {str(e)}"}), 400
     except Exception as e:
         return jsonify({"error": f"转换过程中发生错误: {str(e)}"}), 500
 
+def read_text_request():
+    """读取 /api/convert/text 的请求参数
+
+    原始 Markdown 请求体的选项从URL参数读取；压缩的请求体从请求流中按块解压。
+
+    Returns:
+        dict: 请求参数，格式与 JSON 请求体相同
+    """
+    encoding = request.headers.get('Content-Encoding')
+    if request.mimetype in MARKDOWN_MIMETYPES:
+        body = read_body(iter_chunks(request.stream), encoding)
+        return {
+            'markdown': decode_text(body, request.mimetype_params.get('charset')),
+            'debug': request.args.get('debug', 'false').lower() == 'true',
+            'image_dpi': request.args.get('image_dpi')
+        }
+    if encoding and request.is_json:
+        try:
+            return json.loads(read_body(iter_chunks(request.stream), encoding))
+        except ValueError:
+            raise BodyError(400, "JSON格式无效")
+    return request.get_json()
+
 @app.route('/api/convert/text', methods=['POST'])
 @require_api_key
+@require_admission
 def convert_text_api():
     """接收Markdown文本并转换为DOCX格式
     
@@ -155,52 +351,262 @@ def convert_text_api():
         {
             "markdown": "# 标题\n正文内容",
             "debug": false,  // 可选，默认为false
+            "image_dpi": 150,  // 可选，按显示尺寸缩小图片的目标DPI
             "api_key": "your-api-key"  // 可选，也可通过请求头X-API-Key传递
         }
     
+    也可以直接发送 text/markdown 或 text/plain 格式的 Markdown 文本，debug 和 image_dpi
+    通过URL参数传递。请求体可以使用 gzip 或 zstd 压缩（Content-Encoding）。
+    
     返回:
         - DOCX文件下载
     """
-    # 获取JSON请求数据
-    data = request.get_json()
+    # 获取请求数据
+    try:
+        with stage('decode'):
+            data = read_text_request()
+    except BodyError as e:
+        return jsonify({"error": str(e)}), e.status
     
     # 检查是否提供了Markdown文本
-    if not data or 'markdown' not in data:
+    if not isinstance(data, dict) or 'markdown' not in data:
         return jsonify({"error": "未提供Markdown文本"}), 400
     
     markdown_text = data['markdown']
     debug = data.get('debug', False)
+    image_dpi = parse_image_dpi(data.get('image_dpi'))
     
     try:
         # 生成唯一的文件名
         output_filename = f"document_{uuid.uuid4().hex}.docx"
-        temp_output = Path(tempfile.gettempdir()) / output_filename
-        
-        # 执行转换
-        converter = BaseConverter(debug=debug)
-        doc = converter.convert(markdown_text)
         
-        # 保存为DOCX文件
-        doc.save(temp_output)
+        # 执行转换并返回生成的DOCX文件
+        def build():
+            converter = BaseConverter(debug=debug, image_dpi=image_dpi)
+            return converter.convert(markdown_text)
         
-        # 返回生成的DOCX文件
-        return send_file(
-            temp_output,
-            as_attachment=True,
-            download_name=output_filename,
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document'
-        )
+        return convert_cached(markdown_text.encode('utf-8'), {'image_dpi': image_dpi},
+                              output_filename, build)
     
     except Exception as e:
         return jsonify({"error": f"转换过程中发生错误: {str(e)}"}), 500
 
+@app.route('/api/convert/batch', methods=['POST'])
+@require_api_key
+@require_admission
+def convert_batch_api():
+    """批量转换多个Markdown文件
+    
+    请求格式: multipart/form-data
+    参数:
+        - files: Markdown文件或zip压缩包，可以上传多个（压缩包中的每个Markdown文件单独转换）
+        - debug: (可选) 是否启用调试模式，默认为False
+        - image_dpi: (可选) 按显示尺寸缩小图片的目标DPI，默认嵌入原图
+    
+    返回:
+        - zip压缩包，各文件转换完成后立即写入并发送，最后的manifest.json记录每个文件的转换状态
+    """
+    with stage('decode'):
+        files = request.files.getlist('files') + request.files.getlist('file')
+    if not files:
+        return jsonify({"error": "未找到上传的文件"}), 400
+    
+    debug = request.form.get('debug', 'false').lower() == 'true'
+    image_dpi = parse_image_dpi(request.form.get('image_dpi'))
+    
+    try:
+        items = collect_items([(f.filename or '', f.stream.read()) for f in files])
+    except BundleError as e:
+        return jsonify({"error": f"压缩包无效: {str(e)}"}), 400
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # 各文件在转换进程池中并行转换，名额在压缩包发送完成后归还；同时转换的其他文件
+    # 各占用一个名额，计入该密钥的并发数
+    admission = g.pop('admission')
+    controller, api_key = get_admission_controller(), g.api_key
+    
+    def generate():
+        try:
+            yield from iter_batch(items, get_engine_pool(), debug=debug, image_dpi=image_dpi,
+                                  extra_slot=lambda: controller.try_hold(api_key))
+        finally:
+            admission.release()
+    
+    response = Response(
+        generate(),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename=batch_{int(time.time())}.zip'}
+    )
+    # 客户端在开始接收前断开时生成器不会执行，由关闭响应时归还
+    response.call_on_close(admission.release)
+    return response
+
+@app.route('/api/jobs', methods=['POST'])
+@require_jobs
+@require_api_key
+@require_admission
+def submit_job_api():
+    """提交异步转换任务，立即返回任务ID
+    
+    请求格式与 /api/convert/text 相同（application/json），或与 /api/convert 相同
+    （multipart/form-data，上传Markdown文件或zip压缩包），另外可以指定:
+        - priority: (可选) 优先级，-100 到 100，数值大的先执行，默认为0
+    
+    返回:
+        - 202: 任务ID、状态和排队位置，Location 响应头为任务状态地址
+        - 429/503: 超出准入控制的限额，或排队的任务数、任务总大小已达上限
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({"error": "未选择文件"}), 400
+        is_bundle = file.filename.lower().endswith('.zip')
+        if not is_bundle and not file.filename.lower().endswith(('.md', '.markdown', '.mdown')):
+            return jsonify({"error": "仅支持Markdown文件或zip压缩包"}), 400
+        
+        content = file.stream.read()
+        options = request.form
+        filename = f"{Path(file.filename).stem}_{int(time.time())}.docx"
+        if is_bundle:
+            params = {'markdown': None, 'bundle': content, 'entry': options.get('entry')}
+        else:
+            try:
+                params = {'markdown': content.decode('utf-8')}
+            except UnicodeDecodeError as e:
+                return jsonify({"error": f"文件不是UTF-8编码: {str(e)}"}), 400
+        params['debug'] = options.get('debug', 'false').lower() == 'true'
+    else:
+        options = request.get_json(silent=True)
+        if not options or 'markdown' not in options:
+            return jsonify({"error": "未提供Markdown文本"}), 400
+        filename = f"document_{uuid.uuid4().hex}.docx"
+        params = {'markdown': options['markdown'], 'debug': bool(options.get('debug', False))}
+    params['image_dpi'] = parse_image_dpi(options.get('image_dpi'))
+    
+    queue = get_job_queue()
+    try:
+        job = queue.submit(filename, priority=parse_priority(options.get('priority')),
+                           api_key=g.api_key, **params)
+    except QueueFull as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    info = queue.describe(job)
+    info['status_url'] = url_for('job_status_api', job_id=job.id)
+    info['result_url'] = url_for('job_result_api', job_id=job.id)
+    response = jsonify(info)
+    response.headers['Location'] = info['status_url']
+    return response, 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@require_jobs
+@require_api_key
+def job_status_api(job_id):
+    """查询任务状态和排队位置"""
+    queue = get_job_queue()
+    job = queue.get(job_id, api_key=g.api_key)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(queue.describe(job))
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+@require_jobs
+@require_api_key
+def job_result_api(job_id):
+    """获取任务结果
+    
+    返回:
+        - 200: DOCX文件下载
+        - 404: 任务不存在或已过期
+        - 409: 任务尚未完成
+        - 500: 转换失败
+    """
+    queue = get_job_queue()
+    job = queue.get(job_id, api_key=g.api_key)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    # 结果可能随时被淘汰，先取出引用
+    result = job.result
+    if job.status == FAILED:
+        return jsonify({"error": f"转换过程中发生错误: {job.error}"}), 500
+    if job.status != SUCCEEDED or result is None:
+        info = queue.describe(job)
+        info['error'] = "任务尚未完成"
+        return jsonify(info), 409
+    return send_file(
+        BytesIO(result),
+        as_attachment=True,
+        download_name=job.filename,
+        mimetype=DOCX_MIMETYPE
+    )
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+@require_jobs
+@require_api_key
+def cancel_job_api(job_id):
+    """取消排队中的任务，或删除已完成的任务及其结果"""
+    queue = get_job_queue()
+    job = queue.get(job_id, api_key=g.api_key)
+    if job is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    if not queue.cancel(job_id):
+        return jsonify({"error": "任务正在执行，无法取消"}), 409
+    return '', 204
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 格式的指标 - 此接口不需要鉴权"""
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({
+            "error": "多进程模式下不支持指标接口，请使用单个工作进程或异步服务器",
+            "status": "metrics_disabled"
+        }), 501
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查接口 - 此接口不需要鉴权"""
-    return jsonify({"status": "ok", "service": "md2docx-api"}), 200
+    if not _ready.is_set():
+        return jsonify({"status": "starting", "service": "md2docx-api", "ready": False}), 503
+    return jsonify({
+        "status": "ok",
+        "service": "md2docx-api",
+        "ready": True,
+        "mermaid_cache": get_diagram_cache().stats(),
+        "mermaid_breaker": get_render_breaker().stats(),
+        "jobs": get_job_queue().stats(),
+        "response_cache": get_response_cache().stats(),
+        "singleflight": get_singleflight().stats(),
+        "admission": get_admission_controller().stats()
+    }), 200
+
+def prewarm():
+    """预热渲染后端：使用常驻渲染服务时启动服务并开始健康检查"""
+    renderer = get_mermaid_renderer()
+    ready = renderer.prewarm()
+    if not ready:
+        print("警告: Mermaid渲染器不可用，图表将无法转换")
+    return ready
+
+def warm_in_background():
+    """在后台线程中预热，完成前健康检查报告未就绪"""
+    _ready.clear()
+
+    def run():
+        try:
+            prewarm()
+        finally:
+            _ready.set()
+
+    thread = threading.Thread(target=run, name='md2docx-prewarm', daemon=True)
+    thread.start()
+    return thread
 
 def start_server(host='0.0.0.0', port=5000, debug=False):
     """启动API服务器"""
+    prewarm()
     app.run(host=host, port=port, debug=debug)
 
 if __name__ == '__main__':
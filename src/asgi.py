@@ -0,0 +1,610 @@
+"""
+异步API服务（ASGI），提供与 api.py 相同的Markdown转Word接口
+
+请求的接收、在线图片的下载和 Mermaid 图表的渲染在事件循环中并发进行，CPU 密集的
+文档构建和序列化交给转换引擎进程池（见 engine.py），一个慢请求不会阻塞其他请求。
+
+转换结果始终完整地保存在内存中：工作进程把 docx 序列化到内存，结果经进程间管道
+传回服务进程，再写入转换结果缓存后返回。api.py 中超过 MD2DOCX_RESPONSE_MEMORY_MB
+的输出转存到临时文件的处理不适用于本服务，转换期间单个结果在工作进程和服务进程中
+各占用一份 docx 大小的内存。
+
+启动::
+
+    python run_api.py --server asgi
+    # 或
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import functools
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from urllib.parse import quote
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from .admission import AdmissionRejected, get_admission_controller
+from .api import EXTRA_API_KEYS, parse_image_dpi, prewarm
+from .batch import BatchError, aiter_batch, collect_items
+from .converter.assets import BundleError
+from .converter.diagrams import get_diagram_cache, get_render_breaker
+from .converter.metrics import stage
+from .engine import get_engine_pool
+from .jobs import FAILED, SUCCEEDED, QueueFull, get_job_queue, parse_priority
+from .metrics import METRICS_CONTENT_TYPE, record_request, record_sizes, render_metrics
+from .request_body import (
+    MARKDOWN_MIMETYPES,
+    BodyError,
+    decode_text,
+    parse_content_type,
+    read_body_async
+)
+from .response_cache import etag_matches, get_response_cache
+from .singleflight import get_singleflight
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# 上传文件大小限制（默认为16MB），与 api.py 一致
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024
+
+# 从环境变量获取API密钥，如果未设置则使用默认值（不建议在生产环境中使用默认值）
+API_KEY = os.environ.get('API_KEY', 'md2docx-default-key')
+
+
+def _unauthorized(message):
+    return JSONResponse({"error": message, "status": "unauthorized"}, status_code=401,
+                        headers={'WWW-Authenticate': 'Bearer'})
+
+
+async def _body_api_key(request: Request):
+    """从表单或JSON请求体中读取API密钥"""
+    content_type = request.headers.get('content-type', '')
+    try:
+        if content_type.startswith(('multipart/form-data', 'application/x-www-form-urlencoded')):
+            form = await request.form(max_part_size=MAX_CONTENT_LENGTH)
+            return form.get('api_key')
+        # 压缩的请求体由接口自身解压
+        if content_type.startswith('application/json') and not request.headers.get('content-encoding'):
+            data = await request.json()
+            return data.get('api_key') if isinstance(data, dict) else None
+    except Exception:
+        # 请求体无效时由接口自身返回错误
+        return None
+    return None
+
+
+def require_api_key(f):
+    """装饰器：要求API密钥验证，密钥的来源与 api.py 相同（请求头、URL参数、表单、JSON）
+
+    请求头和URL参数中有密钥时不解析请求体。
+    """
+    @functools.wraps(f)
+    async def decorated(request: Request):
+        provided_key = (request.headers.get('X-API-Key')
+                        or request.query_params.get('api_key')
+                        or await _body_api_key(request))
+        if not provided_key:
+            return _unauthorized("未提供API密钥")
+        if provided_key != API_KEY and provided_key not in EXTRA_API_KEYS:
+            return _unauthorized("API密钥无效")
+        request.state.api_key = provided_key
+        return await f(request)
+    return decorated
+
+
+def require_admission(f):
+    """装饰器：转换接口占用准入控制的名额（需在 require_api_key 之后）
+
+    排队时不占用线程。名额在接口返回后归还；流式响应的接口可以取走
+    request.state.admission，在发送完成后自行归还。
+    """
+    @functools.wraps(f)
+    async def decorated(request: Request):
+        try:
+            request.state.admission = await get_admission_controller().acquire_async(
+                request.state.api_key)
+        except AdmissionRejected as e:
+            return JSONResponse({"error": str(e), "status": e.reason}, status_code=e.status,
+                                headers={'Retry-After': str(e.retry_after)})
+        try:
+            return await f(request)
+        finally:
+            admission = getattr(request.state, 'admission', None)
+            if admission is not None:
+                admission.release()
+    return decorated
+
+
+class _AdmittedStreamingResponse(StreamingResponse):
+    """发送完成或客户端断开后归还准入名额的流式响应"""
+
+    def __init__(self, *args, admission, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.admission.release()
+
+
+class _MetricsMiddleware:
+    """按路由模板记录请求数、状态码和耗时"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            record_request(getattr(route, 'path', 'unmatched'), scope['method'], status,
+                           time.perf_counter() - start)
+
+
+class _BodyTooLarge(Exception):
+    """请求体超过 MAX_CONTENT_LENGTH"""
+    pass
+
+
+class _BodyLimitMiddleware:
+    """读取请求流时限制请求体大小
+
+    _too_large 只检查 Content-Length，分块传输的请求没有这个请求头。这里按实际收到的
+    字节数计算，超过 MAX_CONTENT_LENGTH 时停止读取并返回 413；接口捕获了读取异常
+    而返回的其他响应同样替换为 413。
+    """
+
+    def __init__(self, app, limit: int = MAX_CONTENT_LENGTH):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                raise _BodyTooLarge()
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded and not started:
+                return
+            if message['type'] == 'http.response.start':
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if started:
+                raise
+        if exceeded and not started:
+            response = JSONResponse({"error": "请求体过大"}, status_code=413)
+            await response(scope, receive, send)
+
+
+def _too_large(request: Request) -> bool:
+    try:
+        return int(request.headers.get('content-length', 0)) > MAX_CONTENT_LENGTH
+    except ValueError:
+        return False
+
+
+def _docx_response(data: bytes, filename: str) -> Response:
+    """以附件形式返回 docx 文件"""
+    ascii_name = filename.encode('ascii', 'ignore').decode() or 'document.docx'
+    disposition = f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+    return Response(data, media_type=DOCX_MIMETYPE,
+                    headers={'Content-Disposition': disposition})
+
+
+def _cached_response(request: Request, item, filename: str, status: str = 'HIT') -> Response:
+    """返回缓存的转换结果，ETag 为内容的 sha256，If-None-Match 匹配时返回 304"""
+    headers = {'ETag': f'"{item.meta.digest}"', 'X-Cache': status}
+    if etag_matches(request.headers.get('if-none-match'), item.meta.digest):
+        return Response(status_code=304, headers=headers)
+    response = _docx_response(item.data, filename)
+    response.headers.update(headers)
+    return response
+
+
+async def _convert_cached(request: Request, filename: str, source: bytes, options, convert,
+                          bundle: bool = False) -> Response:
+    """先查找转换结果缓存，未命中时执行转换并写入缓存，相同的并发请求共享一次转换
+
+    Args:
+        request: 当前请求
+        filename: 下载文件名
+        source: 上传的 Markdown 内容（或压缩包）
+        options: 影响转换结果的选项
+        convert: 执行转换、返回 docx 内容的协程函数
+        bundle: source 是否为压缩包
+    """
+    cache = get_response_cache()
+
+    def lookup():
+        key = cache.key(source, options)
+        return key, cache.get(key, volatile=cache.volatile(source, bundle=bundle))
+
+    key, cached = await asyncio.to_thread(lookup)
+    if cached is not None:
+        return _cached_response(request, cached, filename)
+
+    # 相同内容和选项的并发请求只转换一次
+    async def run():
+        data = await convert()
+        record_sizes(len(source), len(data))
+        return await asyncio.to_thread(cache.put, key, data)
+
+    item = await get_singleflight().do_async(key, run)
+    return _cached_response(request, item, filename, 'MISS')
+
+
+@require_api_key
+async def test_auth(request: Request):
+    """测试API密钥鉴权是否正常工作"""
+    return JSONResponse({
+        "status": "ok",
+        "message": "API密钥验证成功",
+        "api_key_source": "环境变量",
+        "api_key_value_masked": f"{API_KEY[:3]}...{API_KEY[-3:]}" if len(API_KEY) > 6 else "***"
+    })
+
+
+@require_api_key
+@require_admission
+async def convert_api(request: Request):
+    """接收Markdown文件并转换为DOCX格式
+
+    请求格式与 api.py 的 /api/convert 相同: multipart/form-data
+    参数:
+        - file: Markdown文件，或包含Markdown文件及其图片的zip压缩包
+        - entry: (可选) 压缩包内的Markdown文件路径，默认自动选择
+        - debug: (可选) 是否启用调试模式，默认为False
+        - image_dpi: (可选) 按显示尺寸缩小图片的目标DPI，默认嵌入原图
+
+    返回:
+        - DOCX文件下载
+    """
+    if _too_large(request):
+        return JSONResponse({"error": "上传的文件过大"}, status_code=413)
+    try:
+        with stage('decode'):
+            form = await request.form(max_part_size=MAX_CONTENT_LENGTH)
+    except Exception:
+        return JSONResponse({"error": "未找到上传的文件"}, status_code=400)
+
+    file = form.get('file')
+    if file is None or isinstance(file, str):
+        return JSONResponse({"error": "未找到上传的文件"}, status_code=400)
+    if not file.filename:
+        return JSONResponse({"error": "未选择文件"}, status_code=400)
+
+    is_bundle = file.filename.lower().endswith('.zip')
+    if not is_bundle and not file.filename.lower().endswith(('.md', '.markdown', '.mdown')):
+        return JSONResponse({"error": "仅支持Markdown文件或zip压缩包"}, status_code=400)
+
+    debug = str(form.get('debug', 'false')).lower() == 'true'
+    image_dpi = parse_image_dpi(form.get('image_dpi'))
+    output_filename = f"{Path(file.filename).stem}_{int(time.time())}.docx"
+    content = await file.read()
+
+    pool = get_engine_pool()
+    entry = form.get('entry')
+
+    async def convert():
+        if is_bundle:
+            return await pool.convert(bundle=content, entry=entry, debug=debug, image_dpi=image_dpi)
+        return await pool.convert(content.decode('utf-8'), debug=debug, image_dpi=image_dpi)
+
+    options = {'image_dpi': image_dpi, 'entry': entry} if is_bundle else {'image_dpi': image_dpi}
+    try:
+        return await _convert_cached(request, output_filename, content, options, convert,
+                                     bundle=is_bundle)
+    except (BundleError, UnicodeDecodeError) as e:
+        if is_bundle:
+            return JSONResponse({"error": f"压缩包无效: {str(e)}"}, status_code=400)
+        return JSONResponse({"error": f"转换过程中发生错误: {str(e)}"}, status_code=500)
+    except Exception as e:
+        return JSONResponse({"error": f"转换过程中发生错误: {str(e)}"}, status_code=500)
+
+
+async def _read_text_request(request: Request):
+    """读取 /api/convert/text 的请求参数，与 api.py 的 read_text_request 相同"""
+    encoding = request.headers.get('content-encoding')
+    mimetype, charset = parse_content_type(request.headers.get('content-type'))
+    if mimetype in MARKDOWN_MIMETYPES:
+        body = await read_body_async(request.stream(), encoding)
+        return {
+            'markdown': decode_text(body, charset),
+            'debug': request.query_params.get('debug', 'false').lower() == 'true',
+            'image_dpi': request.query_params.get('image_dpi')
+        }
+    if encoding:
+        try:
+            return json.loads(await read_body_async(request.stream(), encoding))
+        except ValueError:
+            raise BodyError(400, "JSON格式无效")
+    return await request.json()
+
+
+@require_api_key
+@require_admission
+async def convert_text_api(request: Request):
+    """接收Markdown文本并转换为DOCX格式
+
+    请求格式与 api.py 的 /api/convert/text 相同: application/json
+    请求体:
+        {
+            "markdown": "# 标题\n正文内容",
+            "debug": false,  // 可选，默认为false
+            "image_dpi": 150  // 可选，按显示尺寸缩小图片的目标DPI
+        }
+
+    也可以直接发送 text/markdown 或 text/plain 格式的 Markdown 文本，debug 和 image_dpi
+    通过URL参数传递。请求体可以使用 gzip 或 zstd 压缩（Content-Encoding）。
+
+    返回:
+        - DOCX文件下载
+    """
+    if _too_large(request):
+        return JSONResponse({"error": "请求体过大"}, status_code=413)
+    try:
+        with stage('decode'):
+            data = await _read_text_request(request)
+    except BodyError as e:
+        return JSONResponse({"error": str(e)}, status_code=e.status)
+    except Exception:
+        data = None
+    if not isinstance(data, dict) or 'markdown' not in data:
+        return JSONResponse({"error": "未提供Markdown文本"}, status_code=400)
+
+    markdown = data['markdown']
+    debug = bool(data.get('debug', False))
+    image_dpi = parse_image_dpi(data.get('image_dpi'))
+
+    async def convert():
+        return await get_engine_pool().convert(markdown, debug=debug, image_dpi=image_dpi)
+
+    try:
+        return await _convert_cached(request, f"document_{uuid.uuid4().hex}.docx",
+                                     markdown.encode('utf-8'), {'image_dpi': image_dpi}, convert)
+    except Exception as e:
+        return JSONResponse({"error": f"转换过程中发生错误: {str(e)}"}, status_code=500)
+
+
+@require_api_key
+@require_admission
+async def convert_batch_api(request: Request):
+    """批量转换多个Markdown文件
+
+    请求格式与 api.py 的 /api/convert/batch 相同: multipart/form-data
+    参数:
+        - files: Markdown文件或zip压缩包，可以上传多个
+        - debug: (可选) 是否启用调试模式，默认为False
+        - image_dpi: (可选) 按显示尺寸缩小图片的目标DPI，默认嵌入原图
+
+    返回:
+        - zip压缩包，各文件转换完成后立即写入并发送，最后的manifest.json记录每个文件的转换状态
+    """
+    if _too_large(request):
+        return JSONResponse({"error": "上传的文件过大"}, status_code=413)
+    try:
+        with stage('decode'):
+            form = await request.form(max_part_size=MAX_CONTENT_LENGTH)
+    except Exception:
+        return JSONResponse({"error": "未找到上传的文件"}, status_code=400)
+
+    files = [f for f in form.getlist('files') + form.getlist('file') if not isinstance(f, str)]
+    if not files:
+        return JSONResponse({"error": "未找到上传的文件"}, status_code=400)
+    debug = str(form.get('debug', 'false')).lower() == 'true'
+    image_dpi = parse_image_dpi(form.get('image_dpi'))
+
+    try:
+        items = collect_items([(f.filename or '', await f.read()) for f in files])
+    except BundleError as e:
+        return JSONResponse({"error": f"压缩包无效: {str(e)}"}, status_code=400)
+    except BatchError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    # 同时转换的其他文件各占用一个名额，计入该密钥的并发数
+    admission, request.state.admission = request.state.admission, None
+    controller, api_key = get_admission_controller(), request.state.api_key
+    return _AdmittedStreamingResponse(
+        aiter_batch(items, get_engine_pool(), debug=debug, image_dpi=image_dpi,
+                    extra_slot=lambda: controller.try_hold(api_key)),
+        media_type='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="batch_{int(time.time())}.zip"'},
+        admission=admission
+    )
+
+
+@require_api_key
+@require_admission
+async def submit_job_api(request: Request):
+    """提交异步转换任务，立即返回任务ID
+
+    请求格式与 api.py 的 /api/jobs 相同：JSON（与 /api/convert/text 相同）或
+    multipart/form-data（与 /api/convert 相同），另外可以指定 priority。
+
+    返回:
+        - 202: 任务ID、状态和排队位置，Location 响应头为任务状态地址
+        - 429/503: 超出准入控制的限额，或排队的任务数、任务总大小已达上限
+    """
+    if _too_large(request):
+        return JSONResponse({"error": "请求体过大"}, status_code=413)
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        try:
+            options = await request.form(max_part_size=MAX_CONTENT_LENGTH)
+        except Exception:
+            return JSONResponse({"error": "未找到上传的文件"}, status_code=400)
+        file = options.get('file')
+        if file is None or isinstance(file, str):
+            return JSONResponse({"error": "未找到上传的文件"}, status_code=400)
+        if not file.filename:
+            return JSONResponse({"error": "未选择文件"}, status_code=400)
+        is_bundle = file.filename.lower().endswith('.zip')
+        if not is_bundle and not file.filename.lower().endswith(('.md', '.markdown', '.mdown')):
+            return JSONResponse({"error": "仅支持Markdown文件或zip压缩包"}, status_code=400)
+
+        content = await file.read()
+        filename = f"{Path(file.filename).stem}_{int(time.time())}.docx"
+        if is_bundle:
+            params = {'markdown': None, 'bundle': content, 'entry': options.get('entry')}
+        else:
+            try:
+                params = {'markdown': content.decode('utf-8')}
+            except UnicodeDecodeError as e:
+                return JSONResponse({"error": f"文件不是UTF-8编码: {str(e)}"}, status_code=400)
+        params['debug'] = str(options.get('debug', 'false')).lower() == 'true'
+    else:
+        try:
+            options = await request.json()
+        except Exception:
+            options = None
+        if not isinstance(options, dict) or 'markdown' not in options:
+            return JSONResponse({"error": "未提供Markdown文本"}, status_code=400)
+        filename = f"document_{uuid.uuid4().hex}.docx"
+        params = {'markdown': options['markdown'], 'debug': bool(options.get('debug', False))}
+    params['image_dpi'] = parse_image_dpi(options.get('image_dpi'))
+
+    queue = get_job_queue()
+    try:
+        job = queue.submit(filename, priority=parse_priority(options.get('priority')),
+                           api_key=request.state.api_key, **params)
+    except QueueFull as e:
+        return JSONResponse({"error": str(e)}, status_code=503, headers={'Retry-After': '5'})
+
+    info = queue.describe(job)
+    info['status_url'] = request.url_for('job_status_api', job_id=job.id).path
+    info['result_url'] = request.url_for('job_result_api', job_id=job.id).path
+    return JSONResponse(info, status_code=202, headers={'Location': info['status_url']})
+
+
+@require_api_key
+async def job_status_api(request: Request):
+    """查询任务状态和排队位置"""
+    queue = get_job_queue()
+    job = queue.get(request.path_params['job_id'], api_key=request.state.api_key)
+    if job is None:
+        return JSONResponse({"error": "任务不存在或已过期"}, status_code=404)
+    return JSONResponse(queue.describe(job))
+
+
+@require_api_key
+async def job_result_api(request: Request):
+    """获取任务结果：完成时返回DOCX文件，未完成返回409，转换失败返回500"""
+    queue = get_job_queue()
+    job = queue.get(request.path_params['job_id'], api_key=request.state.api_key)
+    if job is None:
+        return JSONResponse({"error": "任务不存在或已过期"}, status_code=404)
+    # 结果可能随时被淘汰，先取出引用
+    result = job.result
+    if job.status == FAILED:
+        return JSONResponse({"error": f"转换过程中发生错误: {job.error}"}, status_code=500)
+    if job.status != SUCCEEDED or result is None:
+        info = queue.describe(job)
+        info['error'] = "任务尚未完成"
+        return JSONResponse(info, status_code=409)
+    return _docx_response(result, job.filename)
+
+
+@require_api_key
+async def cancel_job_api(request: Request):
+    """取消排队中的任务，或删除已完成的任务及其结果"""
+    queue = get_job_queue()
+    job_id = request.path_params['job_id']
+    if queue.get(job_id, api_key=request.state.api_key) is None:
+        return JSONResponse({"error": "任务不存在或已过期"}, status_code=404)
+    if not queue.cancel(job_id):
+        return JSONResponse({"error": "任务正在执行，无法取消"}, status_code=409)
+    return Response(status_code=204)
+
+
+async def metrics(request: Request):
+    """Prometheus 格式的指标 - 此接口不需要鉴权"""
+    return Response(render_metrics(), headers={'Content-Type': METRICS_CONTENT_TYPE})
+
+
+async def health_check(request: Request):
+    """健康检查接口 - 此接口不需要鉴权"""
+    return JSONResponse({
+        "status": "ok",
+        "service": "md2docx-api",
+        "mermaid_cache": get_diagram_cache().stats(),
+        "mermaid_breaker": get_render_breaker().stats(),
+        "engine": get_engine_pool().stats(),
+        "jobs": get_job_queue().stats(),
+        "response_cache": get_response_cache().stats(),
+        "singleflight": get_singleflight().stats(),
+        "admission": get_admission_controller().stats()
+    })
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """启动时预热渲染后端和转换进程，退出时停止任务队列并关闭进程池"""
+    pool = get_engine_pool()
+    await asyncio.gather(asyncio.to_thread(prewarm), asyncio.to_thread(pool.start))
+    yield
+    await asyncio.to_thread(get_job_queue().shutdown)
+    await asyncio.to_thread(pool.shutdown)
+
+
+app = Starlette(routes=[
+    Route('/api/test-auth', test_auth, methods=['GET']),
+    Route('/api/convert', convert_api, methods=['POST']),
+    Route('/api/convert/text', convert_text_api, methods=['POST']),
+    Route('/api/convert/batch', convert_batch_api, methods=['POST']),
+    Route('/api/jobs', submit_job_api, methods=['POST']),
+    Route('/api/jobs/{job_id}', job_status_api, methods=['GET'], name='job_status_api'),
+    Route('/api/jobs/{job_id}', cancel_job_api, methods=['DELETE']),
+    Route('/api/jobs/{job_id}/result', job_result_api, methods=['GET'], name='job_result_api'),
+    Route('/api/health', health_check, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+], middleware=[Middleware(_MetricsMiddleware), Middleware(_BodyLimitMiddleware)],
+    lifespan=lifespan)
+
+
+def start_server(host='0.0.0.0', port=5000, debug=False):
+    """启动异步API服务器"""
+    import uvicorn
+
+    uvicorn.run(app, host=host, port=port, log_level='debug' if debug else 'info')
@@ -0,0 +1,314 @@
+"""
+批量转换
+
+一次请求上传多个 Markdown 文件（或包含多个 Markdown 文件的 zip 压缩包），各文件在
+转换进程池中并行转换（同时提交的文件数有上限），结果以 zip 压缩包流式返回：每个文件
+转换完成后立即写入压缩包并发送给客户端，最后写入记录每个文件转换状态的 manifest.json。单个文件转换失败只
+记入清单，不影响其他文件。
+"""
+import asyncio
+import json
+import os
+import posixpath
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .admission import Admission
+from .converter.assets import list_documents
+from .converter.assets.bundle import MARKDOWN_SUFFIXES
+from .engine import EnginePool
+
+MANIFEST_NAME = 'manifest.json'
+
+# 一次批量转换的最大文件数
+BATCH_MAX_FILES = 200
+
+# 一次批量转换同时交给转换进程池的文件数
+BATCH_WINDOW = 2
+
+
+class BatchError(ValueError):
+    """批量转换的输入无效（没有可转换的文件或文件过多）"""
+    pass
+
+
+@dataclass
+class BatchItem:
+    """批量转换中的一个文件"""
+    index: int
+    source: str  # 上传的文件名或压缩包内的路径
+    output: str  # 结果压缩包中的 docx 文件名
+    markdown: Optional[str] = None
+    bundle: Optional[bytes] = None  # 来自压缩包时为整个压缩包，图片从中读取
+    entry: Optional[str] = None
+    error: Optional[str] = None  # 不为 None 时不提交转换，直接记为失败
+
+
+def batch_max_files() -> int:
+    """一次批量转换的最大文件数，通过环境变量 MD2DOCX_BATCH_MAX_FILES 配置"""
+    try:
+        return int(os.environ['MD2DOCX_BATCH_MAX_FILES'])
+    except (KeyError, ValueError):
+        return BATCH_MAX_FILES
+
+
+def batch_window() -> int:
+    """一次批量转换同时交给转换进程池的文件数，通过环境变量 MD2DOCX_BATCH_WINDOW 配置
+
+    批量转换只占用一个准入名额，限制同时提交的文件数，避免一次批量转换占满转换
+    进程池的队列，使其他请求长时间排队。
+    """
+    try:
+        window = int(os.environ['MD2DOCX_BATCH_WINDOW'])
+    except (KeyError, ValueError):
+        return BATCH_WINDOW
+    return max(1, window)
+
+
+def collect_items(uploads: List[Tuple[str, bytes]]) -> List[BatchItem]:
+    """把上传的文件展开为待转换的文件列表
+
+    zip 压缩包中的每个 Markdown 文件单独转换，图片相对各自的目录从压缩包中读取。
+    无法解码或类型不支持的文件仍然列出，在清单中记为失败。
+
+    Args:
+        uploads: (文件名, 内容) 列表
+
+    Returns:
+        List[BatchItem]: 待转换的文件
+
+    Raises:
+        BundleError: 压缩包无效
+        BatchError: 没有可转换的文件或文件数超过上限
+    """
+    items: List[BatchItem] = []
+    outputs = set()
+
+    def add(source, **kwargs):
+        output = _output_name(source, outputs)
+        outputs.add(output)
+        items.append(BatchItem(len(items), source, output, **kwargs))
+
+    for filename, content in uploads:
+        lower = filename.lower()
+        if lower.endswith('.zip'):
+            for name in list_documents(content):
+                add(name, bundle=content, entry=name)
+        elif lower.endswith(MARKDOWN_SUFFIXES):
+            try:
+                add(filename, markdown=content.decode('utf-8'))
+            except UnicodeDecodeError as e:
+                add(filename, error=f"文件不是UTF-8编码: {str(e)}")
+        else:
+            add(filename, error="仅支持Markdown文件或zip压缩包")
+
+    if not items:
+        raise BatchError("没有可转换的Markdown文件")
+    limit = batch_max_files()
+    if len(items) > limit:
+        raise BatchError(f"文件过多: {len(items)} 个，最多 {limit} 个")
+    return items
+
+
+def _output_name(source: str, taken) -> str:
+    """由源文件路径生成结果文件名，去掉越出根目录的部分，重名时加序号"""
+    parts = [part for part in source.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+    stem = posixpath.splitext('/'.join(parts) or 'document')[0]
+    name = f"{stem}.docx"
+    counter = 1
+    while name in taken or name == MANIFEST_NAME:
+        name = f"{stem}-{counter}.docx"
+        counter += 1
+    return name
+
+
+class _Sink:
+    """只追加的输出缓冲；没有 tell/seek，zipfile 以流式模式写入（使用数据描述符）"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class BatchArchive:
+    """逐个写入转换结果的 zip 压缩包，每次写入返回可以立即发送的数据"""
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, 'w')
+        self._entries: Dict[int, Dict] = {}
+
+    def add(self, item: BatchItem, data: Optional[bytes] = None,
+            error: Optional[str] = None) -> bytes:
+        """写入一个文件的转换结果
+
+        Args:
+            item: 批量转换中的文件
+            data: docx 内容，转换失败时为 None
+            error: 失败原因
+
+        Returns:
+            bytes: 新产生的压缩包数据
+        """
+        entry = {'source': item.source, 'output': None, 'status': 'error', 'bytes': 0}
+        if data is not None:
+            info = zipfile.ZipInfo(item.output, date_time=time.localtime(time.time())[:6])
+            # docx 本身已经压缩，直接存储
+            self._zip.writestr(info, data, compress_type=zipfile.ZIP_STORED)
+            entry.update(output=item.output, status='ok', bytes=len(data))
+        else:
+            entry['error'] = error or "转换失败"
+        self._entries[item.index] = entry
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """写入清单并结束压缩包，返回剩余的数据"""
+        files = [self._entries[index] for index in sorted(self._entries)]
+        succeeded = sum(entry['status'] == 'ok' for entry in files)
+        manifest = {
+            'total': len(files),
+            'succeeded': succeeded,
+            'failed': len(files) - succeeded,
+            'files': files,
+        }
+        self._zip.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2),
+                           compress_type=zipfile.ZIP_DEFLATED)
+        self._zip.close()
+        return self._sink.drain()
+
+
+def iter_batch(items: List[BatchItem], pool: EnginePool, debug: bool = False,
+               image_dpi: Optional[int] = None,
+               extra_slot: Optional[Callable[[], Optional[Admission]]] = None) -> Iterator[bytes]:
+    """在转换进程池中并行转换，按完成顺序产生结果压缩包的数据（同步服务使用）
+
+    每个文件由一个线程先在本进程中预先获取图片和图表，再交给转换进程池。同时转换的
+    文件数不超过 batch_window()，一个文件完成后再提交下一个。客户端断开连接（生成器
+    被关闭）时取消尚未开始的转换。
+
+    Args:
+        extra_slot: 为第一个以外同时转换的文件占用准入名额的函数，没有名额时返回 None，
+            此时等前面的文件完成后再提交；第一个文件使用批量请求本身的名额
+    """
+    archive = BatchArchive()
+    futures = {}
+    waiting, head = _ready_items(items, archive)
+    window = batch_window()
+    executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix='md2docx-batch')
+    try:
+        if head:
+            yield head
+        pending = set()
+        while waiting or pending:
+            while waiting and len(pending) < window:
+                slot = _take_slot(pending, extra_slot)
+                if slot is False:
+                    break
+                item = waiting.pop()
+                future = executor.submit(_convert_sync, pool, item, debug, image_dpi)
+                _release_when_done(future, slot)
+                futures[future] = item
+                pending.add(future)
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield _add_result(archive, futures[future], future)
+        yield archive.close()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _convert_sync(pool: EnginePool, item: BatchItem, debug: bool, image_dpi: Optional[int]) -> bytes:
+    """在线程中转换一个文件：预先获取资源后交给转换进程池并等待结果"""
+    return asyncio.run(pool.convert(item.markdown, debug=debug, image_dpi=image_dpi,
+                                    bundle=item.bundle, entry=item.entry))
+
+
+async def aiter_batch(items: List[BatchItem], pool: EnginePool, debug: bool = False,
+                      image_dpi: Optional[int] = None,
+                      extra_slot: Optional[Callable[[], Optional[Admission]]] = None
+                      ) -> AsyncIterator[bytes]:
+    """在转换进程池中并行转换，按完成顺序产生结果压缩包的数据（异步服务使用）
+
+    同时转换的文件数和占用的准入名额与 iter_batch 相同。客户端断开连接时取消尚未
+    完成的转换任务。
+    """
+    archive = BatchArchive()
+    tasks = {}
+    waiting, head = _ready_items(items, archive)
+    try:
+        if head:
+            yield head
+        window = batch_window()
+        pending = set()
+        while waiting or pending:
+            while waiting and len(pending) < window:
+                slot = _take_slot(pending, extra_slot)
+                if slot is False:
+                    break
+                item = waiting.pop()
+                task = asyncio.ensure_future(pool.convert(item.markdown, debug=debug, image_dpi=image_dpi,
+                                                          bundle=item.bundle, entry=item.entry))
+                _release_when_done(task, slot)
+                tasks[task] = item
+                pending.add(task)
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield _add_result(archive, tasks[task], task)
+        yield archive.close()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _ready_items(items: List[BatchItem], archive: BatchArchive) -> Tuple[List[BatchItem], bytes]:
+    """把无法转换的文件直接记为失败
+
+    Returns:
+        Tuple[List[BatchItem], bytes]: 待转换的文件（逆序，从末尾取出）和新产生的压缩包数据
+    """
+    waiting = []
+    chunks = []
+    for item in items:
+        if item.error is not None:
+            chunks.append(archive.add(item, error=item.error))
+        else:
+            waiting.append(item)
+    waiting.reverse()
+    return waiting, b''.join(chunks)
+
+
+def _take_slot(pending, extra_slot) -> Union[Admission, None, bool]:
+    """为下一个文件占用名额：没有转换中的文件时使用批量请求本身的名额（返回 None），
+    需要但没有空闲名额时返回 False"""
+    if not pending or extra_slot is None:
+        return None
+    slot = extra_slot()
+    return False if slot is None else slot
+
+
+def _release_when_done(future, slot: Optional[Admission]) -> None:
+    if slot is not None:
+        future.add_done_callback(lambda _: slot.release())
+
+
+def _add_result(archive: BatchArchive, item: BatchItem, future) -> bytes:
+    """把一个已完成的转换写入压缩包"""
+    try:
+        data = future.result()
+    except Exception as e:
+        return archive.add(item, error=str(e))
+    return archive.add(item, data)
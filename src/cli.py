@@ -6,25 +6,44 @@ import os
 import argparse
 import time
 from pathlib import Path
+from typing import List, Optional
 from docx import Document
 from .converter import BaseConverter
+from .converter.assets import ImageResolver, MarkdownBundle, save_document
 
 
-def convert_file(input_file: str, output_file: str, debug: bool = False) -> None:
+def convert_file(input_file: str, output_file: str, debug: bool = False,
+                 image_dpi: Optional[int] = None,
+                 image_paths: Optional[List[str]] = None,
+                 entry: Optional[str] = None) -> None:
     """转换文件
     
     Args:
-        input_file: 输入的 Markdown 文件路径
+        input_file: 输入的 Markdown 文件或 zip 压缩包路径
         output_file: 输出的 DOCX 文件路径
         debug: 是否显示调试信息
+        image_dpi: 图片按显示尺寸重新采样的目标DPI，为 None 时嵌入原图
+        image_paths: 本地图片的额外搜索目录，先在 Markdown 文件所在目录中查找
+        entry: 压缩包内的 Markdown 文件路径，为 None 时自动选择
     """
-    # 读取输入文件
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # 初始化转换器并执行转换
-    converter = BaseConverter(debug=debug)
-    doc = converter.convert(content)
+    if input_file.lower().endswith('.zip'):
+        # 压缩包中的图片在转换时按需读取，不解压到磁盘
+        with MarkdownBundle(input_file, entry=entry) as bundle:
+            content = bundle.read_markdown()
+            converter = BaseConverter(debug=debug, image_dpi=image_dpi,
+                                      image_resolver=bundle.resolver())
+            doc = converter.convert(content)
+    else:
+        # 读取输入文件
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        # 初始化转换器并执行转换
+        # 本地图片相对于 Markdown 文件所在目录解析
+        resolver = ImageResolver(base_dir=os.path.dirname(os.path.abspath(input_file)),
+                                 search_paths=image_paths or ())
+        converter = BaseConverter(debug=debug, image_dpi=image_dpi, image_resolver=resolver)
+        doc = converter.convert(content)
     
     # 检查输出文件是否被占用，如果是则添加时间戳后缀
     output_path = Path(output_file)
@@ -34,7 +53,7 @@ def convert_file(input_file: str, output_file: str, debug: bool = False) -> None
     while attempt < 5:  # 最多尝试5次
         try:
             # 尝试保存文件
-            doc.save(final_output_file)
+            save_document(doc, final_output_file)
             print(f"转换完成: {final_output_file}")
             return
         except PermissionError:
@@ -55,9 +74,14 @@ def convert_file(input_file: str, output_file: str, debug: bool = False) -> None
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='将 Markdown 文件转换为 DOCX 文件')
-    parser.add_argument('input', help='输入的 Markdown 文件路径')
+    parser.add_argument('input', help='输入的 Markdown 文件或 zip 压缩包路径')
     parser.add_argument('output', help='输出的 DOCX 文件路径')
     parser.add_argument('--debug', action='store_true', help='显示调试信息')
+    parser.add_argument('--image-dpi', type=int, default=None,
+                        help='按显示尺寸缩小图片的目标DPI（如150），默认嵌入原图')
+    parser.add_argument('--image-path', action='append', default=[], dest='image_paths',
+                        help='本地图片的额外搜索目录，可多次指定')
+    parser.add_argument('--entry', help='压缩包内的 Markdown 文件路径，默认自动选择')
     
     args = parser.parse_args()
     
@@ -66,7 +90,8 @@ def main():
         sys.exit(1)
     
     try:
-        convert_file(args.input, args.output, args.debug)
+        convert_file(args.input, args.output, args.debug, args.image_dpi, args.image_paths,
+                     args.entry)
     except Exception as e:
         print(f"错误: {str(e)}")
         sys.exit(1)
@@ -0,0 +1,71 @@
+"""
+图片等外部资源的获取、缓存与嵌入
+"""
+from .cache import (
+    ImageCache,
+    ImageMeta,
+    CachedImage,
+    default_cache_dir,
+    get_image_cache,
+    set_image_cache,
+    sniff_image_meta
+)
+from .http import (
+    HttpClient,
+    FetchDeadline,
+    FetchDeadlineExceeded,
+    DownloadBudget,
+    DownloadRejected,
+    get_http_client,
+    set_http_client
+)
+from .picture import add_picture, add_svg_picture, release_spool
+from .spool import (
+    SharedOutput,
+    SpooledImagePart,
+    save_document,
+    serialize_document,
+    response_memory_limit
+)
+from .processing import ImageOptimizer
+from .normalize import ImageNormalizer, UnsupportedImageFormat, detect_format
+from .svg import svg_fallback_png, svg_size
+from .resolver import ImageResolver, StatCache
+from .bundle import MarkdownBundle, BundleImageResolver, BundleError, list_documents
+
+__all__ = [
+    'ImageCache',
+    'ImageMeta',
+    'CachedImage',
+    'default_cache_dir',
+    'get_image_cache',
+    'set_image_cache',
+    'sniff_image_meta',
+    'HttpClient',
+    'FetchDeadline',
+    'FetchDeadlineExceeded',
+    'DownloadBudget',
+    'DownloadRejected',
+    'get_http_client',
+    'set_http_client',
+    'add_picture',
+    'add_svg_picture',
+    'release_spool',
+    'SharedOutput',
+    'SpooledImagePart',
+    'save_document',
+    'serialize_document',
+    'response_memory_limit',
+    'ImageOptimizer',
+    'ImageNormalizer',
+    'UnsupportedImageFormat',
+    'detect_format',
+    'svg_fallback_png',
+    'svg_size',
+    'ImageResolver',
+    'StatCache',
+    'MarkdownBundle',
+    'BundleImageResolver',
+    'BundleError',
+    'list_documents'
+]
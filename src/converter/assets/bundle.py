@@ -0,0 +1,206 @@
+"""
+Markdown 压缩包输入
+
+压缩包中包含 Markdown 文件及其引用的图片。图片不解压到临时目录，而是在转换
+过程中按需从压缩包成员读取，未被引用的成员不会被解压。
+
+压缩包中的图片在共享图片缓存中以解压后内容的 sha256 作为键和验证标识。zip 头部的
+CRC32 和大小可以由上传者任意构造，不能用来判断两个成员的内容是否相同。
+"""
+import hashlib
+import io
+import posixpath
+import threading
+import zipfile
+from typing import BinaryIO, Dict, List, Optional, Union
+from urllib.parse import unquote
+
+MARKDOWN_SUFFIXES = ('.md', '.markdown', '.mdown')
+
+# 未指定入口文件时优先使用的文件名
+PREFERRED_ENTRIES = ('index.md', 'readme.md')
+
+
+class BundleError(ValueError):
+    """压缩包无效或无法确定入口文件"""
+    pass
+
+
+class MarkdownBundle:
+    """包含 Markdown 文件和图片资源的 zip 压缩包"""
+
+    def __init__(self, source: Union[str, bytes, BinaryIO], entry: Optional[str] = None,
+                 max_member_bytes: int = 50 * 1024 * 1024):
+        """打开压缩包
+
+        Args:
+            source: 压缩包路径、内容或可随机访问的文件对象
+            entry: 压缩包内的 Markdown 文件路径，为 None 时自动选择
+            max_member_bytes: 单个成员解压后的最大字节数
+
+        Raises:
+            BundleError: 不是有效的压缩包或找不到 Markdown 文件
+        """
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        try:
+            self._zip = zipfile.ZipFile(source)
+        except zipfile.BadZipFile as e:
+            raise BundleError(f"无效的压缩包: {str(e)}")
+        self.max_member_bytes = max_member_bytes
+        self._lock = threading.Lock()
+        # 只读取中央目录，成员内容在需要时才解压
+        self._members = {
+            info.filename: info for info in self._zip.infolist() if not info.is_dir()
+        }
+        self.entry = self._select_entry(entry)
+
+    def read_markdown(self, encoding: str = 'utf-8') -> str:
+        """读取入口 Markdown 文件的内容"""
+        return self.read(self.entry).decode(encoding)
+
+    def resolver(self) -> 'BundleImageResolver':
+        """创建相对入口文件目录解析图片的解析器"""
+        return BundleImageResolver(self, posixpath.dirname(self.entry))
+
+    def member(self, name: str) -> Optional[zipfile.ZipInfo]:
+        return self._members.get(name)
+
+    def read(self, name: str) -> bytes:
+        """解压单个成员
+
+        Raises:
+            BundleError: 成员不存在或解压后超出大小限制
+        """
+        info = self._members.get(name)
+        if info is None:
+            raise BundleError(f"压缩包中不存在: {name}")
+        if info.file_size > self.max_member_bytes:
+            raise BundleError(f"压缩包成员过大: {name} ({info.file_size} 字节)")
+        with self._lock:
+            with self._zip.open(info) as f:
+                # 按声明大小读取，防止伪造头部信息的压缩炸弹
+                data = f.read(self.max_member_bytes + 1)
+        if len(data) > self.max_member_bytes:
+            raise BundleError(f"压缩包成员过大: {name}")
+        return data
+
+    def digest(self, name: str) -> str:
+        """按块解压单个成员并计算内容的 sha256，不把整个成员读入内存
+
+        Raises:
+            BundleError: 成员不存在或解压后超出大小限制
+        """
+        info = self._members.get(name)
+        if info is None:
+            raise BundleError(f"压缩包中不存在: {name}")
+        if info.file_size > self.max_member_bytes:
+            raise BundleError(f"压缩包成员过大: {name} ({info.file_size} 字节)")
+        digest = hashlib.sha256()
+        size = 0
+        with self._lock:
+            with self._zip.open(info) as f:
+                for chunk in iter(lambda: f.read(64 * 1024), b''):
+                    size += len(chunk)
+                    if size > self.max_member_bytes:
+                        raise BundleError(f"压缩包成员过大: {name}")
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    def markdown_files(self) -> List[str]:
+        return sorted(name for name in self._members if name.lower().endswith(MARKDOWN_SUFFIXES))
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self) -> 'MarkdownBundle':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _select_entry(self, entry: Optional[str]) -> str:
+        if entry:
+            entry = _normalize(entry)
+            if entry not in self._members:
+                raise BundleError(f"压缩包中不存在入口文件: {entry}")
+            return entry
+
+        candidates = _documents(self.markdown_files())
+        if not candidates:
+            raise BundleError("压缩包中没有Markdown文件")
+        if len(candidates) == 1:
+            return candidates[0]
+
+        # 多个 Markdown 文件时选择层级最浅的 index.md / README.md
+        candidates.sort(key=lambda name: (name.count('/'), name))
+        for name in candidates:
+            if posixpath.basename(name).lower() in PREFERRED_ENTRIES:
+                return name
+        shallowest = [name for name in candidates if name.count('/') == candidates[0].count('/')]
+        if len(shallowest) == 1:
+            return shallowest[0]
+        raise BundleError(f"压缩包中有多个Markdown文件，请指定入口文件: {', '.join(shallowest)}")
+
+
+def list_documents(source: Union[str, bytes, BinaryIO]) -> List[str]:
+    """列出压缩包中可以作为入口的 Markdown 文件（不含隐藏文件和 __MACOSX 目录）
+
+    Raises:
+        BundleError: 不是有效的压缩包
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    try:
+        with zipfile.ZipFile(source) as zf:
+            names = [info.filename for info in zf.infolist() if not info.is_dir()]
+    except zipfile.BadZipFile as e:
+        raise BundleError(f"无效的压缩包: {str(e)}")
+    return _documents(sorted(name for name in names if name.lower().endswith(MARKDOWN_SUFFIXES)))
+
+
+def _documents(names: List[str]) -> List[str]:
+    return [name for name in names
+            if not posixpath.basename(name).startswith('.') and not name.startswith('__MACOSX/')]
+
+
+class BundleImageResolver:
+    """从压缩包成员中解析和读取图片，接口与 ImageResolver 一致"""
+
+    def __init__(self, bundle: MarkdownBundle, base_dir: str = ''):
+        self.bundle = bundle
+        self.base_dir = base_dir
+        # 成员名 -> 内容的 sha256
+        self._digests: Dict[str, str] = {}
+
+    def resolve(self, src: str) -> Optional[str]:
+        """将图片地址解析为压缩包成员名，越出压缩包根目录的路径视为不存在"""
+        src = unquote(src.split('?', 1)[0].split('#', 1)[0])
+        if not src or src.startswith(('/', '\\')) or ':' in src:
+            return None
+        name = _normalize(posixpath.join(self.base_dir, src.replace('\\', '/')))
+        if name.startswith('../') or name == '..':
+            return None
+        return name if self.bundle.member(name) is not None else None
+
+    def cache_key(self, name: str) -> str:
+        """图片缓存使用的键：内容相同的图片共用一个缓存条目，与成员名无关"""
+        return f"zip:sha256:{self._digest(name)}"
+
+    def validator(self, name: str) -> Optional[str]:
+        if self.bundle.member(name) is None:
+            return None
+        return f'"{self._digest(name)}"'
+
+    def read(self, name: str) -> bytes:
+        return self.bundle.read(name)
+
+    def _digest(self, name: str) -> str:
+        digest = self._digests.get(name)
+        if digest is None:
+            digest = self._digests[name] = self.bundle.digest(name)
+        return digest
+
+
+def _normalize(name: str) -> str:
+    return posixpath.normpath(name.replace('\\', '/'))
@@ -0,0 +1,506 @@
+"""
+图片共享缓存模块
+
+两级缓存：进程内按字节预算淘汰的 LRU 内存层，以及按内容哈希寻址、
+按总大小淘汰的磁盘层。磁盘层通过原子替换和文件锁保证多个 API 工作进程
+同时读写时的一致性。
+
+磁盘层的目录只允许当前用户访问（0700），打开时检查目录属于当前用户且其他用户
+不可写，避免在共享的临时目录中读到他人预先放置的缓存内容。
+"""
+import os
+import json
+import stat
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Iterator, Optional
+
+from docx.image.image import Image as DocxImage
+
+try:  # Windows 下没有 fcntl，此时只依赖原子替换保证一致性
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+@dataclass
+class ImageMeta:
+    """图片元数据，解析一次后随图片一起缓存"""
+    digest: str  # 内容的 sha256，同时作为磁盘层的寻址键
+    sha1: str  # python-docx 用于去重图片部件的哈希
+    size: int
+    content_type: Optional[str] = None
+    ext: Optional[str] = None
+    px_width: Optional[int] = None
+    px_height: Optional[int] = None
+    horz_dpi: Optional[int] = None
+    vert_dpi: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    stored_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ImageMeta':
+        known = {name: data[name] for name in cls.__dataclass_fields__ if name in data}
+        return cls(**known)
+
+    @property
+    def recognized(self) -> bool:
+        """python-docx 是否能识别该图片格式"""
+        return self.content_type is not None and self.px_width is not None
+
+
+@dataclass
+class CachedImage:
+    """缓存中的一张图片"""
+    key: str
+    data: bytes
+    meta: ImageMeta
+
+    def is_fresh(self, ttl: float) -> bool:
+        """是否仍在新鲜期内（新鲜期内无需向源站重新验证）"""
+        return time.time() - self.meta.stored_at < ttl
+
+
+def sniff_image_meta(data: bytes, etag: Optional[str] = None,
+                     last_modified: Optional[str] = None) -> ImageMeta:
+    """计算哈希并解析图片头部信息
+
+    Args:
+        data: 图片数据
+        etag: 源站返回的 ETag
+        last_modified: 源站返回的 Last-Modified
+
+    Returns:
+        ImageMeta: 图片元数据，无法识别的格式只包含哈希和大小
+    """
+    meta = ImageMeta(
+        digest=hashlib.sha256(data).hexdigest(),
+        sha1=hashlib.sha1(data).hexdigest(),
+        size=len(data),
+        etag=etag,
+        last_modified=last_modified,
+    )
+    try:
+        image = DocxImage.from_blob(data)
+        meta.content_type = image.content_type
+        meta.ext = image.ext
+        meta.px_width = image.px_width
+        meta.px_height = image.px_height
+        meta.horz_dpi = image.horz_dpi
+        meta.vert_dpi = image.vert_dpi
+    except Exception:
+        # 无法识别的格式交给后续流程处理
+        pass
+    return meta
+
+
+class MemoryLRU:
+    """按字节预算淘汰的线程安全 LRU"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: 'OrderedDict[str, CachedImage]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, item: CachedImage) -> None:
+        size = len(item.data)
+        with self._lock:
+            self._discard_locked(item.key)
+            # 超过整个预算的单个条目不进入内存层
+            if size > self.max_bytes:
+                return
+            self._items[item.key] = item
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted.data)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._discard_locked(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def _discard_locked(self, key: str) -> None:
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.data)
+
+
+def default_cache_dir(name: str) -> str:
+    """默认的磁盘缓存目录
+
+    设置了 XDG_CACHE_HOME 时为 $XDG_CACHE_HOME/md2docx/<name>，否则为系统临时目录下
+    当前用户专用的 md2docx-cache-<uid>/<name>。
+
+    Args:
+        name: 缓存名称（images、mermaid、responses）
+    """
+    base = os.environ.get('XDG_CACHE_HOME')
+    if base:
+        return os.path.join(base, 'md2docx', name)
+    user = os.getuid() if hasattr(os, 'getuid') else os.environ.get('USERNAME', 'user')
+    return os.path.join(tempfile.gettempdir(), f'md2docx-cache-{user}', name)
+
+
+def private_dir(path: str) -> None:
+    """创建只有当前用户可以访问的目录，已存在时检查其属主和权限
+
+    上级目录同样需要属于当前用户（或 root），其他用户可写时必须设置了粘滞位，
+    否则其他用户可以替换整个目录。
+
+    Raises:
+        PermissionError: 目录不属于当前用户，或者其他用户可以写入或替换
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, mode=0o700, exist_ok=True)
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    if not hasattr(os, 'getuid'):  # pragma: no cover
+        return
+    info = os.stat(parent)
+    if info.st_uid not in (os.getuid(), 0):
+        raise PermissionError(f"缓存目录的上级目录不属于当前用户: {parent}")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH) and not info.st_mode & stat.S_ISVTX:
+        raise PermissionError(f"缓存目录的上级目录可被其他用户写入: {parent}")
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"缓存目录不属于当前用户: {path}")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"缓存目录可被其他用户写入: {path}")
+
+
+class DiskStore:
+    """按内容寻址的磁盘存储
+
+    目录结构::
+
+        root/objects/ab/<sha256>   图片数据，相同内容只存一份
+        root/index/<sha256(key)>.json   键到元数据（含内容哈希）的映射
+        root/.lock   淘汰时使用的跨进程文件锁
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._objects_dir = os.path.join(root, 'objects')
+        self._index_dir = os.path.join(root, 'index')
+        private_dir(root)
+        os.makedirs(self._objects_dir, mode=0o700, exist_ok=True)
+        os.makedirs(self._index_dir, mode=0o700, exist_ok=True)
+        self._lock_path = os.path.join(root, '.lock')
+        self._approx_bytes = self._scan_bytes()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        meta = self._read_index(key)
+        if meta is None:
+            return None
+        path = self.object_path(meta.digest)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # 更新访问时间，淘汰时按修改时间近似 LRU
+            os.utime(path, None)
+        except OSError:
+            # 对象已被其他进程淘汰
+            return None
+        return CachedImage(key, data, meta)
+
+    def put(self, key: str, data: bytes, meta: ImageMeta) -> None:
+        path = self.object_path(meta.digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._atomic_write(path, data)
+            with self._lock:
+                self._approx_bytes += len(data)
+        self.write_meta(key, meta)
+        if self._approx_bytes > self.max_bytes:
+            self.evict()
+
+    def write_meta(self, key: str, meta: ImageMeta) -> None:
+        """写入（或刷新）键对应的元数据"""
+        payload = json.dumps(meta.to_dict()).encode('utf-8')
+        self._atomic_write(self._index_path(key), payload)
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self._objects_dir, digest[:2], digest)
+
+    def evict(self) -> int:
+        """淘汰最久未访问的对象，直到总大小低于预算的 90%，并删除指向已删除对象的索引
+
+        Returns:
+            int: 删除的对象数量
+        """
+        removed = 0
+        with self._file_lock():
+            entries = []
+            total = 0
+            for path in self._iter_objects():
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            target = int(self.max_bytes * 0.9)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            with self._lock:
+                self._approx_bytes = total
+            if removed:
+                self._prune_index()
+        return removed
+
+    def _prune_index(self) -> None:
+        """删除对象已不存在的索引（调用方持有文件锁）"""
+        for name in os.listdir(self._index_dir):
+            if name.startswith('.tmp-'):
+                continue
+            path = os.path.join(self._index_dir, name)
+            try:
+                with open(path, 'rb') as f:
+                    digest = json.loads(f.read().decode('utf-8'))['digest']
+            except (OSError, ValueError, TypeError, KeyError):
+                digest = None
+            if digest is None or not os.path.exists(self.object_path(digest)):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        with self._file_lock():
+            for directory in (self._objects_dir, self._index_dir):
+                for dirpath, _, filenames in os.walk(directory):
+                    for name in filenames:
+                        try:
+                            os.unlink(os.path.join(dirpath, name))
+                        except OSError:
+                            pass
+            with self._lock:
+                self._approx_bytes = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return self._approx_bytes
+
+    def _read_index(self, key: str) -> Optional[ImageMeta]:
+        try:
+            with open(self._index_path(key), 'rb') as f:
+                return ImageMeta.from_dict(json.loads(f.read().decode('utf-8')))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _index_path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self._index_dir, name + '.json')
+
+    def _atomic_write(self, path: str, data: bytes) -> None:
+        # 先写临时文件再原子替换，其他进程永远不会读到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _iter_objects(self) -> Iterator[str]:
+        for dirpath, _, filenames in os.walk(self._objects_dir):
+            for name in filenames:
+                if not name.startswith('.tmp-'):
+                    yield os.path.join(dirpath, name)
+
+    def _scan_bytes(self) -> int:
+        total = 0
+        for path in self._iter_objects():
+            try:
+                total += os.path.getsize(path)
+            except OSError:
+                pass
+        return total
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with open(self._lock_path, 'a+') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ImageCache:
+    """两级图片缓存：内存 LRU + 磁盘内容寻址存储"""
+
+    def __init__(self, max_memory_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024,
+                 ttl: float = 300):
+        """初始化图片缓存
+
+        Args:
+            max_memory_bytes: 内存层字节预算
+            disk_dir: 磁盘层目录，为 None 时只使用内存层
+            max_disk_bytes: 磁盘层字节预算
+            ttl: 远程图片的新鲜期（秒），过期后需要用 ETag/Last-Modified 重新验证
+        """
+        self.memory = MemoryLRU(max_memory_bytes)
+        self.disk = DiskStore(disk_dir, max_disk_bytes) if disk_dir else None
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        """按键读取缓存，磁盘层命中时提升到内存层"""
+        item = self.memory.get(key)
+        if item is None and self.disk is not None:
+            item = self.disk.get(key)
+            if item is not None:
+                self.memory.put(item)
+        if item is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return item
+
+    def put(self, key: str, data: bytes, etag: Optional[str] = None,
+            last_modified: Optional[str] = None) -> CachedImage:
+        """写入缓存
+
+        Args:
+            key: 缓存键（URL 或本地路径）
+            data: 图片数据
+            etag: 用于重新验证的 ETag
+            last_modified: 用于重新验证的 Last-Modified
+
+        Returns:
+            CachedImage: 写入的缓存条目
+        """
+        item = CachedImage(key, data, sniff_image_meta(data, etag, last_modified))
+        self.memory.put(item)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, data, item.meta)
+            except OSError:
+                # 磁盘层只是加速手段，写入失败不影响转换
+                pass
+        return item
+
+    def refresh(self, item: CachedImage) -> CachedImage:
+        """源站确认内容未变化（304）后刷新新鲜期"""
+        item.meta.stored_at = time.time()
+        self.memory.put(item)
+        if self.disk is not None:
+            try:
+                self.disk.write_meta(item.key, item.meta)
+            except OSError:
+                pass
+        return item
+
+    def object_file(self, item: CachedImage) -> Optional[str]:
+        """磁盘层中保存该图片数据的文件，不存在时返回 None"""
+        if self.disk is None:
+            return None
+        path = self.disk.object_path(item.meta.digest)
+        return path if os.path.exists(path) else None
+
+    def discard(self, key: str) -> None:
+        self.memory.discard(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        """缓存统计信息"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_entries': len(self.memory),
+            'memory_bytes': self.memory.current_bytes,
+            'disk_bytes': self.disk.current_bytes if self.disk is not None else 0,
+        }
+
+
+_shared_cache: Optional[ImageCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """获取进程内共享的图片缓存
+
+    通过环境变量配置：
+        MD2DOCX_IMAGE_CACHE_DIR: 磁盘层目录，默认见 default_cache_dir，设为空字符串时禁用磁盘层
+        MD2DOCX_IMAGE_CACHE_MEMORY_MB: 内存层预算（MB），默认 64
+        MD2DOCX_IMAGE_CACHE_DISK_MB: 磁盘层预算（MB），默认 512
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            disk_dir = os.environ.get('MD2DOCX_IMAGE_CACHE_DIR', default_cache_dir('images'))
+            memory_mb = int(os.environ.get('MD2DOCX_IMAGE_CACHE_MEMORY_MB', 64))
+            disk_mb = int(os.environ.get('MD2DOCX_IMAGE_CACHE_DISK_MB', 512))
+            _shared_cache = ImageCache(
+                max_memory_bytes=memory_mb * 1024 * 1024,
+                disk_dir=disk_dir or None,
+                max_disk_bytes=disk_mb * 1024 * 1024,
+            )
+        return _shared_cache
+
+
+def set_image_cache(cache: Optional[ImageCache]) -> None:
+    """替换共享图片缓存（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = cache
@@ -0,0 +1,367 @@
+"""
+远程图片获取使用的共享 HTTP 客户端
+
+基于 requests.Session 的连接池复用 TCP/TLS 连接，并提供每个主机的并发上限、
+带退避的有限重试以及按文档计算的整体获取截止时间。重试在客户端中进行，每次重试前
+检查截止时间，Retry-After 和退避等待不会超出文档的截止时间。
+响应体按块流式读取，单张图片和单个文档的下载字节数都有上限。
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class FetchDeadlineExceeded(Exception):
+    """文档的图片获取总时间已用完"""
+    pass
+
+
+class DownloadRejected(Exception):
+    """图片因大小或类型不符合要求被拒绝下载"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class DownloadBudget:
+    """单个文档的图片下载字节预算
+
+    同一文档的图片可能在多个线程中并发下载，读取到的每块数据先在锁内预留预算，
+    并发下载的总字节数同样不会超出文档上限。
+    """
+
+    def __init__(self, max_image_bytes: int, max_document_bytes: int):
+        """初始化下载预算
+
+        Args:
+            max_image_bytes: 单张图片的最大字节数
+            max_document_bytes: 一个文档全部图片的最大字节数
+        """
+        self.max_image_bytes = max_image_bytes
+        self.max_document_bytes = max_document_bytes
+        self.used = 0
+        self._lock = threading.Lock()
+
+    @property
+    def allowance(self) -> int:
+        """下一张图片最多可以下载的字节数"""
+        with self._lock:
+            return max(0, min(self.max_image_bytes, self.max_document_bytes - self.used))
+
+    def reserve(self, size: int) -> None:
+        """预留下载字节数
+
+        Raises:
+            DownloadRejected: 超出文档的下载上限
+        """
+        with self._lock:
+            if self.used + size > self.max_document_bytes:
+                raise DownloadRejected(f"文档图片总大小超出限制 {self.max_document_bytes} 字节")
+            self.used += size
+
+    def release(self, size: int) -> None:
+        """归还未使用的预留字节数（下载中止时）"""
+        with self._lock:
+            self.used -= size
+
+
+# 允许的响应类型，缺失 Content-Type 时按二进制流处理
+ALLOWED_CONTENT_TYPES = ('image/', 'application/octet-stream', 'binary/octet-stream')
+
+# 需要重试的响应状态码
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class FetchDeadline:
+    """单个文档的图片获取截止时间"""
+
+    def __init__(self, seconds: Optional[float]):
+        """初始化截止时间
+
+        Args:
+            seconds: 允许的总时长（秒），为 None 时不限制
+        """
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+
+    def remaining(self) -> Optional[float]:
+        """剩余时间（秒），不限制时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+
+class HttpClient:
+    """带连接池、主机并发上限和重试策略的 HTTP 客户端"""
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10,
+                 max_per_host: int = 4, retries: int = 2, backoff_factor: float = 0.3,
+                 timeout: float = 10, document_deadline: Optional[float] = 60,
+                 max_image_bytes: int = 20 * 1024 * 1024,
+                 max_document_bytes: int = 100 * 1024 * 1024,
+                 chunk_size: int = 64 * 1024,
+                 user_agent: str = 'md2docx'):
+        """初始化 HTTP 客户端
+
+        Args:
+            pool_connections: 缓存连接池的主机数量
+            pool_maxsize: 每个主机连接池保留的连接数
+            max_per_host: 每个主机同时进行的请求数上限
+            retries: 连接错误和 429/5xx 响应的最大重试次数
+            backoff_factor: 重试退避系数，第 n 次重试前等待 backoff_factor * 2^(n-1) 秒，
+                响应带有 Retry-After 时按其等待；等待时间不超过单个请求的超时时间，
+                超出文档截止时间时不再重试
+            timeout: 单个请求的超时时间（秒）
+            document_deadline: 单个文档全部图片获取的总时长（秒），None 表示不限制
+            max_image_bytes: 单张图片的最大下载字节数
+            max_document_bytes: 单个文档全部图片的最大下载字节数
+            chunk_size: 流式读取响应体的块大小
+            user_agent: 请求使用的 User-Agent
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_per_host = max_per_host
+        self.document_deadline = document_deadline
+        self.max_image_bytes = max_image_bytes
+        self.max_document_bytes = max_document_bytes
+        self.chunk_size = chunk_size
+
+        # 重试由 _send 完成，连接池本身不重试（否则等待时间不受截止时间约束）
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
+
+    def new_deadline(self) -> FetchDeadline:
+        """为一个新文档创建获取截止时间"""
+        return FetchDeadline(self.document_deadline)
+
+    def new_budget(self) -> DownloadBudget:
+        """为一个新文档创建下载预算"""
+        return DownloadBudget(self.max_image_bytes, self.max_document_bytes)
+
+    def download(self, url: str, headers: Optional[Mapping[str, str]] = None,
+                 deadline: Optional[FetchDeadline] = None,
+                 budget: Optional[DownloadBudget] = None) -> Tuple[requests.Response, Optional[bytes]]:
+        """流式下载图片
+
+        先根据 Content-Type 和 Content-Length 决定是否下载，再按块读取响应体，
+        超出预算时立即中止并关闭连接。
+
+        Args:
+            url: 图片地址
+            headers: 额外的请求头
+            deadline: 文档级截止时间
+            budget: 文档级下载预算
+
+        Returns:
+            Tuple[requests.Response, Optional[bytes]]: 响应对象和响应体，
+            状态码不是 200 时响应体为 None
+
+        Raises:
+            DownloadRejected: 类型不是图片或大小超出预算
+        """
+        if budget is None:
+            budget = self.new_budget()
+        # 读取响应体期间同样占用主机并发名额
+        with self._host_slot(url, deadline):
+            response = self._send(url, headers, deadline, stream=True)
+            try:
+                if response.status_code != 200:
+                    return response, None
+
+                content_type = response_header(response, 'Content-Type')
+                if content_type and not content_type.lower().startswith(ALLOWED_CONTENT_TYPES):
+                    raise DownloadRejected(f"不是图片类型: {content_type}")
+
+                allowance = budget.allowance
+                content_length = response_header(response, 'Content-Length')
+                if content_length and content_length.isdigit() and int(content_length) > allowance:
+                    raise DownloadRejected(f"图片大小 {content_length} 字节超出限制 {allowance} 字节")
+
+                body = bytearray()
+                try:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if len(body) + len(chunk) > budget.max_image_bytes:
+                            raise DownloadRejected(f"图片大小超出限制 {budget.max_image_bytes} 字节")
+                        budget.reserve(len(chunk))
+                        body += chunk
+                        if deadline is not None and deadline.expired:
+                            raise FetchDeadlineExceeded(f"图片获取超出文档截止时间: {url}")
+                except BaseException:
+                    budget.release(len(body))
+                    raise
+                return response, bytes(body)
+            finally:
+                # 中途放弃时关闭连接，避免继续接收剩余数据
+                response.close()
+
+    def get(self, url: str, headers: Optional[Mapping[str, str]] = None,
+            deadline: Optional[FetchDeadline] = None, stream: bool = False) -> requests.Response:
+        """发送 GET 请求
+
+        Args:
+            url: 请求地址
+            headers: 额外的请求头
+            deadline: 文档级截止时间，请求超时不会超过剩余时间
+            stream: 是否以流式方式读取响应体
+
+        Returns:
+            requests.Response: 响应对象
+
+        Raises:
+            FetchDeadlineExceeded: 截止时间已过
+            requests.RequestException: 请求失败
+        """
+        with self._host_slot(url, deadline):
+            return self._send(url, headers, deadline, stream)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _send(self, url: str, headers: Optional[Mapping[str, str]],
+              deadline: Optional[FetchDeadline], stream: bool) -> requests.Response:
+        """发送请求，连接错误和 429/5xx 响应按退避策略重试
+
+        等待时间超出文档截止时间时不再重试：连接错误直接抛出，响应原样返回。
+        """
+        attempt = 0
+        while True:
+            timeout = self._request_timeout(url, deadline)
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries or not self._wait_retry(attempt, None, deadline):
+                    raise
+            else:
+                if (response.status_code not in RETRY_STATUSES or attempt >= self.retries
+                        or not self._wait_retry(attempt, response, deadline)):
+                    return response
+                response.close()
+            attempt += 1
+
+    def _wait_retry(self, attempt: int, response: Optional[requests.Response],
+                    deadline: Optional[FetchDeadline]) -> bool:
+        """等待下一次重试，等待后已超出截止时间时返回 False（不等待）"""
+        delay = self.backoff_factor * (2 ** attempt)
+        retry_after = retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            delay = retry_after
+        delay = min(delay, self.timeout)
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and delay >= remaining:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def _request_timeout(self, url: str, deadline: Optional[FetchDeadline]) -> float:
+        timeout = self.timeout
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    raise FetchDeadlineExceeded(f"图片获取超出文档截止时间: {url}")
+                timeout = min(timeout, remaining)
+        return timeout
+
+    @contextmanager
+    def _host_slot(self, url: str, deadline: Optional[FetchDeadline]) -> Iterator[None]:
+        """占用请求地址所在主机的并发名额，等待时间不超过文档截止时间
+
+        Raises:
+            FetchDeadlineExceeded: 截止时间之前没有等到名额
+        """
+        host = urlsplit(url).netloc
+        with self._slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_per_host)
+                self._host_slots[host] = slot
+        remaining = deadline.remaining() if deadline is not None else None
+        if not slot.acquire(timeout=remaining):
+            raise FetchDeadlineExceeded(f"等待主机并发名额超出文档截止时间: {url}")
+        try:
+            yield
+        finally:
+            slot.release()
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），缺失或无效时返回 None"""
+    value = response_header(response, 'Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def response_header(response, name: str) -> Optional[str]:
+    """读取响应头，非字符串值按缺失处理"""
+    headers = getattr(response, 'headers', None)
+    value = headers.get(name) if headers is not None else None
+    return value if isinstance(value, str) else None
+
+
+_shared_client: Optional[HttpClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """获取进程内共享的 HTTP 客户端
+
+    通过环境变量配置：
+        MD2DOCX_HTTP_POOL_SIZE: 每个主机保留的连接数，默认 10
+        MD2DOCX_HTTP_MAX_PER_HOST: 每个主机的并发请求上限，默认 4
+        MD2DOCX_HTTP_RETRIES: 最大重试次数，默认 2
+        MD2DOCX_HTTP_TIMEOUT: 单个请求超时（秒），默认 10
+        MD2DOCX_HTTP_DOCUMENT_DEADLINE: 单个文档的图片获取总时长（秒），默认 60
+        MD2DOCX_IMAGE_MAX_MB: 单张远程图片的大小上限（MB），默认 20
+        MD2DOCX_IMAGE_DOCUMENT_MAX_MB: 单个文档远程图片的总大小上限（MB），默认 100
+    """
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient(
+                pool_maxsize=int(os.environ.get('MD2DOCX_HTTP_POOL_SIZE', 10)),
+                max_per_host=int(os.environ.get('MD2DOCX_HTTP_MAX_PER_HOST', 4)),
+                retries=int(os.environ.get('MD2DOCX_HTTP_RETRIES', 2)),
+                timeout=float(os.environ.get('MD2DOCX_HTTP_TIMEOUT', 10)),
+                document_deadline=float(os.environ.get('MD2DOCX_HTTP_DOCUMENT_DEADLINE', 60)),
+                max_image_bytes=int(float(os.environ.get('MD2DOCX_IMAGE_MAX_MB', 20)) * 1024 * 1024),
+                max_document_bytes=int(
+                    float(os.environ.get('MD2DOCX_IMAGE_DOCUMENT_MAX_MB', 100)) * 1024 * 1024),
+            )
+        return _shared_client
+
+
+def set_http_client(client: Optional[HttpClient]) -> None:
+    """替换共享 HTTP 客户端（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is not None and _shared_client is not client:
+            _shared_client.close()
+        _shared_client = client
@@ -0,0 +1,164 @@
+"""
+图片格式规范化模块
+
+python-docx 只能嵌入 PNG、JPEG、GIF、BMP 和 TIFF。其他格式（WebP、AVIF、ICO 等）
+根据文件头识别后用 Pillow 转换为 PNG 或 JPEG，SVG 通过可替换的栅格化函数转换为
+PNG。转换结果按源图片哈希缓存，同一张图片在多个文档中只转换一次。
+"""
+from io import BytesIO
+from typing import Callable, Optional
+
+from .cache import CachedImage, ImageCache, get_image_cache
+
+# SVG 栅格化函数：(SVG 数据, 缩放比例) -> PNG 数据
+SvgRasterizer = Callable[[bytes, float], bytes]
+
+# 有损格式在没有透明通道时转换为 JPEG，其余转换为 PNG
+LOSSY_FORMATS = {'jpeg', 'webp', 'avif', 'heic'}
+
+
+class UnsupportedImageFormat(ValueError):
+    """图片格式无法识别或无法转换为可嵌入的格式"""
+
+    def __init__(self, image_format: Optional[str]):
+        super().__init__(f"不支持的图片格式: {image_format or '未知'}")
+        self.image_format = image_format
+
+
+def detect_format(data: bytes) -> Optional[str]:
+    """根据文件头识别图片格式
+
+    Args:
+        data: 图片数据
+
+    Returns:
+        str: 小写的格式名（如 'png'、'webp'、'svg'），无法识别时返回 None
+    """
+    head = data[:32]
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if head.startswith(b'BM'):
+        return 'bmp'
+    if head.startswith((b'II*\x00', b'MM\x00*')):
+        return 'tiff'
+    if head.startswith(b'RIFF') and head[8:12] == b'WEBP':
+        return 'webp'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'avif', b'avis'):
+            return 'avif'
+        if brand in (b'heic', b'heix', b'mif1', b'msf1'):
+            return 'heic'
+    if head.startswith(b'\x00\x00\x01\x00'):
+        return 'ico'
+    text = data[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if text.startswith((b'<?xml', b'<svg', b'<!doctype svg', b'<!--')) and b'<svg' in text:
+        return 'svg'
+    return None
+
+
+def cairosvg_rasterizer() -> Optional[SvgRasterizer]:
+    """基于 cairosvg 的默认 SVG 栅格化函数，未安装 cairosvg 时返回 None"""
+    try:
+        import cairosvg
+    except (ImportError, OSError):
+        return None
+
+    def rasterize(data: bytes, scale: float) -> bytes:
+        return cairosvg.svg2png(bytestring=data, scale=scale)
+
+    return rasterize
+
+
+class ImageNormalizer:
+    """将 python-docx 无法嵌入的图片转换为 PNG 或 JPEG"""
+
+    def __init__(self, image_cache: Optional[ImageCache] = None,
+                 svg_rasterizer: Optional[SvgRasterizer] = None,
+                 svg_scale: float = 2.0, jpeg_quality: int = 90):
+        """初始化格式转换器
+
+        Args:
+            image_cache: 保存转换结果的缓存，默认使用共享图片缓存
+            svg_rasterizer: SVG 栅格化函数，默认使用 cairosvg（如已安装）
+            svg_scale: SVG 栅格化的缩放比例，写入相应 DPI 后显示大小不变
+            jpeg_quality: 转换为 JPEG 时的编码质量
+        """
+        self.image_cache = image_cache or get_image_cache()
+        self.svg_rasterizer = svg_rasterizer or cairosvg_rasterizer()
+        self.svg_scale = svg_scale
+        self.jpeg_quality = jpeg_quality
+
+    def normalize(self, image: CachedImage) -> CachedImage:
+        """确保图片可以被 python-docx 嵌入
+
+        Args:
+            image: 原始图片
+
+        Returns:
+            CachedImage: 可识别的图片原样返回，否则返回转换后的图片
+
+        Raises:
+            UnsupportedImageFormat: 格式无法识别或转换失败
+        """
+        if image.meta.recognized:
+            return image
+
+        key = f"normalized:{image.meta.digest}"
+        cached = self.image_cache.get(key)
+        if cached is not None:
+            return cached
+
+        image_format = detect_format(image.data)
+        if image_format == 'svg':
+            data = self._rasterize_svg(image.data)
+        else:
+            data = self._encode(image.data, image_format)
+        if data is None:
+            raise UnsupportedImageFormat(image_format)
+
+        result = self.image_cache.put(key, data)
+        if not result.meta.recognized:
+            self.image_cache.discard(key)
+            raise UnsupportedImageFormat(image_format)
+        return result
+
+    def _rasterize_svg(self, data: bytes) -> Optional[bytes]:
+        if self.svg_rasterizer is None:
+            return None
+        try:
+            png = self.svg_rasterizer(data, self.svg_scale)
+        except Exception:
+            return None
+        # SVG 的像素按 96 DPI 计算，写入放大后的 DPI 使显示大小与原图一致
+        dpi = round(96 * self.svg_scale)
+        return self._encode(png, 'png', dpi=(dpi, dpi))
+
+    def _encode(self, data: bytes, image_format: Optional[str], dpi=None) -> Optional[bytes]:
+        from PIL import Image
+
+        try:
+            img = Image.open(BytesIO(data))
+            # 动图只保留第一帧
+            img.seek(0)
+            img.load()
+            dpi = dpi or img.info.get('dpi')
+            has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+
+            out = BytesIO()
+            options = {'dpi': dpi} if dpi else {}
+            if image_format in LOSSY_FORMATS and not has_alpha:
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                img.save(out, format='JPEG', quality=self.jpeg_quality, **options)
+            else:
+                if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                    img = img.convert('RGBA')
+                img.save(out, format='PNG', compress_level=6, **options)
+            return out.getvalue()
+        except Exception:
+            return None
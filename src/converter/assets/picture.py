@@ -0,0 +1,195 @@
+"""
+使用缓存的元数据向文档插入图片
+
+python-docx 的 ``run.add_picture`` 每次都会重新解析图片头部，并在去重时
+对文档中已有的每个图片部件重新计算 SHA1。这里直接用缓存中的元数据构造
+图片对象，按 SHA1 索引复用图片部件。较大的图片使用磁盘图片部件，数据不常驻内存。
+SVG 以原生矢量图嵌入，同时附带一张后备 PNG。
+"""
+import weakref
+from io import BytesIO
+from typing import Dict, Optional
+
+from docx.image.image import BaseImageHeader, Image as DocxImage
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.oxml.shape import CT_Inline
+from docx.parts.image import ImagePart
+from docx.shape import InlineShape
+from docx.shared import Emu
+
+from .cache import CachedImage, ImageMeta
+from .spool import SPOOL_THRESHOLD, ImageSpool, SpooledImagePart
+from .svg import SVG_BLIP_URI, SVG_CONTENT_TYPE, SVG_NAMESPACE, svg_size
+
+# SVG 的像素按 96 DPI 计算
+_EMU_PER_PX = 914400 // 96
+
+
+class _CachedImageHeader(BaseImageHeader):
+    """由缓存元数据构造的图片头部"""
+
+    def __init__(self, meta: ImageMeta):
+        super().__init__(meta.px_width, meta.px_height,
+                         meta.horz_dpi or 72, meta.vert_dpi or 72)
+        self._content_type = meta.content_type
+        self._ext = meta.ext or 'png'
+
+    @property
+    def content_type(self) -> str:
+        return self._content_type
+
+    @property
+    def default_ext(self) -> str:
+        return self._ext
+
+
+class _CachedDocxImage(DocxImage):
+    """SHA1 取自缓存元数据、无需重新计算的图片对象"""
+
+    def __init__(self, blob: bytes, filename: str, header: BaseImageHeader, sha1: str):
+        super().__init__(blob, filename, header)
+        self._sha1 = sha1
+
+    @property
+    def sha1(self) -> str:
+        return self._sha1
+
+
+# 每个文档包的 SHA1 -> 图片部件索引
+_parts_by_sha1: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+# 每个文档包的图片临时目录
+_spools: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def release_spool(document) -> None:
+    """立即删除文档的图片临时目录
+
+    临时目录默认在文档对象被回收时删除。文档保存后不再需要这些文件，服务端在
+    保存后调用本函数，不依赖垃圾回收的时机。删除后文档不能再次保存。
+
+    Args:
+        document: python-docx 文档对象
+    """
+    spool = _spools.pop(document.part.package, None)
+    if spool is not None:
+        spool.close()
+
+
+def _get_or_add_image_part(package, image: CachedImage, header: BaseImageHeader,
+                           source_path: Optional[str],
+                           spool_threshold: Optional[int]) -> ImagePart:
+    index: Dict[str, ImagePart] = _parts_by_sha1.setdefault(package, {})
+    meta = image.meta
+    part = index.get(meta.sha1)
+    if part is None:
+        image_parts = package.image_parts
+        partname = image_parts._next_image_partname(header.default_ext)
+        filename = f"image.{header.default_ext}"
+        if spool_threshold is not None and meta.size >= spool_threshold:
+            spool = _spools.get(package)
+            if spool is None:
+                spool = _spools[package] = ImageSpool(package)
+            path = spool.add(image.data, source_path)
+            # 部件只引用磁盘文件，图片对象中不保留数据
+            docx_image = _CachedDocxImage(b'', filename, header, meta.sha1)
+            part = SpooledImagePart(partname, header.content_type, path, meta.size, docx_image)
+        else:
+            docx_image = _CachedDocxImage(image.data, filename, header, meta.sha1)
+            part = ImagePart.from_image(docx_image, partname)
+        image_parts.append(part)
+        index[meta.sha1] = part
+    return part
+
+
+def add_picture(run, image: CachedImage, width=None, height=None,
+                source_path: Optional[str] = None,
+                spool_threshold: Optional[int] = SPOOL_THRESHOLD) -> InlineShape:
+    """向 run 中插入缓存的图片
+
+    Args:
+        run: 目标 run
+        image: 缓存的图片
+        width: 显示宽度（Length），为 None 时按高度等比缩放或使用原始尺寸
+        height: 显示高度（Length）
+        source_path: 磁盘缓存中内容相同的文件，使用磁盘图片部件时直接链接该文件
+        spool_threshold: 不小于该大小的图片使用磁盘图片部件，为 None 时全部保存在内存中
+
+    Returns:
+        InlineShape: 插入的内联图片
+    """
+    meta = image.meta
+    if not meta.recognized:
+        # 无法识别的格式交给 python-docx 处理（会抛出相应异常）
+        return run.add_picture(BytesIO(image.data), width=width, height=height)
+
+    part = run.part
+    header = _CachedImageHeader(meta)
+    image_part = _get_or_add_image_part(part.package, image, header, source_path, spool_threshold)
+    r_id = part.relate_to(image_part, RT.IMAGE)
+    docx_image = image_part.image
+    cx, cy = docx_image.scaled_dimensions(width, height)
+    inline = CT_Inline.new_pic_inline(part.next_id, r_id, docx_image.filename, cx, cy)
+    run._r.add_drawing(inline)
+    return InlineShape(inline)
+
+
+def _get_or_add_svg_part(package, svg: CachedImage) -> ImagePart:
+    index: Dict[str, ImagePart] = _parts_by_sha1.setdefault(package, {})
+    part = index.get(svg.meta.sha1)
+    if part is None:
+        image_parts = package.image_parts
+        part = ImagePart(image_parts._next_image_partname('svg'), SVG_CONTENT_TYPE, svg.data)
+        image_parts.append(part)
+        index[svg.meta.sha1] = part
+    return part
+
+
+def add_svg_picture(run, svg: CachedImage, fallback: CachedImage, width=None, height=None,
+                    spool_threshold: Optional[int] = SPOOL_THRESHOLD) -> InlineShape:
+    """向 run 中插入原生 SVG 图片，不支持 SVG 的阅读器显示后备 PNG
+
+    Args:
+        run: 目标 run
+        svg: 缓存的 SVG 图片
+        fallback: 缓存的后备 PNG 图片
+        width: 显示宽度（Length），为 None 时按高度等比缩放或使用 SVG 的原始尺寸
+        height: 显示高度（Length）
+        spool_threshold: 后备图片不小于该大小时使用磁盘图片部件
+
+    Returns:
+        InlineShape: 插入的内联图片
+
+    Raises:
+        ValueError: 无法读取 SVG 的尺寸
+    """
+    size = svg_size(svg.data)
+    if size is None:
+        raise ValueError("无法读取SVG图片的尺寸")
+
+    part = run.part
+    header = _CachedImageHeader(fallback.meta)
+    png_part = _get_or_add_image_part(part.package, fallback, header, None, spool_threshold)
+    svg_part = _get_or_add_svg_part(part.package, svg)
+    png_r_id = part.relate_to(png_part, RT.IMAGE)
+    svg_r_id = part.relate_to(svg_part, RT.IMAGE)
+
+    cx, cy = Emu(round(size[0] * _EMU_PER_PX)), Emu(round(size[1] * _EMU_PER_PX))
+    if width is not None and height is not None:
+        cx, cy = width, height
+    elif width is not None:
+        cx, cy = width, Emu(round(cy * width / cx))
+    elif height is not None:
+        cx, cy = Emu(round(cx * height / cy)), height
+
+    inline = CT_Inline.new_pic_inline(part.next_id, png_r_id, 'image.svg', cx, cy)
+    blip = inline.xpath('.//a:blip')[0]
+    blip.append(parse_xml(
+        f'<a:extLst {nsdecls("a", "r")}><a:ext uri="{SVG_BLIP_URI}">'
+        f'<asvg:svgBlip xmlns:asvg="{SVG_NAMESPACE}" r:embed="{svg_r_id}"/>'
+        f'</a:ext></a:extLst>'
+    ))
+    run._r.add_drawing(inline)
+    return InlineShape(inline)
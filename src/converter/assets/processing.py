@@ -0,0 +1,115 @@
+"""
+图片处理模块
+
+按图片在文档中的显示尺寸和目标 DPI 重新采样并重新编码，去除 EXIF 等元数据，
+处理结果按（源图片哈希, 目标尺寸）缓存。
+"""
+from io import BytesIO
+from typing import Optional, Tuple
+
+from docx.shared import Emu
+
+from .cache import CachedImage, ImageCache, get_image_cache
+
+# 可以安全重新采样的格式，其他格式（如 WMF/EMF）保持原样
+RESAMPLABLE_TYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/bmp', 'image/tiff'}
+
+
+class ImageOptimizer:
+    """将图片缩小到显示尺寸并重新编码"""
+
+    def __init__(self, dpi: int = 150, jpeg_quality: int = 85, min_reduction: float = 0.8,
+                 image_cache: Optional[ImageCache] = None):
+        """初始化图片优化器
+
+        Args:
+            dpi: 目标分辨率（每英寸像素数）
+            jpeg_quality: JPEG 重新编码质量
+            min_reduction: 目标宽度小于原宽度的该比例时才重新采样
+            image_cache: 保存处理结果的缓存，默认使用共享图片缓存
+        """
+        self.dpi = dpi
+        self.jpeg_quality = jpeg_quality
+        self.min_reduction = min_reduction
+        self.image_cache = image_cache or get_image_cache()
+
+    def optimize(self, image: CachedImage, width=None, height=None) -> CachedImage:
+        """按显示尺寸优化图片
+
+        显示尺寸的计算规则与 python-docx 的 ``add_picture`` 一致：
+        只给出一边时按比例计算另一边，都不给出时使用原始尺寸。
+        处理后的图片写入 DPI 信息，因此原始尺寸显示时大小不变。
+
+        Args:
+            image: 原始图片
+            width: 显示宽度（Length）
+            height: 显示高度（Length）
+
+        Returns:
+            CachedImage: 优化后的图片，无需处理或处理无收益时返回原图
+        """
+        meta = image.meta
+        if not meta.recognized or meta.content_type not in RESAMPLABLE_TYPES:
+            return image
+
+        display_w, display_h = self._display_inches(image, width, height)
+        target_w = max(1, round(display_w * self.dpi))
+        target_h = max(1, round(display_h * self.dpi))
+        if target_w > meta.px_width * self.min_reduction:
+            return image
+
+        key = f"optimized:{meta.digest}:{target_w}x{target_h}@{self.dpi}q{self.jpeg_quality}"
+        cached = self.image_cache.get(key)
+        if cached is not None:
+            return cached
+
+        data = self._resample(image.data, (target_w, target_h), (display_w, display_h),
+                              meta.content_type)
+        if data is None or len(data) >= meta.size:
+            # 处理后反而更大时保留原图，同样写入缓存避免重复计算
+            data = image.data
+        return self.image_cache.put(key, data)
+
+    def _display_inches(self, image: CachedImage, width, height) -> Tuple[float, float]:
+        meta = image.meta
+        native_w = meta.px_width / (meta.horz_dpi or 72)
+        native_h = meta.px_height / (meta.vert_dpi or 72)
+        if width is None and height is None:
+            return native_w, native_h
+        if width is None:
+            h = Emu(height).inches
+            return native_w * h / native_h, h
+        if height is None:
+            w = Emu(width).inches
+            return w, native_h * w / native_w
+        return Emu(width).inches, Emu(height).inches
+
+    def _resample(self, data: bytes, size: Tuple[int, int], display: Tuple[float, float],
+                  content_type: str) -> Optional[bytes]:
+        from PIL import Image
+
+        try:
+            img = Image.open(BytesIO(data))
+            if getattr(img, 'is_animated', False):
+                return None
+            if img.format == 'JPEG':
+                # JPEG 可以直接以缩小的比例解码，省去大部分解码开销
+                img.draft('RGB', size)
+            img = img.resize(size, Image.LANCZOS, reducing_gap=3.0)
+
+            # 写入与显示尺寸一致的 DPI，原始尺寸显示时大小不变
+            dpi = (size[0] / display[0], size[1] / display[1])
+            out = BytesIO()
+            if content_type == 'image/jpeg':
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                img.save(out, format='JPEG', quality=self.jpeg_quality,
+                         optimize=True, progressive=True, dpi=dpi)
+            else:
+                if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+                    img = img.convert('RGBA')
+                img.save(out, format='PNG', compress_level=6, dpi=dpi)
+            # 未传入 exif/icc_profile，元数据在重新编码时被去除
+            return out.getvalue()
+        except Exception:
+            return None
@@ -0,0 +1,139 @@
+"""
+本地图片路径解析模块
+
+相对路径按 Markdown 文件所在目录和额外的搜索目录依次查找。文件状态（包括
+不存在的路径）缓存在按批次共享的 StatCache 中，同一批文档引用相同资源目录时
+每个路径只访问一次文件系统。
+"""
+import os
+import mmap
+import stat
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import unquote
+
+
+class StatCache:
+    """文件状态缓存，不存在的路径同样被缓存"""
+
+    def __init__(self):
+        self._stats: Dict[str, Optional[os.stat_result]] = {}
+        self._resolved: Dict[Tuple[Tuple[str, ...], str], Optional[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def stat(self, path: str) -> Optional[os.stat_result]:
+        """获取文件状态，路径不存在时返回 None"""
+        with self._lock:
+            if path in self._stats:
+                self.hits += 1
+                return self._stats[path]
+        try:
+            result = os.stat(path)
+        except OSError:
+            result = None
+        with self._lock:
+            self.misses += 1
+            self._stats[path] = result
+        return result
+
+    def resolved(self, key: Tuple[Tuple[str, ...], str]) -> Tuple[bool, Optional[str]]:
+        """查询路径解析结果
+
+        Returns:
+            Tuple[bool, Optional[str]]: (是否已缓存, 解析结果)
+        """
+        with self._lock:
+            if key in self._resolved:
+                return True, self._resolved[key]
+        return False, None
+
+    def remember(self, key: Tuple[Tuple[str, ...], str], path: Optional[str]) -> None:
+        """记录路径解析结果（包括找不到的情况）"""
+        with self._lock:
+            self._resolved[key] = path
+
+    def clear(self) -> None:
+        """清空缓存（批次结束或资源目录发生变化时调用）"""
+        with self._lock:
+            self._stats.clear()
+            self._resolved.clear()
+
+
+class ImageResolver:
+    """将 Markdown 中的本地图片地址解析为文件路径并读取内容"""
+
+    def __init__(self, base_dir: Optional[str] = None, search_paths: Iterable[str] = (),
+                 stat_cache: Optional[StatCache] = None,
+                 mmap_threshold: int = 4 * 1024 * 1024):
+        """初始化解析器
+
+        Args:
+            base_dir: Markdown 文件所在目录，为 None 时使用当前工作目录
+            search_paths: 额外的搜索目录，按顺序在 base_dir 之后查找
+            stat_cache: 文件状态缓存，批量转换时在多个文档之间共享
+            mmap_threshold: 不小于该大小的文件通过内存映射读取
+        """
+        roots = [base_dir or os.getcwd()] + list(search_paths)
+        self.roots: Tuple[str, ...] = tuple(os.path.abspath(root) for root in roots)
+        self.stat_cache = stat_cache if stat_cache is not None else StatCache()
+        self.mmap_threshold = mmap_threshold
+
+    def resolve(self, src: str) -> Optional[str]:
+        """解析图片地址
+
+        Args:
+            src: Markdown 中的图片地址，可以是相对路径、绝对路径或 file:// 地址
+
+        Returns:
+            str: 文件的绝对路径，找不到时返回 None
+        """
+        cache_key = (self.roots, src)
+        found, path = self.stat_cache.resolved(cache_key)
+        if found:
+            return path
+
+        path = self._find(src)
+        self.stat_cache.remember(cache_key, path)
+        return path
+
+    def cache_key(self, path: str) -> str:
+        """图片缓存使用的键"""
+        return f"file:{path}"
+
+    def validator(self, path: str) -> Optional[str]:
+        """由文件修改时间和大小生成的弱验证标识"""
+        st = self.stat_cache.stat(path)
+        if st is None:
+            return None
+        return f'W/"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+    def read(self, path: str) -> bytes:
+        """读取文件内容，大文件通过内存映射读取，避免经过额外的读缓冲区"""
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= self.mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return mm[:]
+            return f.read()
+
+    def _find(self, src: str) -> Optional[str]:
+        if src.startswith('file://'):
+            src = src[len('file://'):]
+        # 去掉查询参数和锚点，并解码 %20 等转义字符
+        src = unquote(src.split('?', 1)[0].split('#', 1)[0])
+        if not src:
+            return None
+
+        if os.path.isabs(src):
+            candidates = [src]
+        else:
+            candidates = [os.path.join(root, src) for root in self.roots]
+
+        for candidate in candidates:
+            path = os.path.normpath(candidate)
+            st = self.stat_cache.stat(path)
+            if st is not None and stat.S_ISREG(st.st_mode):
+                return path
+        return None
@@ -0,0 +1,247 @@
+"""
+磁盘图片部件
+
+python-docx 的图片部件把图片数据保存在内存中直到文档保存，图片很多的文档会
+占用大量内存。较大的图片改为保存在文档专属的临时目录中（优先硬链接磁盘缓存中
+的文件，无需复制），图片部件只保留文件路径，保存文档时再逐块写入 zip。
+"""
+import io
+import os
+import time
+import hashlib
+import shutil
+import tempfile
+import threading
+import weakref
+import zipfile
+from typing import IO, Optional, Tuple, Union
+
+from docx.opc.packuri import PACKAGE_URI
+from docx.opc.pkgwriter import PackageWriter
+from docx.parts.image import ImagePart
+
+from ..metrics import stage
+
+# 不小于该大小的图片保存在磁盘上
+SPOOL_THRESHOLD = 64 * 1024
+
+# 序列化后的文档不超过该大小时保存在内存中
+RESPONSE_MEMORY_LIMIT = 32 * 1024 * 1024
+
+# 已压缩的图片格式在 zip 中直接存储，避免无意义的二次压缩
+STORED_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/gif'}
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class SpooledImagePart(ImagePart):
+    """数据保存在磁盘文件中的图片部件"""
+
+    def __init__(self, partname, content_type: str, path: str, size: int, image=None):
+        super().__init__(partname, content_type, b'', image)
+        self.path = path
+        self.size = size
+
+    @property
+    def blob(self) -> bytes:
+        # 通过 python-docx 原生的保存流程时按需读取，每次只有一张图片在内存中
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def open(self) -> IO[bytes]:
+        return open(self.path, 'rb')
+
+
+class ImageSpool:
+    """文档专属的图片临时目录，文档对象被回收时自动删除"""
+
+    def __init__(self, owner, root: Optional[str] = None):
+        """创建临时目录
+
+        Args:
+            owner: 拥有该目录的文档包，被回收时删除目录
+            root: 临时目录的父目录，默认使用系统临时目录
+        """
+        self.dir = tempfile.mkdtemp(prefix='md2docx-parts-', dir=root)
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(owner, shutil.rmtree, self.dir, True)
+
+    def add(self, data: bytes, source_path: Optional[str] = None) -> str:
+        """将图片放入临时目录
+
+        Args:
+            data: 图片数据
+            source_path: 磁盘缓存中内容相同的文件，存在时优先硬链接
+
+        Returns:
+            str: 临时目录中的文件路径
+        """
+        with self._lock:
+            self._counter += 1
+            path = os.path.join(self.dir, f"image{self._counter}")
+        if source_path:
+            try:
+                # 硬链接不复制数据，且磁盘缓存淘汰该文件后链接依然有效
+                os.link(source_path, path)
+                return path
+            except OSError:
+                pass
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def close(self) -> None:
+        self._finalizer()
+
+
+def save_document(document, target: Union[str, IO[bytes]]) -> None:
+    """保存文档，磁盘图片部件逐块写入而不整体读入内存
+
+    与 ``document.save`` 的输出一致，只是图片部件的写入方式不同。
+
+    Args:
+        document: python-docx 文档对象
+        target: 输出文件路径或可写的文件对象
+    """
+    with stage('save'):
+        package = document.part.package
+        for part in package.parts:
+            part.before_marshal()
+
+        parts = list(package.parts)
+        phys_writer = _PackageZipWriter(target)
+        try:
+            PackageWriter._write_content_types_stream(phys_writer, parts)
+            phys_writer.write(PACKAGE_URI.rels_uri, package.rels.xml)
+            for part in parts:
+                if isinstance(part, SpooledImagePart):
+                    phys_writer.write_stream(part)
+                else:
+                    phys_writer.write(part.partname, part.blob)
+                if len(part.rels):
+                    phys_writer.write(part.partname.rels_uri, part.rels.xml)
+        finally:
+            phys_writer.close()
+
+
+def response_memory_limit() -> int:
+    """序列化文档的内存上限，通过环境变量 MD2DOCX_RESPONSE_MEMORY_MB 配置，默认 32"""
+    try:
+        return int(float(os.environ['MD2DOCX_RESPONSE_MEMORY_MB']) * 1024 * 1024)
+    except (KeyError, ValueError):
+        return RESPONSE_MEMORY_LIMIT
+
+
+def serialize_document(document, max_memory: Optional[int] = None) -> Tuple[IO[bytes], int]:
+    """把文档序列化到可读取的缓冲区
+
+    缓冲区是 SpooledTemporaryFile：不超过内存上限时完全在内存中，超过时转存到
+    匿名临时文件（创建后即从目录中删除，关闭或进程退出时由系统回收空间），不会
+    在临时目录中留下文件。
+
+    Args:
+        document: python-docx 文档对象
+        max_memory: 内存上限（字节），默认由环境变量配置
+
+    Returns:
+        Tuple[IO[bytes], int]: (定位到开头的缓冲区, 字节数)，使用完毕后由调用方关闭
+    """
+    if max_memory is None:
+        max_memory = response_memory_limit()
+    buffer = tempfile.SpooledTemporaryFile(max_size=max_memory, prefix='md2docx-out-')
+    try:
+        save_document(document, buffer)
+        size = buffer.tell()
+        buffer.seek(0)
+    except BaseException:
+        buffer.close()
+        raise
+    return buffer, size
+
+
+class SharedOutput:
+    """序列化后超过内存上限的文档
+
+    数据保存在 serialize_document 的匿名临时文件中。合并的多个请求共享同一个结果，
+    各自通过 open() 得到独立的读取位置；结果不再被引用后临时文件随之关闭，由系统
+    回收空间。
+    """
+
+    def __init__(self, buffer: IO[bytes], size: int):
+        """计算内容的 sha256
+
+        Args:
+            buffer: serialize_document 返回的缓冲区
+            size: 字节数
+        """
+        self.size = size
+        self._buffer = buffer
+        self._lock = threading.Lock()
+        digest = hashlib.sha256()
+        buffer.seek(0)
+        for chunk in iter(lambda: buffer.read(_COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        self.digest = digest.hexdigest()
+
+    def open(self) -> IO[bytes]:
+        """从头读取文档的文件对象"""
+        return io.BufferedReader(_OutputReader(self), _COPY_CHUNK_SIZE)
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        with self._lock:
+            self._buffer.seek(offset)
+            return self._buffer.read(size)
+
+
+class _OutputReader(io.RawIOBase):
+    """SharedOutput 的独立读取位置"""
+
+    def __init__(self, output: SharedOutput):
+        self.output = output
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.output.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def readinto(self, b) -> int:
+        data = self.output.read_at(self.position, len(b))
+        b[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+class _PackageZipWriter:
+    """docx 压缩包的写入器
+
+    write 和 close 与 python-docx 的 PhysPkgWriter 相同（ZIP_DEFLATED 压缩，逐个
+    写入部件），另外提供 write_stream 从磁盘文件逐块写入图片部件。
+    """
+
+    def __init__(self, target: Union[str, IO[bytes]]):
+        self._zip = zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED)
+
+    def write(self, pack_uri, blob: bytes) -> None:
+        self._zip.writestr(pack_uri.membername, blob)
+
+    def write_stream(self, part: SpooledImagePart) -> None:
+        info = zipfile.ZipInfo(part.partname.membername, date_time=time.localtime(time.time())[:6])
+        info.compress_type = (zipfile.ZIP_STORED if part.content_type in STORED_CONTENT_TYPES
+                              else zipfile.ZIP_DEFLATED)
+        info.file_size = part.size
+        with part.open() as src, self._zip.open(info, 'w', force_zip64=part.size > zipfile.ZIP64_LIMIT) as dst:
+            shutil.copyfileobj(src, dst, _COPY_CHUNK_SIZE)
+
+    def close(self) -> None:
+        self._zip.close()
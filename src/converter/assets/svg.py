@@ -0,0 +1,88 @@
+"""
+以原生 SVG 图片嵌入矢量图
+
+Word 2016 及以后的版本支持在图片的 ``a:blip`` 中通过 ``asvg:svgBlip`` 扩展引用
+SVG 部件，同时保留一张 PNG 作为旧版本阅读器的后备图片。矢量图不需要栅格化，
+文档也更小；后备 PNG 只在旧版阅读器中显示，可以使用较低的分辨率。
+"""
+import re
+from io import BytesIO
+from typing import Optional, Tuple
+from xml.etree import ElementTree
+
+from .normalize import SvgRasterizer, cairosvg_rasterizer
+
+SVG_CONTENT_TYPE = 'image/svg+xml'
+SVG_BLIP_URI = '{96DAC541-7B7A-43D3-8B79-37D633B846F1}'
+SVG_NAMESPACE = 'http://schemas.microsoft.com/office/drawing/2016/SVG/main'
+
+_LENGTH = re.compile(r'^\s*([0-9.]+)\s*(px)?\s*$')
+
+
+def svg_size(data: bytes) -> Optional[Tuple[float, float]]:
+    """读取 SVG 的显示尺寸（CSS 像素）
+
+    优先使用以像素为单位的 width/height 属性，否则使用 viewBox 的宽高
+    （Mermaid 输出的宽度为 ``100%``，尺寸只在 viewBox 中）。
+
+    Args:
+        data: SVG 数据
+
+    Returns:
+        Tuple[float, float]: (宽, 高)，无法解析时返回 None
+    """
+    try:
+        root = ElementTree.fromstring(data)
+    except ElementTree.ParseError:
+        return None
+
+    width = _LENGTH.match(root.get('width', ''))
+    height = _LENGTH.match(root.get('height', ''))
+    if width and height:
+        size = (float(width.group(1)), float(height.group(1)))
+    else:
+        parts = re.split(r'[\s,]+', root.get('viewBox', '').strip())
+        try:
+            size = (float(parts[2]), float(parts[3]))
+        except (IndexError, ValueError):
+            return None
+    if size[0] <= 0 or size[1] <= 0:
+        return None
+    return size
+
+
+def svg_fallback_png(data: bytes, width: int,
+                     rasterizer: Optional[SvgRasterizer] = None) -> Optional[bytes]:
+    """生成 SVG 的后备 PNG 图片
+
+    安装了 cairosvg（或传入了栅格化函数）时把 SVG 栅格化为指定宽度；否则生成
+    一张宽高比相同的占位图片，只有不支持 SVG 的旧版阅读器会显示它。
+
+    Args:
+        data: SVG 数据
+        width: 后备图片的宽度（像素）
+        rasterizer: SVG 栅格化函数，默认使用 cairosvg（如已安装）
+
+    Returns:
+        bytes: PNG 数据，无法读取 SVG 尺寸时返回 None
+    """
+    size = svg_size(data)
+    if size is None:
+        return None
+    width = max(1, int(width))
+    height = max(1, round(width * size[1] / size[0]))
+
+    rasterizer = rasterizer or cairosvg_rasterizer()
+    if rasterizer is not None:
+        try:
+            return rasterizer(data, width / size[0])
+        except Exception:
+            pass
+
+    from PIL import Image, ImageDraw
+
+    img = Image.new('RGB', (width, height), (255, 255, 255))
+    ImageDraw.Draw(img).rectangle([0, 0, width - 1, height - 1], outline=(160, 160, 160))
+    buffer = BytesIO()
+    img.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
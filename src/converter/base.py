@@ -1,11 +1,16 @@
 """
 基础转换器模块，处理 Markdown 到 DOCX 的核心转换逻辑
 """
-from typing import Dict, List, Tuple
+import time
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple, Union
 from docx import Document
+from docx.api import _default_docx_path
 from markdown_it import MarkdownIt
 
 from .elements.base import ElementConverter
+from .assets import ImageOptimizer, ImageResolver, BundleImageResolver
 from .elements import (
     HeadingConverter,
     TextConverter,
@@ -18,8 +23,11 @@ from .elements import (
     HRConverter,
     TaskListConverter,
     HtmlConverter,
-    MermaidConverter
+    MermaidConverter,
+    MathConverter
 )
+from .formula import math_plugin
+from .metrics import count_elements, get_metrics
 
 
 class MD2DocxError(Exception):
@@ -37,24 +45,51 @@ class ConvertError(MD2DocxError):
     pass
 
 
+@lru_cache(maxsize=1)
+def markdown_parser() -> MarkdownIt:
+    """共享的 Markdown 解析器（解析过程不修改解析器，可以在线程之间共享）"""
+    return (MarkdownIt('commonmark', {'breaks': True, 'html': True})  # 启用HTML支持
+            .enable('strikethrough')
+            .enable('emphasis')
+            .enable('table')  # 启用表格支持
+            .use(math_plugin))  # 启用数学公式（$...$ 和 $$...$$）
+
+
+@lru_cache(maxsize=1)
+def template_bytes() -> bytes:
+    """python-docx 的默认模板，只从磁盘读取一次"""
+    with open(_default_docx_path(), 'rb') as f:
+        return f.read()
+
+
 class BaseConverter:
     """基础转换器，处理文档结构"""
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, image_dpi: Optional[int] = None,
+                 image_resolver: Optional[Union[ImageResolver, BundleImageResolver]] = None,
+                 unavailable: Optional[Dict[str, Optional[str]]] = None,
+                 mermaid_renderer=None):
         """初始化转换器
         
         Args:
             debug: 是否显示调试信息
+            image_dpi: 图片按显示尺寸重新采样的目标DPI，为 None 时嵌入原图
+            image_resolver: 本地图片路径解析器，为 None 时相对当前工作目录查找；
+                转换压缩包时使用 MarkdownBundle.resolver()
+            unavailable: 已确认无法获取的图片地址和图表缓存键，不再下载或渲染，
+                图片的值为拒绝原因（插入占位文本）或 None（跳过）
+            mermaid_renderer: Mermaid 图表渲染器，默认使用进程内共享的渲染器
         """
         # 调试模式
         self.debug = debug
+        self.image_dpi = image_dpi
+        self.image_resolver = image_resolver
+        self.unavailable = unavailable or {}
+        self.mermaid_renderer = mermaid_renderer
         
         # 启用所有需要的插件
-        self.md = (MarkdownIt('commonmark', {'breaks': True, 'html': True})  # 启用HTML支持
-                  .enable('strikethrough')
-                  .enable('emphasis')
-                  .enable('table'))  # 启用表格支持
-        self.document = Document()
+        self.md = markdown_parser()
+        self.document = Document(BytesIO(template_bytes()))
         self.converters = {}
         self._list_stack: List[Tuple[str, int]] = []  # [(list_type, level), ...]
         
@@ -73,12 +108,17 @@ class BaseConverter:
         self.register_converter('list', ListConverter(self))
         self.register_converter('code', CodeConverter(self))
         self.register_converter('link', LinkConverter(self))
-        self.register_converter('image', ImageConverter(self))
+        optimizer = ImageOptimizer(dpi=self.image_dpi) if self.image_dpi else None
+        self.register_converter('image', ImageConverter(self, optimizer=optimizer,
+                                                        resolver=self.image_resolver,
+                                                        unavailable=self.unavailable))
         self.register_converter('table', TableConverter(self))
         self.register_converter('hr', HRConverter(self))
         self.register_converter('task_list', TaskListConverter(self))
         self.register_converter('html', HtmlConverter(self))  # 注册HTML转换器
-        self.register_converter('mermaid', MermaidConverter(self))  # 注册Mermaid转换器
+        self.register_converter('mermaid', MermaidConverter(self, renderer=self.mermaid_renderer,
+                                                            unavailable=self.unavailable))  # 注册Mermaid转换器
+        self.register_converter('math', MathConverter(self))  # 注册数学公式转换器
     
     def register_converter(self, element_type: str, converter: ElementConverter):
         """注册一个元素转换器
@@ -105,7 +145,13 @@ class BaseConverter:
         """
         try:
             # 解析 Markdown 文本为 AST
+            metrics = get_metrics()
+            start = time.perf_counter()
             tokens = self.md.parse(md_text)
+            render_start = time.perf_counter()
+            metrics.observe('md2docx_stage_duration_seconds', render_start - start, stage='parse')
+            for element, count in count_elements(tokens).items():
+                metrics.inc('md2docx_elements_total', count, type=element)
             
             # 调试：打印所有标记
             if self.debug:
@@ -119,6 +165,10 @@ class BaseConverter:
                         for child in token.children:
                             print(f"  Child: type={child.type}, content={child.content if hasattr(child, 'content') else ''}")
 
+            # 需要整个文档信息的转换器先做准备（如批量渲染全部Mermaid图表）
+            for converter in self.converters.values():
+                converter.prepare(tokens)
+
             # 用于跟踪已处理的段落，避免重复处理
             processed_paragraphs = set()
             
@@ -265,6 +315,13 @@ class BaseConverter:
                         converter.convert(token)
                     i += 1
                 
+                # 处理块级公式
+                elif token.type == 'math_block':
+                    converter = self.converters.get('math')
+                    if converter:
+                        converter.convert(token)
+                    i += 1
+                
                 # 处理图片
                 elif token.type == 'image':
                     converter = self.converters.get('image')
@@ -348,6 +405,12 @@ class BaseConverter:
                 else:
                     i += 1
 
+            # 等待异步生成的内容（如并发渲染的Mermaid图表）放入文档
+            for converter in self.converters.values():
+                converter.finish()
+
+            metrics.observe('md2docx_stage_duration_seconds', time.perf_counter() - render_start,
+                            stage='render')
             return self.document
             
         except Exception as e:
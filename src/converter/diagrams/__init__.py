@@ -0,0 +1,55 @@
+"""
+Mermaid 等图表的渲染与缓存
+"""
+from .cache import diagram_key, get_diagram_cache, set_diagram_cache
+from .renderer import (
+    DEFAULT_CONFIG,
+    MmdcRenderer,
+    RendererUnavailable,
+    output_format,
+    renderer_version,
+    svg_fallback_width
+)
+from .pool import document_timeout, get_render_executor, set_render_executor, render_workers
+from .breaker import (
+    CircuitBreaker,
+    FailureCache,
+    get_failure_cache,
+    get_render_breaker,
+    set_failure_cache,
+    set_render_breaker
+)
+from .service import (
+    RenderService,
+    ServiceRenderer,
+    ServiceUnavailable,
+    get_mermaid_renderer,
+    set_mermaid_renderer
+)
+
+__all__ = [
+    'diagram_key',
+    'get_diagram_cache',
+    'set_diagram_cache',
+    'DEFAULT_CONFIG',
+    'MmdcRenderer',
+    'RendererUnavailable',
+    'renderer_version',
+    'output_format',
+    'svg_fallback_width',
+    'RenderService',
+    'ServiceRenderer',
+    'ServiceUnavailable',
+    'get_mermaid_renderer',
+    'set_mermaid_renderer',
+    'get_render_executor',
+    'set_render_executor',
+    'render_workers',
+    'document_timeout',
+    'CircuitBreaker',
+    'FailureCache',
+    'get_render_breaker',
+    'set_render_breaker',
+    'get_failure_cache',
+    'set_failure_cache'
+]
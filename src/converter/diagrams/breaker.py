@@ -0,0 +1,176 @@
+"""
+渲染器熔断与失败缓存
+
+mmdc 缺失或异常时，每个图表都要经历多次重试和超时，API 工作线程会被长时间
+占用。CircuitBreaker 在渲染器连续失败后断开，断开期间图表直接退回为代码块，
+经过冷却时间后只放行一次探测调用，探测成功才恢复。FailureCache 记录渲染失败
+的图表源码，同一个有错误的图表在有效期内不再交给渲染器。
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class CircuitBreaker:
+    """渲染器熔断器，多个请求和线程共享"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后断开
+            reset_timeout: 断开后经过多久（秒）放行一次探测调用
+            clock: 单调时钟，便于测试替换
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trips = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """是否可以调用渲染器
+
+        断开状态下冷却时间结束后，只有第一个调用者得到 True 作为探测调用，
+        探测结果通过 record_success / record_failure 报告之前其余调用者仍被拒绝。
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._trips += 1
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'trips': self._trips,
+                'rejected': self._rejected,
+            }
+
+
+class FailureCache:
+    """记录渲染失败的图表，有效期内不再重复渲染"""
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1024,
+                 clock: Callable[[], float] = time.monotonic):
+        """初始化失败缓存
+
+        Args:
+            ttl: 失败记录的有效期（秒）
+            max_entries: 最多记录的条数，超出时淘汰最早的记录
+            clock: 单调时钟，便于测试替换
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, float]' = OrderedDict()
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = self._clock() + self.ttl
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is None:
+                return False
+            if self._clock() >= expires:
+                del self._entries[key]
+                return False
+            return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+_shared_breaker: Optional[CircuitBreaker] = None
+_shared_failures: Optional[FailureCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_render_breaker() -> CircuitBreaker:
+    """获取进程内共享的渲染器熔断器
+
+    通过环境变量配置：
+        MD2DOCX_MERMAID_BREAKER_THRESHOLD: 连续失败多少次后断开，默认 5
+        MD2DOCX_MERMAID_BREAKER_RESET: 断开后多久（秒）探测恢复，默认 30
+    """
+    global _shared_breaker
+    with _shared_lock:
+        if _shared_breaker is None:
+            _shared_breaker = CircuitBreaker(
+                failure_threshold=int(os.environ.get('MD2DOCX_MERMAID_BREAKER_THRESHOLD', 5)),
+                reset_timeout=float(os.environ.get('MD2DOCX_MERMAID_BREAKER_RESET', 30)),
+            )
+        return _shared_breaker
+
+
+def set_render_breaker(breaker: Optional[CircuitBreaker]) -> None:
+    """替换共享熔断器（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_breaker
+    with _shared_lock:
+        _shared_breaker = breaker
+
+
+def get_failure_cache() -> FailureCache:
+    """获取进程内共享的渲染失败缓存
+
+    通过环境变量配置：
+        MD2DOCX_MERMAID_FAILURE_TTL: 失败记录的有效期（秒），默认 300
+    """
+    global _shared_failures
+    with _shared_lock:
+        if _shared_failures is None:
+            _shared_failures = FailureCache(
+                ttl=float(os.environ.get('MD2DOCX_MERMAID_FAILURE_TTL', 300)))
+        return _shared_failures
+
+
+def set_failure_cache(cache: Optional[FailureCache]) -> None:
+    """替换共享失败缓存（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_failures
+    with _shared_lock:
+        _shared_failures = cache
@@ -0,0 +1,66 @@
+"""
+Mermaid 渲染结果缓存
+
+渲染结果按（图表源码, 渲染配置, 渲染器版本, 输出格式）的哈希保存，复用图片
+缓存的两级存储和按大小淘汰的策略。未修改的图表再次转换时不会启动渲染器。
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+from ..assets import ImageCache, default_cache_dir
+
+
+def diagram_key(source: str, config: Dict[str, Any], version: Optional[str],
+                fmt: str = 'png') -> str:
+    """计算渲染结果的缓存键
+
+    Args:
+        source: 图表源码
+        config: 渲染配置
+        version: 渲染器版本
+        fmt: 输出格式
+
+    Returns:
+        str: 缓存键
+    """
+    payload = json.dumps({
+        'source': source,
+        'config': config,
+        'version': version,
+        'format': fmt,
+    }, sort_keys=True, ensure_ascii=False)
+    return f"mermaid:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+_shared_cache: Optional[ImageCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_diagram_cache() -> ImageCache:
+    """获取进程内共享的图表渲染缓存
+
+    通过环境变量配置：
+        MD2DOCX_MERMAID_CACHE_DIR: 磁盘层目录，默认见 default_cache_dir，设为空字符串时禁用磁盘层
+        MD2DOCX_MERMAID_CACHE_DISK_MB: 磁盘层预算（MB），默认 256
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            disk_dir = os.environ.get('MD2DOCX_MERMAID_CACHE_DIR', default_cache_dir('mermaid'))
+            disk_mb = int(os.environ.get('MD2DOCX_MERMAID_CACHE_DISK_MB', 256))
+            _shared_cache = ImageCache(
+                max_memory_bytes=16 * 1024 * 1024,
+                disk_dir=disk_dir or None,
+                max_disk_bytes=disk_mb * 1024 * 1024,
+            )
+        return _shared_cache
+
+
+def set_diagram_cache(cache: Optional[ImageCache]) -> None:
+    """替换共享图表渲染缓存（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = cache
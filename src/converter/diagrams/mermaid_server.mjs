@@ -0,0 +1,145 @@
+#!/usr/bin/env node
+/**
+ * 常驻的 Mermaid 渲染服务
+ *
+ * 启动时打开一个无头浏览器并保持运行，通过 mermaid-cli 的 renderMermaid 接口
+ * 渲染图表，最多同时使用 --pages 个页面。协议与 stub_server.py 相同：
+ *
+ *   GET  /health  -> {"status": "ok", "version": "..."}
+ *   POST /render  {"diagrams": [...], "config": {...}, "format": "png"}
+ *                 -> {"version": "...", "results": [{"data": "<base64>"} | {"error": "..."}]}
+ *
+ * 用法:
+ *   node mermaid_server.mjs --listen unix:/tmp/md2docx-mermaid.sock --pages 4 \
+ *       --module-root "$(npm root -g)"
+ */
+import fs from 'node:fs';
+import http from 'node:http';
+import path from 'node:path';
+import { createRequire } from 'node:module';
+import { pathToFileURL } from 'node:url';
+
+function parseArgs(argv) {
+  const args = { listen: null, pages: 4, moduleRoot: null };
+  for (let i = 0; i < argv.length; i += 2) {
+    const [name, value] = [argv[i], argv[i + 1]];
+    if (name === '--listen') args.listen = value;
+    else if (name === '--pages') args.pages = parseInt(value, 10);
+    else if (name === '--module-root') args.moduleRoot = value;
+  }
+  if (!args.listen) {
+    console.error('missing --listen');
+    process.exit(2);
+  }
+  return args;
+}
+
+async function loadModules(moduleRoot) {
+  // mermaid-cli 通常全局安装，ESM 不读取 NODE_PATH，因此按绝对路径加载
+  const cliDir = path.join(moduleRoot, '@mermaid-js', 'mermaid-cli');
+  const manifest = JSON.parse(fs.readFileSync(path.join(cliDir, 'package.json'), 'utf8'));
+  const require = createRequire(path.join(cliDir, 'package.json'));
+  const cli = await import(pathToFileURL(require.resolve('@mermaid-js/mermaid-cli')).href);
+  const puppeteer = (await import(pathToFileURL(require.resolve('puppeteer')).href)).default;
+  return { cli, puppeteer, version: `${manifest.name}@${manifest.version}` };
+}
+
+class PagePool {
+  /** 限制同时渲染的页面数量 */
+  constructor(size) {
+    this.available = size;
+    this.waiting = [];
+  }
+
+  async run(task) {
+    if (this.available > 0) {
+      this.available -= 1;
+    } else {
+      await new Promise((resolve) => this.waiting.push(resolve));
+    }
+    try {
+      return await task();
+    } finally {
+      const next = this.waiting.shift();
+      if (next) next();
+      else this.available += 1;
+    }
+  }
+}
+
+async function main() {
+  const args = parseArgs(process.argv.slice(2));
+  const moduleRoot = args.moduleRoot || path.join(path.dirname(process.execPath), '..', 'lib', 'node_modules');
+  const { cli, puppeteer, version } = await loadModules(moduleRoot);
+
+  const browser = await puppeteer.launch({ headless: 'new', args: ['--no-sandbox'] });
+  browser.on('disconnected', () => {
+    // 浏览器崩溃后退出，由监督进程重新启动
+    console.error('browser disconnected');
+    process.exit(1);
+  });
+  const pool = new PagePool(Math.max(1, args.pages));
+
+  async function renderOne(definition, config, format) {
+    return pool.run(async () => {
+      const { data } = await cli.renderMermaid(browser, definition, format, {
+        backgroundColor: 'transparent',
+        mermaidConfig: config,
+      });
+      return Buffer.from(data).toString('base64');
+    });
+  }
+
+  const server = http.createServer((req, res) => {
+    const reply = (status, payload) => {
+      const body = JSON.stringify(payload);
+      res.writeHead(status, { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) });
+      res.end(body);
+    };
+
+    if (req.method === 'GET' && req.url === '/health') {
+      reply(200, { status: 'ok', version });
+      return;
+    }
+    if (req.method !== 'POST' || req.url !== '/render') {
+      reply(404, { error: 'not found' });
+      return;
+    }
+
+    const chunks = [];
+    req.on('data', (chunk) => chunks.push(chunk));
+    req.on('end', async () => {
+      try {
+        const request = JSON.parse(Buffer.concat(chunks).toString('utf8'));
+        const format = request.format || 'png';
+        const results = await Promise.all((request.diagrams || []).map((definition) =>
+          renderOne(definition, request.config || {}, format)
+            .then((data) => ({ data }))
+            .catch((err) => ({ error: String(err && err.message ? err.message : err) }))));
+        reply(200, { version, results });
+      } catch (err) {
+        reply(400, { error: String(err) });
+      }
+    });
+  });
+
+  if (args.listen.startsWith('unix:')) {
+    server.listen(args.listen.slice('unix:'.length));
+  } else {
+    const url = new URL(args.listen);
+    server.listen(parseInt(url.port, 10), url.hostname);
+  }
+
+  const shutdown = async () => {
+    server.close();
+    await browser.close().catch(() => {});
+    process.exit(0);
+  };
+  process.on('SIGTERM', shutdown);
+  process.on('SIGINT', shutdown);
+}
+
+main().catch((err) => {
+  console.error(err);
+  process.exit(1);
+});
@@ -0,0 +1,40 @@
+"""
+图表渲染线程池
+
+文档中的图表在解析完成后立即提交到进程内共享的线程池，与文档其余部分的构建
+同时进行。线程数即同时进行的渲染调用数，在多个请求之间共享上限。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+_shared_executor: Optional[ThreadPoolExecutor] = None
+_shared_lock = threading.Lock()
+
+
+def render_workers() -> int:
+    """同时进行的渲染调用数，通过环境变量 MD2DOCX_MERMAID_WORKERS 配置，默认 4"""
+    return max(1, int(os.environ.get('MD2DOCX_MERMAID_WORKERS', 4)))
+
+
+def document_timeout() -> float:
+    """一个文档等待图表渲染的最长时间（秒），通过环境变量 MD2DOCX_MERMAID_DOCUMENT_TIMEOUT 配置，默认 60"""
+    return float(os.environ.get('MD2DOCX_MERMAID_DOCUMENT_TIMEOUT', 60))
+
+
+def get_render_executor() -> ThreadPoolExecutor:
+    """获取进程内共享的渲染线程池"""
+    global _shared_executor
+    with _shared_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(max_workers=render_workers(),
+                                                  thread_name_prefix='mermaid-render')
+        return _shared_executor
+
+
+def set_render_executor(executor: Optional[ThreadPoolExecutor]) -> None:
+    """替换共享线程池（传入 None 时下次使用重新创建）"""
+    global _shared_executor
+    with _shared_lock:
+        _shared_executor = executor
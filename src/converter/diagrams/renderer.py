@@ -0,0 +1,273 @@
+"""
+Mermaid 渲染器
+
+通过 mermaid-cli（mmdc）将图表渲染为图片。一个文档中的多个图表可以写入同一个
+Markdown 文件，由一次 mmdc 调用在同一个浏览器会话中全部渲染，浏览器启动开销
+每个文档只付出一次。渲染配置和渲染器版本共同决定了输出图片，两者都参与渲染
+缓存的键。
+
+图表默认渲染为 PNG；也可以渲染为 SVG，以原生矢量图嵌入文档，省去栅格化。
+"""
+import os
+import re
+import json
+import time
+import shutil
+import tempfile
+import functools
+import subprocess
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..assets.normalize import cairosvg_rasterizer
+
+# mmdc 输出中表示图表源码有错误的信息，这类失败是确定性的，不需要重试
+_SOURCE_ERROR = re.compile(
+    r'Parse error|Syntax error|Lexical error|UnknownDiagramError|No diagram type detected',
+    re.IGNORECASE
+)
+
+
+class RendererUnavailable(Exception):
+    """渲染器本身无法工作（未安装、超时或进程异常），与图表源码的错误无关"""
+    pass
+
+
+# mmdc 使用的默认渲染配置
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "theme": "default",
+    "themeVariables": {
+        "fontSize": "16px",
+        "fontFamily": "arial",
+    },
+    "flowchart": {
+        "htmlLabels": True,
+        "curve": "linear"
+    },
+    "sequence": {
+        "showSequenceNumbers": False,
+        "actorMargin": 50,
+        "messageMargin": 40
+    },
+    "gantt": {
+        "leftPadding": 75,
+        "rightPadding": 20
+    }
+}
+
+MERMAID_CLI_PACKAGE = '@mermaid-js/mermaid-cli'
+
+OUTPUT_FORMATS = ('png', 'svg')
+
+
+def output_format() -> str:
+    """图表的嵌入格式，通过环境变量 MD2DOCX_MERMAID_FORMAT 配置：png（默认）或 svg
+
+    svg 需要 cairosvg 生成后备 PNG；未安装时后备图片只能是空白占位，不支持 SVG 的
+    阅读器会显示空白，因此退回 png。
+    """
+    fmt = os.environ.get('MD2DOCX_MERMAID_FORMAT', 'png').lower()
+    if fmt == 'svg' and cairosvg_rasterizer() is None:
+        return 'png'
+    return fmt if fmt in OUTPUT_FORMATS else 'png'
+
+
+def svg_fallback_width() -> int:
+    """SVG 图表后备 PNG 的宽度（像素），通过环境变量 MD2DOCX_MERMAID_SVG_FALLBACK_WIDTH 配置，默认 480"""
+    return max(1, int(os.environ.get('MD2DOCX_MERMAID_SVG_FALLBACK_WIDTH', 480)))
+
+
+@functools.lru_cache(maxsize=None)
+def renderer_version(executable: str = 'mmdc') -> Optional[str]:
+    """获取渲染器版本，不启动 mmdc 进程
+
+    从 mmdc 所在的 npm 包中读取 package.json 的版本号；找不到时以可执行文件
+    的路径、大小和修改时间作为版本标识，升级后同样会使缓存失效。
+
+    Args:
+        executable: mmdc 可执行文件名或路径
+
+    Returns:
+        str: 版本标识，找不到 mmdc 时返回 None
+    """
+    path = shutil.which(executable)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+
+    directory = os.path.dirname(path)
+    while True:
+        manifest = os.path.join(directory, 'package.json')
+        if os.path.isfile(manifest):
+            try:
+                with open(manifest, 'r', encoding='utf-8') as f:
+                    package = json.load(f)
+                if package.get('name') == MERMAID_CLI_PACKAGE and package.get('version'):
+                    return f"{MERMAID_CLI_PACKAGE}@{package['version']}"
+            except (OSError, ValueError):
+                pass
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+
+    st = os.stat(path)
+    return f"{path}:{st.st_size:x}:{st.st_mtime_ns:x}"
+
+
+class MmdcRenderer:
+    """调用 mmdc 渲染 Mermaid 图表"""
+
+    def __init__(self, executable: str = 'mmdc', timeout: float = 30,
+                 per_diagram_timeout: float = 5, max_retries: int = 3,
+                 retry_delay: float = 1, debug: bool = False):
+        """初始化渲染器
+
+        Args:
+            executable: mmdc 可执行文件名或路径
+            timeout: 单次调用的基础超时（秒）
+            per_diagram_timeout: 批量渲染时每个图表增加的超时（秒）
+            max_retries: 最大尝试次数
+            retry_delay: 重试间隔（秒）
+            debug: 是否显示调试信息
+        """
+        self.executable = executable
+        self.timeout = timeout
+        self.per_diagram_timeout = per_diagram_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.debug = debug
+
+    @property
+    def version(self) -> Optional[str]:
+        return renderer_version(self.executable)
+
+    def prewarm(self) -> bool:
+        """检查 mmdc 是否可用（每次调用都会启动新的浏览器，无法预热）"""
+        return self.version is not None
+
+    def stop(self) -> None:
+        """mmdc 没有常驻进程，无需停止"""
+        pass
+
+    def render(self, code: str, config: Dict[str, Any], fmt: str = 'png') -> Optional[bytes]:
+        """渲染单个图表
+
+        Returns:
+            bytes: 图片数据，图表有错误时返回 None
+
+        Raises:
+            RendererUnavailable: mmdc 未安装、超时或异常退出
+        """
+        return self.render_batch([code], config, fmt)[0]
+
+    def render_batch(self, codes: Sequence[str], config: Dict[str, Any],
+                     fmt: str = 'png') -> List[Optional[bytes]]:
+        """在一次 mmdc 调用中渲染多个图表
+
+        图表按顺序写入同一个 Markdown 文件，mmdc 为其中的每个 mermaid 代码块
+        依次生成 ``out-1.png``、``out-2.png`` ……
+
+        Args:
+            codes: 图表源码列表
+            config: 渲染配置
+            fmt: 输出格式，png 或 svg
+
+        Returns:
+            List[Optional[bytes]]: 与 codes 一一对应的图片数据，失败的位置为 None
+
+        Raises:
+            RendererUnavailable: mmdc 未安装、超时或异常退出
+        """
+        if not codes:
+            return []
+
+        temp_dir = tempfile.mkdtemp(prefix='md2docx-mermaid-')
+        try:
+            input_file = os.path.join(temp_dir, 'batch.md')
+            with open(input_file, 'w', encoding='utf-8') as f:
+                for code in codes:
+                    fence = _fence_for(code)
+                    f.write(f"{fence}mermaid\n{code.rstrip()}\n{fence}\n\n")
+
+            config_file = os.path.join(temp_dir, 'config.json')
+            with open(config_file, 'w', encoding='utf-8') as f:
+                json.dump(config, f)
+
+            output_file = os.path.join(temp_dir, 'out.md')
+            cmd = [
+                self.executable,
+                '-i', input_file,
+                '-o', output_file,
+                '-e', fmt,
+                '-c', config_file,
+                '-b', 'transparent'
+            ]
+            images = [os.path.join(temp_dir, f'out-{i + 1}.{fmt}') for i in range(len(codes))]
+            timeout = self.timeout + self.per_diagram_timeout * (len(codes) - 1)
+            self._run(cmd, timeout, images)
+
+            results: List[Optional[bytes]] = []
+            for path in images:
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        results.append(f.read())
+                else:
+                    results.append(None)
+            return results
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _run(self, cmd: List[str], timeout: float, outputs: List[str]) -> bool:
+        """执行 mmdc
+
+        图表源码有错误时不重试，返回 False（对应位置的图片为 None）；超时和进程
+        异常最多尝试 max_retries 次，仍然失败时抛出 RendererUnavailable。
+        """
+        if self.debug:
+            print(f"执行命令: {' '.join(cmd)}")
+
+        error = None
+        for attempt in range(self.max_retries):
+            try:
+                if self.debug:
+                    print(f"尝试生成图片，第 {attempt + 1} 次")
+
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+                if result.returncode == 0 and all(os.path.exists(path) for path in outputs):
+                    if self.debug:
+                        print(f"图片生成成功: {len(outputs)} 张")
+                    return True
+
+                if self.debug:
+                    print(f"命令执行失败 (尝试 {attempt + 1}/{self.max_retries})")
+                    print(f"错误输出: {result.stderr}")
+                    print(f"标准输出: {result.stdout}")
+
+                # 图表源码有错误，或正常退出但缺少部分图片：重试的结果相同
+                if result.returncode == 0 or _SOURCE_ERROR.search(f"{result.stderr}\n{result.stdout}"):
+                    return False
+                error = f"mmdc 退出码 {result.returncode}"
+
+            except subprocess.TimeoutExpired:
+                if self.debug:
+                    print(f"命令执行超时 (尝试 {attempt + 1}/{self.max_retries})")
+                error = f"mmdc 执行超时 ({timeout} 秒)"
+            except FileNotFoundError:
+                # 未安装 mmdc，重试没有意义
+                raise RendererUnavailable(f"找不到渲染器: {self.executable}")
+            except Exception as e:
+                if self.debug:
+                    print(f"生成图片时发生异常: {str(e)}")
+                error = str(e)
+
+            if attempt < self.max_retries - 1:
+                time.sleep(self.retry_delay)
+
+        raise RendererUnavailable(error)
+
+
+def _fence_for(code: str) -> str:
+    """选择比源码中最长的反引号序列更长的代码块围栏"""
+    longest = max((len(run) for run in re.findall(r'`+', code)), default=0)
+    return '`' * max(3, longest + 1)
@@ -0,0 +1,327 @@
+"""
+常驻 Mermaid 渲染服务
+
+每次调用 mmdc 都要启动一次浏览器。常驻服务（mermaid_server.mjs）保持一个已启动
+的浏览器，通过 Unix 套接字或本机端口接收渲染请求。RenderService 负责启动、
+健康检查和在服务异常时重新启动；ServiceRenderer 与 MmdcRenderer 接口一致，
+服务不可用时退回到 mmdc。
+
+默认每个进程使用自己的套接字文件，预派生模式下每个工作进程各自启动服务；多个进程
+显式配置同一个 Unix 套接字地址时，通过文件锁保证只有一个进程启动服务，其他进程
+直接使用已就绪的服务。stub_server.py 实现了相同的协议，用于没有 Node 的
+环境和测试。
+"""
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import shutil
+import tempfile
+import threading
+import subprocess
+import http.client
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+try:  # Windows 下没有 fcntl，也不使用 Unix 套接字
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from .renderer import MmdcRenderer
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mermaid_server.mjs')
+STUB_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_server.py')
+
+
+class ServiceUnavailable(Exception):
+    """渲染服务无法连接或返回了异常响应"""
+    pass
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """通过 Unix 套接字发送 HTTP 请求"""
+
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        self.sock = sock
+
+
+def default_address() -> str:
+    """默认服务地址：支持 Unix 套接字时使用临时目录下本进程专用的套接字文件"""
+    if hasattr(socket, 'AF_UNIX'):
+        return f"unix:{os.path.join(tempfile.gettempdir(), f'md2docx-mermaid-{os.getpid()}.sock')}"
+    return 'http://127.0.0.1:8765'
+
+
+def node_service_command(address: str, pages: int = 4) -> List[str]:
+    """启动 Node 渲染服务的命令"""
+    command = ['node', SERVER_SCRIPT, '--listen', address, '--pages', str(pages)]
+    npm = shutil.which('npm')
+    if npm:
+        try:
+            root = subprocess.run([npm, 'root', '-g'], capture_output=True, text=True,
+                                  timeout=10).stdout.strip()
+            if root:
+                command += ['--module-root', root]
+        except (OSError, subprocess.SubprocessError):
+            pass
+    return command
+
+
+def stub_service_command(address: str, delay: float = 0.0) -> List[str]:
+    """启动渲染服务替身的命令"""
+    return [sys.executable, STUB_SCRIPT, '--listen', address, '--delay', str(delay)]
+
+
+class RenderService:
+    """管理常驻渲染服务进程：启动、健康检查和异常时重新启动"""
+
+    def __init__(self, command: List[str], address: str,
+                 startup_timeout: float = 30, request_timeout: float = 60,
+                 health_interval: float = 10):
+        """初始化服务管理器
+
+        Args:
+            command: 启动服务的命令，服务需监听 address
+            address: ``unix:/path`` 或 ``http://host:port``
+            startup_timeout: 等待服务就绪的最长时间（秒）
+            request_timeout: 单次渲染请求的超时（秒）
+            health_interval: 后台健康检查的间隔（秒）
+        """
+        self.command = command
+        self.address = address
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        self.health_interval = health_interval
+        self.version: Optional[str] = None
+        self.restarts = 0
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        self._restarting = False
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def healthy(self) -> bool:
+        """服务是否可以响应请求"""
+        try:
+            status, payload = self._request('GET', '/health', timeout=2)
+        except ServiceUnavailable:
+            return False
+        if status != 200:
+            return False
+        self.version = payload.get('version')
+        return True
+
+    def ensure_running(self) -> bool:
+        """确保服务正在运行，不健康时（重新）启动
+
+        Returns:
+            bool: 服务是否就绪
+        """
+        with self._lock, self._start_lock():
+            if self.healthy():
+                return True
+            self._terminate()
+            if self._socket_path:
+                # 健康检查失败说明套接字文件已失效
+                try:
+                    os.unlink(self._socket_path)
+                except OSError:
+                    pass
+            try:
+                self._process = subprocess.Popen(self.command, stdin=subprocess.DEVNULL,
+                                                 stdout=subprocess.DEVNULL,
+                                                 stderr=subprocess.DEVNULL)
+            except OSError:
+                return False
+            self.restarts += 1
+
+            deadline = time.monotonic() + self.startup_timeout
+            while time.monotonic() < deadline:
+                if self._process.poll() is not None:
+                    return False
+                if self.healthy():
+                    return True
+                time.sleep(0.05)
+            return False
+
+    def restart_async(self) -> None:
+        """在后台线程中重新启动服务，正在重启时不重复触发"""
+        with self._lock:
+            if self._restarting:
+                return
+            self._restarting = True
+
+        def restart():
+            try:
+                self.ensure_running()
+            finally:
+                self._restarting = False
+
+        threading.Thread(target=restart, name='mermaid-service-restart', daemon=True).start()
+
+    def start_watchdog(self) -> None:
+        """启动后台健康检查，服务异常时自动重新启动"""
+        if self._watchdog is not None:
+            return
+
+        def watch():
+            while not self._stopped.wait(self.health_interval):
+                if not self.healthy():
+                    self.ensure_running()
+
+        self._watchdog = threading.Thread(target=watch, name='mermaid-service-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def render(self, codes: Sequence[str], config: Dict[str, Any],
+               fmt: str = 'png') -> List[Optional[bytes]]:
+        """请求服务渲染一批图表
+
+        Returns:
+            List[Optional[bytes]]: 与 codes 一一对应的图片数据，渲染出错的位置为 None
+
+        Raises:
+            ServiceUnavailable: 服务无法连接或响应异常
+        """
+        body = json.dumps({'diagrams': list(codes), 'config': config, 'format': fmt})
+        status, payload = self._request('POST', '/render', body, timeout=self.request_timeout)
+        results = payload.get('results')
+        if status != 200 or not isinstance(results, list) or len(results) != len(codes):
+            raise ServiceUnavailable(f"渲染服务响应异常: {status}")
+        self.version = payload.get('version', self.version)
+        return [base64.b64decode(item['data']) if item.get('data') else None for item in results]
+
+    def stop(self) -> None:
+        """停止后台健康检查和本进程启动的服务，并删除服务的套接字文件和锁文件"""
+        self._stopped.set()
+        with self._lock:
+            started = self._process is not None
+            self._terminate()
+            if started and self._socket_path:
+                for path in (self._socket_path, f"{self._socket_path}.lock"):
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+    @property
+    def _socket_path(self) -> Optional[str]:
+        return self.address[len('unix:'):] if self.address.startswith('unix:') else None
+
+    @contextmanager
+    def _start_lock(self) -> Iterator[None]:
+        """跨进程的启动锁，同一个套接字地址同时只有一个进程检查和启动服务"""
+        if fcntl is None or not self._socket_path:
+            yield
+            return
+        with open(f"{self._socket_path}.lock", 'a+') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _terminate(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._process = None
+
+    def _request(self, method: str, path: str, body: Optional[str] = None,
+                 timeout: Optional[float] = None):
+        if self.address.startswith('unix:'):
+            conn = _UnixHTTPConnection(self.address[len('unix:'):], timeout=timeout)
+        else:
+            host = self.address.split('://', 1)[-1]
+            conn = http.client.HTTPConnection(host, timeout=timeout)
+        try:
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, json.loads(response.read() or b'{}')
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            raise ServiceUnavailable(str(e))
+        finally:
+            conn.close()
+
+
+class ServiceRenderer:
+    """通过常驻服务渲染图表，服务不可用时退回到 mmdc，接口与 MmdcRenderer 一致"""
+
+    def __init__(self, service: RenderService, fallback: Optional[MmdcRenderer] = None):
+        self.service = service
+        self.fallback = fallback or MmdcRenderer()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.service.version or self.fallback.version
+
+    def prewarm(self) -> bool:
+        """启动服务并开始后台健康检查（在 API 启动时调用）"""
+        ready = self.service.ensure_running()
+        self.service.start_watchdog()
+        return ready
+
+    def stop(self) -> None:
+        """停止服务（进程退出前调用）"""
+        self.service.stop()
+
+    def render(self, code: str, config: Dict[str, Any], fmt: str = 'png') -> Optional[bytes]:
+        return self.render_batch([code], config, fmt)[0]
+
+    def render_batch(self, codes: Sequence[str], config: Dict[str, Any],
+                     fmt: str = 'png') -> List[Optional[bytes]]:
+        try:
+            return self.service.render(codes, config, fmt)
+        except ServiceUnavailable:
+            # 本次请求退回到 mmdc，同时在后台重新启动服务
+            self.service.restart_async()
+            return self.fallback.render_batch(codes, config, fmt)
+
+
+_shared_renderer = None
+_shared_lock = threading.Lock()
+
+
+def get_mermaid_renderer():
+    """获取进程内共享的 Mermaid 渲染器
+
+    通过环境变量配置：
+        MD2DOCX_MERMAID_BACKEND: mmdc（默认，每次调用 mmdc）、service（常驻 Node 服务）
+            或 stub（服务替身，不需要 Node）
+        MD2DOCX_MERMAID_SERVICE_ADDRESS: 服务地址，默认为临时目录下本进程专用的 Unix 套接字
+        MD2DOCX_MERMAID_SERVICE_PAGES: 服务同时渲染的页面数，默认 4
+    """
+    global _shared_renderer
+    with _shared_lock:
+        if _shared_renderer is None:
+            backend = os.environ.get('MD2DOCX_MERMAID_BACKEND', 'mmdc').lower()
+            address = os.environ.get('MD2DOCX_MERMAID_SERVICE_ADDRESS') or default_address()
+            if backend == 'service':
+                pages = int(os.environ.get('MD2DOCX_MERMAID_SERVICE_PAGES', 4))
+                service = RenderService(node_service_command(address, pages), address)
+                _shared_renderer = ServiceRenderer(service)
+            elif backend == 'stub':
+                _shared_renderer = ServiceRenderer(RenderService(stub_service_command(address), address))
+            else:
+                _shared_renderer = MmdcRenderer()
+        return _shared_renderer
+
+
+def set_mermaid_renderer(renderer) -> None:
+    """替换共享渲染器（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_renderer
+    with _shared_lock:
+        _shared_renderer = renderer
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Mermaid 渲染服务的本地替身
+
+实现与 mermaid_server.mjs 相同的 HTTP 协议，不依赖 Node 和浏览器：每个图表
+渲染为一张标出首行源码的占位 PNG（或 SVG）。用于测试以及没有安装 Node 的开发环境。
+
+协议::
+
+    GET  /health  -> {"status": "ok", "version": "..."}
+    POST /render  {"diagrams": [...], "config": {...}, "format": "png"}
+                  -> {"version": "...", "results": [{"data": "<base64>"} | {"error": "..."}]}
+
+以 ``error`` 开头的图表返回错误，便于测试单个图表失败的情况。
+
+用法:
+    python stub_server.py --listen unix:/tmp/md2docx-mermaid.sock [--delay 0.1]
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import socketserver
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VERSION = 'stub-1'
+
+
+def render_placeholder(code: str) -> bytes:
+    from PIL import Image, ImageDraw
+
+    first_line = code.strip().splitlines()[0] if code.strip() else ''
+    img = Image.new('RGB', (320, 80), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, 319, 79], outline=(120, 120, 120))
+    draw.text((10, 30), first_line[:48], fill=(0, 0, 0))
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_placeholder_svg(code: str) -> bytes:
+    from xml.sax.saxutils import escape
+
+    first_line = code.strip().splitlines()[0] if code.strip() else ''
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="100%" viewBox="0 0 320 80" '
+        'style="max-width: 320px;">'
+        '<rect x="0.5" y="0.5" width="319" height="79" fill="#fff" stroke="#787878"/>'
+        f'<text x="10" y="44" font-family="arial" font-size="14">{escape(first_line[:48])}</text>'
+        '</svg>'
+    ).encode('utf-8')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'version': VERSION})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/render':
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length))
+        render = render_placeholder_svg if request.get('format') == 'svg' else render_placeholder
+        results = []
+        for code in request.get('diagrams', []):
+            time.sleep(self.delay)
+            if code.lstrip().startswith('error'):
+                results.append({'error': 'Parse error'})
+            else:
+                results.append({'data': base64.b64encode(render(code)).decode('ascii')})
+        self._send_json(200, {'version': VERSION, 'results': results})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix 套接字没有客户端地址
+        return 'local'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def create_server(listen: str):
+    if listen.startswith('unix:'):
+        path = listen[len('unix:'):]
+        if os.path.exists(path):
+            os.unlink(path)
+        return UnixHTTPServer(path, StubHandler)
+    host, _, port = listen.replace('http://', '').partition(':')
+    return ThreadingHTTPServer((host, int(port)), StubHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mermaid 渲染服务替身')
+    parser.add_argument('--listen', required=True, help='unix:/path/to.sock 或 http://127.0.0.1:port')
+    parser.add_argument('--delay', type=float, default=0.0, help='每个图表的模拟渲染耗时（秒）')
+    args = parser.parse_args()
+
+    StubHandler.delay = args.delay
+    server = create_server(args.listen)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.listen.startswith('unix:'):
+            try:
+                os.unlink(args.listen[len('unix:'):])
+            except OSError:
+                pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
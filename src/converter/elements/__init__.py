@@ -14,6 +14,7 @@ from .hr import HRConverter
 from .task_list import TaskListConverter
 from .html import HtmlConverter
 from .mermaid import MermaidConverter
+from .math import MathConverter
 
 __all__ = [
     'ElementConverter',
@@ -28,5 +29,6 @@ __all__ = [
     'HRConverter',
     'TaskListConverter',
     'HtmlConverter',
-    'MermaidConverter'
+    'MermaidConverter',
+    'MathConverter'
 ] 
\ No newline at end of file
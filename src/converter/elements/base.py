@@ -1,7 +1,7 @@
 """
 基础元素转换器模块
 """
-from typing import Any, Optional
+from typing import Any, List, Optional
 from docx import Document
 
 
@@ -25,6 +25,23 @@ class ElementConverter:
         """
         self.document = document
     
+    def prepare(self, tokens: List[Any]) -> None:
+        """在逐个转换之前查看整个文档的标记（默认不做任何处理）
+        
+        需要一次性处理整个文档的转换器（如批量渲染图表）可以重写此方法。
+        
+        Args:
+            tokens: 整个文档的标记列表
+        """
+        pass
+    
+    def finish(self) -> None:
+        """在全部标记转换完成之后调用（默认不做任何处理）
+        
+        异步生成内容的转换器（如并发渲染图表）可以在这里把结果放入文档。
+        """
+        pass
+    
     def convert(self, element: Any) -> Any:
         """转换元素（需要子类实现）
         
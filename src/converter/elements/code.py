@@ -53,11 +53,24 @@ class CodeConverter(ElementConverter):
 
         # 创建新段落
         paragraph = self.document.add_paragraph()
-        paragraph.style = 'Code'
 
         # 获取代码内容
         code = token.content if hasattr(token, 'content') else ''
-        
+        self.write_code(paragraph, code)
+
+        # 更新状态
+        if code:
+            self._last_was_code = True
+
+    def write_code(self, paragraph, code: str) -> None:
+        """把代码内容以代码块样式写入段落
+
+        Args:
+            paragraph: 目标段落
+            code: 代码内容
+        """
+        paragraph.style = 'Code'
+
         # 处理空的代码块
         if not code:
             paragraph.add_run("")
@@ -65,7 +78,7 @@ class CodeConverter(ElementConverter):
 
         # 分割并处理每一行，去掉末尾的空行
         lines = code.rstrip('\n').splitlines()
-        
+
         # 添加代码内容
         for i, line in enumerate(lines):
             if i > 0:  # 不是第一行，添加换行符
@@ -73,6 +86,3 @@ class CodeConverter(ElementConverter):
             run = paragraph.add_run(line)
             run.font.name = 'Consolas'
             run.font.color.rgb = RGBColor(51, 51, 51)  # 深灰色
-
-        # 更新状态
-        self._last_was_code = True 
\ No newline at end of file
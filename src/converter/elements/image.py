@@ -1,24 +1,66 @@
 """
 图片转换器模块
 """
-import os
 import re
-import requests
 from io import BytesIO
-from typing import Any, Dict, Optional, Tuple
-from docx.shared import Inches, Pt
+from typing import Any, Dict, Optional, Tuple, Union
+from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from .base import ElementConverter
+from ..metrics import stage
+from ..assets import (
+    CachedImage,
+    ImageCache,
+    HttpClient,
+    FetchDeadline,
+    DownloadBudget,
+    DownloadRejected,
+    FetchDeadlineExceeded,
+    ImageOptimizer,
+    ImageNormalizer,
+    UnsupportedImageFormat,
+    ImageResolver,
+    BundleImageResolver,
+    get_image_cache,
+    get_http_client,
+    add_picture
+)
+from ..assets.http import response_header
 
 
 class ImageConverter(ElementConverter):
     """图片转换器，处理各种类型的图片"""
 
-    def __init__(self, base_converter=None):
+    def __init__(self, base_converter=None, image_cache: Optional[ImageCache] = None,
+                 http_client: Optional[HttpClient] = None,
+                 optimizer: Optional[ImageOptimizer] = None,
+                 normalizer: Optional[ImageNormalizer] = None,
+                 resolver: Optional[Union[ImageResolver, BundleImageResolver]] = None,
+                 unavailable: Optional[Dict[str, Optional[str]]] = None):
         super().__init__(base_converter)
         self.document = None
-        # 图片缓存，避免重复下载
-        self._image_cache = {}
+        # 进程内共享的图片缓存，避免跨文档重复下载
+        self.image_cache = image_cache or get_image_cache()
+        # 进程内共享的HTTP客户端，复用连接池
+        self.http_client = http_client or get_http_client()
+        # 可选的图片优化器，按显示尺寸重新采样
+        self.optimizer = optimizer
+        # 将 WebP、SVG 等无法直接嵌入的格式转换为 PNG/JPEG
+        self.normalizer = normalizer or ImageNormalizer(self.image_cache)
+        # 本地图片路径解析器，默认相对当前工作目录查找
+        self.resolver = resolver or ImageResolver()
+        # 本文档的图片获取截止时间，首次获取在线图片时开始计时
+        self._fetch_deadline: Optional[FetchDeadline] = None
+        # 本文档的图片下载字节预算
+        self._download_budget: Optional[DownloadBudget] = None
+        # 服务进程已确认无法获取的图片：值为拒绝原因时插入占位文本，为 None 时跳过
+        self.unavailable = unavailable or {}
+
+    def start_fetching(self) -> None:
+        """开始本文档的图片获取计时并创建下载预算（并发下载前调用一次）"""
+        if self._fetch_deadline is None:
+            self._fetch_deadline = self.http_client.new_deadline()
+            self._download_budget = self.http_client.new_budget()
 
     def convert(self, tokens: Tuple[Any, Any]) -> None:
         """转换图片元素
@@ -63,21 +105,20 @@ class ImageConverter(ElementConverter):
         # 添加图片
         try:
             # 获取图片数据
-            image_data = self._get_image_data(src)
-            if not image_data:
+            image = self._load_image(src)
+            if not image:
                 if debug:
                     print(f"无法获取图片数据: {src}")
                 return
             
             # 添加图片到文档
+            run = paragraph.add_run()
             if width and height:
                 # 使用指定尺寸
-                run = paragraph.add_run()
-                run.add_picture(image_data, width=Pt(width), height=Pt(height))
+                self._add_picture(run, image, Pt(width), Pt(height))
             else:
                 # 使用默认尺寸
-                run = paragraph.add_run()
-                run.add_picture(image_data)
+                self._add_picture(run, image)
             
             # 添加图片标题（如果有）
             if title:
@@ -89,6 +130,16 @@ class ImageConverter(ElementConverter):
             
             if debug:
                 print(f"图片添加成功: {src}")
+        
+        except (DownloadRejected, FetchDeadlineExceeded) as e:
+            if debug:
+                print(f"跳过图片: {src}, 原因: {str(e)}")
+            self._add_placeholder(paragraph, alt, src)
+        
+        except UnsupportedImageFormat as e:
+            if debug:
+                print(f"跳过图片: {src}, 原因: {str(e)}")
+            self._add_placeholder(paragraph, alt, src)
                 
         except Exception as e:
             if debug:
@@ -129,8 +180,8 @@ class ImageConverter(ElementConverter):
         # 添加图片
         try:
             # 获取图片数据
-            image_data = self._get_image_data(src)
-            if not image_data:
+            image = self._load_image(src)
+            if not image:
                 if debug:
                     print(f"无法获取图片数据: {src}")
                 return
@@ -139,18 +190,61 @@ class ImageConverter(ElementConverter):
             run = paragraph.add_run()
             if width and height:
                 # 使用指定尺寸
-                run.add_picture(image_data, width=Pt(width), height=Pt(height))
+                self._add_picture(run, image, Pt(width), Pt(height))
             else:
                 # 使用默认尺寸（较小，适合内联）
-                run.add_picture(image_data, width=Pt(100))
+                self._add_picture(run, image, Pt(100))
             
             if debug:
                 print(f"段落内图片添加成功: {src}")
+        
+        except (DownloadRejected, FetchDeadlineExceeded) as e:
+            if debug:
+                print(f"跳过段落内图片: {src}, 原因: {str(e)}")
+            self._add_placeholder(paragraph, alt, src)
+        
+        except UnsupportedImageFormat as e:
+            if debug:
+                print(f"跳过段落内图片: {src}, 原因: {str(e)}")
+            self._add_placeholder(paragraph, alt, src)
                 
         except Exception as e:
             if debug:
                 print(f"添加段落内图片失败: {str(e)}")
     
+    def _add_picture(self, run, image: CachedImage, width=None, height=None) -> None:
+        """插入图片，先转换不支持的格式，启用优化器时再按显示尺寸缩小
+        
+        Args:
+            run: 目标 run
+            image: 图片
+            width: 显示宽度
+            height: 显示高度
+            
+        Raises:
+            UnsupportedImageFormat: 图片格式无法转换
+        """
+        image = self.normalizer.normalize(image)
+        if self.optimizer:
+            image = self.optimizer.optimize(image, width, height)
+        # 较大的图片以磁盘文件的形式保存在文档中，优先链接磁盘缓存中的文件
+        add_picture(run, image, width=width, height=height,
+                    source_path=self.image_cache.object_file(image))
+    
+    def _add_placeholder(self, paragraph, alt: str, src: str) -> None:
+        """为未嵌入的图片插入占位文本
+        
+        Args:
+            paragraph: 段落对象
+            alt: 图片alt文本
+            src: 图片地址
+        """
+        label = alt.split('|')[0].strip() if alt else ''
+        run = paragraph.add_run(f"[图片未嵌入: {label or src}]")
+        run.italic = True
+        run.font.size = Pt(9)
+        run.font.color.rgb = RGBColor(128, 128, 128)
+    
     def _get_image_data(self, src: str) -> Optional[BytesIO]:
         """获取图片数据
         
@@ -160,37 +254,36 @@ class ImageConverter(ElementConverter):
         Returns:
             BytesIO: 图片数据流
         """
-        # 检查缓存
-        if src in self._image_cache:
-            return BytesIO(self._image_cache[src])
+        image = self._load_image(src)
+        return BytesIO(image.data) if image else None
+    
+    def _load_image(self, src: str) -> Optional[CachedImage]:
+        """获取图片及其元数据，优先使用共享缓存
         
+        Args:
+            src: 图片路径或URL
+            
+        Returns:
+            CachedImage: 缓存的图片，获取失败时返回 None
+            
+        Raises:
+            DownloadRejected: 在线图片的类型或大小超出限制
+            FetchDeadlineExceeded: 文档的图片获取总时间已用完
+        """
+        if src in self.unavailable:
+            reason = self.unavailable[src]
+            if reason is not None:
+                raise DownloadRejected(reason)
+            return None
         try:
             # 处理在线图片
             if src.startswith(('http://', 'https://')):
-                response = requests.get(src, timeout=10)
-                if response.status_code == 200:
-                    image_data = response.content
-                    # 缓存图片数据
-                    self._image_cache[src] = image_data
-                    return BytesIO(image_data)
+                return self._load_remote_image(src)
             # 处理本地图片
-            else:
-                # 尝试从当前目录加载
-                if os.path.exists(src):
-                    with open(src, 'rb') as f:
-                        image_data = f.read()
-                        # 缓存图片数据
-                        self._image_cache[src] = image_data
-                        return BytesIO(image_data)
-                
-                # 尝试从测试目录加载
-                test_path = os.path.join('tests', 'samples', 'basic', src)
-                if os.path.exists(test_path):
-                    with open(test_path, 'rb') as f:
-                        image_data = f.read()
-                        # 缓存图片数据
-                        self._image_cache[src] = image_data
-                        return BytesIO(image_data)
+            return self._load_local_image(src)
+        except (DownloadRejected, FetchDeadlineExceeded):
+            # 被拒绝或超出截止时间的图片由调用方插入占位文本
+            raise
         except Exception as e:
             debug = self.base_converter.debug if hasattr(self.base_converter, 'debug') else False
             if debug:
@@ -198,6 +291,52 @@ class ImageConverter(ElementConverter):
         
         return None
     
+    def _load_remote_image(self, src: str) -> Optional[CachedImage]:
+        """获取在线图片，过期的缓存条目使用 ETag/Last-Modified 重新验证"""
+        cached = self.image_cache.get(src)
+        if cached and cached.is_fresh(self.image_cache.ttl):
+            return cached
+        
+        # 构造条件请求头
+        headers = {}
+        if cached:
+            if cached.meta.etag:
+                headers['If-None-Match'] = cached.meta.etag
+            if cached.meta.last_modified:
+                headers['If-Modified-Since'] = cached.meta.last_modified
+        
+        self.start_fetching()
+        with stage('image_fetch'):
+            response, body = self.http_client.download(
+                src,
+                headers=headers or None,
+                deadline=self._fetch_deadline,
+                budget=self._download_budget
+            )
+        
+        if response.status_code == 304 and cached:
+            return self.image_cache.refresh(cached)
+        if body is not None:
+            return self.image_cache.put(
+                src,
+                body,
+                etag=response_header(response, 'ETag'),
+                last_modified=response_header(response, 'Last-Modified')
+            )
+        return None
+    
+    def _load_local_image(self, src: str) -> Optional[CachedImage]:
+        """获取本地图片（或压缩包中的图片），以修改时间和大小（或内容的sha256）作为验证标识"""
+        path = self.resolver.resolve(src)
+        if not path:
+            return None
+        key = self.resolver.cache_key(path)
+        validator = self.resolver.validator(path)
+        cached = self.image_cache.get(key)
+        if cached and cached.meta.etag == validator:
+            return cached
+        return self.image_cache.put(key, self.resolver.read(path), etag=validator)
+    
     def _parse_size(self, alt: str) -> Tuple[Optional[int], Optional[int]]:
         """从alt文本中解析图片尺寸
         
@@ -230,4 +369,4 @@ class ImageConverter(ElementConverter):
                     print(f"解析到图片尺寸: {width}x{height}")
                 return width, height
         
-        return None, None 
\ No newline at end of file
+        return None, None
@@ -109,6 +109,15 @@ class ListConverter(ElementConverter):
                 if text.endswith(' '):
                     text = text[:-1]
                 current_text += text
+            elif child.type == 'math_inline':
+                if current_text:
+                    self._add_text_with_style(paragraph, current_text, current_style)
+                    current_text = ""
+                math_converter = self.base_converter.converters.get('math') if self.base_converter else None
+                if math_converter:
+                    math_converter.convert_in_paragraph(paragraph, child, current_style.copy())
+                else:
+                    current_text += f"{child.markup}{child.content}{child.markup}"
             elif child.type == 'strong_open':
                 if current_text:
                     self._add_text_with_style(paragraph, current_text, current_style)
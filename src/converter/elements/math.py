@@ -0,0 +1,71 @@
+"""
+数学公式转换器模块
+"""
+from docx.oxml import OxmlElement
+from docx.text.paragraph import Paragraph
+from .base import ElementConverter
+from ..formula import LatexError, latex_to_omml
+
+
+class MathConverter(ElementConverter):
+    """数学公式转换器，把 LaTeX 公式转换为 Word 原生公式（OMML）
+
+    块级公式（``$$...$$``）单独成段，行内公式（``$...$``）插入所在段落。转换结果
+    按公式源码缓存，无法解析的公式按原文显示。
+    """
+
+    def __init__(self, base_converter=None):
+        super().__init__(base_converter)
+        self.debug = False
+        if base_converter:
+            self.debug = base_converter.debug
+
+    def convert(self, token):
+        """转换块级公式
+
+        Args:
+            token: math_block 标记
+
+        Returns:
+            docx.paragraph: 包含公式的段落，公式为空时返回 None
+        """
+        if not self.document:
+            raise ValueError("Document not set for MathConverter")
+
+        latex = token.content if hasattr(token, 'content') else ''
+        if not latex.strip():
+            return None
+
+        paragraph = self.document.add_paragraph()
+        try:
+            math_para = OxmlElement('m:oMathPara')
+            math_para.append(latex_to_omml(latex))
+            paragraph._p.append(math_para)
+        except LatexError as e:
+            if self.debug:
+                print(f"公式转换失败: {str(e)}")
+            paragraph.alignment = 1  # 居中对齐
+            paragraph.add_run(f"$${latex}$$")
+        return paragraph
+
+    def convert_in_paragraph(self, paragraph: Paragraph, token, style=None) -> None:
+        """在段落中插入行内公式
+
+        Args:
+            paragraph: 目标段落
+            token: math_inline 标记
+            style: 公式无法解析时原文使用的样式
+        """
+        latex = token.content if hasattr(token, 'content') else ''
+        if not latex.strip():
+            return
+        try:
+            paragraph._p.append(latex_to_omml(latex))
+        except LatexError as e:
+            if self.debug:
+                print(f"公式转换失败: {str(e)}")
+            run = paragraph.add_run(f"{token.markup or '$'}{latex}{token.markup or '$'}")
+            if style:
+                run.bold = style.get("bold")
+                run.italic = style.get("italic")
+                run.font.strike = style.get("strike")
@@ -1,97 +1,173 @@
 """
 Mermaid图表转换器模块
 """
-import os
-import json
 import time
-import tempfile
-import subprocess
-from pathlib import Path
+from concurrent.futures import Executor, Future, TimeoutError as FutureTimeoutError
+from typing import Any, Collection, Dict, List, Optional, Tuple, Union
 from docx.shared import Inches
+from docx.text.paragraph import Paragraph
 from .base import ElementConverter
+from ..metrics import stage
+from .code import CodeConverter
+from ..assets import CachedImage, ImageCache, add_picture, add_svg_picture, svg_fallback_png, svg_size
+from ..diagrams import (
+    DEFAULT_CONFIG,
+    CircuitBreaker,
+    FailureCache,
+    MmdcRenderer,
+    ServiceRenderer,
+    diagram_key,
+    document_timeout,
+    get_diagram_cache,
+    get_failure_cache,
+    get_mermaid_renderer,
+    get_render_breaker,
+    get_render_executor,
+    output_format,
+    render_workers,
+    svg_fallback_width
+)
 
 
 class MermaidConverter(ElementConverter):
-    """Mermaid图表转换器，处理Markdown中的mermaid代码块"""
+    """Mermaid图表转换器，处理Markdown中的mermaid代码块
 
-    def __init__(self, base_converter=None):
+    解析完成后，未缓存的图表立即提交到共享线程池并发渲染；转换过程中遇到图表时
+    先插入占位段落，文档其余部分继续构建，全部转换完成后再把图片放入占位段落。
+
+    渲染失败、渲染器熔断或超过文档的等待时间时，图表以代码块的形式保留源码。
+
+    输出格式为 svg 时，图表以原生 SVG 嵌入，并附带一张低分辨率的后备 PNG。
+    """
+
+    def __init__(self, base_converter=None, cache: Optional[ImageCache] = None,
+                 config: Optional[Dict[str, Any]] = None,
+                 renderer: Optional[Union[MmdcRenderer, ServiceRenderer]] = None,
+                 executor: Optional[Executor] = None, workers: Optional[int] = None,
+                 breaker: Optional[CircuitBreaker] = None, failures: Optional[FailureCache] = None,
+                 timeout: Optional[float] = None, fmt: Optional[str] = None,
+                 fallback_width: Optional[int] = None,
+                 unavailable: Optional[Collection[str]] = None):
         """初始化Mermaid转换器
-        
+
         Args:
             base_converter: 基础转换器实例
+            cache: 渲染结果缓存，默认使用进程内共享的图表缓存
+            config: mmdc 渲染配置，默认使用 DEFAULT_CONFIG
+            renderer: 图表渲染器，默认使用进程内共享的渲染器（mmdc 或常驻渲染服务）
+            executor: 执行渲染的线程池，默认使用进程内共享的线程池
+            workers: 一个文档的图表最多分成几组并发渲染，默认与共享线程池的线程数一致
+            breaker: 渲染器熔断器，默认使用进程内共享的熔断器
+            failures: 渲染失败缓存，默认使用进程内共享的失败缓存
+            timeout: 一个文档等待并发渲染的最长时间（秒），默认由环境变量配置
+            fmt: 图表的嵌入格式，png 或 svg，默认由环境变量配置
+            fallback_width: svg 格式时后备 PNG 的宽度（像素），默认由环境变量配置
+            unavailable: 本文档不再渲染的图表缓存键（服务进程等待超时或被熔断的图表），
+                直接以代码块形式保留，也不记入失败缓存
         """
         super().__init__(base_converter)
         self.debug = False
-        self.max_retries = 3  # 最大重试次数
-        self.retry_delay = 1  # 重试间隔（秒）
         if base_converter:
             self.debug = base_converter.debug
+        self.config = config or DEFAULT_CONFIG
+        self.cache = cache or get_diagram_cache()
+        self.renderer = renderer or get_mermaid_renderer()
+        self.executor = executor or get_render_executor()
+        self.workers = workers or render_workers()
+        self.breaker = breaker or get_render_breaker()
+        self.failures = failures if failures is not None else get_failure_cache()
+        self.timeout = timeout if timeout is not None else document_timeout()
+        self.format = fmt or output_format()
+        self.fallback_width = fallback_width or svg_fallback_width()
+        self.unavailable = unavailable or ()
+        # 本文档的全部图表源码
+        self._codes: List[str] = []
+        # 本文档已经得到的图表：源码 -> 图片
+        self._prepared: Dict[str, CachedImage] = {}
+        # 正在渲染的图表：源码 -> 所在分组的渲染任务
+        self._pending: Dict[str, Future] = {}
+        # 等待放入图片的占位段落
+        self._reserved: List[Tuple[Paragraph, str]] = []
+        self._deadline = 0.0
+
+    def prepare(self, tokens) -> None:
+        """收集文档中的全部mermaid代码块，未缓存的图表分组提交到线程池并发渲染
 
-    def _generate_mermaid_image(self, mmd_file, config_file, img_file):
-        """生成Mermaid图表图片
-        
         Args:
-            mmd_file: Mermaid代码文件路径
-            config_file: 配置文件路径
-            img_file: 输出图片文件路径
-            
-        Returns:
-            bool: 是否成功生成图片
+            tokens: 整个文档的标记列表
         """
-        cmd = [
-            'mmdc',
-            '-i', mmd_file,
-            '-o', img_file,
-            '-c', config_file,
-            '-b', 'transparent'
-        ]
-        
+        self._prepared = {}
+        self._pending = {}
+        self._reserved = []
+        self._deadline = time.monotonic() + self.timeout
+        codes: List[str] = []
+        self._codes = codes
+        for token in tokens:
+            if token.type != 'fence' or token.info.strip().lower() != 'mermaid':
+                continue
+            if token.content and token.content not in codes:
+                codes.append(token.content)
+        if not codes:
+            return
+
+        pending = []
+        for code in codes:
+            key = self._key(code)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._prepared[code] = cached
+            elif key not in self.failures and key not in self.unavailable:
+                pending.append(code)
         if self.debug:
-            print(f"执行命令: {' '.join(cmd)}")
-            cmd.append('--verbose')
+            print(f"Mermaid图表: 共 {len(codes)} 个，缓存命中 {len(self._prepared)} 个")
+        if not pending:
+            return
+        if self.breaker.state == CircuitBreaker.OPEN:
+            # 渲染器熔断期间不占用线程池，图表直接退回为代码块
+            if self.debug:
+                print("Mermaid渲染器已熔断，图表以代码块形式保留")
+            return
 
-        for attempt in range(self.max_retries):
-            try:
-                if self.debug:
-                    print(f"尝试生成图片，第 {attempt + 1} 次")
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)  # 添加超时限制
-                
-                if result.returncode == 0 and os.path.exists(img_file):
-                    if self.debug:
-                        print(f"图片生成成功: {img_file}")
-                        print(f"图片大小: {os.path.getsize(img_file)} 字节")
-                    return True
-                
-                if self.debug:
-                    print(f"命令执行失败 (尝试 {attempt + 1}/{self.max_retries})")
-                    print(f"错误输出: {result.stderr}")
-                    print(f"标准输出: {result.stdout}")
-                
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-                    
-            except subprocess.TimeoutExpired:
-                if self.debug:
-                    print(f"命令执行超时 (尝试 {attempt + 1}/{self.max_retries})")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-            except Exception as e:
-                if self.debug:
-                    print(f"生成图片时发生异常: {str(e)}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(self.retry_delay)
-        
-        return False
+        # 每组通过一次渲染器调用批量渲染，各组之间并发
+        groups = min(self.workers, len(pending))
+        for i in range(groups):
+            chunk = pending[i::groups]
+            future = self.executor.submit(self._render_chunk, chunk)
+            for code in chunk:
+                self._pending[code] = future
+
+    def rendering(self) -> List[Future]:
+        """prepare 提交到线程池、尚未完成的渲染任务"""
+        return [future for future in set(self._pending.values()) if not future.done()]
+
+    def collect(self) -> Dict[str, Optional[CachedImage]]:
+        """不等待地返回 prepare 收集到的每个图表目前的结果
+
+        异步 API 服务在自己的进程中预先渲染图表，等待 rendering() 中的任务后调用
+        本方法，把结果交给转换进程。
+
+        Returns:
+            Dict[str, Optional[CachedImage]]: 缓存键 -> 图片，渲染失败、被熔断或
+            仍在渲染的图表为 None
+        """
+        results: Dict[str, Optional[CachedImage]] = {}
+        for code in self._codes:
+            image = self._prepared.get(code)
+            future = self._pending.get(code)
+            if image is None and future is not None and future.done() and not future.cancelled():
+                if future.exception() is None:
+                    image = future.result().get(code)
+            results[self._key(code)] = image
+        return results
 
     def convert(self, token):
         """转换mermaid代码块为图片
-        
+
         Args:
             token: mermaid代码块token
-            
+
         Returns:
-            docx.paragraph: 包含图片的段落
+            docx.paragraph: 包含图片（或图片占位）的段落
         """
         if not self.document:
             raise ValueError("Document not set for MermaidConverter")
@@ -106,85 +182,177 @@ class MermaidConverter(ElementConverter):
                 print("Mermaid代码为空")
             return None
 
-        temp_dir = None
+        # 创建新段落
+        paragraph = self.document.add_paragraph()
+        paragraph.alignment = 1  # 居中对齐
+
+        if code in self._pending:
+            # 图表仍在渲染，先保留位置，全部转换完成后再放入图片
+            self._reserved.append((paragraph, code))
+            return paragraph
+
         try:
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp()
-            if self.debug:
-                print(f"创建临时目录: {temp_dir}")
-            
-            # 创建临时文件保存mermaid代码
-            mmd_file = os.path.join(temp_dir, 'diagram.mmd')
-            with open(mmd_file, 'w', encoding='utf-8') as f:
-                f.write(code)
-            if self.debug:
-                print(f"已保存Mermaid代码到文件: {mmd_file}")
-
-            # 创建配置文件
-            config = {
-                "theme": "default",
-                "themeVariables": {
-                    "fontSize": "16px",
-                    "fontFamily": "arial",
-                },
-                "flowchart": {
-                    "htmlLabels": True,
-                    "curve": "linear"
-                },
-                "sequence": {
-                    "showSequenceNumbers": False,
-                    "actorMargin": 50,
-                    "messageMargin": 40
-                },
-                "gantt": {
-                    "leftPadding": 75,
-                    "rightPadding": 20
-                }
-            }
-            
-            config_file = os.path.join(temp_dir, 'config.json')
-            with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f)
-
-            # 生成图片文件路径
-            img_file = os.path.join(temp_dir, 'diagram.png')
+            image = self._render(code)
+            if image is None:
+                if self.debug:
+                    print("图片生成失败，所有重试都失败了")
+                return self._fallback(paragraph, code)
+
+            self._insert(paragraph, image)
+            return paragraph
+
+        except Exception as e:
             if self.debug:
-                print(f"目标图片文件路径: {img_file}")
+                print(f"Mermaid转换异常: {str(e)}")
+            return self._fallback(paragraph, code)
+
+    def finish(self) -> None:
+        """等待并发渲染完成，把图片放入占位段落
 
-            # 生成图片
-            if not self._generate_mermaid_image(mmd_file, config_file, img_file):
+        最多等待到文档的截止时间，超时或渲染失败的图表以代码块形式保留。超时的
+        渲染任务仍在后台完成并写入缓存。
+        """
+        reserved, self._reserved = self._reserved, []
+        for paragraph, code in reserved:
+            image = None
+            try:
+                remaining = max(0.0, self._deadline - time.monotonic())
+                image = self._pending[code].result(timeout=remaining).get(code)
+                if image is not None:
+                    self._insert(paragraph, image)
+            except FutureTimeoutError:
+                if self.debug:
+                    print("等待Mermaid图表渲染超时")
+            except Exception as e:
+                image = None
+                if self.debug:
+                    print(f"Mermaid转换异常: {str(e)}")
+            if image is None:
                 if self.debug:
                     print("图片生成失败，所有重试都失败了")
-                return None
+                self._fallback(paragraph, code)
+        self._pending = {}
 
-            # 创建新段落
-            paragraph = self.document.add_paragraph()
-            paragraph.alignment = 1  # 居中对齐
+    def _fallback(self, paragraph, code: str) -> Optional[Paragraph]:
+        """把图表段落改为显示源码的代码块，没有代码块转换器时删除段落"""
+        converters = getattr(self.base_converter, 'converters', None)
+        code_converter = converters.get('code') if isinstance(converters, dict) else None
+        if not isinstance(code_converter, CodeConverter):
+            _remove_paragraph(paragraph)
+            return None
+        paragraph.alignment = None
+        code_converter.write_code(paragraph, code)
+        return paragraph
 
-            # 添加图片到段落
-            run = paragraph.add_run()
-            run.add_picture(img_file, width=Inches(6))  # 设置合适的宽度
+    def _insert(self, paragraph, image: CachedImage) -> None:
+        # 添加图片到段落
+        run = paragraph.add_run()
+        if self.format == 'svg':
+            self._insert_svg(run, image)
+            return
+        add_picture(run, image, width=Inches(6),  # 设置合适的宽度
+                    source_path=self.cache.object_file(image))
 
-            return paragraph
+    def _insert_svg(self, run, image: CachedImage) -> None:
+        """以原生 SVG 插入图表，宽度不超过 6 英寸"""
+        key = f"{image.key}:fallback:{self.fallback_width}"
+        fallback = self.cache.get(key)
+        if fallback is None:
+            data = svg_fallback_png(image.data, self.fallback_width)
+            if data is None:
+                raise ValueError("无法读取SVG图表的尺寸")
+            fallback = self.cache.put(key, data)
+
+        width = Inches(6)
+        size = svg_size(image.data)
+        if size is not None:
+            # SVG 的像素按 96 DPI 计算
+            width = min(width, Inches(size[0] / 96))
+        add_svg_picture(run, image, fallback, width=width)
+
+    def _render_chunk(self, codes: List[str]) -> Dict[str, Optional[CachedImage]]:
+        """在线程池中渲染一组图表并写入缓存
 
+        批量渲染中有语法错误的图表会导致整批失败，此时逐个重新渲染。单独渲染
+        仍然失败的图表记入失败缓存。渲染器抛出异常或被熔断时不再逐个重试，整组
+        图表在本文档中以代码块保留。
+        """
+        results = self._call_renderer(codes)
+        if results is None:
+            return {code: None for code in codes}
+        single = len(codes) == 1
+
+        images: Dict[str, Optional[CachedImage]] = {}
+        for code, data in zip(codes, results):
+            if data is None and not single:
+                retry = self._call_renderer([code])
+                data = retry[0] if retry is not None else None
+                if retry is not None and data is None:
+                    self.failures.add(self._key(code))
+            elif data is None:
+                self.failures.add(self._key(code))
+            images[code] = self.cache.put(self._key(code), data) if data is not None else None
+        return images
+
+    def _call_renderer(self, codes: List[str]) -> Optional[List[Optional[bytes]]]:
+        """经过熔断器调用渲染器，并报告调用结果
+
+        只有渲染器抛出异常（未安装、超时、服务异常）才计为熔断器的失败；渲染器
+        正常返回时，即使其中的图表因语法错误没有结果也计为成功，这些图表只记入
+        失败缓存，不影响其他用户的图表。
+
+        Returns:
+            List[Optional[bytes]]: 渲染结果；熔断器拒绝或渲染器抛出异常时返回 None
+        """
+        if not self.breaker.allow():
+            return None
+        try:
+            with stage('mermaid_render'):
+                results = self.renderer.render_batch(codes, self.config, fmt=self.format)
         except Exception as e:
             if self.debug:
-                print(f"Mermaid转换异常: {str(e)}")
+                print(f"渲染Mermaid图表异常: {str(e)}")
+            self.breaker.record_failure()
             return None
-            
-        finally:
-            # 确保在所有情况下都清理临时文件和目录
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    for file_name in os.listdir(temp_dir):
-                        file_path = os.path.join(temp_dir, file_name)
-                        if os.path.exists(file_path):
-                            if self.debug:
-                                print(f"删除临时文件: {file_path}")
-                            os.unlink(file_path)
-                    os.rmdir(temp_dir)
-                    if self.debug:
-                        print(f"删除临时目录: {temp_dir}")
-                except Exception as e:
-                    if self.debug:
-                        print(f"清理临时文件时出错: {str(e)}")
\ No newline at end of file
+        self.breaker.record_success()
+        return results
+
+    def _render(self, code: str) -> Optional[CachedImage]:
+        """同步获取图表图片，依次使用预先得到的结果、缓存、失败缓存和单独渲染
+
+        Args:
+            code: mermaid代码
+
+        Returns:
+            CachedImage: 渲染结果，渲染失败时返回 None
+        """
+        image = self._prepared.get(code)
+        if image is not None:
+            return image
+
+        key = self._key(code)
+        cached = self.cache.get(key)
+        if cached is not None:
+            if self.debug:
+                print(f"使用缓存的Mermaid图表: {key}")
+            return cached
+
+        if key in self.failures or key in self.unavailable:
+            return None
+
+        results = self._call_renderer([code])
+        data = results[0] if results is not None else None
+        if data is None:
+            if results is not None:
+                self.failures.add(key)
+            return None
+        image = self._prepared[code] = self.cache.put(key, data)
+        return image
+
+    def _key(self, code: str) -> str:
+        return diagram_key(code, self.config, self.renderer.version, self.format)
+
+
+def _remove_paragraph(paragraph) -> None:
+    element = paragraph._p
+    element.getparent().remove(element)
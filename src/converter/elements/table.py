@@ -287,6 +287,13 @@ class TableConverter(ElementConverter):
                                                     run.italic = self.current_style['italic']
                                                 if 'strike' in self.current_style:
                                                     run.font.strike = self.current_style['strike']
+                                            elif child.type == 'math_inline':
+                                                # 行内公式
+                                                math_converter = self.base_converter.converters.get('math')
+                                                if math_converter:
+                                                    math_converter.convert_in_paragraph(p, child, self.current_style)
+                                                else:
+                                                    p.add_run(f"{child.markup}{child.content}{child.markup}")
                                             elif child.type == 'strong_open':
                                                 # 开始加粗
                                                 self.current_style = {'bold': True}
@@ -64,6 +64,11 @@ class TextConverter(ElementConverter):
             if debug:
                 print("未找到图片转换器")
         
+        # 检查是否有公式转换器
+        math_converter = None
+        if self.base_converter and 'math' in self.base_converter.converters:
+            math_converter = self.base_converter.converters.get('math')
+        
         # 处理段落内的文本和样式
         current_text = ""
         current_style = {"bold": False, "italic": False, "strike": False}
@@ -305,6 +310,19 @@ class TextConverter(ElementConverter):
                         print(f"处理段落内图片")
                     image_converter.convert_in_paragraph(paragraph, child, current_style.copy())
                 
+                i += 1
+            elif child.type == 'math_inline':
+                # 处理公式前的文本
+                if current_text:
+                    self._add_text_with_style(paragraph, current_text, current_style)
+                    current_text = ""
+                
+                # 处理行内公式
+                if math_converter:
+                    math_converter.convert_in_paragraph(paragraph, child, current_style.copy())
+                else:
+                    current_text += f"{child.markup}{child.content}{child.markup}"
+                
                 i += 1
             elif child.type == 'strong_open':
                 if current_text:
@@ -0,0 +1,12 @@
+"""
+数学公式：Markdown 解析插件和 LaTeX 到 Office Math（OMML）的转换
+"""
+from .omml import LatexError, latex_to_omml, translation_cache_info
+from .plugin import math_plugin
+
+__all__ = [
+    'LatexError',
+    'latex_to_omml',
+    'translation_cache_info',
+    'math_plugin'
+]
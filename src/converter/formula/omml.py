@@ -0,0 +1,605 @@
+"""
+LaTeX 到 Office Math（OMML）的转换
+
+不依赖外部进程和栅格化：直接解析 LaTeX 数学公式的常用子集（分数、根式、上下标、
+求和与积分、函数、定界符、矩阵和多行对齐等），生成 Word 原生的 ``m:oMath`` 元素。
+转换结果按公式源码缓存，文档中重复出现的公式只转换一次，每次使用时复制缓存的
+元素即可。
+"""
+import copy
+import functools
+from typing import Dict, List, Optional, Tuple
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
+
+
+class LatexError(ValueError):
+    """公式无法解析"""
+    pass
+
+
+# 希腊字母和常用符号
+SYMBOLS: Dict[str, str] = {
+    'alpha': 'α', 'beta': 'β', 'gamma': 'γ', 'delta': 'δ', 'epsilon': 'ϵ',
+    'varepsilon': 'ε', 'zeta': 'ζ', 'eta': 'η', 'theta': 'θ', 'vartheta': 'ϑ',
+    'iota': 'ι', 'kappa': 'κ', 'lambda': 'λ', 'mu': 'μ', 'nu': 'ν', 'xi': 'ξ',
+    'omicron': 'ο', 'pi': 'π', 'varpi': 'ϖ', 'rho': 'ρ', 'varrho': 'ϱ',
+    'sigma': 'σ', 'varsigma': 'ς', 'tau': 'τ', 'upsilon': 'υ', 'phi': 'ϕ',
+    'varphi': 'φ', 'chi': 'χ', 'psi': 'ψ', 'omega': 'ω',
+    'Gamma': 'Γ', 'Delta': 'Δ', 'Theta': 'Θ', 'Lambda': 'Λ', 'Xi': 'Ξ',
+    'Pi': 'Π', 'Sigma': 'Σ', 'Upsilon': 'Υ', 'Phi': 'Φ', 'Psi': 'Ψ', 'Omega': 'Ω',
+    'times': '×', 'cdot': '⋅', 'pm': '±', 'mp': '∓', 'div': '÷', 'ast': '∗',
+    'star': '⋆', 'circ': '∘', 'bullet': '∙', 'oplus': '⊕', 'otimes': '⊗',
+    'le': '≤', 'leq': '≤', 'ge': '≥', 'geq': '≥', 'ne': '≠', 'neq': '≠',
+    'approx': '≈', 'equiv': '≡', 'sim': '∼', 'simeq': '≃', 'cong': '≅',
+    'propto': '∝', 'll': '≪', 'gg': '≫', 'in': '∈', 'notin': '∉', 'ni': '∋',
+    'subset': '⊂', 'subseteq': '⊆', 'supset': '⊃', 'supseteq': '⊇',
+    'cup': '∪', 'cap': '∩', 'setminus': '∖', 'emptyset': '∅', 'varnothing': '∅',
+    'infty': '∞', 'partial': '∂', 'nabla': '∇', 'forall': '∀', 'exists': '∃',
+    'neg': '¬', 'lnot': '¬', 'land': '∧', 'wedge': '∧', 'lor': '∨', 'vee': '∨',
+    'to': '→', 'rightarrow': '→', 'leftarrow': '←', 'gets': '←',
+    'leftrightarrow': '↔', 'Rightarrow': '⇒', 'Leftarrow': '⇐',
+    'Leftrightarrow': '⇔', 'implies': '⇒', 'iff': '⇔', 'mapsto': '↦',
+    'uparrow': '↑', 'downarrow': '↓',
+    'ldots': '…', 'dots': '…', 'cdots': '⋯', 'vdots': '⋮', 'ddots': '⋱',
+    'prime': '′', 'angle': '∠', 'perp': '⊥', 'parallel': '∥', 'mid': '∣',
+    'hbar': 'ℏ', 'ell': 'ℓ', 'Re': 'ℜ', 'Im': 'ℑ', 'aleph': 'ℵ', 'degree': '°',
+    'langle': '⟨', 'rangle': '⟩', 'lfloor': '⌊', 'rfloor': '⌋',
+    'lceil': '⌈', 'rceil': '⌉', 'vert': '|', 'lvert': '|', 'rvert': '|',
+    'Vert': '‖', 'lVert': '‖', 'rVert': '‖', 'colon': ':',
+    '{': '{', '}': '}', '|': '‖', '%': '%', '$': '$', '#': '#', '&': '&', '_': '_',
+}
+
+# 空白
+SPACES: Dict[str, str] = {
+    ',': ' ', ':': ' ', '>': ' ', ';': ' ', ' ': ' ',
+    'quad': ' ', 'qquad': '  ', '!': '',
+}
+
+# 键盘字符对应的数学符号
+OPERATORS: Dict[str, str] = {'-': '−', '*': '∗'}
+
+# 大型运算符：(字符, 上下限位置)
+NARY: Dict[str, Tuple[str, str]] = {
+    'sum': ('∑', 'undOvr'), 'prod': ('∏', 'undOvr'), 'coprod': ('∐', 'undOvr'),
+    'bigcup': ('⋃', 'undOvr'), 'bigcap': ('⋂', 'undOvr'),
+    'bigoplus': ('⨁', 'undOvr'), 'bigotimes': ('⨂', 'undOvr'),
+    'int': ('∫', 'subSup'), 'iint': ('∬', 'subSup'), 'iiint': ('∭', 'subSup'),
+    'oint': ('∮', 'subSup'),
+}
+
+# 以正体显示的函数名
+FUNCTIONS = {
+    'sin', 'cos', 'tan', 'cot', 'sec', 'csc', 'arcsin', 'arccos', 'arctan',
+    'sinh', 'cosh', 'tanh', 'coth', 'log', 'ln', 'lg', 'exp', 'det', 'dim',
+    'ker', 'deg', 'gcd', 'arg', 'hom', 'Pr',
+}
+
+# 上下限写在下方的函数
+LIMIT_FUNCTIONS = {'lim', 'max', 'min', 'sup', 'inf', 'limsup', 'liminf'}
+
+# 重音：字符
+ACCENTS: Dict[str, str] = {
+    'hat': '̂', 'widehat': '̂', 'tilde': '̃', 'widetilde': '̃',
+    'vec': '⃗', 'dot': '̇', 'ddot': '̈', 'check': '̌',
+    'acute': '́', 'grave': '̀', 'breve': '̆',
+}
+
+# 字体命令：(m:sty, m:scr)
+FONTS: Dict[str, Tuple[Optional[str], Optional[str]]] = {
+    'mathrm': ('p', None), 'mathbf': ('b', None), 'boldsymbol': ('bi', None),
+    'mathit': ('i', None), 'mathbb': ('p', 'double-struck'),
+    'mathcal': ('p', 'script'), 'mathscr': ('p', 'script'),
+    'mathfrak': ('p', 'fraktur'), 'mathsf': ('p', 'sans-serif'),
+    'mathtt': ('p', 'monospace'), 'operatorname': ('p', None),
+}
+
+TEXT_COMMANDS = {'text', 'textrm', 'textit', 'textbf', 'mbox'}
+
+# 矩阵环境：(左定界符, 右定界符)
+MATRICES: Dict[str, Tuple[str, str]] = {
+    'matrix': ('', ''), 'smallmatrix': ('', ''), 'array': ('', ''),
+    'pmatrix': ('(', ')'), 'bmatrix': ('[', ']'), 'Bmatrix': ('{', '}'),
+    'vmatrix': ('|', '|'), 'Vmatrix': ('‖', '‖'),
+}
+
+# 多行对齐环境
+ALIGNED = {
+    'align', 'align*', 'aligned', 'alignat', 'alignat*', 'gather', 'gather*',
+    'gathered', 'split', 'eqnarray', 'eqnarray*', 'multline', 'multline*',
+    'equation', 'equation*', 'cases',
+}
+
+# 大型运算符的作用范围到关系符为止
+RELATIONS = {'=', '<', '>'} | {'\\' + name for name in (
+    'le', 'leq', 'ge', 'geq', 'ne', 'neq', 'approx', 'equiv', 'sim', 'simeq',
+    'cong', 'propto', 'll', 'gg',
+)}
+
+# 定界符命令
+DELIMITERS: Dict[str, str] = {
+    '{': '{', '}': '}', '|': '‖', 'langle': '⟨', 'rangle': '⟩', 'lfloor': '⌊',
+    'rfloor': '⌋', 'lceil': '⌈', 'rceil': '⌉', 'vert': '|', 'lvert': '|',
+    'rvert': '|', 'Vert': '‖', 'lVert': '‖', 'rVert': '‖',
+}
+
+
+def _el(tag: str, **attrs) -> etree._Element:
+    element = OxmlElement(tag)
+    for name, value in attrs.items():
+        element.set(qn(f'm:{name}'), value)
+    return element
+
+
+def _wrap(tag: str, children: List[etree._Element]) -> etree._Element:
+    element = _el(tag)
+    element.extend(children)
+    return element
+
+
+def _prop(parent_tag: str, **values: Optional[str]) -> etree._Element:
+    """构造属性元素，如 ``m:fPr/m:type@val``"""
+    pr = _el(parent_tag)
+    for name, value in values.items():
+        if value is not None:
+            pr.append(_el(f'm:{name}', val=value))
+    return pr
+
+
+class _Parser:
+    """递归下降解析 LaTeX，边解析边生成 OMML 元素"""
+
+    def __init__(self, source: str):
+        self.src = source
+        self.pos = 0
+        # 当前字体：(m:sty, m:scr)
+        self.font: Tuple[Optional[str], Optional[str]] = (None, None)
+
+    # ---- 词法 ----
+
+    def _skip_space(self) -> None:
+        while self.pos < len(self.src) and self.src[self.pos].isspace():
+            self.pos += 1
+
+    def _peek(self) -> Optional[str]:
+        """返回下一个记号（不移动位置）：命令为 ``\\name``，其余为单个字符"""
+        saved = self.pos
+        token = self._next()
+        self.pos = saved
+        return token
+
+    def _next(self) -> Optional[str]:
+        self._skip_space()
+        if self.pos >= len(self.src):
+            return None
+        char = self.src[self.pos]
+        if char != '\\':
+            self.pos += 1
+            return char
+        start = self.pos
+        self.pos += 1
+        if self.pos >= len(self.src):
+            raise LatexError("公式以反斜杠结尾")
+        if self.src[self.pos].isalpha():
+            while self.pos < len(self.src) and self.src[self.pos].isalpha():
+                self.pos += 1
+        else:
+            self.pos += 1
+        return self.src[start:self.pos]
+
+    def _expect(self, token: str) -> None:
+        actual = self._next()
+        if actual != token:
+            raise LatexError(f"应为 {token!r}，实际为 {actual!r}")
+
+    def _read_raw_group(self) -> str:
+        """读取花括号中的原始文本（保留空白）"""
+        self._expect('{')
+        depth, start = 1, self.pos
+        while self.pos < len(self.src):
+            char = self.src[self.pos]
+            if char == '\\':
+                self.pos += 2
+                continue
+            if char == '{':
+                depth += 1
+            elif char == '}':
+                depth -= 1
+                if depth == 0:
+                    self.pos += 1
+                    return self.src[start:self.pos - 1]
+            self.pos += 1
+        raise LatexError("花括号不匹配")
+
+    # ---- 语法 ----
+
+    def parse(self) -> List[etree._Element]:
+        rows = self._parse_rows(stop=None)
+        if len(rows) == 1:
+            return self._join_cells(rows[0])
+        return [self._eq_array(rows)]
+
+    def _parse_sequence(self, stop: Tuple[Optional[str], ...],
+                        until_relation: bool = False) -> List[etree._Element]:
+        """解析到 stop 中的记号（不消耗该记号）为止"""
+        items: List[etree._Element] = []
+        while True:
+            token = self._peek()
+            if token in stop:
+                return items
+            if token is None:
+                raise LatexError("公式意外结束")
+            if until_relation and token in RELATIONS:
+                return items
+            items.extend(self._parse_scripted())
+
+    def _parse_rows(self, stop: Optional[str]) -> List[List[List[etree._Element]]]:
+        """解析按 ``&`` 和 ``\\\\`` 分隔的行和单元格，直到 stop"""
+        rows: List[List[List[etree._Element]]] = []
+        cells: List[List[etree._Element]] = []
+        while True:
+            cells.append(self._parse_sequence((stop, '&', '\\\\')))
+            token = self._next()
+            if token == '&':
+                continue
+            rows.append(cells)
+            cells = []
+            if token == stop:
+                break
+            # 换行后可以跟可选的间距参数，如 \\[2pt]
+            if self._peek() == '[':
+                while self._next() not in (']', None):
+                    pass
+        # 末尾的空行（如最后一行后的 \\）不输出
+        if len(rows) > 1 and rows[-1] == [[]]:
+            rows.pop()
+        return rows
+
+    def _parse_argument(self) -> List[etree._Element]:
+        """解析命令的一个参数：花括号分组或单个记号"""
+        if self._peek() == '{':
+            self._next()
+            items = self._parse_sequence(('}',))
+            self._next()
+            return items
+        return self._parse_atom()
+
+    def _parse_scripted(self) -> List[etree._Element]:
+        """解析一个原子及其上下标"""
+        token = self._peek()
+        if token in ('^', '_'):
+            # 没有底数的上下标（如 {}^2）
+            base: List[etree._Element] = []
+        else:
+            if token[1:] in NARY and token.startswith('\\'):
+                self._next()
+                return [self._nary(*NARY[token[1:]])]
+            if token[1:] in LIMIT_FUNCTIONS and token.startswith('\\'):
+                self._next()
+                return [self._limit_function(token[1:])]
+            base = self._parse_atom()
+
+        sub = sup = None
+        while self._peek() in ('^', '_', "'"):
+            token = self._next()
+            if token == "'":
+                sup = (sup or []) + [self._run('′')]
+            elif token == '^':
+                sup = (sup or []) + self._parse_argument()
+            else:
+                sub = (sub or []) + self._parse_argument()
+        if sub is None and sup is None:
+            return base
+        return self._attach_scripts(base, sub, sup)
+
+    def _parse_limits(self) -> Tuple[Optional[List[etree._Element]], Optional[List[etree._Element]]]:
+        sub = sup = None
+        while True:
+            token = self._peek()
+            if token == '_':
+                self._next()
+                sub = self._parse_argument()
+            elif token == '^':
+                self._next()
+                sup = self._parse_argument()
+            elif token in ('\\limits', '\\nolimits'):
+                self._next()
+            else:
+                return sub, sup
+
+    def _operand(self) -> List[etree._Element]:
+        """大型运算符和 lim 等作用的表达式：到下一个关系符或分组结束为止"""
+        return self._parse_sequence((None, '}', '&', '\\\\', '\\right', '\\end'), until_relation=True)
+
+    def _nary(self, char: str, location: str) -> etree._Element:
+        sub, sup = self._parse_limits()
+        pr = _prop('m:naryPr', chr=char, limLoc=location,
+                   subHide='1' if sub is None else None,
+                   supHide='1' if sup is None else None)
+        return _wrap('m:nary', [pr, _wrap('m:sub', sub or []), _wrap('m:sup', sup or []),
+                                _wrap('m:e', self._operand())])
+
+    def _limit_function(self, name: str) -> etree._Element:
+        sub, sup = self._parse_limits()
+        fname = [self._run(name, font=('p', None))]
+        if sub is not None:
+            fname = [_wrap('m:limLow', [_wrap('m:e', fname), _wrap('m:lim', sub)])]
+        return _wrap('m:func', [_wrap('m:fName', fname), _wrap('m:e', self._operand())])
+
+    def _function(self, name: str) -> etree._Element:
+        fname = [self._run(name, font=('p', None))]
+        sub, sup = self._parse_limits()
+        if sub is not None or sup is not None:
+            fname = self._attach_scripts(fname, sub, sup)
+        if self._peek() in ('(', '['):
+            # 函数参数带括号时整体作为参数
+            open_char = self._next()
+            close_char = ')' if open_char == '(' else ']'
+            inner = self._parse_sequence((close_char,))
+            self._next()
+            argument = [self._delimited(open_char, close_char, inner)]
+        elif self._peek() in (None, '}', '&', '\\\\', '\\right', '\\end'):
+            argument = []
+        else:
+            argument = self._parse_scripted()
+        return _wrap('m:func', [_wrap('m:fName', fname), _wrap('m:e', argument)])
+
+    def _attach_scripts(self, base, sub, sup) -> List[etree._Element]:
+        base_el = _wrap('m:e', base)
+        if sub is not None and sup is not None:
+            return [_wrap('m:sSubSup', [base_el, _wrap('m:sub', sub), _wrap('m:sup', sup)])]
+        if sup is not None:
+            return [_wrap('m:sSup', [base_el, _wrap('m:sup', sup)])]
+        return [_wrap('m:sSub', [base_el, _wrap('m:sub', sub)])]
+
+    def _parse_atom(self) -> List[etree._Element]:
+        token = self._next()
+        if token is None:
+            raise LatexError("公式意外结束")
+        if token == '{':
+            items = self._parse_sequence(('}',))
+            self._next()
+            return items
+        if token == '}':
+            raise LatexError("花括号不匹配")
+        if not token.startswith('\\'):
+            if token.isdigit():
+                # 连续的数字作为一个整体
+                while self.pos < len(self.src) and (self.src[self.pos].isdigit() or (
+                        self.src[self.pos] == '.' and self.pos + 1 < len(self.src)
+                        and self.src[self.pos + 1].isdigit())):
+                    token += self.src[self.pos]
+                    self.pos += 1
+            elif token == '~':
+                token = ' '
+            elif token in OPERATORS:
+                token = OPERATORS[token]
+            return [self._run(token)]
+        return self._command(token[1:])
+
+    def _command(self, name: str) -> List[etree._Element]:
+        if name in SPACES:
+            return [self._run(SPACES[name])] if SPACES[name] else []
+        if name in SYMBOLS:
+            return [self._run(SYMBOLS[name])]
+        if name in ('frac', 'dfrac', 'tfrac', 'cfrac'):
+            num = self._parse_argument()
+            den = self._parse_argument()
+            return [_wrap('m:f', [_wrap('m:num', num), _wrap('m:den', den)])]
+        if name in ('binom', 'dbinom', 'tbinom'):
+            top = self._parse_argument()
+            bottom = self._parse_argument()
+            fraction = _wrap('m:f', [_prop('m:fPr', type='noBar'),
+                                     _wrap('m:num', top), _wrap('m:den', bottom)])
+            return [self._delimited('(', ')', [fraction])]
+        if name == 'sqrt':
+            degree = None
+            if self._peek() == '[':
+                self._next()
+                degree = self._parse_sequence((']',))
+                self._next()
+            body = self._parse_argument()
+            if degree is None:
+                return [_wrap('m:rad', [_prop('m:radPr', degHide='1'), _el('m:deg'),
+                                        _wrap('m:e', body)])]
+            return [_wrap('m:rad', [_wrap('m:deg', degree), _wrap('m:e', body)])]
+        if name in ACCENTS:
+            body = self._parse_argument()
+            return [_wrap('m:acc', [_prop('m:accPr', chr=ACCENTS[name]), _wrap('m:e', body)])]
+        if name in ('bar', 'overline', 'underline'):
+            body = self._parse_argument()
+            position = 'bot' if name == 'underline' else 'top'
+            return [_wrap('m:bar', [_prop('m:barPr', pos=position), _wrap('m:e', body)])]
+        if name in ('overbrace', 'underbrace'):
+            body = self._parse_argument()
+            char, position = ('⏞', 'top') if name == 'overbrace' else ('⏟', 'bot')
+            return [_wrap('m:groupChr', [_prop('m:groupChrPr', chr=char, pos=position),
+                                         _wrap('m:e', body)])]
+        if name in FUNCTIONS:
+            return [self._function(name)]
+        if name in TEXT_COMMANDS:
+            return [self._run(self._read_raw_group(), plain=True)]
+        if name in FONTS:
+            saved = self.font
+            self.font = FONTS[name]
+            try:
+                return self._parse_argument()
+            finally:
+                self.font = saved
+        if name == 'left':
+            open_char = self._delimiter()
+            inner = self._parse_sequence(('\\right',))
+            self._next()
+            close_char = self._delimiter()
+            return [self._delimited(open_char, close_char, inner)]
+        if name in ('big', 'Big', 'bigg', 'Bigg', 'bigl', 'bigr', 'Bigl', 'Bigr',
+                    'biggl', 'biggr', 'Biggl', 'Biggr'):
+            char = self._delimiter()
+            return [self._run(char)] if char else []
+        if name == 'begin':
+            return self._environment(self._read_raw_group().strip())
+        if name in ('displaystyle', 'textstyle', 'scriptstyle', 'limits', 'nolimits',
+                    'nonumber', 'notag'):
+            return []
+        if name in ('right', 'end'):
+            raise LatexError(f"多余的 \\{name}")
+        # 未知命令按名称原样显示
+        return [self._run(name, font=('p', None))]
+
+    def _delimiter(self) -> str:
+        token = self._next()
+        if token is None:
+            raise LatexError("缺少定界符")
+        if token == '.':
+            return ''
+        if token.startswith('\\'):
+            char = DELIMITERS.get(token[1:])
+            if char is None:
+                raise LatexError(f"不支持的定界符: {token}")
+            return char
+        return token
+
+    def _delimited(self, open_char: str, close_char: str,
+                   inner: List[etree._Element]) -> etree._Element:
+        pr = _prop('m:dPr', begChr=open_char, endChr=close_char)
+        return _wrap('m:d', [pr, _wrap('m:e', inner)])
+
+    def _environment(self, name: str) -> List[etree._Element]:
+        if name == 'array' and self._peek() == '{':
+            self._read_raw_group()  # 列格式
+        if name not in MATRICES and name not in ALIGNED:
+            raise LatexError(f"不支持的环境: {name}")
+        rows = self._parse_rows(stop='\\end')
+        end_name = self._read_raw_group().strip()
+        if end_name != name:
+            raise LatexError(f"环境不匹配: {name} / {end_name}")
+
+        if name in MATRICES:
+            open_char, close_char = MATRICES[name]
+            width = max(len(cells) for cells in rows)
+            matrix = _el('m:m')
+            for cells in rows:
+                row = _el('m:mr')
+                for i in range(width):
+                    row.append(_wrap('m:e', cells[i] if i < len(cells) else []))
+                matrix.append(row)
+            if not open_char and not close_char:
+                return [matrix]
+            return [self._delimited(open_char, close_char, [matrix])]
+
+        array = self._eq_array(rows)
+        if name == 'cases':
+            return [self._delimited('{', '', [array])]
+        if len(rows) == 1:
+            return self._join_cells(rows[0])
+        return [array]
+
+    def _eq_array(self, rows: List[List[List[etree._Element]]]) -> etree._Element:
+        array = _el('m:eqArr')
+        for cells in rows:
+            array.append(_wrap('m:e', self._join_cells(cells)))
+        return array
+
+    def _join_cells(self, cells: List[List[etree._Element]]) -> List[etree._Element]:
+        """把对齐单元格连接为一行，第二个及之后的单元格开头标记对齐点"""
+        items: List[etree._Element] = list(cells[0])
+        for cell in cells[1:]:
+            if not cell or cell[0].tag != qn('m:r'):
+                cell = [self._run('')] + list(cell)
+            _mark_alignment(cell[0])
+            items.extend(cell)
+        return items
+
+    def _run(self, text: str, font: Optional[Tuple[Optional[str], Optional[str]]] = None,
+             plain: bool = False) -> etree._Element:
+        """构造 ``m:r``；plain 为 True 时按普通文本显示（\\text）"""
+        run = _el('m:r')
+        style, script = font or self.font
+        if plain or style or script:
+            rpr = _el('m:rPr')
+            if plain:
+                rpr.append(_el('m:nor'))
+            else:
+                if script:
+                    rpr.append(_el('m:scr', val=script))
+                if style:
+                    rpr.append(_el('m:sty', val=style))
+            run.append(rpr)
+        t = _el('m:t')
+        t.text = text
+        if text != text.strip():
+            t.set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
+        run.append(t)
+        return run
+
+
+def _mark_alignment(run: etree._Element) -> None:
+    rpr = run.find(qn('m:rPr'))
+    if rpr is None:
+        rpr = _el('m:rPr')
+        run.insert(0, rpr)
+    rpr.append(_el('m:aln'))
+
+
+def _merge_runs(parent: etree._Element) -> None:
+    """合并格式相同的相邻 run，减小文档体积"""
+    previous = None
+    for child in list(parent):
+        if child.tag != qn('m:r'):
+            _merge_runs(child)
+            previous = None
+            continue
+        rpr = child.find(qn('m:rPr'))
+        if (previous is not None and (rpr is None or rpr.find(qn('m:aln')) is None)
+                and _rpr_key(rpr) == _rpr_key(previous.find(qn('m:rPr')))):
+            target = previous.find(qn('m:t'))
+            target.text = (target.text or '') + (child.find(qn('m:t')).text or '')
+            if target.text != target.text.strip():
+                target.set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
+            parent.remove(child)
+        else:
+            previous = child
+
+
+def _rpr_key(rpr: Optional[etree._Element]) -> bytes:
+    return b'' if rpr is None else etree.tostring(rpr)
+
+
+@functools.lru_cache(maxsize=4096)
+def _translate(latex: str):
+    try:
+        items = _Parser(latex).parse()
+    except LatexError as e:
+        return e
+    except RecursionError:
+        return LatexError("公式嵌套过深")
+    math = _wrap('m:oMath', items)
+    _merge_runs(math)
+    return math
+
+
+def latex_to_omml(latex: str) -> etree._Element:
+    """把 LaTeX 公式转换为 ``m:oMath`` 元素
+
+    转换结果按源码缓存（包括转换失败），返回的是缓存元素的副本，可以直接插入文档。
+
+    Args:
+        latex: 公式源码（不含 $ 定界符）
+
+    Returns:
+        etree._Element: ``m:oMath`` 元素
+
+    Raises:
+        LatexError: 公式无法解析
+    """
+    result = _translate(latex.strip())
+    if isinstance(result, LatexError):
+        raise LatexError(str(result))
+    return copy.deepcopy(result)
+
+
+def translation_cache_info():
+    """公式转换缓存的命中统计"""
+    return _translate.cache_info()
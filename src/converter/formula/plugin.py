@@ -0,0 +1,106 @@
+"""
+markdown-it 数学公式插件
+
+识别 ``$...$`` 行内公式和 ``$$...$$`` 块级公式，分别生成 ``math_inline`` 和
+``math_block`` 标记，公式源码（不含定界符）保存在标记的 content 中。
+
+规则与常见的 Markdown 数学扩展一致：行内公式的 ``$`` 之后和结束的 ``$`` 之前
+不能是空白，结束的 ``$`` 之后不能紧跟数字（避免把 ``$5 和 $10`` 识别为公式）；
+``\\$`` 表示普通的美元符号。
+"""
+from markdown_it import MarkdownIt
+from markdown_it.rules_block import StateBlock
+from markdown_it.rules_inline import StateInline
+
+
+def _math_inline(state: StateInline, silent: bool) -> bool:
+    src, start = state.src, state.pos
+    if src[start] != '$':
+        return False
+
+    if src.startswith('$$', start):
+        # 行内的 $$...$$
+        end = src.find('$$', start + 2)
+        if end == -1:
+            return False
+        if not silent:
+            token = state.push('math_inline', 'math', 0)
+            token.content = src[start + 2:end]
+            token.markup = '$$'
+        state.pos = end + 2
+        return True
+
+    if start + 1 >= state.posMax or src[start + 1].isspace():
+        return False
+    end = start + 1
+    while True:
+        end = src.find('$', end)
+        if end == -1 or end >= state.posMax:
+            return False
+        if src[end - 1] == '\\':
+            end += 1
+            continue
+        break
+    if src[end - 1].isspace() or (end + 1 < state.posMax and src[end + 1].isdigit()):
+        return False
+
+    if not silent:
+        token = state.push('math_inline', 'math', 0)
+        token.content = src[start + 1:end]
+        token.markup = '$'
+    state.pos = end + 1
+    return True
+
+
+def _math_block(state: StateBlock, start_line: int, end_line: int, silent: bool) -> bool:
+    # 缩进 4 个空格以上是代码块
+    if state.sCount[start_line] - state.blkIndent >= 4:
+        return False
+    pos = state.bMarks[start_line] + state.tShift[start_line]
+    maximum = state.eMarks[start_line]
+    if not state.src.startswith('$$', pos):
+        return False
+
+    first = state.src[pos + 2:maximum].rstrip()
+    if first.endswith('$$'):
+        # 单行的 $$...$$
+        content = first[:-2]
+        next_line = start_line
+    else:
+        lines = [first]
+        next_line = start_line
+        while True:
+            next_line += 1
+            if next_line >= end_line:
+                return False
+            line_start = state.bMarks[next_line] + state.tShift[next_line]
+            line = state.src[line_start:state.eMarks[next_line]].rstrip()
+            if state.sCount[next_line] < state.blkIndent and line:
+                return False
+            if line.endswith('$$'):
+                lines.append(line[:-2])
+                break
+            lines.append(line)
+        content = '\n'.join(lines)
+
+    if silent:
+        return True
+    state.line = next_line + 1
+    token = state.push('math_block', 'math', 0)
+    token.block = True
+    token.content = content.strip()
+    token.markup = '$$'
+    token.map = [start_line, state.line]
+    return True
+
+
+def math_plugin(md: MarkdownIt) -> None:
+    """为 MarkdownIt 实例启用数学公式语法
+
+    用法::
+
+        md = MarkdownIt('commonmark').use(math_plugin)
+    """
+    md.inline.ruler.before('escape', 'math_inline', _math_inline)
+    md.block.ruler.before('fence', 'math_block', _math_block,
+                          {'alt': ['paragraph', 'reference', 'blockquote', 'list']})
@@ -0,0 +1,225 @@
+"""
+转换指标
+
+记录转换各阶段的耗时（上传解码、Markdown 解析、构建文档、下载图片、渲染 Mermaid
+图表、序列化 docx）、输入输出大小、各类元素的数量以及 HTTP 请求统计，以 Prometheus
+文本格式输出。
+
+指标保存在进程内。转换在工作进程中执行时，工作进程在每次转换后取出（drain）本进程
+记录的增量，随结果返回给服务进程合并（merge），服务进程的 /metrics 接口包含全部
+进程的数据。
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+GAUGE = 'gauge'
+
+# 耗时（秒）和大小（字节）的分桶上界
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1KB ~ 1GB
+
+# (名称, 类型, 说明, 标签, 分桶)
+DEFINITIONS = (
+    ('md2docx_http_requests_total', COUNTER, '按路由和状态码统计的请求数',
+     ('route', 'method', 'status'), None),
+    ('md2docx_http_request_duration_seconds', HISTOGRAM, '按路由统计的请求耗时',
+     ('route',), SECONDS_BUCKETS),
+    ('md2docx_stage_duration_seconds', HISTOGRAM, '转换各阶段的耗时',
+     ('stage',), SECONDS_BUCKETS),
+    ('md2docx_input_bytes', HISTOGRAM, '转换输入（Markdown 或压缩包）的大小',
+     (), BYTES_BUCKETS),
+    ('md2docx_output_bytes', HISTOGRAM, '生成的 docx 的大小',
+     (), BYTES_BUCKETS),
+    ('md2docx_elements_total', COUNTER, '转换的文档中各类元素的数量',
+     ('type',), None),
+)
+
+# 标记类型 -> 元素类型
+_ELEMENT_TYPES = {
+    'heading_open': 'heading',
+    'paragraph_open': 'paragraph',
+    'list_item_open': 'list_item',
+    'blockquote_open': 'blockquote',
+    'table_open': 'table',
+    'fence': 'code',
+    'code_block': 'code',
+    'math_block': 'math',
+    'math_inline': 'math',
+    'hr': 'hr',
+    'html_block': 'html',
+    'html_inline': 'html',
+    'image': 'image',
+    'link_open': 'link',
+}
+
+
+class MetricsRegistry:
+    """进程内的计数器和直方图"""
+
+    def __init__(self, definitions: Iterable[Tuple] = DEFINITIONS):
+        self._lock = threading.Lock()
+        self._definitions: Dict[str, Tuple] = {}
+        # 名称 -> 标签值 -> 计数（计数器）或 [各分桶计数..., 总和, 次数]（直方图）
+        self._values: Dict[str, Dict[Tuple[str, ...], Any]] = {}
+        for name, kind, help_text, labels, buckets in definitions:
+            self._definitions[name] = (kind, help_text, labels, buckets)
+            self._values[name] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """计数器加上 value"""
+        key = self._label_values(name, labels)
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """直方图记录一次观测值"""
+        key = self._label_values(name, labels)
+        buckets = self._definitions[name][3]
+        with self._lock:
+            state = self._values[name].get(key)
+            if state is None:
+                state = self._values[name][key] = [0] * len(buckets) + [0.0, 0]
+            index = bisect.bisect_left(buckets, value)
+            if index < len(buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _label_values(self, name: str, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, '')) for label in self._definitions[name][2])
+
+    def drain(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """取出并清空已记录的数据（工作进程把增量交给服务进程时使用）"""
+        with self._lock:
+            snapshot = {name: values for name, values in self._values.items() if values}
+            self._values = {name: {} for name in self._definitions}
+        return snapshot
+
+    def merge(self, snapshot: Dict[str, Dict[Tuple[str, ...], Any]]) -> None:
+        """合并其他进程取出的数据"""
+        with self._lock:
+            for name, values in snapshot.items():
+                if name not in self._values:
+                    continue
+                target = self._values[name]
+                for key, value in values.items():
+                    if isinstance(value, list):
+                        state = target.setdefault(key, [0] * (len(value) - 2) + [0.0, 0])
+                        for i, count in enumerate(value):
+                            state[i] += count
+                    else:
+                        target[key] = target.get(key, 0) + value
+
+    def value(self, name: str, **labels) -> Any:
+        """计数器的当前值，或直方图的 (总和, 次数)"""
+        key = self._label_values(name, labels)
+        with self._lock:
+            value = self._values[name].get(key)
+        if isinstance(value, list):
+            return value[-2], value[-1]
+        return value or 0
+
+    def render(self, collected: Sequence[Tuple[str, str, str, Dict[str, Any], float]] = ()) -> str:
+        """输出 Prometheus 文本格式
+
+        Args:
+            collected: 采集时计算的 (名称, 类型, 说明, 标签, 值) 列表
+
+        Returns:
+            str: 指标文本
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help_text, labels, buckets) in self._definitions.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(self._values[name].items()):
+                    pairs = list(zip(labels, key))
+                    if kind == COUNTER:
+                        lines.append(f"{name}{_format_labels(pairs)} {_format_value(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets, value):
+                        cumulative += count
+                        le = _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels(pairs + [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(pairs + [('le', '+Inf')])} {value[-1]}")
+                    lines.append(f"{name}_sum{_format_labels(pairs)} {_format_value(value[-2])}")
+                    lines.append(f"{name}_count{_format_labels(pairs)} {value[-1]}")
+
+        described = set()
+        for name, kind, help_text, labels, value in collected:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_format_labels(list(labels.items()))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(pairs: List[Tuple[str, str]]) -> str:
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def count_elements(tokens) -> Dict[str, int]:
+    """统计解析结果中各类元素的数量（Mermaid 代码块单独计数）"""
+    counts: Dict[str, int] = {}
+
+    def add(token):
+        element = _ELEMENT_TYPES.get(token.type)
+        if element == 'code' and token.info.strip().lower().startswith('mermaid'):
+            element = 'mermaid'
+        if element is not None:
+            counts[element] = counts.get(element, 0) + 1
+
+    for token in tokens:
+        add(token)
+        for child in token.children or []:
+            add(child)
+    return counts
+
+
+@contextmanager
+def stage(name: str):
+    """记录一个转换阶段的耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics().observe('md2docx_stage_duration_seconds', time.perf_counter() - start, stage=name)
+
+
+_shared_metrics: Optional[MetricsRegistry] = None
+_shared_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """获取进程内共享的指标"""
+    global _shared_metrics
+    with _shared_lock:
+        if _shared_metrics is None:
+            _shared_metrics = MetricsRegistry()
+        return _shared_metrics
+
+
+def set_metrics(metrics: Optional[MetricsRegistry]) -> None:
+    """替换共享指标（传入 None 时下次使用重新创建）"""
+    global _shared_metrics
+    with _shared_lock:
+        _shared_metrics = metrics
@@ -0,0 +1,417 @@
+"""
+转换引擎进程池
+
+构建文档、序列化并压缩为 docx 都是 CPU 密集的工作，在线程中执行会被 GIL 串行化。
+异步 API 服务把这部分工作交给固定数量的工作进程，事件循环只负责网络 I/O。每个
+工作进程启动时预热一次转换引擎（导入全部模块、构建解析器、填充公式缓存），之后
+一直复用。
+
+在线图片的下载和 Mermaid 图表的渲染属于 I/O，由服务进程并发完成，不占用工作进程。
+结果随转换任务发送给工作进程并写入其进程内缓存，工作进程转换时直接命中缓存。图表的
+缓存键包含渲染器版本，工作进程按服务进程渲染器的版本计算缓存键；工作进程不启动常驻
+渲染服务，没有预先获取资源的转换直接调用 mmdc。
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, Future, InvalidStateError, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from .converter import BaseConverter
+from .converter.base import markdown_parser
+from .converter.assets import (
+    DownloadRejected,
+    FetchDeadlineExceeded,
+    MarkdownBundle,
+    get_image_cache,
+    release_spool,
+    save_document
+)
+from .converter.diagrams import (
+    MmdcRenderer,
+    RendererUnavailable,
+    get_diagram_cache,
+    get_failure_cache,
+    set_mermaid_renderer
+)
+from .converter.elements import ImageConverter, MermaidConverter
+from .converter.metrics import get_metrics
+
+# 预热用的文档，覆盖常用的元素（不包含需要下载或渲染的内容）
+WARMUP_MARKDOWN = """# 标题
+
+正文 **加粗** *斜体* `代码` [链接](https://example.com) $E=mc^2$
+
+- 列表
+  1. 嵌套
+
+> 引用
+
+| 列 | 列 |
+| --- | --- |
+| 1 | 2 |
+
+```python
+print('hello')
+```
+
+$$
+\\sum_{i=1}^n i = \\frac{n(n+1)}{2}
+$$
+"""
+
+# 一个文档同时下载的在线图片数
+PREFETCH_CONCURRENCY = 8
+
+
+@dataclass
+class PrefetchedAssets:
+    """服务进程预先得到的图片和图表，随转换任务发送给工作进程"""
+    # (URL, 数据, ETag, Last-Modified)
+    images: List[Tuple[str, bytes, Optional[str], Optional[str]]] = field(default_factory=list)
+    # 图表缓存键 -> 数据，渲染失败的图表为 None
+    diagrams: Dict[str, Optional[bytes]] = field(default_factory=dict)
+    # 无法得到的图片地址或图表缓存键 -> 图片被拒绝的原因（插入占位文本），
+    # 下载失败的图片和等待超时、被熔断的图表为 None；工作进程不再下载或渲染
+    unavailable: Dict[str, Optional[str]] = field(default_factory=dict)
+    # 服务进程渲染器的版本，工作进程用它计算图表缓存键
+    renderer_version: Optional[str] = None
+
+
+class _PrefetchedRenderer:
+    """工作进程转换预先获取了资源的文档时使用的渲染器
+
+    版本与服务进程的渲染器一致，图表缓存键与服务进程计算的相同；图表都已由服务进程
+    渲染，本身不渲染。
+    """
+
+    def __init__(self, version: Optional[str]):
+        self.version = version
+
+    def prewarm(self) -> bool:
+        return True
+
+    def stop(self) -> None:
+        pass
+
+    def render(self, code: str, config: Dict[str, Any], fmt: str = 'png') -> Optional[bytes]:
+        return self.render_batch([code], config, fmt)[0]
+
+    def render_batch(self, codes: List[str], config: Dict[str, Any],
+                     fmt: str = 'png') -> List[Optional[bytes]]:
+        raise RendererUnavailable("图表由服务进程渲染")
+
+
+def engine_workers() -> int:
+    """转换进程数，通过环境变量 MD2DOCX_ENGINE_WORKERS 配置，默认与CPU核数一致"""
+    try:
+        workers = int(os.environ.get('MD2DOCX_ENGINE_WORKERS', ''))
+    except ValueError:
+        workers = 0
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def _warm_engine() -> None:
+    """工作进程的初始化函数：完整转换一次预热文档"""
+    save_document(BaseConverter().convert(WARMUP_MARKDOWN), BytesIO())
+    # 预热不计入指标
+    get_metrics().drain()
+
+
+def _init_worker() -> None:
+    """工作进程的初始化函数：使用 mmdc 渲染器（不启动常驻渲染服务）并预热转换引擎"""
+    set_mermaid_renderer(MmdcRenderer())
+    _warm_engine()
+
+
+def _seed_caches(assets: PrefetchedAssets) -> None:
+    """把服务进程得到的图片和图表写入本进程的缓存
+
+    渲染失败的图表记入失败缓存；等待超时或被熔断的图表只在本次转换中以代码块保留
+    （见 PrefetchedAssets.unavailable），不影响之后的文档。
+    """
+    images = get_image_cache()
+    for url, data, etag, last_modified in assets.images:
+        images.put(url, data, etag=etag, last_modified=last_modified)
+    diagrams = get_diagram_cache()
+    failures = get_failure_cache()
+    for key, data in assets.diagrams.items():
+        if data is None:
+            failures.add(key)
+        else:
+            diagrams.put(key, data)
+
+
+def convert_document(markdown: Optional[str], debug: bool = False, image_dpi: Optional[int] = None,
+                     assets: Optional[PrefetchedAssets] = None, bundle: Optional[bytes] = None,
+                     entry: Optional[str] = None) -> bytes:
+    """转换文档并序列化为 docx（在工作进程中执行）
+
+    Args:
+        markdown: Markdown 文本，转换压缩包时忽略
+        debug: 是否显示调试信息
+        image_dpi: 图片按显示尺寸重新采样的目标DPI
+        assets: 服务进程预先得到的图片和图表
+        bundle: zip 压缩包的内容，图片从压缩包中读取
+        entry: 压缩包内的 Markdown 文件路径
+
+    Returns:
+        bytes: docx 文件内容
+
+    Raises:
+        BundleError: 压缩包无效
+    """
+    unavailable = None
+    renderer = None
+    if assets is not None:
+        _seed_caches(assets)
+        unavailable = assets.unavailable
+        renderer = _PrefetchedRenderer(assets.renderer_version)
+    if bundle is not None:
+        with MarkdownBundle(bundle, entry=entry) as archive:
+            converter = BaseConverter(debug=debug, image_dpi=image_dpi,
+                                      image_resolver=archive.resolver(), unavailable=unavailable,
+                                      mermaid_renderer=renderer)
+            doc = converter.convert(archive.read_markdown())
+    else:
+        doc = BaseConverter(debug=debug, image_dpi=image_dpi, unavailable=unavailable,
+                            mermaid_renderer=renderer).convert(markdown)
+    buffer = BytesIO()
+    try:
+        save_document(doc, buffer)
+    finally:
+        release_spool(doc)
+    return buffer.getvalue()
+
+
+def convert_measured(*args, **kwargs) -> Tuple[bytes, Dict[str, Any]]:
+    """在工作进程中转换文档，同时取出本进程记录的指标，交给服务进程合并"""
+    return convert_document(*args, **kwargs), get_metrics().drain()
+
+
+def _scan(markdown: str) -> Tuple[List[str], Any]:
+    """解析文档，返回在线图片地址和全部标记"""
+    tokens = markdown_parser().parse(markdown)
+    urls: List[str] = []
+    for token in tokens:
+        for child in token.children or []:
+            if child.type != 'image':
+                continue
+            src = child.attrGet('src') or ''
+            if src.startswith(('http://', 'https://')) and src not in urls:
+                urls.append(src)
+    return urls, tokens
+
+
+class EnginePool:
+    """转换引擎进程池
+
+    用法::
+
+        pool = EnginePool(workers=4)
+        pool.start()
+        data = await pool.convert('# 标题')
+    """
+
+    def __init__(self, workers: Optional[int] = None, executor: Optional[Executor] = None):
+        """初始化进程池
+
+        Args:
+            workers: 工作进程数，默认由环境变量配置
+            executor: 执行转换的执行器，默认在首次使用时创建进程池
+        """
+        self.workers = workers or engine_workers()
+        self._executor = executor
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                # 服务进程中有渲染线程等后台线程，使用 spawn 避免 fork 后锁状态不一致
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._executor
+
+    def start(self) -> None:
+        """启动并预热全部工作进程（阻塞直到完成）"""
+        futures = [self.executor.submit(os.getpid) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    def submit(self, markdown: Optional[str] = None, debug: bool = False,
+               image_dpi: Optional[int] = None, assets: Optional[PrefetchedAssets] = None,
+               bundle: Optional[bytes] = None, entry: Optional[str] = None) -> Future:
+        """把转换提交给工作进程，参数与 convert_document 相同
+
+        工作进程记录的指标在转换完成时合并到本进程。取消返回的 Future 时同时取消
+        尚未开始的转换。
+
+        Returns:
+            Future: 结果为 docx 文件内容
+        """
+        inner = self.executor.submit(convert_measured, markdown, debug, image_dpi, assets,
+                                     bundle, entry)
+        outer = Future()
+        with self._lock:
+            self.in_flight += 1
+
+        def done(future):
+            error = None if future.cancelled() else future.exception()
+            with self._lock:
+                self.in_flight -= 1
+                if error is not None:
+                    self.failed += 1
+                elif not future.cancelled():
+                    self.completed += 1
+            try:
+                if future.cancelled():
+                    outer.cancel()
+                elif error is not None:
+                    outer.set_exception(error)
+                else:
+                    data, samples = future.result()
+                    get_metrics().merge(samples)
+                    outer.set_result(data)
+            except InvalidStateError:
+                # 调用方已经取消
+                pass
+
+        inner.add_done_callback(done)
+        outer.add_done_callback(lambda future: future.cancelled() and inner.cancel())
+        return outer
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    async def prefetch(self, markdown: str, debug: bool = False) -> PrefetchedAssets:
+        """在服务进程中并发下载在线图片、渲染 Mermaid 图表
+
+        下载和渲染使用现有的 HTTP 客户端和渲染器，在线程中执行，事件循环只等待
+        结果。下载被拒绝或失败的图片、等待超时的图表也发送给工作进程，工作进程直接
+        插入占位文本或保留代码块，不会重新下载或渲染。
+
+        Args:
+            markdown: Markdown 文本
+            debug: 是否显示调试信息
+
+        Returns:
+            PrefetchedAssets: 得到的图片和图表
+        """
+        urls, tokens = await asyncio.to_thread(_scan, markdown)
+        assets = PrefetchedAssets()
+
+        # 图表提交到共享的渲染线程池，与图片下载同时进行
+        diagrams = MermaidConverter()
+        diagrams.prepare(tokens)
+        assets.renderer_version = diagrams.renderer.version
+
+        # 同一个文档的图片共用一个下载截止时间和字节预算，在并发下载前创建
+        loader = ImageConverter()
+        loader.start_fetching()
+        slots = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+        def fetch(url):
+            try:
+                return loader._load_image(url), None
+            except (DownloadRejected, FetchDeadlineExceeded) as e:
+                if debug:
+                    print(f"预先下载图片被拒绝: {url}: {str(e)}")
+                return None, str(e)
+
+        async def fetch_bounded(url):
+            async with slots:
+                return await asyncio.to_thread(fetch, url)
+
+        results = await asyncio.gather(*(fetch_bounded(url) for url in urls))
+        for url, (image, reason) in zip(urls, results):
+            if image is not None:
+                assets.images.append((image.key, image.data, image.meta.etag,
+                                      image.meta.last_modified))
+            else:
+                assets.unavailable[url] = reason
+
+        rendering = [asyncio.wrap_future(future) for future in diagrams.rendering()]
+        if rendering:
+            await asyncio.wait(rendering, timeout=diagrams.timeout)
+        collected = diagrams.collect()
+        for key, image in collected.items():
+            if image is not None:
+                assets.diagrams[key] = image.data
+            elif key in diagrams.failures:
+                assets.diagrams[key] = None
+            else:
+                assets.unavailable[key] = None
+        if debug:
+            print(f"预先获取: 图片 {len(assets.images)}/{len(urls)} 张，"
+                  f"图表 {sum(d is not None for d in assets.diagrams.values())}/{len(collected)} 个")
+        return assets
+
+    async def convert(self, markdown: Optional[str] = None, debug: bool = False,
+                      image_dpi: Optional[int] = None, bundle: Optional[bytes] = None,
+                      entry: Optional[str] = None) -> bytes:
+        """异步转换文档：先预先获取资源，再交给工作进程转换
+
+        Args:
+            markdown: Markdown 文本，转换压缩包时为 None
+            debug: 是否显示调试信息
+            image_dpi: 图片按显示尺寸重新采样的目标DPI
+            bundle: zip 压缩包的内容
+            entry: 压缩包内的 Markdown 文件路径
+
+        Returns:
+            bytes: docx 文件内容
+
+        Raises:
+            BundleError: 压缩包无效
+            UnicodeDecodeError: 压缩包中的 Markdown 文件不是 UTF-8 编码
+        """
+        if bundle is not None:
+            with MarkdownBundle(bundle, entry=entry) as archive:
+                source = archive.read_markdown()
+        else:
+            source = markdown
+        assets = await self.prefetch(source, debug=debug)
+        return await asyncio.wrap_future(self.submit(markdown, debug, image_dpi, assets, bundle, entry))
+
+    def stats(self) -> Dict[str, int]:
+        """进程池统计信息"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'failed': self.failed,
+            }
+
+
+_shared_pool: Optional[EnginePool] = None
+_shared_lock = threading.Lock()
+
+
+def get_engine_pool() -> EnginePool:
+    """获取进程内共享的转换引擎进程池"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = EnginePool()
+        return _shared_pool
+
+
+def set_engine_pool(pool: Optional[EnginePool]) -> None:
+    """替换共享进程池（传入 None 时下次使用重新创建）"""
+    global _shared_pool
+    with _shared_lock:
+        _shared_pool = pool
@@ -0,0 +1,362 @@
+"""
+异步转换任务
+
+耗时很长的转换（大表格、大量 Mermaid 图表）不再占用 HTTP 连接：提交后立即返回任务
+ID，客户端轮询任务状态，完成后再获取结果。
+
+任务按优先级（数值大的优先，相同优先级先提交先执行）排队，由固定数量的调度线程
+交给转换进程池执行。排队的任务数和排队任务的参数（Markdown 文本、压缩包）总大小
+都有上限，超过时拒绝提交。结果保存在内存中，超过保留时间或总大小超过上限时，最早完成的
+任务连同结果一起删除。
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 任务状态
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFull(Exception):
+    """排队的任务数或排队任务的参数总大小已达上限"""
+    pass
+
+
+@dataclass
+class Job:
+    """一个转换任务"""
+    id: str
+    filename: str  # 结果的下载文件名
+    params: Dict[str, Any]  # 传给 convert_document 的参数
+    priority: int = 0
+    api_key: Optional[str] = None  # 提交任务的 API 密钥
+    seq: int = 0  # 提交序号，相同优先级按序号执行
+    status: str = QUEUED
+    submitted_at: float = field(default_factory=time.time)
+    size: int = 0  # 参数的字节数，排队期间计入排队总大小
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[bytes] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def _convert(job: Job) -> bytes:
+    """默认的任务执行方式：由本进程预先获取图片和图表，再交给共享的转换进程池并等待结果
+
+    执行期间占用一个转换名额，计入提交者密钥的并发数。
+    """
+    from .admission import get_admission_controller
+    from .engine import get_engine_pool
+
+    admission = get_admission_controller().hold(job.api_key or '')
+    try:
+        return asyncio.run(get_engine_pool().convert(**job.params))
+    finally:
+        admission.release()
+
+
+def payload_size(params: Dict[str, Any]) -> int:
+    """任务参数中 Markdown 文本和压缩包的字节数"""
+    size = len(params.get('bundle') or b'')
+    markdown = params.get('markdown')
+    if markdown:
+        size += len(markdown.encode('utf-8'))
+    return size
+
+
+def parse_priority(value) -> int:
+    """解析任务优先级参数，无效值按 0 处理，范围限制在 -100 到 100"""
+    try:
+        priority = int(value)
+    except (TypeError, ValueError):
+        return 0
+    return max(-100, min(100, priority))
+
+
+class JobQueue:
+    """带优先级的转换任务队列和结果存储"""
+
+    def __init__(self, workers: Optional[int] = None, max_queued: int = 10000,
+                 max_queued_bytes: int = 256 * 1024 * 1024, result_ttl: float = 3600, max_result_bytes: int = 256 * 1024 * 1024,
+                 run: Optional[Callable[[Job], bytes]] = None,
+                 clock: Callable[[], float] = time.time):
+        """初始化任务队列
+
+        Args:
+            workers: 同时执行的任务数，默认与转换进程数一致
+            max_queued: 最多排队的任务数
+            max_queued_bytes: 排队任务的参数总大小上限（字节）
+            result_ttl: 任务完成后保留的时间（秒）
+            max_result_bytes: 保留的结果总大小上限（字节）
+            run: 执行任务并返回 docx 内容的函数，默认交给转换进程池
+            clock: 时间函数
+        """
+        if workers is None:
+            from .engine import engine_workers
+
+            workers = engine_workers()
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.max_queued_bytes = max_queued_bytes
+        self.result_ttl = result_ttl
+        self.max_result_bytes = max_result_bytes
+        self._run = run or _convert
+        self._clock = clock
+        self._jobs: Dict[str, Job] = {}
+        # (-优先级, 序号, 任务)，取消的任务在出队时跳过
+        self._heap: List[Tuple[int, int, Job]] = []
+        self._counter = itertools.count()
+        # 已完成的任务，按完成顺序
+        self._finished: 'OrderedDict[str, Job]' = OrderedDict()
+        self._result_bytes = 0
+        self._queued = 0
+        self._queued_bytes = 0
+        self._running = 0
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self.submitted = 0
+        self.evicted = 0
+
+    def submit(self, filename: str, priority: int = 0, api_key: Optional[str] = None,
+               **params) -> Job:
+        """提交任务
+
+        Args:
+            filename: 结果的下载文件名
+            priority: 优先级，数值大的先执行
+            api_key: 提交任务的 API 密钥
+            **params: 传给 convert_document 的参数（markdown、bundle、entry、debug、image_dpi）
+
+        Returns:
+            Job: 新任务
+
+        Raises:
+            QueueFull: 排队的任务数或排队任务的参数总大小已达上限
+        """
+        job = Job(uuid.uuid4().hex, filename, params, priority, api_key=api_key,
+                  size=payload_size(params), submitted_at=self._clock())
+        with self._condition:
+            self._purge_locked()
+            if self._queued >= self.max_queued:
+                raise QueueFull(f"排队的任务已达上限 ({self.max_queued})")
+            if self._queued_bytes + job.size > self.max_queued_bytes:
+                raise QueueFull(f"排队任务的总大小已达上限 "
+                                f"({self.max_queued_bytes // (1024 * 1024)}MB)")
+            self._start_locked()
+            job.seq = next(self._counter)
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (-priority, job.seq, job))
+            self._queued += 1
+            self._queued_bytes += job.size
+            self.submitted += 1
+            self._condition.notify()
+        return job
+
+    def get(self, job_id: str, api_key: Optional[str] = None) -> Optional[Job]:
+        """按 ID 查找任务
+
+        Args:
+            job_id: 任务 ID
+            api_key: 请求使用的 API 密钥，给出时只返回该密钥提交的任务
+
+        Returns:
+            Job: 任务；不存在、已过期或由其他密钥提交时返回 None
+        """
+        with self._condition:
+            self._purge_locked()
+            job = self._jobs.get(job_id)
+        if job is None or (api_key is not None and job.api_key != api_key):
+            return None
+        return job
+
+    def position(self, job: Job) -> int:
+        """排在任务前面的任务数，任务不在排队中时返回 0"""
+        with self._condition:
+            if job.status != QUEUED:
+                return 0
+            key = (-job.priority, job.seq)
+            return sum(1 for priority, seq, other in self._heap
+                       if other.status == QUEUED and (priority, seq) < key)
+
+    def describe(self, job: Job) -> Dict[str, Any]:
+        """任务状态，供状态查询接口返回"""
+        info = {
+            'job_id': job.id,
+            'status': job.status,
+            'priority': job.priority,
+            'submitted_at': job.submitted_at,
+            'started_at': job.started_at,
+            'finished_at': job.finished_at,
+        }
+        if job.status == QUEUED:
+            info['position'] = self.position(job)
+        if job.status == SUCCEEDED and job.result is not None:
+            info['bytes'] = len(job.result)
+        if job.error is not None:
+            info['error'] = job.error
+        return info
+
+    def cancel(self, job_id: str) -> bool:
+        """取消排队中的任务，或删除已完成的任务及其结果
+
+        Returns:
+            bool: 任务存在且未在执行中时返回 True
+        """
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status == RUNNING:
+                return False
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = self._clock()
+                self._queued -= 1
+                self._queued_bytes -= job.size
+            self._forget_locked(job)
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        """任务队列统计信息"""
+        with self._condition:
+            return {
+                'workers': self.workers,
+                'queued': self._queued,
+                'queued_bytes': self._queued_bytes,
+                'running': self._running,
+                'finished': len(self._finished),
+                'submitted': self.submitted,
+                'evicted': self.evicted,
+                'result_bytes': self._result_bytes,
+            }
+
+    def shutdown(self) -> None:
+        """停止调度线程，正在执行的任务完成后退出"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _start_locked(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'md2docx-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                job = None
+                while job is None:
+                    while not self._heap and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+                    job = heapq.heappop(self._heap)[2]
+                    if job.status != QUEUED:
+                        job = None
+                job.status = RUNNING
+                job.started_at = self._clock()
+                self._queued -= 1
+                self._queued_bytes -= job.size
+                self._running += 1
+
+            result, error = None, None
+            try:
+                result = self._run(job)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+
+            with self._condition:
+                self._running -= 1
+                job.finished_at = self._clock()
+                if error is None:
+                    job.status = SUCCEEDED
+                    job.result = result
+                    self._result_bytes += len(result)
+                else:
+                    job.status = FAILED
+                    job.error = error
+                # 参数中可能有较大的压缩包，完成后不再需要
+                job.params = {}
+                self._finished[job.id] = job
+                self._purge_locked()
+
+    def _purge_locked(self) -> None:
+        """删除超过保留时间的任务，结果总大小超过上限时删除最早完成的任务"""
+        now = self._clock()
+        while self._finished:
+            job = next(iter(self._finished.values()))
+            if job.finished_at + self.result_ttl > now and self._result_bytes <= self.max_result_bytes:
+                break
+            self._forget_locked(job)
+            self.evicted += 1
+
+    def _forget_locked(self, job: Job) -> None:
+        self._jobs.pop(job.id, None)
+        self._finished.pop(job.id, None)
+        if job.result is not None:
+            self._result_bytes -= len(job.result)
+            job.result = None
+
+
+_shared_queue: Optional[JobQueue] = None
+_shared_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """获取进程内共享的任务队列
+
+    通过环境变量配置：
+        MD2DOCX_JOB_WORKERS: 同时执行的任务数，默认与转换进程数一致
+        MD2DOCX_JOB_QUEUE_SIZE: 最多排队的任务数，默认 10000
+        MD2DOCX_JOB_QUEUE_MB: 排队任务的参数总大小上限（MB），默认 256
+        MD2DOCX_JOB_RESULT_TTL: 任务完成后保留的时间（秒），默认 3600
+        MD2DOCX_JOB_RESULT_MB: 保留的结果总大小上限（MB），默认 256
+    """
+    global _shared_queue
+    with _shared_lock:
+        if _shared_queue is None:
+            workers = int(_env_number('MD2DOCX_JOB_WORKERS', 0)) or None
+            _shared_queue = JobQueue(
+                workers=workers,
+                max_queued=int(_env_number('MD2DOCX_JOB_QUEUE_SIZE', 10000)),
+                max_queued_bytes=int(_env_number('MD2DOCX_JOB_QUEUE_MB', 256) * 1024 * 1024),
+                result_ttl=_env_number('MD2DOCX_JOB_RESULT_TTL', 3600),
+                max_result_bytes=int(_env_number('MD2DOCX_JOB_RESULT_MB', 256) * 1024 * 1024)
+            )
+        return _shared_queue
+
+
+def set_job_queue(queue: Optional[JobQueue]) -> None:
+    """替换共享任务队列（传入 None 时下次使用重新创建）"""
+    global _shared_queue
+    with _shared_lock:
+        _shared_queue = queue
+
@@ -0,0 +1,70 @@
+"""
+服务指标
+
+在转换指标（见 converter/metrics.py）之外记录 HTTP 请求数、状态码和耗时，并在采集时
+计算转换进程池、准入控制和任务队列的饱和度，供 /metrics 接口以 Prometheus 文本格式
+输出。
+"""
+from typing import Any, Dict, List, Tuple
+
+from .converter.metrics import COUNTER, GAUGE, get_metrics
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def record_request(route: str, method: str, status: int, seconds: float) -> None:
+    """记录一次 HTTP 请求
+
+    Args:
+        route: 路由模板（如 /api/jobs/<job_id>），未匹配的请求为 unmatched
+        method: 请求方法
+        status: 响应状态码
+        seconds: 处理耗时
+    """
+    metrics = get_metrics()
+    metrics.inc('md2docx_http_requests_total', route=route, method=method, status=status)
+    metrics.observe('md2docx_http_request_duration_seconds', seconds, route=route)
+
+
+def record_sizes(input_bytes: int, output_bytes: int) -> None:
+    """记录一次实际执行的转换的输入和输出大小"""
+    metrics = get_metrics()
+    metrics.observe('md2docx_input_bytes', input_bytes)
+    metrics.observe('md2docx_output_bytes', output_bytes)
+
+
+def saturation_gauges() -> List[Tuple[str, str, str, Dict[str, Any], float]]:
+    """转换进程池、准入控制、任务队列和请求合并的当前状态"""
+    from .admission import get_admission_controller
+    from .engine import get_engine_pool
+    from .jobs import get_job_queue
+    from .singleflight import get_singleflight
+
+    engine = get_engine_pool().stats()
+    admission = get_admission_controller().stats()
+    jobs = get_job_queue().stats()
+    flight = get_singleflight().stats()
+    gauges = [
+        ('md2docx_engine_workers', GAUGE, '转换工作进程数', {}, engine['workers']),
+        ('md2docx_engine_in_flight', GAUGE, '已提交给工作进程、尚未完成的转换数', {}, engine['in_flight']),
+        ('md2docx_admission_limit', GAUGE, '同时执行的转换数上限', {}, admission['max_concurrent']),
+        ('md2docx_admission_running', GAUGE, '占用转换名额的请求和后台工作数', {}, admission['running']),
+        ('md2docx_admission_queued', GAUGE, '排队等待转换名额的请求数', {}, admission['queued']),
+        ('md2docx_admission_held_waiting', GAUGE, '等待转换名额的异步任务数', {},
+         admission['held_waiting']),
+        ('md2docx_jobs_queued', GAUGE, '排队中的异步任务数', {}, jobs['queued']),
+        ('md2docx_jobs_queued_bytes', GAUGE, '排队中的异步任务的参数总大小（字节）', {},
+         jobs['queued_bytes']),
+        ('md2docx_jobs_running', GAUGE, '执行中的异步任务数', {}, jobs['running']),
+        ('md2docx_singleflight_in_flight', GAUGE, '正在执行、可被合并的转换数', {}, flight['in_flight']),
+        ('md2docx_singleflight_coalesced_total', COUNTER, '被合并的转换请求数', {}, flight['coalesced']),
+    ]
+    for reason, count in admission['rejected'].items():
+        gauges.append(('md2docx_admission_rejected_total', COUNTER, '准入控制拒绝的请求数',
+                       {'reason': reason}, count))
+    return gauges
+
+
+def render_metrics() -> str:
+    """Prometheus 文本格式的全部指标"""
+    return get_metrics().render(saturation_gauges())
@@ -0,0 +1,140 @@
+"""
+预派生多进程服务（生产环境）
+
+使用 Gunicorn 运行同步 API 服务：主进程导入全部模块，完整转换一次预热文档（构建
+Markdown 解析器、读取 docx 模板、填充公式缓存），然后派生固定数量的工作进程。工作
+进程以写时复制的方式共享这些内存，启动后可以立即处理转换请求；派生前冻结垃圾回收
+跟踪的对象，避免回收扫描触碰共享的内存页导致复制。
+
+线程、子进程和网络连接不能跨越 fork，Mermaid 渲染服务在每个工作进程启动后于后台
+预热（每个工作进程使用自己的套接字），预热完成前健康检查返回 503，工作进程退出时
+停止。
+
+每个工作进程的状态相互独立：批量转换使用的转换进程池按 CPU 核数在工作进程之间
+均分；异步任务的队列和结果无法跨进程查询，多个工作进程时关闭异步任务接口。
+
+仅支持类 Unix 系统（Gunicorn 不支持 Windows）。
+"""
+import gc
+import os
+from typing import Any, Dict, Optional
+
+# 工作进程处理一个请求的最长时间（秒），超时的工作进程会被重启
+DEFAULT_TIMEOUT = 120
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        value = int(os.environ.get(name, ''))
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def server_workers() -> int:
+    """工作进程数，通过环境变量 MD2DOCX_WORKERS 配置，默认与CPU核数一致"""
+    return _env_int('MD2DOCX_WORKERS', os.cpu_count() or 1)
+
+
+def server_threads() -> int:
+    """每个工作进程的线程数，通过环境变量 MD2DOCX_THREADS 配置，默认 4
+
+    转换在请求线程中执行，多个线程主要用于并发下载图片和等待图表渲染。
+    """
+    return _env_int('MD2DOCX_THREADS', 4)
+
+
+def partition_resources(workers: int) -> None:
+    """按工作进程数划分资源（在主进程中、派生工作进程之前调用）
+
+    Args:
+        workers: 工作进程数
+    """
+    from .api import app
+
+    # 未显式配置时，每个工作进程的转换进程池只使用自己那一份 CPU
+    os.environ.setdefault('MD2DOCX_ENGINE_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+    # 提交任务和查询结果的请求可能被分配到不同的工作进程
+    app.config['JOBS_ENABLED'] = workers == 1
+    # 每个工作进程有各自的指标，抓取结果会随处理请求的进程跳变
+    app.config['METRICS_ENABLED'] = workers == 1
+
+
+def preload():
+    """在主进程中加载并预热应用（派生工作进程之前调用）
+
+    Returns:
+        Flask 应用
+    """
+    from .api import app
+    from .engine import _warm_engine
+
+    _warm_engine()
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def _post_worker_init(worker) -> None:
+    """工作进程启动后在后台预热渲染后端"""
+    from .api import warm_in_background
+    from .converter.diagrams import set_mermaid_renderer
+
+    # 主进程预热时创建的渲染器带有主进程的服务地址，工作进程重新创建自己的渲染器
+    set_mermaid_renderer(None)
+    warm_in_background()
+
+
+def _worker_exit(server, worker) -> None:
+    """工作进程退出时停止它启动的渲染服务"""
+    from .converter.diagrams import get_mermaid_renderer
+
+    get_mermaid_renderer().stop()
+
+
+def server_options(host: str = '0.0.0.0', port: int = 5000, workers: Optional[int] = None,
+                   threads: Optional[int] = None, debug: bool = False) -> Dict[str, Any]:
+    """Gunicorn 配置
+
+    Args:
+        host: 监听的主机地址
+        port: 监听的端口
+        workers: 工作进程数，默认见 server_workers
+        threads: 每个工作进程的线程数，默认见 server_threads
+        debug: 是否输出调试日志
+
+    Returns:
+        Dict[str, Any]: 配置项
+    """
+    return {
+        'bind': f'{host}:{port}',
+        'workers': workers or server_workers(),
+        'worker_class': 'gthread',
+        'threads': threads or server_threads(),
+        'preload_app': True,
+        'timeout': _env_int('MD2DOCX_WORKER_TIMEOUT', DEFAULT_TIMEOUT),
+        'loglevel': 'debug' if debug else 'info',
+        'post_worker_init': _post_worker_init,
+        'worker_exit': _worker_exit,
+    }
+
+
+def start_server(host='0.0.0.0', port=5000, debug=False, workers=None, threads=None):
+    """启动预派生多进程API服务器"""
+    from gunicorn.app.base import BaseApplication
+
+    class PreforkApplication(BaseApplication):
+        def __init__(self, options: Dict[str, Any]):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return preload()
+
+    options = server_options(host, port, workers, threads, debug)
+    partition_resources(options['workers'])
+    PreforkApplication(options).run()
@@ -0,0 +1,190 @@
+"""
+请求体的流式读取
+
+/api/convert/text 除 JSON 外还接受原始的 Markdown 请求体（text/markdown、text/plain），
+客户端不需要把整个文档转义到 JSON 字符串中，服务端也不需要解析 JSON。请求体可以使用
+gzip 或 zstd 压缩（Content-Encoding），从请求流中按块读取并解压，解压后的大小有上限，
+超过时立即停止读取并返回 413，压缩炸弹不会占满内存。
+
+zstd 需要 Python 3.14 的 compression.zstd 或 backports.zstd，均未安装时返回 415。
+"""
+import os
+import zlib
+from typing import AsyncIterable, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+# 按原始 Markdown 读取的请求体类型
+MARKDOWN_MIMETYPES = ('text/markdown', 'text/x-markdown', 'text/plain')
+
+# 每次从请求流读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+
+class BodyError(Exception):
+    """请求体无法读取"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def max_decoded_bytes() -> int:
+    """解压后请求体的大小上限，通过环境变量 MD2DOCX_MAX_DECODED_MB 配置，默认 16MB"""
+    try:
+        limit = float(os.environ.get('MD2DOCX_MAX_DECODED_MB', ''))
+    except ValueError:
+        limit = 0
+    return int((limit if limit > 0 else 16) * 1024 * 1024)
+
+
+def supported_encodings() -> List[str]:
+    """支持的 Content-Encoding"""
+    return ['gzip', 'zstd'] if zstd is not None else ['gzip']
+
+
+class BodyDecoder:
+    """按块解压请求体并检查解压后的大小"""
+
+    def __init__(self, content_encoding: Optional[str] = None, limit: Optional[int] = None):
+        """初始化解码器
+
+        Args:
+            content_encoding: 请求头 Content-Encoding 的值，None 或 identity 表示未压缩
+            limit: 解压后的大小上限（字节），默认见 max_decoded_bytes
+
+        Raises:
+            BodyError: 不支持的压缩格式（415）
+        """
+        encoding = (content_encoding or '').strip().lower()
+        if encoding == 'x-gzip':
+            encoding = 'gzip'
+        if encoding in ('', 'identity'):
+            encoding = None
+        elif encoding not in supported_encodings():
+            raise BodyError(415, f"不支持的Content-Encoding: {content_encoding}，"
+                                 f"支持: {', '.join(supported_encodings())}")
+        self.encoding = encoding
+        self.limit = limit if limit is not None else max_decoded_bytes()
+        self.received = 0
+        self.size = 0
+        self._parts: List[bytes] = []
+        self._decompressor = self._new_decompressor()
+
+    def _new_decompressor(self):
+        if self.encoding == 'gzip':
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.encoding == 'zstd':
+            return zstd.ZstdDecompressor()
+        return None
+
+    def feed(self, chunk: bytes) -> None:
+        """写入从请求流读取的一块数据
+
+        Raises:
+            BodyError: 解压后超过大小上限（413）或压缩数据无效（400）
+        """
+        self.received += len(chunk)
+        if self._decompressor is None:
+            self._append(chunk)
+            return
+        try:
+            self._decompress(chunk)
+        except (zlib.error, getattr(zstd, 'ZstdError', zlib.error)) as e:
+            raise BodyError(400, f"请求体解压失败: {str(e)}")
+
+    def _decompress(self, data: bytes) -> None:
+        # 连接在一起的多个 gzip 成员或 zstd 帧依次解压
+        while data:
+            if self._decompressor.eof:
+                self._decompressor = self._new_decompressor()
+            # 每次最多输出到刚好超过上限为止，输出少于该长度说明已处理完全部输入
+            self._append(self._decompressor.decompress(data, self.limit - self.size + 1))
+            data = self._decompressor.unused_data if self._decompressor.eof else b''
+
+    def _append(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.limit:
+            raise BodyError(413, f"解压后的请求体超过上限 ({self.limit // (1024 * 1024)}MB)")
+        if data:
+            self._parts.append(data)
+
+    def finish(self) -> bytes:
+        """结束读取，返回解压后的完整请求体
+
+        Raises:
+            BodyError: 压缩数据不完整（400）
+        """
+        if self._decompressor is not None and self.received and not self._decompressor.eof:
+            raise BodyError(400, "压缩的请求体不完整")
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+
+def iter_chunks(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """按块读取文件对象"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_body(chunks: Iterable[bytes], content_encoding: Optional[str] = None,
+              limit: Optional[int] = None) -> bytes:
+    """读取并解压请求体
+
+    Args:
+        chunks: 请求流的数据块
+        content_encoding: 请求头 Content-Encoding 的值
+        limit: 解压后的大小上限（字节），默认见 max_decoded_bytes
+
+    Returns:
+        bytes: 解压后的请求体
+
+    Raises:
+        BodyError: 不支持的压缩格式（415）、超过大小上限（413）或压缩数据无效（400）
+    """
+    decoder = BodyDecoder(content_encoding, limit)
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.finish()
+
+
+async def read_body_async(chunks: AsyncIterable[bytes], content_encoding: Optional[str] = None,
+                          limit: Optional[int] = None) -> bytes:
+    """异步版本的 read_body"""
+    decoder = BodyDecoder(content_encoding, limit)
+    async for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.finish()
+
+
+def parse_content_type(value: Optional[str]) -> Tuple[str, Optional[str]]:
+    """解析 Content-Type，返回 (小写的类型, 字符集)"""
+    mimetype, *params = (value or '').split(';')
+    charset = None
+    for param in params:
+        name, _, param_value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = param_value.strip().strip('"') or None
+    return mimetype.strip().lower(), charset
+
+
+def decode_text(data: bytes, charset: Optional[str] = None) -> str:
+    """按 Content-Type 中的字符集（默认 UTF-8）解码 Markdown 请求体
+
+    Raises:
+        BodyError: 字符集未知或内容无法解码（400）
+    """
+    try:
+        return data.decode(charset or 'utf-8')
+    except (LookupError, UnicodeDecodeError) as e:
+        raise BodyError(400, f"Markdown文本解码失败: {str(e)}")
@@ -0,0 +1,183 @@
+"""
+转换结果缓存
+
+相同的 Markdown 和选项再次转换时直接返回上次生成的 docx。缓存键是 Markdown 内容、
+转换选项和转换器版本的哈希，存储复用图片缓存的两级结构（内存 LRU + 按大小淘汰的
+磁盘存储），多个服务进程可以共享同一个磁盘目录。
+
+响应的 ETag 是 docx 内容的 sha256（强验证器），客户端携带 If-None-Match 时未变化的
+结果返回 304。
+
+结果还依赖 Markdown 以外的内容：在线图片可能更新，Mermaid 渲染失败时图表以代码块
+保留。引用在线资源或包含 Mermaid 图表的文档（以及无法检查内容的压缩包）的结果只在
+有效期内使用。
+"""
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .converter.assets import CachedImage, ImageCache, default_cache_dir
+from .converter.assets.cache import sniff_image_meta
+
+# 结果依赖外部内容的文档的缓存有效期（秒）
+VOLATILE_TTL = 300
+
+# 超过该大小的结果不缓存
+MAX_ENTRY_BYTES = 32 * 1024 * 1024
+
+_VOLATILE_MARKERS = (b'http://', b'https://', b'mermaid')
+
+
+@lru_cache(maxsize=1)
+def converter_version() -> str:
+    """转换器版本：转换器源码和主要依赖版本的哈希，代码或依赖更新后缓存自动失效"""
+    digest = hashlib.sha256()
+    root = Path(__file__).resolve().parent / 'converter'
+    for path in sorted(root.rglob('*.py')):
+        digest.update(str(path.relative_to(root)).encode('utf-8'))
+        digest.update(path.read_bytes())
+    for package in ('python-docx', 'markdown-it-py', 'pillow'):
+        try:
+            digest.update(f"{package}=={metadata.version(package)}".encode('utf-8'))
+        except metadata.PackageNotFoundError:
+            pass
+    return digest.hexdigest()[:16]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否包含指定的 ETag（按弱比较，支持 *）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    """按内容哈希缓存转换结果"""
+
+    def __init__(self, store: ImageCache, volatile_ttl: float = VOLATILE_TTL,
+                 max_entry_bytes: int = MAX_ENTRY_BYTES):
+        """初始化结果缓存
+
+        Args:
+            store: 保存结果的两级缓存
+            volatile_ttl: 结果依赖外部内容的文档的缓存有效期（秒）
+            max_entry_bytes: 超过该大小的结果不缓存
+        """
+        self.store = store
+        self.volatile_ttl = volatile_ttl
+        self.max_entry_bytes = max_entry_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def key(self, source: bytes, options: Optional[Dict[str, Any]] = None) -> str:
+        """计算缓存键
+
+        Args:
+            source: 上传的 Markdown 内容（或压缩包）
+            options: 影响转换结果的选项
+
+        Returns:
+            str: 缓存键
+        """
+        options = dict(options or {})
+        if b'mermaid' in source:
+            # 图表的嵌入格式和渲染器版本同样影响结果
+            from .converter.diagrams import get_mermaid_renderer, output_format, svg_fallback_width
+
+            options['mermaid'] = [output_format(), svg_fallback_width(),
+                                  get_mermaid_renderer().version]
+        payload = json.dumps({'options': options, 'version': converter_version()},
+                             sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(payload.encode('utf-8'))
+        digest.update(source)
+        return f"response:{digest.hexdigest()}"
+
+    @staticmethod
+    def volatile(source: bytes, bundle: bool = False) -> bool:
+        """结果是否依赖 Markdown 以外可能变化的内容"""
+        return bundle or any(marker in source for marker in _VOLATILE_MARKERS)
+
+    def get(self, key: str, volatile: bool = False) -> Optional[CachedImage]:
+        """读取缓存的结果，依赖外部内容且已过有效期的结果按未命中处理"""
+        item = self.store.get(key)
+        if item is not None and volatile and not item.is_fresh(self.volatile_ttl):
+            self.store.discard(key)
+            item = None
+        with self._lock:
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.bytes_saved += item.meta.size
+        return item
+
+    def put(self, key: str, data: bytes) -> CachedImage:
+        """缓存结果并返回缓存条目，超过大小上限的结果不写入缓存"""
+        if len(data) > self.max_entry_bytes:
+            return CachedImage(key, data, sniff_image_meta(data))
+        return self.store.put(key, data)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'bytes_saved': self.bytes_saved,
+            }
+        store = self.store.stats()
+        stats.update(memory_bytes=store['memory_bytes'], disk_bytes=store['disk_bytes'])
+        return stats
+
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """获取进程内共享的转换结果缓存
+
+    通过环境变量配置：
+        MD2DOCX_RESPONSE_CACHE_DIR: 磁盘层目录，默认见 default_cache_dir，设为空字符串时禁用磁盘层
+        MD2DOCX_RESPONSE_CACHE_MEMORY_MB: 内存层预算（MB），默认 64
+        MD2DOCX_RESPONSE_CACHE_DISK_MB: 磁盘层预算（MB），默认 512
+        MD2DOCX_RESPONSE_CACHE_TTL: 依赖外部内容的结果的有效期（秒），默认 300
+    """
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            disk_dir = os.environ.get('MD2DOCX_RESPONSE_CACHE_DIR', default_cache_dir('responses'))
+            memory_mb = int(os.environ.get('MD2DOCX_RESPONSE_CACHE_MEMORY_MB', 64))
+            disk_mb = int(os.environ.get('MD2DOCX_RESPONSE_CACHE_DISK_MB', 512))
+            store = ImageCache(
+                max_memory_bytes=memory_mb * 1024 * 1024,
+                disk_dir=disk_dir or None,
+                max_disk_bytes=disk_mb * 1024 * 1024,
+            )
+            ttl = float(os.environ.get('MD2DOCX_RESPONSE_CACHE_TTL', VOLATILE_TTL))
+            _shared_cache = ResponseCache(store, volatile_ttl=ttl)
+        return _shared_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    """替换共享结果缓存（传入 None 时下次使用按环境变量重新创建）"""
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = cache
@@ -0,0 +1,129 @@
+"""
+合并并发的相同转换请求
+
+文档站点重新部署时，大量相同的转换请求几乎同时到达，结果缓存还没有写入，每个请求
+都会各自转换一次，同时下载相同的图片、渲染相同的图表。相同缓存键的请求在第一个
+请求转换期间到达时不再另外转换，等待并共享它的结果（转换失败时共享同一个异常）。
+
+同步服务（每个请求一个线程）使用 do，异步服务使用 do_async。
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class _Call:
+    """一次正在执行的转换，后到的相同请求等待它完成"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """按键合并同时进行的相同调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """执行 fn 并返回结果；相同键的调用正在执行时等待并返回它的结果
+
+        Args:
+            key: 调用的键（结果缓存键）
+            fn: 实际执行转换的函数
+
+        Returns:
+            fn 的返回值
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """异步版本的 do
+
+        转换作为独立的任务执行，第一个请求的客户端断开连接时不会取消转换，
+        其他等待中的请求照常得到结果。
+
+        Args:
+            key: 调用的键（结果缓存键）
+            fn: 返回执行转换的协程的函数
+
+        Returns:
+            协程的返回值
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self._tasks[key] = task
+                self.executed += 1
+                task.add_done_callback(lambda done: self._finish(key, done))
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future) -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+        # 所有等待的请求都已断开时，避免未读取的异常产生警告
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """合并统计信息"""
+        with self._lock:
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls) + len(self._tasks),
+            }
+
+
+_shared_flight: Optional[SingleFlight] = None
+_shared_lock = threading.Lock()
+
+
+def get_singleflight() -> SingleFlight:
+    """获取进程内共享的请求合并器"""
+    global _shared_flight
+    with _shared_lock:
+        if _shared_flight is None:
+            _shared_flight = SingleFlight()
+        return _shared_flight
+
+
+def set_singleflight(flight: Optional[SingleFlight]) -> None:
+    """替换共享的请求合并器（传入 None 时下次使用重新创建）"""
+    global _shared_flight
+    with _shared_lock:
+        _shared_flight = flight
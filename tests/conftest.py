@@ -2,6 +2,8 @@
 测试配置文件
 """
 import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 import pytest
 from docx import Document
@@ -14,6 +16,12 @@ sys.path.insert(0, str(SRC_PATH))
 
 # 基础导入
 from src.converter.base import BaseConverter
+from src.converter.assets import ImageCache, set_image_cache
+from src.converter.diagrams import set_diagram_cache, set_failure_cache, set_render_breaker
+from src.response_cache import ResponseCache, set_response_cache
+from src.singleflight import set_singleflight
+from src.admission import set_admission_controller
+from src.converter.metrics import set_metrics
 from src.converter.elements import (
     HeadingConverter,
     TextConverter,
@@ -22,6 +30,23 @@ from src.converter.elements import (
     CodeConverter
 )
 
+@pytest.fixture(autouse=True)
+def isolated_image_cache():
+    """每个测试使用独立的纯内存图片缓存、图表缓存、结果缓存和渲染熔断状态，避免测试之间相互影响"""
+    cache = ImageCache(disk_dir=None)
+    set_image_cache(cache)
+    set_diagram_cache(ImageCache(disk_dir=None))
+    set_response_cache(ResponseCache(ImageCache(disk_dir=None)))
+    yield cache
+    set_image_cache(None)
+    set_diagram_cache(None)
+    set_response_cache(None)
+    set_singleflight(None)
+    set_admission_controller(None)
+    set_metrics(None)
+    set_render_breaker(None)
+    set_failure_cache(None)
+
 @pytest.fixture
 def base_converter():
     """创建基础转换器实例"""
@@ -45,4 +70,56 @@ def converter():
 @pytest.fixture
 def samples_dir():
     """获取测试样例目录"""
-    return TESTS_DIR / 'samples' / 'basic' 
\ No newline at end of file
+    return TESTS_DIR / 'samples' / 'basic'
+
+
+class StandInServer:
+    """替代真实图片源站的本地HTTP服务
+
+    routes 将路径映射到 (状态码, 响应头, 响应体) 列表，按请求顺序依次返回，
+    最后一个响应会被重复使用。
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # 支持keep-alive
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                responses = server.routes.get(self.path, [(404, {}, b'')])
+                status, headers, body = responses[0] if len(responses) == 1 else responses.pop(0)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stand_in_server():
+    """启动本地替身服务器"""
+    server = StandInServer()
+    yield server
+    server.close()
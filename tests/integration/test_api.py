@@ -0,0 +1,313 @@
+"""
+API接口集成测试
+"""
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+import pytest
+from docx import Document
+from PIL import Image
+
+from src import api
+from src.admission import AdmissionController, set_admission_controller
+from src.engine import EnginePool, convert_document, set_engine_pool
+from src.jobs import JobQueue, set_job_queue
+
+
+@pytest.fixture
+def client():
+    """创建Flask测试客户端"""
+    api.app.config['TESTING'] = True
+    with api.app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def headers():
+    return {'X-API-Key': api.API_KEY}
+
+
+def make_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), (0, 0, 200)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def read_docx(response):
+    return Document(io.BytesIO(response.data))
+
+
+def test_requires_api_key(client):
+    """测试未提供API密钥时返回401"""
+    response = client.post('/api/convert/text', json={'markdown': '# 标题'})
+    assert response.status_code == 401
+
+
+def test_convert_text(client, headers):
+    """测试文本转换接口"""
+    response = client.post('/api/convert/text', json={'markdown': '# 标题\n\n正文'}, headers=headers)
+    assert response.status_code == 200
+    assert read_docx(response).paragraphs[0].text == '标题'
+
+
+def test_convert_raw_markdown(client, headers):
+    """测试原始 Markdown 请求体和压缩的请求体"""
+    response = client.post('/api/convert/text?debug=false', data='# 标题\n\n正文'.encode('utf-8'),
+                           headers={**headers, 'Content-Type': 'text/markdown; charset=utf-8'})
+    assert response.status_code == 200
+    assert read_docx(response).paragraphs[0].text == '标题'
+
+    body = gzip.compress('# 压缩'.encode('utf-8'))
+    response = client.post('/api/convert/text', data=body,
+                           headers={**headers, 'Content-Type': 'text/markdown', 'Content-Encoding': 'gzip'})
+    assert read_docx(response).paragraphs[0].text == '压缩'
+
+    body = gzip.compress(json.dumps({'markdown': '# JSON'}).encode('utf-8'))
+    response = client.post('/api/convert/text', data=body,
+                           headers={**headers, 'Content-Type': 'application/json', 'Content-Encoding': 'gzip'})
+    assert read_docx(response).paragraphs[0].text == 'JSON'
+
+    response = client.post('/api/convert/text', data=b'# a',
+                           headers={**headers, 'Content-Type': 'text/plain', 'Content-Encoding': 'br'})
+    assert response.status_code == 415
+
+
+def test_convert_markdown_file(client, headers):
+    """测试文件转换接口"""
+    data = {'file': (io.BytesIO('# 文件标题'.encode('utf-8')), 'doc.md')}
+    response = client.post('/api/convert', data=data, headers=headers,
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert read_docx(response).paragraphs[0].text == '文件标题'
+
+
+def test_convert_bundle(client, headers):
+    """测试上传包含图片的zip压缩包"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr('docs/index.md', '# 压缩包\n\n![图](img/a.png)')
+        zf.writestr('docs/img/a.png', make_png())
+    buffer.seek(0)
+
+    response = client.post('/api/convert', data={'file': (buffer, 'docs.zip')}, headers=headers,
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    doc = read_docx(response)
+    assert doc.paragraphs[0].text == '压缩包'
+    assert len(doc.inline_shapes) == 1
+
+
+def test_convert_invalid_bundle(client, headers):
+    """测试无效压缩包返回400"""
+    data = {'file': (io.BytesIO(b'not a zip'), 'docs.zip')}
+    response = client.post('/api/convert', data=data, headers=headers,
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+def test_no_temp_files_left(client, headers, tmp_path, monkeypatch):
+    """测试转换不在临时目录中留下文件，超过内存上限的输出转存到匿名临时文件"""
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    monkeypatch.setenv('MD2DOCX_RESPONSE_MEMORY_MB', '0.01')
+    # 随机像素的图片无法压缩，超过磁盘图片部件的阈值
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (160, 160), os.urandom(160 * 160 * 3)).save(buffer, format='PNG')
+    bundle = io.BytesIO()
+    with zipfile.ZipFile(bundle, 'w') as zf:
+        zf.writestr('index.md', '# 大图\n\n![图](a.png)')
+        zf.writestr('a.png', buffer.getvalue())
+
+    responses = [
+        client.post('/api/convert', data={'file': (io.BytesIO(bundle.getvalue()), 'docs.zip')},
+                    headers=headers, content_type='multipart/form-data'),
+        client.post('/api/convert', data={'file': (io.BytesIO('# 文件'.encode('utf-8')), 'doc.md')},
+                    headers=headers, content_type='multipart/form-data'),
+        client.post('/api/convert/text', json={'markdown': '# 文本'}, headers=headers),
+    ]
+    for response in responses:
+        assert response.status_code == 200
+        assert response.content_length == len(response.data)
+        read_docx(response)
+        response.close()
+    assert len(read_docx(responses[0]).inline_shapes) == 1
+    # 超过内存上限的结果从临时文件流式返回，不写入结果缓存
+    assert responses[0].content_length > 0.01 * 1024 * 1024
+    again = client.post('/api/convert', data={'file': (io.BytesIO(bundle.getvalue()), 'docs.zip')},
+                        headers=headers, content_type='multipart/form-data')
+    assert again.headers['X-Cache'] == 'MISS' and len(read_docx(again).inline_shapes) == 1
+    again.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def read_batch(data):
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    manifest = json.loads(archive.read('manifest.json'))
+    return archive, manifest
+
+
+def test_convert_batch(client, headers):
+    """测试批量转换：多个文件并行转换，失败的文件只记入清单"""
+    pool = EnginePool(workers=1)
+    set_engine_pool(pool)
+    try:
+        bundle = io.BytesIO()
+        with zipfile.ZipFile(bundle, 'w') as zf:
+            zf.writestr('guide/index.md', '# 指南\n\n![图](a.png)')
+            zf.writestr('guide/a.png', make_png())
+            zf.writestr('guide/bad.md', b'\xff\xfe# bad')
+        bundle.seek(0)
+        data = {'files': [
+            (io.BytesIO('# 一'.encode('utf-8')), 'one.md'),
+            (io.BytesIO(b'\xff\xfe'), 'broken.md'),
+            (bundle, 'guide.zip'),
+        ]}
+        response = client.post('/api/convert/batch', data=data, headers=headers,
+                               content_type='multipart/form-data')
+        assert response.status_code == 200
+        archive, manifest = read_batch(response.data)
+    finally:
+        pool.shutdown()
+        set_engine_pool(None)
+
+    assert (manifest['total'], manifest['succeeded'], manifest['failed']) == (4, 2, 2)
+    assert [f['source'] for f in manifest['files']] == ['one.md', 'broken.md', 'guide/bad.md',
+                                                      'guide/index.md']
+    assert [f['status'] for f in manifest['files']] == ['ok', 'error', 'error', 'ok']
+    assert Document(io.BytesIO(archive.read('one.docx'))).paragraphs[0].text == '一'
+    assert len(Document(io.BytesIO(archive.read('guide/index.docx'))).inline_shapes) == 1
+
+
+def test_convert_batch_invalid(client, headers):
+    """测试没有文件或压缩包无效时返回400"""
+    assert client.post('/api/convert/batch', data={}, headers=headers,
+                       content_type='multipart/form-data').status_code == 400
+    data = {'files': (io.BytesIO(b'not a zip'), 'docs.zip')}
+    assert client.post('/api/convert/batch', data=data, headers=headers,
+                       content_type='multipart/form-data').status_code == 400
+
+
+def wait_for_job(client, headers, status_url):
+    for _ in range(500):
+        info = client.get(status_url, headers=headers).get_json()
+        if info['status'] not in ('queued', 'running'):
+            return info
+        time.sleep(0.01)
+    raise AssertionError("任务未完成")
+
+
+def test_job_api(client, headers, monkeypatch):
+    """测试提交任务、查询状态、获取结果和删除任务，其他密钥查不到任务"""
+    monkeypatch.setattr(api, 'EXTRA_API_KEYS', frozenset({'other-key'}))
+    other = {'X-API-Key': 'other-key'}
+    queue = JobQueue(workers=1, run=lambda job: convert_document(**job.params))
+    set_job_queue(queue)
+    try:
+        response = client.post('/api/jobs', json={'markdown': '# 任务', 'priority': 3}, headers=headers)
+        assert response.status_code == 202
+        info = response.get_json()
+        assert response.headers['Location'] == info['status_url'] == f"/api/jobs/{info['job_id']}"
+        assert info['priority'] == 3
+
+        assert wait_for_job(client, headers, info['status_url'])['status'] == 'succeeded'
+        result = client.get(info['result_url'], headers=headers)
+        assert result.status_code == 200
+        assert read_docx(result).paragraphs[0].text == '任务'
+        for url in (info['status_url'], info['result_url']):
+            assert client.get(url, headers=other).status_code == 404
+        assert client.delete(info['status_url'], headers=other).status_code == 404
+
+        data = {'file': (io.BytesIO(b'\xff\xfe'), 'doc.md')}
+        assert client.post('/api/jobs', data=data, headers=headers,
+                           content_type='multipart/form-data').status_code == 400
+
+        assert client.delete(info['status_url'], headers=headers).status_code == 204
+        assert client.get(info['result_url'], headers=headers).status_code == 404
+        assert client.get('/api/jobs/unknown', headers=headers).status_code == 404
+    finally:
+        queue.shutdown()
+        set_job_queue(None)
+
+
+def test_response_cache(client, headers):
+    """测试相同内容再次转换命中结果缓存，If-None-Match 匹配时返回304"""
+    payload = {'markdown': '# 缓存\n\n正文'}
+    first = client.post('/api/convert/text', json=payload, headers=headers)
+    assert first.status_code == 200
+    assert first.headers['X-Cache'] == 'MISS'
+    etag = first.headers['ETag']
+
+    second = client.post('/api/convert/text', json=payload, headers=headers)
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.headers['ETag'] == etag
+    assert second.data == first.data
+
+    other = client.post('/api/convert/text', json={**payload, 'image_dpi': 150}, headers=headers)
+    assert other.headers['X-Cache'] == 'MISS'
+
+    response = client.post('/api/convert/text', json=payload,
+                           headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    health = client.get('/api/health').get_json()
+    stats = health['response_cache']
+    assert stats['hits'] == 2 and stats['bytes_saved'] == 2 * len(first.data)
+    assert health['singleflight']['executed'] == 2
+
+
+def test_admission_control(client, headers):
+    """测试没有空闲名额时返回503，超出密钥速率限额时返回429，均带有Retry-After"""
+    controller = AdmissionController(1, max_queued=0, key_rate=1, key_burst=2)
+    set_admission_controller(controller)
+    held = controller.acquire('other')
+
+    response = client.post('/api/convert/text', json={'markdown': '# 繁忙'}, headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+    held.release()
+    assert client.post('/api/convert/text', json={'markdown': '# 空闲'},
+                       headers=headers).status_code == 200
+    response = client.post('/api/convert/text', json={'markdown': '# 频繁'}, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    response = client.post('/api/jobs', json={'markdown': '# 频繁'}, headers=headers)
+    assert response.status_code == 429
+
+    stats = client.get('/api/health').get_json()['admission']
+    assert stats['running'] == 0
+    assert stats['rejected']['queue_full'] == 1 and stats['rejected']['rate_limited'] == 2
+
+
+def test_batch_holds_admission_until_sent(client, headers):
+    """测试批量转换在压缩包发送完成后才归还名额"""
+    controller = AdmissionController(1, max_queued=0)
+    set_admission_controller(controller)
+    data = {'files': [(io.BytesIO('# 文档'.encode('utf-8')), 'doc.md')]}
+    response = client.post('/api/convert/batch', data=data, headers=headers,
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert zipfile.ZipFile(io.BytesIO(response.data)).namelist() == ['doc.docx', 'manifest.json']
+    assert controller.stats()['running'] == 0
+
+
+def test_metrics(client, headers):
+    """测试指标接口包含按路由的请求数、各阶段耗时和元素数量"""
+    client.post('/api/convert/text', json={'markdown': '# 指标\n\n| a |\n| - |\n| 1 |'}, headers=headers)
+    client.post('/api/convert/text', json={'markdown': '# 指标'})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert 'md2docx_http_requests_total{route="/api/convert/text",method="POST",status="200"} 1' in text
+    assert 'md2docx_http_requests_total{route="/api/convert/text",method="POST",status="401"} 1' in text
+    for name in ('decode', 'parse', 'render', 'save'):
+        assert f'md2docx_stage_duration_seconds_count{{stage="{name}"}} 1' in text
+    assert 'md2docx_elements_total{type="table"} 1' in text
+    assert 'md2docx_output_bytes_count 1' in text
+    assert 'md2docx_admission_running 0' in text
@@ -0,0 +1,337 @@
+"""
+异步API接口集成测试
+"""
+import asyncio
+import gzip
+import io
+import json
+import threading
+import time
+import zipfile
+import pytest
+from docx import Document
+from PIL import Image
+from starlette.testclient import TestClient
+
+from src import asgi
+from src.admission import AdmissionController, set_admission_controller
+from src.converter.diagrams import (
+    DEFAULT_CONFIG,
+    MmdcRenderer,
+    diagram_key,
+    get_failure_cache,
+    get_mermaid_renderer,
+    output_format,
+    set_mermaid_renderer
+)
+from src.engine import EnginePool, PrefetchedAssets, _init_worker, convert_document, set_engine_pool
+from src.jobs import JobQueue, set_job_queue
+
+
+@pytest.fixture(scope='module')
+def pool():
+    """单个工作进程的转换进程池，整个模块共用"""
+    pool = EnginePool(workers=1)
+    set_engine_pool(pool)
+    yield pool
+    pool.shutdown()
+    set_engine_pool(None)
+
+
+@pytest.fixture
+def client(pool):
+    with TestClient(asgi.app) as client:
+        yield client
+
+
+@pytest.fixture
+def headers():
+    return {'X-API-Key': asgi.API_KEY}
+
+
+def make_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10), (0, 0, 200)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def read_docx(response):
+    return Document(io.BytesIO(response.content))
+
+
+def test_requires_api_key(client):
+    """测试未提供或提供错误的API密钥时返回401"""
+    assert client.post('/api/convert/text', json={'markdown': '# 标题'}).status_code == 401
+    response = client.post('/api/convert/text', json={'markdown': '# 标题', 'api_key': 'wrong'})
+    assert response.status_code == 401
+
+
+def test_convert_text(client, headers):
+    """测试文本转换接口"""
+    response = client.post('/api/convert/text', json={'markdown': '# 标题\n\n正文'}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers['content-disposition'].startswith('attachment;')
+    assert read_docx(response).paragraphs[0].text == '标题'
+
+
+def test_convert_raw_markdown(client, headers, monkeypatch):
+    """测试压缩的原始 Markdown 请求体和解压后的大小上限"""
+    body = gzip.compress('# 压缩\n\n正文'.encode('utf-8'))
+    response = client.post('/api/convert/text', content=body,
+                           headers={**headers, 'Content-Type': 'text/markdown', 'Content-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert read_docx(response).paragraphs[0].text == '压缩'
+
+    monkeypatch.setenv('MD2DOCX_MAX_DECODED_MB', '0.001')
+    response = client.post('/api/convert/text', content=gzip.compress(b'a' * 4096),
+                           headers={**headers, 'Content-Type': 'text/plain', 'Content-Encoding': 'gzip'})
+    assert response.status_code == 413
+
+
+def test_chunked_body_limit(client, headers):
+    """测试没有Content-Length的分块请求体同样受大小限制"""
+    def chunks():
+        for _ in range(17):
+            yield b'a' * (1024 * 1024)
+
+    response = client.post('/api/convert/text', content=chunks(),
+                           headers={**headers, 'Content-Type': 'text/markdown'})
+    assert response.status_code == 413
+    response = client.post('/api/convert', content=chunks(),
+                           headers={**headers, 'Content-Type': 'multipart/form-data; boundary=x'})
+    assert response.status_code == 413
+
+
+def test_convert_markdown_file(client):
+    """测试文件转换接口，密钥通过表单传递"""
+    response = client.post('/api/convert', data={'api_key': asgi.API_KEY},
+                           files={'file': ('doc.md', '# 文件标题'.encode('utf-8'))})
+    assert response.status_code == 200
+    assert read_docx(response).paragraphs[0].text == '文件标题'
+
+
+def test_convert_bundle(client, headers):
+    """测试上传包含图片的zip压缩包，无效压缩包返回400"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr('docs/index.md', '# 压缩包\n\n![图](img/a.png)')
+        zf.writestr('docs/img/a.png', make_png())
+
+    response = client.post('/api/convert', files={'file': ('docs.zip', buffer.getvalue())},
+                           headers=headers)
+    assert response.status_code == 200
+    doc = read_docx(response)
+    assert doc.paragraphs[0].text == '压缩包'
+    assert len(doc.inline_shapes) == 1
+
+    response = client.post('/api/convert', files={'file': ('docs.zip', b'not a zip')},
+                           headers=headers)
+    assert response.status_code == 400
+
+
+def test_remote_images_fetched_once(client, headers, pool, stand_in_server):
+    """测试在线图片由服务进程下载，工作进程直接使用下载结果"""
+    stand_in_server.routes['/a.png'] = [(200, {'Content-Type': 'image/png'}, make_png())]
+    markdown = f'# 图片\n\n![图]({stand_in_server.url}/a.png)'
+
+    response = client.post('/api/convert/text', json={'markdown': markdown}, headers=headers)
+    assert response.status_code == 200
+    assert len(read_docx(response).inline_shapes) == 1
+    assert len(stand_in_server.requests) == 1
+    assert client.get('/api/health').json()['engine']['completed'] >= 1
+
+
+class FakeRenderer:
+    version = 'fake-asgi'
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+
+    def render_batch(self, codes, config, fmt='png'):
+        return [None if code in self.fail else make_png() for code in codes]
+
+
+def test_prefetch_diagrams():
+    """测试预先渲染的图表按缓存键交给工作进程，失败的图表为 None"""
+    set_mermaid_renderer(FakeRenderer(fail={'graph TD\n  B\n'}))
+    try:
+        markdown = '```mermaid\ngraph TD\n  A\n```\n\n```mermaid\ngraph TD\n  B\n```\n'
+        assets = asyncio.run(EnginePool(workers=1).prefetch(markdown))
+    finally:
+        set_mermaid_renderer(None)
+
+    assert len(assets.diagrams) == 2
+    assert sorted(data is not None for data in assets.diagrams.values()) == [False, True]
+    assert assets.images == []
+
+
+class BlockingRenderer:
+    version = 'blocking-asgi'
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def render_batch(self, codes, config, fmt='png'):
+        self.calls += 1
+        self.release.wait(5)
+        return [make_png() for _ in codes]
+
+
+def test_prefetch_sends_unavailable_assets(stand_in_server, monkeypatch):
+    """测试被拒绝的图片和等待超时的图表交给工作进程，工作进程不再下载或渲染"""
+    stand_in_server.routes['/page.png'] = [(200, {'Content-Type': 'text/html'}, b'<html></html>')]
+    monkeypatch.setenv('MD2DOCX_MERMAID_DOCUMENT_TIMEOUT', '0.2')
+    renderer = BlockingRenderer()
+    set_mermaid_renderer(renderer)
+    try:
+        markdown = (f'![页面]({stand_in_server.url}/page.png)\n\n'
+                    f'![缺失]({stand_in_server.url}/missing.png)\n\n'
+                    '```mermaid\ngraph TD\n  slow\n```\n')
+        assets = asyncio.run(EnginePool(workers=1).prefetch(markdown))
+        assert assets.images == [] and assets.diagrams == {}
+        assert len(assets.unavailable) == 3
+        (key,) = [key for key in assets.unavailable if not key.startswith('http')]
+        assert key not in get_failure_cache()
+
+        requests = len(stand_in_server.requests)
+        doc = Document(io.BytesIO(convert_document(markdown, assets=assets)))
+        assert len(stand_in_server.requests) == requests
+        assert renderer.calls == 1
+        assert key not in get_failure_cache()
+        text = '\n'.join(p.text for p in doc.paragraphs)
+        assert '[图片未嵌入: 页面]' in text and '缺失' not in text
+        assert 'slow' in text
+    finally:
+        renderer.release.set()
+        set_mermaid_renderer(None)
+
+
+def test_worker_uses_server_renderer_version():
+    """测试工作进程按服务进程渲染器的版本查找预先渲染的图表，不自己渲染"""
+    code = 'graph TD\n  server\n'
+    key = diagram_key(code, DEFAULT_CONFIG, 'server-version', output_format())
+    assets = PrefetchedAssets(diagrams={key: make_png()}, renderer_version='server-version')
+    renderer = BlockingRenderer()
+    renderer.release.set()
+    set_mermaid_renderer(renderer)
+    try:
+        data = convert_document(f'```mermaid\n{code}```\n', assets=assets)
+    finally:
+        set_mermaid_renderer(None)
+    assert renderer.calls == 0
+    doc = Document(io.BytesIO(data))
+    assert len(doc.inline_shapes) == 1
+    assert 'server' not in '\n'.join(p.text for p in doc.paragraphs)
+
+
+def test_worker_never_starts_service(monkeypatch):
+    """测试工作进程初始化后使用 mmdc 渲染器，不启动常驻渲染服务"""
+    monkeypatch.setenv('MD2DOCX_MERMAID_BACKEND', 'stub')
+    set_mermaid_renderer(None)
+    try:
+        _init_worker()
+        assert isinstance(get_mermaid_renderer(), MmdcRenderer)
+    finally:
+        set_mermaid_renderer(None)
+
+
+def test_convert_batch(client, headers):
+    """测试批量转换结果以zip流式返回，并附带转换状态清单"""
+    files = [('files', (f'doc{i}.md', f'# 文档{i}'.encode('utf-8'))) for i in range(3)]
+    files.append(('files', ('notes.txt', b'text')))
+    response = client.post('/api/convert/batch', files=files, headers=headers)
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/zip'
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    manifest = json.loads(archive.read('manifest.json'))
+    assert (manifest['succeeded'], manifest['failed']) == (3, 1)
+    assert manifest['files'][3]['status'] == 'error'
+    for i in range(3):
+        doc = Document(io.BytesIO(archive.read(f'doc{i}.docx')))
+        assert doc.paragraphs[0].text == f'文档{i}'
+
+
+def test_job_api(client, headers, pool, monkeypatch):
+    """测试提交文件任务、查询状态并获取结果，其他密钥查不到任务"""
+    monkeypatch.setattr(asgi, 'EXTRA_API_KEYS', frozenset({'other-key'}))
+    other = {'X-API-Key': 'other-key'}
+    queue = JobQueue(workers=1)
+    set_job_queue(queue)
+    try:
+        response = client.post('/api/jobs', files={'file': ('doc.md', '# 异步任务'.encode('utf-8'))},
+                               headers=headers)
+        assert response.status_code == 202
+        info = response.json()
+        assert info['status'] == 'queued' and info['position'] == 0
+
+        for _ in range(500):
+            status = client.get(info['status_url'], headers=headers).json()
+            if status['status'] not in ('queued', 'running'):
+                break
+            time.sleep(0.01)
+        assert status['status'] == 'succeeded'
+        result = client.get(info['result_url'], headers=headers)
+        assert result.status_code == 200
+        assert read_docx(result).paragraphs[0].text == '异步任务'
+        for url in (info['status_url'], info['result_url']):
+            assert client.get(url, headers=other).status_code == 404
+        assert client.delete(info['status_url'], headers=other).status_code == 404
+        assert client.get('/api/health').json()['jobs']['submitted'] == 1
+    finally:
+        queue.shutdown()
+        set_job_queue(None)
+
+
+def test_response_cache(client, headers):
+    """测试相同文件再次转换命中结果缓存，If-None-Match 匹配时返回304"""
+    files = {'file': ('doc.md', '# 缓存'.encode('utf-8'))}
+    first = client.post('/api/convert', files=files, headers=headers)
+    assert first.status_code == 200
+    assert first.headers['x-cache'] == 'MISS'
+    completed = client.get('/api/health').json()['engine']['completed']
+
+    second = client.post('/api/convert', files=files, headers=headers)
+    assert second.headers['x-cache'] == 'HIT'
+    assert second.headers['etag'] == first.headers['etag']
+    assert second.content == first.content
+
+    response = client.post('/api/convert', files=files,
+                           headers={**headers, 'If-None-Match': first.headers['etag']})
+    assert response.status_code == 304
+
+    health = client.get('/api/health').json()
+    assert health['engine']['completed'] == completed
+    assert health['response_cache']['hits'] == 2
+
+
+def test_admission_control(client, headers):
+    """测试没有空闲名额时返回503并带有Retry-After，名额归还后正常转换"""
+    controller = AdmissionController(1, max_queued=0)
+    set_admission_controller(controller)
+    held = controller.acquire('other')
+
+    response = client.post('/api/convert/text', json={'markdown': '# 繁忙'}, headers=headers)
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '5'
+    response = client.post('/api/jobs', json={'markdown': '# 繁忙'}, headers=headers)
+    assert response.status_code == 503
+
+    held.release()
+    assert client.post('/api/convert/text', json={'markdown': '# 空闲'},
+                       headers=headers).status_code == 200
+    assert client.get('/api/health').json()['admission']['running'] == 0
+
+
+def test_metrics(client, headers):
+    """测试工作进程记录的转换阶段耗时合并到服务进程的指标中"""
+    response = client.post('/api/convert/text', json={'markdown': '# 指标\n\n- 列表'}, headers=headers)
+    assert response.status_code == 200
+
+    text = client.get('/metrics').text
+    assert 'md2docx_http_requests_total{route="/api/convert/text",method="POST",status="200"} 1' in text
+    for name in ('parse', 'render', 'save'):
+        assert f'md2docx_stage_duration_seconds_count{{stage="{name}"}} 1' in text
+    assert 'md2docx_elements_total{type="list_item"} 1' in text
+    assert 'md2docx_engine_workers 1' in text
@@ -7,30 +7,29 @@ from unittest.mock import patch, MagicMock
 from io import BytesIO
 from docx import Document
 
+from PIL import Image
+
 from src.converter import BaseConverter
+from src.converter.assets import ImageResolver
 
 
 class TestImageIntegration:
     """图片转换集成测试"""
 
     @pytest.fixture
-    def base_converter(self):
-        """创建基础转换器实例"""
-        return BaseConverter(debug=False)
+    def image_dir(self, tmp_path):
+        """创建包含测试图片的目录"""
+        for name in ('test.png', 'test1.png', 'test2.png', 'test3.png'):
+            Image.new('RGB', (20, 10), (0, 128, 0)).save(tmp_path / name)
+        return tmp_path
+
+    @pytest.fixture
+    def base_converter(self, image_dir):
+        """创建基础转换器实例，本地图片相对测试图片目录解析"""
+        return BaseConverter(debug=False, image_resolver=ImageResolver(base_dir=str(image_dir)))
 
-    @patch('src.converter.elements.image.requests.get')
-    @patch('src.converter.elements.image.os.path.exists')
-    @patch('builtins.open')
-    def test_convert_basic_image(self, mock_open, mock_exists, mock_get, base_converter):
+    def test_convert_basic_image(self, base_converter):
         """测试转换基本图片"""
-        # 模拟本地文件存在
-        mock_exists.return_value = True
-        
-        # 模拟文件读取
-        mock_file = MagicMock()
-        mock_file.__enter__.return_value.read.return_value = b'fake_local_image'
-        mock_open.return_value = mock_file
-        
         # 测试转换
         md_text = "![测试图片](test.png)"
         doc = base_converter.convert(md_text)
@@ -38,22 +37,10 @@ class TestImageIntegration:
         # 验证结果
         assert len(doc.paragraphs) >= 1
         # 图片会被添加到一个新段落中
-        # 由于图片是通过run.add_picture添加的，我们无法直接验证图片内容
-        # 但可以验证段落是否存在
+        assert len(doc.inline_shapes) == 1
 
-    @patch('src.converter.elements.image.requests.get')
-    @patch('src.converter.elements.image.os.path.exists')
-    @patch('builtins.open')
-    def test_convert_image_with_title(self, mock_open, mock_exists, mock_get, base_converter):
+    def test_convert_image_with_title(self, base_converter):
         """测试转换带标题的图片"""
-        # 模拟本地文件存在
-        mock_exists.return_value = True
-        
-        # 模拟文件读取
-        mock_file = MagicMock()
-        mock_file.__enter__.return_value.read.return_value = b'fake_local_image'
-        mock_open.return_value = mock_file
-        
         # 测试转换
         md_text = '![测试图片](test.png "图片标题")'
         doc = base_converter.convert(md_text)
@@ -72,14 +59,14 @@ class TestImageIntegration:
         #     assert doc.paragraphs[1].runs[0].text == '图片标题'
         #     assert doc.paragraphs[1].runs[0].italic
 
-    @patch('src.converter.elements.image.requests.get')
+    @patch('src.converter.assets.http.HttpClient.download')
     def test_convert_online_image(self, mock_get, base_converter):
         """测试转换在线图片"""
         # 模拟请求响应
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.content = b'fake_online_image'
-        mock_get.return_value = mock_response
+        mock_response.headers = {}
+        mock_get.return_value = (mock_response, b'fake_online_image')
         
         # 测试转换
         md_text = "![在线图片](http://example.com/image.png)"
@@ -87,21 +74,11 @@ class TestImageIntegration:
         
         # 验证结果
         assert len(doc.paragraphs) >= 1
-        mock_get.assert_called_once_with('http://example.com/image.png', timeout=10)
+        mock_get.assert_called_once()
+        assert mock_get.call_args[0][0] == 'http://example.com/image.png'
 
-    @patch('src.converter.elements.image.requests.get')
-    @patch('src.converter.elements.image.os.path.exists')
-    @patch('builtins.open')
-    def test_convert_inline_image(self, mock_open, mock_exists, mock_get, base_converter):
+    def test_convert_inline_image(self, base_converter):
         """测试转换内联图片"""
-        # 模拟本地文件存在
-        mock_exists.return_value = True
-        
-        # 模拟文件读取
-        mock_file = MagicMock()
-        mock_file.__enter__.return_value.read.return_value = b'fake_local_image'
-        mock_open.return_value = mock_file
-        
         # 测试转换
         md_text = "这是一个段落，包含一个内联图片 ![内联图片](test.png) 在文本中。"
         doc = base_converter.convert(md_text)
@@ -110,20 +87,10 @@ class TestImageIntegration:
         assert len(doc.paragraphs) >= 1
         # 段落应该包含文本和图片
         assert len(doc.paragraphs[0].runs) >= 3  # 文本前、图片、文本后
+        assert len(doc.inline_shapes) == 1
 
-    @patch('src.converter.elements.image.requests.get')
-    @patch('src.converter.elements.image.os.path.exists')
-    @patch('builtins.open')
-    def test_convert_multiple_images(self, mock_open, mock_exists, mock_get, base_converter):
+    def test_convert_multiple_images(self, base_converter):
         """测试转换多个图片"""
-        # 模拟本地文件存在
-        mock_exists.return_value = True
-        
-        # 模拟文件读取
-        mock_file = MagicMock()
-        mock_file.__enter__.return_value.read.return_value = b'fake_local_image'
-        mock_open.return_value = mock_file
-        
         # 测试转换
         md_text = """
 # 多个图片测试
@@ -140,5 +107,14 @@ class TestImageIntegration:
         # 应该有1个标题段落和至少3个图片段落
         assert len(doc.paragraphs) >= 4
         
-        # 验证mock被调用了3次
-        assert mock_open.call_count >= 3 
\ No newline at end of file
+        # 验证3张图片都已嵌入
+        assert len(doc.inline_shapes) == 3 
+    def test_document_relative_lookup(self, image_dir, tmp_path_factory):
+        """测试图片按Markdown文件目录和额外搜索目录解析，与当前工作目录无关"""
+        assets = tmp_path_factory.mktemp('assets')
+        Image.new('RGB', (8, 8)).save(assets / 'shared.png')
+        resolver = ImageResolver(base_dir=str(image_dir), search_paths=[str(assets)])
+        converter = BaseConverter(image_resolver=resolver)
+
+        doc = converter.convert("![a](test.png)\n\n![b](shared.png)\n\n![c](missing.png)")
+        assert len(doc.inline_shapes) == 2
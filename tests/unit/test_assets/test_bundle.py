@@ -0,0 +1,98 @@
+"""
+测试Markdown压缩包输入
+"""
+import hashlib
+import io
+import zipfile
+import pytest
+from unittest.mock import patch
+from PIL import Image
+
+from src.converter import BaseConverter
+from src.converter.assets import MarkdownBundle, BundleError
+
+
+def make_png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (6, 6), (200, 0, 0)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_select_entry():
+    """测试自动选择入口文件"""
+    assert MarkdownBundle(make_zip({'docs/guide.md': '# a'})).entry == 'docs/guide.md'
+    bundle = MarkdownBundle(make_zip({'a.md': '', 'README.md': '', 'sub/index.md': ''}))
+    assert bundle.entry == 'README.md'
+
+    with pytest.raises(BundleError):
+        MarkdownBundle(make_zip({'a.md': '', 'b.md': ''}))
+    with pytest.raises(BundleError):
+        MarkdownBundle(make_zip({'img.png': b''}))
+    with pytest.raises(BundleError):
+        MarkdownBundle(b'not a zip')
+
+    assert MarkdownBundle(make_zip({'a.md': '', 'b.md': ''}), entry='b.md').entry == 'b.md'
+
+
+def test_resolver_relative_to_entry():
+    """测试图片相对入口文件目录解析，且不能越出压缩包"""
+    bundle = MarkdownBundle(make_zip({
+        'docs/guide.md': '',
+        'docs/img/a.png': b'a',
+        'assets/b.png': b'b',
+    }))
+    resolver = bundle.resolver()
+
+    assert resolver.resolve('img/a.png') == 'docs/img/a.png'
+    assert resolver.resolve('./img/../img/a.png') == 'docs/img/a.png'
+    assert resolver.resolve('../assets/b.png') == 'assets/b.png'
+    assert resolver.resolve('../../etc/passwd') is None
+    assert resolver.resolve('/etc/passwd') is None
+    assert resolver.resolve('missing.png') is None
+    assert resolver.read('docs/img/a.png') == b'a'
+
+
+def test_only_referenced_members_are_read():
+    """测试只解压被引用的图片"""
+    png = make_png()
+    data = make_zip({
+        'doc.md': '![a](used.png)',
+        'used.png': png,
+        'unused1.png': png,
+        'unused2.png': png,
+    })
+    bundle = MarkdownBundle(data)
+
+    with patch.object(bundle._zip, 'open', wraps=bundle._zip.open) as mock_open:
+        doc = BaseConverter(image_resolver=bundle.resolver()).convert(bundle.read_markdown())
+
+    opened = {call.args[0].filename for call in mock_open.call_args_list}
+    assert opened == {'doc.md', 'used.png'}
+    assert len(doc.inline_shapes) == 1
+
+
+def test_cache_key_uses_content_digest():
+    """测试缓存键和验证标识由解压后内容的sha256决定，与zip头部的CRC无关"""
+    first = MarkdownBundle(make_zip({'a.md': '', 'img.png': b'one'})).resolver()
+    second = MarkdownBundle(make_zip({'a.md': '', 'img.png': b'two'})).resolver()
+    digest = hashlib.sha256(b'one').hexdigest()
+    assert first.cache_key('img.png') == f"zip:sha256:{digest}"
+    assert first.validator('img.png') == f'"{digest}"'
+    assert first.cache_key('img.png') != second.cache_key('img.png')
+    same = MarkdownBundle(make_zip({'b.md': '', 'x/other.png': b'one'})).resolver()
+    assert same.cache_key('x/other.png') == first.cache_key('img.png')
+
+
+def test_member_size_limit():
+    """测试解压大小限制"""
+    bundle = MarkdownBundle(make_zip({'a.md': '', 'big.png': b'x' * 2000}), max_member_bytes=1000)
+    with pytest.raises(BundleError):
+        bundle.read('big.png')
@@ -0,0 +1,173 @@
+"""
+测试图片共享缓存
+"""
+import os
+import stat
+import tempfile
+import time
+import pytest
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+from docx import Document
+from PIL import Image
+
+from src.converter.assets import ImageCache, CachedImage, add_picture, sniff_image_meta
+from src.converter.assets.cache import MemoryLRU, default_cache_dir
+from src.converter.elements.image import ImageConverter
+
+
+def make_png(width=4, height=3, color=(255, 0, 0)):
+    """生成测试用PNG图片"""
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_item(key, size):
+    data = b'x' * size
+    return CachedImage(key, data, sniff_image_meta(data))
+
+
+def test_memory_lru_byte_budget():
+    """测试内存层按字节预算淘汰最久未使用的条目"""
+    lru = MemoryLRU(max_bytes=100)
+    lru.put(make_item('a', 40))
+    lru.put(make_item('b', 40))
+    lru.get('a')  # a 变为最近使用
+    lru.put(make_item('c', 40))
+
+    assert 'a' in lru
+    assert 'b' not in lru
+    assert 'c' in lru
+    assert lru.current_bytes == 80
+
+    # 超过整个预算的条目不进入内存层
+    lru.put(make_item('big', 200))
+    assert 'big' not in lru
+
+
+def test_sniff_image_meta():
+    """测试元数据解析"""
+    meta = sniff_image_meta(make_png(8, 6))
+    assert meta.recognized
+    assert meta.content_type == 'image/png'
+    assert (meta.px_width, meta.px_height) == (8, 6)
+
+    unknown = sniff_image_meta(b'not an image')
+    assert not unknown.recognized
+    assert unknown.size == 12
+
+
+def test_disk_tier_shared_between_instances(tmp_path):
+    """测试磁盘层在不同缓存实例（模拟不同工作进程）之间共享"""
+    data = make_png()
+    first = ImageCache(disk_dir=str(tmp_path))
+    first.put('http://example.com/a.png', data, etag='"v1"')
+
+    second = ImageCache(disk_dir=str(tmp_path))
+    item = second.get('http://example.com/a.png')
+    assert item is not None
+    assert item.data == data
+    assert item.meta.etag == '"v1"'
+    assert item.meta.px_width == 4
+
+    # 相同内容只存一份
+    second.put('http://example.com/copy.png', data)
+    objects = [p for p in (tmp_path / 'objects').rglob('*') if p.is_file()]
+    assert len(objects) == 1
+
+
+def test_disk_tier_eviction(tmp_path):
+    """测试磁盘层超出预算后淘汰最旧的对象"""
+    cache = ImageCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=250)
+    for i in range(5):
+        cache.put(f'img{i}', bytes([i]) * 100)
+        time.sleep(0.01)
+
+    assert cache.disk.current_bytes <= 250
+    assert cache.get('img0') is None
+    assert cache.get('img4') is not None
+
+
+def test_disk_eviction_prunes_index(tmp_path):
+    """测试淘汰对象时一并删除指向它们的索引，索引数量不会无限增长"""
+    cache = ImageCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=500)
+    for i in range(200):
+        cache.put(f'img{i}', i.to_bytes(2, 'big') * 50)
+
+    objects = sum(len(files) for _, _, files in os.walk(tmp_path / 'objects'))
+    assert objects <= 5
+    assert len(os.listdir(tmp_path / 'index')) == objects
+    assert cache.get('img199') is not None
+
+
+def test_private_cache_dir(tmp_path, monkeypatch):
+    """测试默认缓存目录按用户区分，磁盘层目录只允许当前用户访问"""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'xdg'))
+    assert default_cache_dir('images') == str(tmp_path / 'xdg' / 'md2docx' / 'images')
+    monkeypatch.delenv('XDG_CACHE_HOME')
+    assert default_cache_dir('images') == os.path.join(
+        tempfile.gettempdir(), f'md2docx-cache-{os.getuid()}', 'images')
+
+    root = tmp_path / 'cache' / 'images'
+    ImageCache(disk_dir=str(root))
+    assert stat.S_IMODE(root.stat().st_mode) == 0o700
+
+    shared = tmp_path / 'shared'
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        ImageCache(disk_dir=str(shared))
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid') or os.getuid() != 0, reason="需要root权限修改属主")
+def test_cache_dir_owned_by_other_user(tmp_path):
+    """测试拒绝使用其他用户创建的缓存目录"""
+    planted = tmp_path / 'planted'
+    planted.mkdir(mode=0o700)
+    os.chown(planted, 65534, 65534)
+    with pytest.raises(PermissionError):
+        ImageCache(disk_dir=str(planted))
+    # 上级目录由其他用户创建时，其中的目录可能被替换
+    with pytest.raises(PermissionError):
+        ImageCache(disk_dir=str(planted / 'images'))
+
+
+@patch('src.converter.assets.http.HttpClient.download')
+def test_remote_revalidation(mock_get):
+    """测试过期条目使用ETag重新验证"""
+    cache = ImageCache(disk_dir=None, ttl=0)
+    converter = ImageConverter(MagicMock(debug=False), image_cache=cache)
+
+    data = make_png()
+    first = MagicMock(status_code=200, headers={'ETag': '"abc"'})
+    not_modified = MagicMock(status_code=304, headers={})
+    mock_get.side_effect = [(first, data), (not_modified, None)]
+
+    url = 'http://example.com/logo.png'
+    assert converter._load_image(url).data == data
+    assert converter._load_image(url).data == data
+
+    _, kwargs = mock_get.call_args
+    assert kwargs['headers'] == {'If-None-Match': '"abc"'}
+
+
+def test_add_picture_reuses_image_part():
+    """测试相同图片只生成一个图片部件"""
+    document = Document()
+    data = make_png(20, 10)
+    image = CachedImage('a', data, sniff_image_meta(data))
+
+    add_picture(document.add_paragraph().add_run(), image)
+    add_picture(document.add_paragraph().add_run(), image)
+
+    assert len(document.part.package.image_parts) == 1
+    assert len(document.inline_shapes) == 2
+
+
+def test_add_picture_unrecognized_format():
+    """测试无法识别的格式交给python-docx处理"""
+    document = Document()
+    image = CachedImage('a', b'fake', sniff_image_meta(b'fake'))
+    with pytest.raises(Exception):
+        add_picture(document.add_paragraph().add_run(), image)
@@ -0,0 +1,228 @@
+"""
+测试共享HTTP客户端
+"""
+import threading
+import time
+import pytest
+from io import BytesIO
+from unittest.mock import MagicMock
+from docx import Document
+from PIL import Image
+
+from src.converter.assets import (
+    HttpClient,
+    FetchDeadline,
+    FetchDeadlineExceeded,
+    DownloadBudget,
+    DownloadRejected,
+    ImageCache
+)
+from src.converter.elements.image import ImageConverter
+
+
+def make_png():
+    buffer = BytesIO()
+    Image.new('RGB', (4, 4), (0, 0, 255)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_connection_reuse(stand_in_server):
+    """测试同一主机的多次请求复用连接"""
+    for i in range(5):
+        stand_in_server.routes[f'/img{i}.png'] = [(200, {'Content-Type': 'image/png'}, make_png())]
+
+    client = HttpClient()
+    for i in range(5):
+        assert client.get(f'{stand_in_server.url}/img{i}.png').status_code == 200
+
+    assert len(stand_in_server.requests) == 5
+    assert stand_in_server.connections == 1
+
+
+def test_retry_on_server_error(stand_in_server):
+    """测试5xx响应按退避策略重试"""
+    stand_in_server.routes['/flaky.png'] = [
+        (503, {}, b''),
+        (200, {}, make_png()),
+    ]
+    client = HttpClient(retries=2, backoff_factor=0)
+    response = client.get(f'{stand_in_server.url}/flaky.png')
+
+    assert response.status_code == 200
+    assert len(stand_in_server.requests) == 2
+
+
+def test_retries_are_bounded(stand_in_server):
+    """测试重试次数有上限"""
+    stand_in_server.routes['/down.png'] = [(500, {}, b'')]
+    client = HttpClient(retries=1, backoff_factor=0)
+    response = client.get(f'{stand_in_server.url}/down.png')
+
+    assert response.status_code == 500
+    assert len(stand_in_server.requests) == 2
+
+
+def test_retry_after_bounded_by_deadline(stand_in_server):
+    """测试 Retry-After 超出文档截止时间时不再等待重试"""
+    stand_in_server.routes['/busy.png'] = [(429, {'Retry-After': '120'}, b'')]
+    client = HttpClient(retries=2, backoff_factor=0)
+    start = time.monotonic()
+    response = client.get(f'{stand_in_server.url}/busy.png', deadline=FetchDeadline(2))
+
+    assert response.status_code == 429
+    assert len(stand_in_server.requests) == 1
+    assert time.monotonic() - start < 1
+
+
+def test_deadline():
+    """测试文档截止时间"""
+    assert FetchDeadline(None).remaining() is None
+    deadline = FetchDeadline(0)
+    assert deadline.expired
+
+    client = HttpClient()
+    with pytest.raises(FetchDeadlineExceeded):
+        client.get('http://127.0.0.1:1/never.png', deadline=deadline)
+
+
+def test_host_slot_wait_bounded_by_deadline(stand_in_server):
+    """测试等待主机并发名额的时间不超过文档截止时间"""
+    stand_in_server.routes['/slow.png'] = [(200, {'Content-Type': 'image/png'}, make_png())]
+    client = HttpClient(max_per_host=1)
+    url = f'{stand_in_server.url}/slow.png'
+    with client._host_slot(url, None):
+        start = time.monotonic()
+        with pytest.raises(FetchDeadlineExceeded):
+            client.download(url, deadline=FetchDeadline(0.2))
+        assert time.monotonic() - start < 2
+    # 名额归还后可以正常下载
+    assert client.download(url, deadline=FetchDeadline(5))[1] == make_png()
+
+
+def test_image_converter_uses_client(stand_in_server):
+    """测试图片转换器通过共享客户端获取图片并在截止时间后放弃"""
+    stand_in_server.routes['/logo.png'] = [(200, {'ETag': '"v1"'}, make_png())]
+    client = HttpClient(document_deadline=60)
+    converter = ImageConverter(MagicMock(debug=False), image_cache=ImageCache(disk_dir=None),
+                               http_client=client)
+
+    image = converter._load_image(f'{stand_in_server.url}/logo.png')
+    assert image is not None
+    assert image.meta.etag == '"v1"'
+
+    # 截止时间用完后不再发起请求
+    converter._fetch_deadline = FetchDeadline(0)
+    with pytest.raises(FetchDeadlineExceeded):
+        converter._load_image(f'{stand_in_server.url}/other.png')
+    assert len(stand_in_server.requests) == 1
+
+
+def test_reject_by_content_length(stand_in_server):
+    """测试根据Content-Length提前拒绝过大的图片"""
+    stand_in_server.routes['/huge.png'] = [(200, {'Content-Type': 'image/png'}, b'x' * 5000)]
+    client = HttpClient()
+    budget = DownloadBudget(max_image_bytes=1000, max_document_bytes=10000)
+
+    with pytest.raises(DownloadRejected):
+        client.download(f'{stand_in_server.url}/huge.png', budget=budget)
+    assert budget.used == 0
+
+
+def test_reject_non_image(stand_in_server):
+    """测试拒绝非图片类型的响应"""
+    stand_in_server.routes['/page'] = [(200, {'Content-Type': 'text/html'}, b'<html></html>')]
+    with pytest.raises(DownloadRejected):
+        HttpClient().download(f'{stand_in_server.url}/page')
+
+
+def test_document_budget(stand_in_server):
+    """测试单个文档的下载总量受限"""
+    png = make_png()
+    stand_in_server.routes['/a.png'] = [(200, {'Content-Type': 'image/png'}, png)]
+    stand_in_server.routes['/b.png'] = [(200, {'Content-Type': 'image/png'}, png)]
+    client = HttpClient()
+    budget = DownloadBudget(max_image_bytes=len(png), max_document_bytes=len(png) + 10)
+
+    _, body = client.download(f'{stand_in_server.url}/a.png', budget=budget)
+    assert body == png
+    with pytest.raises(DownloadRejected):
+        client.download(f'{stand_in_server.url}/b.png', budget=budget)
+
+
+def test_document_budget_concurrent():
+    """测试并发下载的总字节数同样不超过文档上限"""
+    client = HttpClient(chunk_size=10, max_per_host=4)
+    barrier = threading.Barrier(4)
+
+    def respond(*args, **kwargs):
+        def chunks():
+            barrier.wait(5)
+            for _ in range(8):
+                yield b'x' * 10
+        response = MagicMock(status_code=200, headers={'Content-Type': 'image/png'})
+        response.iter_content.return_value = chunks()
+        return response
+
+    client.session.get = MagicMock(side_effect=respond)
+    budget = DownloadBudget(max_image_bytes=100, max_document_bytes=200)
+    results = []
+
+    def download(i):
+        try:
+            results.append(len(client.download(f'http://example.com/{i}.png', budget=budget)[1]))
+        except DownloadRejected:
+            results.append(None)
+
+    threads = [threading.Thread(target=download, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 每块数据先预留预算，被拒绝的下载归还已预留的字节数
+    downloaded = [size for size in results if size is not None]
+    assert len(results) == 4 and len(downloaded) <= 2
+    assert budget.used == sum(downloaded) <= 200
+
+
+def test_stream_limit_without_content_length():
+    """测试没有Content-Length时按块读取并在超限时中止"""
+    client = HttpClient(chunk_size=10)
+    response = MagicMock(status_code=200, headers={'Content-Type': 'image/png'})
+    response.iter_content.return_value = iter([b'x' * 10] * 100)
+    client.session.get = MagicMock(return_value=response)
+
+    with pytest.raises(DownloadRejected):
+        client.download('http://example.com/a.png', budget=DownloadBudget(50, 1000))
+    response.close.assert_called_once()
+
+
+def test_placeholder_for_rejected_image(stand_in_server):
+    """测试被拒绝的图片以占位文本代替"""
+    stand_in_server.routes['/huge.png'] = [(200, {'Content-Type': 'image/png'}, b'x' * 5000)]
+    client = HttpClient(max_image_bytes=1000)
+    converter = ImageConverter(MagicMock(debug=False), image_cache=ImageCache(disk_dir=None),
+                               http_client=client)
+    converter.set_document(Document())
+
+    token = MagicMock()
+    token.attrs = {'src': f'{stand_in_server.url}/huge.png'}
+    token.content = '架构图|300x200'
+    converter.convert((token, token))
+
+    assert converter.document.paragraphs[0].text == '[图片未嵌入: 架构图]'
+
+
+def test_placeholder_after_deadline():
+    """测试超出文档截止时间的图片以占位文本代替"""
+    converter = ImageConverter(MagicMock(debug=False), image_cache=ImageCache(disk_dir=None),
+                               http_client=HttpClient())
+    converter.set_document(Document())
+    converter._fetch_deadline = FetchDeadline(0)
+    converter._download_budget = DownloadBudget(1000, 1000)
+
+    token = MagicMock()
+    token.attrs = {'src': 'http://127.0.0.1:1/late.png'}
+    token.content = '流程图'
+    converter.convert((token, token))
+
+    assert converter.document.paragraphs[0].text == '[图片未嵌入: 流程图]'
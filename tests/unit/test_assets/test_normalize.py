@@ -0,0 +1,120 @@
+"""
+测试图片格式识别与转换
+"""
+from io import BytesIO
+from unittest.mock import MagicMock, patch
+import pytest
+from docx import Document
+from PIL import Image
+
+from src.converter.assets import (
+    ImageCache,
+    ImageNormalizer,
+    ImageResolver,
+    UnsupportedImageFormat,
+    CachedImage,
+    detect_format,
+    sniff_image_meta
+)
+from src.converter.elements.image import ImageConverter
+
+SVG = b'<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10"></svg>'
+
+
+def encode(img, fmt, **options):
+    buffer = BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def make_cached(data):
+    return CachedImage('src', data, sniff_image_meta(data))
+
+
+def test_detect_format():
+    """测试根据文件头识别格式"""
+    img = Image.new('RGB', (4, 4))
+    assert detect_format(encode(img, 'PNG')) == 'png'
+    assert detect_format(encode(img, 'JPEG')) == 'jpeg'
+    assert detect_format(encode(img, 'WEBP')) == 'webp'
+    assert detect_format(encode(img, 'ICO')) == 'ico'
+    assert detect_format(SVG) == 'svg'
+    assert detect_format(b'<svg xmlns="http://www.w3.org/2000/svg"/>') == 'svg'
+    assert detect_format(b'<html></html>') is None
+
+
+def test_webp_transcoded():
+    """测试WebP按是否透明转换为JPEG或PNG"""
+    normalizer = ImageNormalizer(image_cache=ImageCache(disk_dir=None))
+
+    opaque = make_cached(encode(Image.new('RGB', (8, 6), (255, 0, 0)), 'WEBP'))
+    assert not opaque.meta.recognized
+    result = normalizer.normalize(opaque)
+    assert result.meta.content_type == 'image/jpeg'
+    assert (result.meta.px_width, result.meta.px_height) == (8, 6)
+
+    transparent = make_cached(encode(Image.new('RGBA', (8, 6), (255, 0, 0, 128)), 'WEBP'))
+    assert normalizer.normalize(transparent).meta.content_type == 'image/png'
+
+
+def test_transcoded_once():
+    """测试相同内容的图片只转换一次"""
+    cache = ImageCache(disk_dir=None)
+    normalizer = ImageNormalizer(image_cache=cache)
+    data = encode(Image.new('RGB', (8, 8)), 'WEBP')
+
+    with patch.object(normalizer, '_encode', wraps=normalizer._encode) as mock_encode:
+        first = normalizer.normalize(CachedImage('a.webp', data, sniff_image_meta(data)))
+        second = normalizer.normalize(CachedImage('b.webp', data, sniff_image_meta(data)))
+
+    assert mock_encode.call_count == 1
+    assert first.data == second.data
+
+
+def test_recognized_image_unchanged():
+    """测试可以直接嵌入的图片原样返回"""
+    image = make_cached(encode(Image.new('RGB', (4, 4)), 'PNG'))
+    assert ImageNormalizer(image_cache=ImageCache(disk_dir=None)).normalize(image) is image
+
+
+def test_svg_rasterizer():
+    """测试SVG通过可替换的栅格化函数转换，显示大小与原图一致"""
+    png = encode(Image.new('RGBA', (20, 20)), 'PNG')
+    rasterizer = MagicMock(return_value=png)
+    normalizer = ImageNormalizer(image_cache=ImageCache(disk_dir=None),
+                                 svg_rasterizer=rasterizer, svg_scale=2.0)
+
+    result = normalizer.normalize(make_cached(SVG))
+
+    rasterizer.assert_called_once_with(SVG, 2.0)
+    assert result.meta.content_type == 'image/png'
+    assert result.meta.horz_dpi == 192
+
+
+def test_unsupported_format():
+    """测试无法转换的格式"""
+    normalizer = ImageNormalizer(image_cache=ImageCache(disk_dir=None))
+    normalizer.svg_rasterizer = None
+    with pytest.raises(UnsupportedImageFormat):
+        normalizer.normalize(make_cached(SVG))
+    with pytest.raises(UnsupportedImageFormat):
+        normalizer.normalize(make_cached(b'not an image'))
+
+
+def test_converter_embeds_webp(tmp_path):
+    """测试图片转换器嵌入WebP，无法转换时插入占位文本"""
+    (tmp_path / 'photo.webp').write_bytes(encode(Image.new('RGB', (8, 8)), 'WEBP'))
+    (tmp_path / 'broken.webp').write_bytes(b'RIFF\x00\x00\x00\x00WEBPVP8 broken')
+
+    converter = ImageConverter(MagicMock(debug=False), image_cache=ImageCache(disk_dir=None),
+                               resolver=ImageResolver(base_dir=str(tmp_path)))
+    converter.set_document(Document())
+
+    for src in ('photo.webp', 'broken.webp'):
+        token = MagicMock()
+        token.attrs = {'src': src}
+        token.content = src
+        converter.convert((token, token))
+
+    assert len(converter.document.inline_shapes) == 1
+    assert converter.document.paragraphs[1].text == '[图片未嵌入: broken.webp]'
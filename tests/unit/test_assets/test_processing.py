@@ -0,0 +1,74 @@
+"""
+测试图片缩放与重新编码
+"""
+from io import BytesIO
+from docx import Document
+from docx.shared import Pt, Inches
+from PIL import Image
+
+from src.converter.assets import ImageCache, ImageOptimizer, CachedImage, sniff_image_meta, add_picture
+
+
+def make_image(width, height, fmt='PNG', dpi=(72, 72)):
+    """生成带噪点的测试图片，使压缩结果与尺寸相关"""
+    img = Image.effect_noise((width, height), 64).convert('RGB')
+    buffer = BytesIO()
+    img.save(buffer, format=fmt, dpi=dpi)
+    data = buffer.getvalue()
+    return CachedImage('src', data, sniff_image_meta(data))
+
+
+def test_downscale_to_display_width():
+    """测试按指定显示宽度缩小"""
+    optimizer = ImageOptimizer(dpi=144, image_cache=ImageCache(disk_dir=None))
+    image = make_image(2000, 1000)
+
+    result = optimizer.optimize(image, width=Pt(100))
+
+    # 100pt = 1.389英寸，144DPI 下约200像素宽，高度按比例
+    assert result.meta.px_width == 200
+    assert result.meta.px_height == 100
+    assert result.meta.size < image.meta.size
+
+
+def test_native_size_preserved():
+    """测试未指定尺寸时显示大小保持不变"""
+    optimizer = ImageOptimizer(dpi=96, image_cache=ImageCache(disk_dir=None))
+    image = make_image(1200, 600, dpi=(300, 300))
+
+    result = optimizer.optimize(image)
+
+    document = Document()
+    shape = add_picture(document.add_paragraph().add_run(), result)
+    assert result.meta.px_width == 384
+    assert abs(shape.width - Inches(4)) < Inches(0.01)
+
+
+def test_small_image_untouched():
+    """测试已经足够小的图片保持原样"""
+    optimizer = ImageOptimizer(dpi=150, image_cache=ImageCache(disk_dir=None))
+    image = make_image(100, 100)
+
+    assert optimizer.optimize(image, width=Pt(100)) is image
+
+
+def test_jpeg_metadata_stripped_and_cached():
+    """测试JPEG去除元数据并按源哈希和目标尺寸缓存"""
+    cache = ImageCache(disk_dir=None)
+    optimizer = ImageOptimizer(dpi=72, image_cache=cache)
+    img = Image.effect_noise((800, 800), 64).convert('RGB')
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera Maker'
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', exif=exif.tobytes())
+    data = buffer.getvalue()
+    image = CachedImage('src', data, sniff_image_meta(data))
+
+    first = optimizer.optimize(image, width=Pt(200), height=Pt(200))
+    second = optimizer.optimize(image, width=Pt(200), height=Pt(200))
+
+    assert first.meta.content_type == 'image/jpeg'
+    assert first.meta.px_width == 200
+    assert not Image.open(BytesIO(first.data)).getexif()
+    assert second.data == first.data
+    assert cache.hits == 1
@@ -0,0 +1,61 @@
+"""
+测试本地图片路径解析
+"""
+import os
+import mmap
+from unittest.mock import patch
+
+from src.converter.assets import ImageResolver, StatCache
+
+
+def test_resolve_order(tmp_path):
+    """测试先查找文档目录，再查找额外搜索目录"""
+    doc_dir = tmp_path / 'doc'
+    assets = tmp_path / 'assets'
+    doc_dir.mkdir()
+    assets.mkdir()
+    (doc_dir / 'a.png').write_bytes(b'doc')
+    (assets / 'a.png').write_bytes(b'assets')
+    (assets / 'b.png').write_bytes(b'b')
+
+    resolver = ImageResolver(base_dir=str(doc_dir), search_paths=[str(assets)])
+
+    assert resolver.resolve('a.png') == str(doc_dir / 'a.png')
+    assert resolver.resolve('b.png') == str(assets / 'b.png')
+    assert resolver.resolve('./img/../b.png') == str(assets / 'b.png')
+    assert resolver.resolve('missing.png') is None
+
+
+def test_resolve_escaped_and_file_url(tmp_path):
+    """测试URL转义和file://地址"""
+    (tmp_path / 'my image.png').write_bytes(b'x')
+    resolver = ImageResolver(base_dir=str(tmp_path))
+
+    assert resolver.resolve('my%20image.png') == str(tmp_path / 'my image.png')
+    assert resolver.resolve(f'file://{tmp_path}/my%20image.png') == str(tmp_path / 'my image.png')
+
+
+def test_stat_cache_shared_across_documents(tmp_path):
+    """测试同一批次内每个路径只访问一次文件系统，包括不存在的路径"""
+    (tmp_path / 'logo.png').write_bytes(b'x')
+    stat_cache = StatCache()
+
+    with patch('src.converter.assets.resolver.os.stat', wraps=os.stat) as mock_stat:
+        for _ in range(3):
+            resolver = ImageResolver(base_dir=str(tmp_path), stat_cache=stat_cache)
+            resolver.resolve('logo.png')
+            resolver.validator(str(tmp_path / 'logo.png'))
+            resolver.resolve('missing.png')
+
+    assert mock_stat.call_count == 2
+
+
+def test_read_large_file_with_mmap(tmp_path):
+    """测试大文件通过内存映射读取"""
+    data = os.urandom(4096)
+    (tmp_path / 'big.bin').write_bytes(data)
+    resolver = ImageResolver(base_dir=str(tmp_path), mmap_threshold=1024)
+
+    with patch('src.converter.assets.resolver.mmap.mmap', wraps=mmap.mmap) as mock_mmap:
+        assert resolver.read(str(tmp_path / 'big.bin')) == data
+    mock_mmap.assert_called_once()
@@ -0,0 +1,117 @@
+"""
+测试磁盘图片部件
+"""
+import gc
+import hashlib
+import os
+import zipfile
+import tracemalloc
+from io import BytesIO
+from docx import Document
+from PIL import Image
+
+from src.converter.assets import (
+    ImageCache,
+    CachedImage,
+    SharedOutput,
+    SpooledImagePart,
+    add_picture,
+    save_document,
+    serialize_document,
+    sniff_image_meta
+)
+
+
+def make_image(size, seed=0):
+    """生成指定边长、难以压缩的PNG图片"""
+    img = Image.frombytes('RGB', (size, size), os.urandom(size * size * 3))
+    buffer = BytesIO()
+    img.save(buffer, format='PNG', compress_level=0)
+    data = buffer.getvalue()
+    return CachedImage(f'img{seed}', data, sniff_image_meta(data))
+
+
+def image_parts(doc):
+    return list(doc.part.package.image_parts)
+
+
+def test_large_image_spooled(tmp_path):
+    """测试较大的图片以磁盘文件保存，保存后内容一致"""
+    doc = Document()
+    large = make_image(100)
+    small = make_image(8, seed=1)
+    add_picture(doc.add_paragraph().add_run(), large, spool_threshold=1024)
+    add_picture(doc.add_paragraph().add_run(), small, spool_threshold=1024)
+
+    parts = image_parts(doc)
+    assert isinstance(parts[0], SpooledImagePart)
+    assert parts[0]._blob == b''
+    assert parts[0].image.blob == b''
+    assert not isinstance(parts[1], SpooledImagePart)
+
+    output = tmp_path / 'out.docx'
+    save_document(doc, str(output))
+    with zipfile.ZipFile(output) as zf:
+        assert zf.read('word/media/image1.png') == large.data
+        assert zf.getinfo('word/media/image1.png').compress_type == zipfile.ZIP_STORED
+    assert len(Document(str(output)).inline_shapes) == 2
+
+    # python-docx 原生的保存流程同样可用
+    buffer = BytesIO()
+    doc.save(buffer)
+    with zipfile.ZipFile(buffer) as zf:
+        assert zf.read('word/media/image1.png') == large.data
+
+
+def test_link_cache_file_and_cleanup(tmp_path):
+    """测试直接链接磁盘缓存中的文件，文档回收后删除临时目录"""
+    cache = ImageCache(disk_dir=str(tmp_path / 'cache'))
+    image = cache.put('big.png', make_image(100).data)
+    source = cache.object_file(image)
+    assert source is not None
+
+    doc = Document()
+    add_picture(doc.add_paragraph().add_run(), image, source_path=source, spool_threshold=1024)
+    part = image_parts(doc)[0]
+    assert os.path.samefile(part.path, source)
+
+    spool_dir = os.path.dirname(part.path)
+    del doc, part
+    gc.collect()
+    assert not os.path.exists(spool_dir)
+
+
+def test_save_memory_independent_of_image_total(tmp_path):
+    """测试保存时的内存峰值不随图片总大小增长"""
+    doc = Document()
+    images = [make_image(600, seed=i) for i in range(10)]
+    for image in images:
+        add_picture(doc.add_paragraph().add_run(), image, spool_threshold=1024)
+    total = sum(image.meta.size for image in images)
+    del images
+    gc.collect()
+
+    tracemalloc.start()
+    try:
+        save_document(doc, str(tmp_path / 'out.docx'))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak < total / 4
+
+
+def test_shared_output_readers():
+    """测试超过内存上限的输出转存到文件，多个读取器各自从头读取"""
+    doc = Document()
+    add_picture(doc.add_paragraph().add_run(), make_image(200), spool_threshold=1024)
+    buffer, size = serialize_document(doc, max_memory=1024)
+    expected = buffer.read()
+    output = SharedOutput(buffer, size)
+
+    first, second = output.open(), output.open()
+    head = first.read(100)
+    assert second.read() == expected and len(expected) == size
+    assert head + first.read() == expected
+    assert output.digest == hashlib.sha256(expected).hexdigest()
+    zipfile.ZipFile(output.open()).testzip()
@@ -0,0 +1,59 @@
+"""
+测试以原生SVG嵌入矢量图
+"""
+import zipfile
+from io import BytesIO
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+
+from src.converter.assets import (
+    ImageCache,
+    add_svg_picture,
+    save_document,
+    svg_fallback_png,
+    svg_size
+)
+
+SVG = (b'<svg xmlns="http://www.w3.org/2000/svg" width="100%" viewBox="-8 -8 300 150" '
+       b'style="max-width: 300px;"><circle cx="100" cy="50" r="40"/></svg>')
+
+
+def test_svg_size():
+    """测试从width/height属性或viewBox读取SVG尺寸"""
+    assert svg_size(SVG) == (300, 150)
+    assert svg_size(b'<svg xmlns="http://www.w3.org/2000/svg" width="40px" height="20"/>') == (40, 20)
+    assert svg_size(b'<svg xmlns="http://www.w3.org/2000/svg"/>') is None
+    assert svg_size(b'not xml') is None
+
+
+def test_fallback_png_width():
+    """测试后备PNG按指定宽度生成并保持宽高比"""
+    png = svg_fallback_png(SVG, 120, rasterizer=lambda data, scale: b'raster')
+    assert png == b'raster'
+    with Image.open(BytesIO(svg_fallback_png(SVG, 120, rasterizer=None))) as img:
+        assert img.size == (120, 60)
+
+
+def test_add_svg_picture(tmp_path):
+    """测试SVG部件与后备PNG一起写入文档，相同的SVG只保存一次"""
+    cache = ImageCache(disk_dir=None)
+    svg = cache.put('svg', SVG)
+    fallback = cache.put('fallback', svg_fallback_png(SVG, 60))
+    document = Document()
+    for _ in range(2):
+        add_svg_picture(document.add_paragraph().add_run(), svg, fallback, width=Inches(2))
+
+    shapes = document.inline_shapes
+    assert shapes[0].width == Inches(2) and shapes[0].height == Inches(1)
+
+    target = tmp_path / 'svg.docx'
+    save_document(document, str(target))
+    with zipfile.ZipFile(target) as zf:
+        media = sorted(name for name in zf.namelist() if name.startswith('word/media/'))
+        assert media == ['word/media/image1.png', 'word/media/image2.svg']
+        assert zf.read('word/media/image2.svg') == SVG
+        assert b'image/svg+xml' in zf.read('[Content_Types].xml')
+        body = zf.read('word/document.xml')
+        assert body.count(b'svgBlip') == 2
+    Document(str(target))
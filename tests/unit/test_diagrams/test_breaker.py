@@ -0,0 +1,67 @@
+"""
+测试渲染器熔断器和失败缓存
+"""
+from src.converter.diagrams import CircuitBreaker, FailureCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_trips_and_recovers():
+    """测试连续失败后断开，冷却后只放行一次探测，探测成功后恢复"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # 探测结果报告之前不再放行
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['trips'] == 1
+
+
+def test_failed_probe_reopens():
+    """测试探测失败后重新断开并重新计时"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 10
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 15
+    assert not breaker.allow()
+    assert breaker.stats()['trips'] == 2
+
+
+def test_failure_cache_expires():
+    """测试失败记录在有效期后失效，超出条数时淘汰最早的记录"""
+    clock = FakeClock()
+    failures = FailureCache(ttl=5, max_entries=2, clock=clock)
+    failures.add('a')
+    failures.add('b')
+    failures.add('c')
+    assert 'a' not in failures
+    assert 'b' in failures and 'c' in failures
+
+    clock.now = 5
+    assert 'b' not in failures
+    assert len(failures) == 1
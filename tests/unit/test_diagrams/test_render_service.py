@@ -0,0 +1,112 @@
+"""
+测试常驻Mermaid渲染服务
+"""
+import os
+import signal
+from unittest.mock import MagicMock
+import pytest
+from docx import Document
+
+from src.converter.assets import ImageCache, sniff_image_meta
+from src.converter.diagrams import (
+    DEFAULT_CONFIG,
+    RenderService,
+    ServiceRenderer,
+    ServiceUnavailable
+)
+from src.converter.diagrams.service import default_address, stub_service_command
+from src.converter.elements import MermaidConverter
+
+
+@pytest.fixture
+def address(tmp_path):
+    return f"unix:{tmp_path / 'mermaid.sock'}"
+
+
+@pytest.fixture
+def service(address):
+    service = RenderService(stub_service_command(address), address, startup_timeout=10)
+    yield service
+    service.stop()
+
+
+def test_stub_service_renders(service):
+    """测试通过服务替身渲染一批图表，出错的图表单独返回 None"""
+    assert service.ensure_running()
+    assert service.version == 'stub-1'
+
+    results = service.render(['graph TD\n  A-->B', 'error here', 'graph LR\n  C-->D'], DEFAULT_CONFIG)
+
+    assert results[1] is None
+    for data in (results[0], results[2]):
+        assert sniff_image_meta(data).content_type == 'image/png'
+    assert service.render(['graph TD'], DEFAULT_CONFIG, 'svg')[0].startswith(b'<svg')
+
+
+def test_restart_when_unhealthy(service):
+    """测试服务进程退出后重新启动"""
+    assert service.ensure_running()
+    os.kill(service._process.pid, signal.SIGKILL)
+    service._process.wait()
+    assert not service.healthy()
+
+    assert service.ensure_running()
+    assert service.restarts == 2
+    assert service.render(['graph TD'], DEFAULT_CONFIG)[0] is not None
+
+
+def test_shared_address_started_once(service, address):
+    """测试多个进程使用同一个地址时只启动一个服务，停止后删除套接字文件"""
+    assert service.ensure_running()
+    other = RenderService(stub_service_command(address), address, startup_timeout=10)
+    assert other.ensure_running()
+    assert other.restarts == 0
+    other.stop()
+    assert service.healthy()
+
+    socket_path = address[len('unix:'):]
+    service.stop()
+    assert not os.path.exists(socket_path)
+
+
+def test_default_address_per_process():
+    """测试默认套接字地址按进程区分"""
+    assert str(os.getpid()) in default_address()
+
+
+def test_unavailable_service(address):
+    """测试服务不可用时抛出 ServiceUnavailable"""
+    service = RenderService(['false'], address, startup_timeout=1)
+    assert not service.ensure_running()
+    with pytest.raises(ServiceUnavailable):
+        service.render(['graph TD'], DEFAULT_CONFIG)
+
+
+def test_fallback_to_mmdc(address):
+    """测试服务不可用时退回到mmdc，并在后台重新启动服务"""
+    service = RenderService(['false'], address, startup_timeout=1)
+    service.restart_async = MagicMock()
+    fallback = MagicMock(version='mmdc-1')
+    fallback.render_batch.return_value = [b'png']
+    renderer = ServiceRenderer(service, fallback=fallback)
+
+    assert renderer.render_batch(['graph TD'], DEFAULT_CONFIG) == [b'png']
+    fallback.render_batch.assert_called_once()
+    service.restart_async.assert_called_once()
+    assert renderer.version == 'mmdc-1'
+
+
+def test_converter_uses_service(service):
+    """测试Mermaid转换器通过预热的服务渲染"""
+    renderer = ServiceRenderer(service, fallback=MagicMock())
+    assert renderer.prewarm()
+
+    converter = MermaidConverter(MagicMock(debug=False), cache=ImageCache(disk_dir=None),
+                                 renderer=renderer)
+    converter.set_document(Document())
+    token = MagicMock()
+    token.content = 'graph TD\n  A-->B'
+
+    assert converter.convert(token) is not None
+    assert len(converter.document.inline_shapes) == 1
+    renderer.fallback.render_batch.assert_not_called()
@@ -12,6 +12,7 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 
 from markdown_it import MarkdownIt
 from src.converter.elements.image import ImageConverter
+from src.converter.assets import CachedImage, ImageResolver, sniff_image_meta
 
 
 class TestImageConverter:
@@ -35,7 +36,7 @@ class TestImageConverter:
     def test_init(self, image_converter):
         """测试初始化"""
         assert image_converter.document is not None
-        assert image_converter._image_cache == {}
+        assert len(image_converter.image_cache.memory) == 0
 
     def test_parse_size(self, image_converter):
         """测试尺寸解析"""
@@ -50,14 +51,14 @@ class TestImageConverter:
         assert image_converter._parse_size("图片|axb") == (None, None)
         assert image_converter._parse_size("图片|100x") == (None, None)
 
-    @patch('src.converter.elements.image.requests.get')
+    @patch('src.converter.assets.http.HttpClient.download')
     def test_get_image_data_online(self, mock_get, image_converter):
         """测试获取在线图片数据"""
         # 模拟请求响应
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.content = b'fake_image_data'
-        mock_get.return_value = mock_response
+        mock_response.headers = {}
+        mock_get.return_value = (mock_response, b'fake_image_data')
         
         # 测试获取在线图片
         url = 'http://example.com/image.png'
@@ -68,8 +69,8 @@ class TestImageConverter:
         assert result.getvalue() == b'fake_image_data'
         
         # 验证缓存
-        assert url in image_converter._image_cache
-        assert image_converter._image_cache[url] == b'fake_image_data'
+        assert url in image_converter.image_cache.memory
+        assert image_converter.image_cache.get(url).data == b'fake_image_data'
         
         # 再次获取应该使用缓存
         mock_get.reset_mock()
@@ -78,29 +79,23 @@ class TestImageConverter:
         assert result2.getvalue() == b'fake_image_data'
         mock_get.assert_not_called()
 
-    @patch('src.converter.elements.image.os.path.exists')
-    @patch('builtins.open')
-    def test_get_image_data_local(self, mock_open, mock_exists, image_converter):
+    def test_get_image_data_local(self, tmp_path):
         """测试获取本地图片数据"""
-        # 模拟文件存在
-        mock_exists.return_value = True
-        
-        # 模拟文件读取
-        mock_file = MagicMock()
-        mock_file.__enter__.return_value.read.return_value = b'fake_local_image'
-        mock_open.return_value = mock_file
+        (tmp_path / 'image.png').write_bytes(b'fake_local_image')
+        converter = ImageConverter(MagicMock(debug=False),
+                                   resolver=ImageResolver(base_dir=str(tmp_path)))
         
         # 测试获取本地图片
-        path = 'image.png'
-        result = image_converter._get_image_data(path)
+        result = converter._get_image_data('image.png')
         
         # 验证结果
         assert isinstance(result, BytesIO)
         assert result.getvalue() == b'fake_local_image'
         
         # 验证缓存
-        assert path in image_converter._image_cache
-        assert image_converter._image_cache[path] == b'fake_local_image'
+        key = f"file:{tmp_path / 'image.png'}"
+        assert key in converter.image_cache.memory
+        assert converter.image_cache.get(key).data == b'fake_local_image'
 
     def test_convert_in_paragraph(self, image_converter):
         """测试在段落中转换图片"""
@@ -113,8 +108,8 @@ class TestImageConverter:
         token.content = '测试图片'
         
         # 模拟获取图片数据
-        with patch.object(image_converter, '_get_image_data') as mock_get_data:
-            mock_get_data.return_value = BytesIO(b'fake_image_data')
+        with patch.object(image_converter, '_load_image') as mock_get_data:
+            mock_get_data.return_value = CachedImage('test.png', b'fake_image_data', sniff_image_meta(b'fake_image_data'))
             
             # 测试转换
             image_converter.convert_in_paragraph(paragraph, token)
@@ -134,9 +129,9 @@ class TestImageConverter:
         token.content = '测试图片|150x100'
         
         # 模拟获取图片数据和解析尺寸
-        with patch.object(image_converter, '_get_image_data') as mock_get_data, \
+        with patch.object(image_converter, '_load_image') as mock_get_data, \
              patch.object(image_converter, '_parse_size') as mock_parse_size:
-            mock_get_data.return_value = BytesIO(b'fake_image_data')
+            mock_get_data.return_value = CachedImage('test.png', b'fake_image_data', sniff_image_meta(b'fake_image_data'))
             mock_parse_size.return_value = (150, 100)
             
             # 测试转换
@@ -155,8 +150,8 @@ class TestImageConverter:
         token.content = '测试图片'
         
         # 模拟获取图片数据
-        with patch.object(image_converter, '_get_image_data') as mock_get_data:
-            mock_get_data.return_value = BytesIO(b'fake_image_data')
+        with patch.object(image_converter, '_load_image') as mock_get_data:
+            mock_get_data.return_value = CachedImage('test.png', b'fake_image_data', sniff_image_meta(b'fake_image_data'))
             
             # 测试转换
             image_converter.convert((token, token))
@@ -184,9 +179,9 @@ class TestImageConverter:
         token.content = '测试图片|200x150'
         
         # 模拟获取图片数据和解析尺寸
-        with patch.object(image_converter, '_get_image_data') as mock_get_data, \
+        with patch.object(image_converter, '_load_image') as mock_get_data, \
              patch.object(image_converter, '_parse_size') as mock_parse_size:
-            mock_get_data.return_value = BytesIO(b'fake_image_data')
+            mock_get_data.return_value = CachedImage('test.png', b'fake_image_data', sniff_image_meta(b'fake_image_data'))
             mock_parse_size.return_value = (200, 150)
             
             # 测试转换
@@ -0,0 +1,101 @@
+"""
+测试数学公式转换
+"""
+from pathlib import Path
+import pytest
+from lxml import etree
+from markdown_it import MarkdownIt
+
+from src.converter import BaseConverter
+from src.converter.formula import LatexError, latex_to_omml, math_plugin, translation_cache_info
+
+SAMPLES_DIR = Path(__file__).parent.parent.parent / 'samples' / 'advanced'
+M = 'http://schemas.openxmlformats.org/officeDocument/2006/math'
+
+
+def xpath(element, path):
+    return etree._Element.xpath(element, path, namespaces={'m': M})
+
+
+def math_tokens(md_text):
+    md = MarkdownIt('commonmark').use(math_plugin)
+    tokens = []
+    for token in md.parse(md_text):
+        tokens.append(token)
+        tokens.extend(token.children or [])
+    return [(t.type, t.content) for t in tokens if t.type.startswith('math')]
+
+
+def test_math_plugin_syntax():
+    """测试行内和块级公式的识别规则"""
+    assert math_tokens('面积 $\\pi r^2$ 和 $$x$$') == [('math_inline', '\\pi r^2'), ('math_inline', 'x')]
+    assert math_tokens('$$\na &= b \\\\\nc\n$$') == [('math_block', 'a &= b \\\\\nc')]
+    assert math_tokens('$$ x + y $$') == [('math_block', 'x + y')]
+    # 金额、空白和转义的美元符号不是公式
+    assert math_tokens('价格 $5 和 $10') == []
+    assert math_tokens('$ x $') == []
+    assert math_tokens('\\$x$') == []
+
+
+def test_omml_structures():
+    """测试常用结构转换为对应的OMML元素"""
+    fraction = latex_to_omml('\\frac{a}{b}')
+    assert xpath(fraction, 'm:f/m:num//m:t/text()') == ['a']
+
+    total = latex_to_omml('\\sum_{i=1}^n i^2 = x')
+    assert xpath(total, 'm:nary/m:naryPr/m:chr/@m:val') == ['∑']
+    assert xpath(total, 'm:nary/m:e/m:sSup')  # 运算对象到关系符为止
+    assert xpath(total, 'm:r/m:t/text()') == ['=x']
+
+    matrix = latex_to_omml('\\begin{pmatrix} 1 & 2 \\\\ 3 & 4 \\end{pmatrix}')
+    assert xpath(matrix, 'm:d/m:dPr/m:begChr/@m:val') == ['(']
+    assert len(xpath(matrix, 'm:d/m:e/m:m/m:mr')) == 2
+
+    aligned = latex_to_omml('\\begin{align} y &= x \\\\ &= z \\end{align}')
+    assert len(xpath(aligned, 'm:eqArr/m:e')) == 2
+    assert len(xpath(aligned, './/m:aln')) == 2
+
+    assert xpath(latex_to_omml('\\mathbb{R}'), './/m:scr/@m:val') == ['double-struck']
+    assert xpath(latex_to_omml('\\sqrt[3]{8}'), 'm:rad/m:deg//m:t/text()') == ['3']
+
+
+def test_invalid_latex():
+    """测试无法解析的公式抛出 LatexError"""
+    for latex in ('\\frac{1}{2', 'x^', 'a}', '\\begin{foo}x\\end{foo}'):
+        with pytest.raises(LatexError):
+            latex_to_omml(latex)
+
+
+def test_convert_math_sample():
+    """测试样例文件中的行内和块级公式转换为原生公式"""
+    md_text = (SAMPLES_DIR / 'math.md').read_text(encoding='utf-8')
+    doc = BaseConverter().convert(md_text)
+    body = doc.element.body
+
+    assert len(xpath(body, './/m:oMathPara')) == 4
+    assert len(xpath(body, './/m:oMath')) == 12
+    # 表格单元格中的公式
+    assert len(xpath(doc.tables[0]._tbl, './/m:oMath')) == 2
+    assert '$' not in ''.join(p.text for p in doc.paragraphs if p.text != '空公式：')
+    inline = next(p for p in doc.paragraphs if p.text.startswith('这是一个行内公式'))
+    assert xpath(inline._p, 'm:oMath//m:t/text()') == ['E=m', 'c', '2']
+
+
+def test_invalid_formula_kept_as_text():
+    """测试无法解析的公式按原文显示"""
+    doc = BaseConverter().convert('公式：$\\frac{1}{2$ 结束\n\n$$\n\\left( x\n$$\n')
+    assert doc.paragraphs[0].text == '公式：$\\frac{1}{2$ 结束'
+    assert doc.paragraphs[1].text == '$$\\left( x$$'
+    assert not xpath(doc.element.body, './/m:oMath')
+
+
+def test_translation_memoized():
+    """测试重复出现的公式只转换一次"""
+    before = translation_cache_info()
+    md_text = ' '.join(['$\\alpha_{memo}$', '$\\beta_{memo}$'] * 500)
+    doc = BaseConverter().convert(md_text)
+
+    after = translation_cache_info()
+    assert after.misses - before.misses == 2
+    assert after.hits - before.hits == 998
+    assert len(xpath(doc.element.body, './/m:oMath')) == 1000
@@ -0,0 +1,367 @@
+"""
+测试Mermaid图表转换器
+"""
+import sys
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import MagicMock
+import pytest
+from docx import Document
+from docx.shared import Inches
+from PIL import Image
+
+from src.converter.assets import ImageCache
+from src.converter import BaseConverter
+from src.converter.diagrams import (
+    DEFAULT_CONFIG,
+    CircuitBreaker,
+    MmdcRenderer,
+    RendererUnavailable,
+    diagram_key,
+    output_format,
+    renderer_version
+)
+from src.converter.elements import MermaidConverter
+
+
+def make_png():
+    buffer = BytesIO()
+    Image.new('RGB', (20, 10), (0, 128, 0)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_svg():
+    return (b'<svg xmlns="http://www.w3.org/2000/svg" width="100%" viewBox="0 0 192 96">'
+            b'<rect width="192" height="96" fill="#0a0"/></svg>')
+
+
+class FakeRenderer:
+    """代替mmdc的渲染器，记录每次调用的图表"""
+
+    version = 'fake-1'
+
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.batches = []
+
+    def render(self, code, config, fmt='png'):
+        return self.render_batch([code], config, fmt)[0]
+
+    def render_batch(self, codes, config, fmt='png'):
+        self.batches.append(list(codes))
+        if self.fail & set(codes):
+            # 与 mmdc 一致：任何一个图表有错误时整批失败
+            return [None] * len(codes)
+        return [make_svg() if fmt == 'svg' else make_png() for _ in codes]
+
+
+@pytest.fixture
+def mermaid():
+    converter = MermaidConverter(MagicMock(debug=False), cache=ImageCache(disk_dir=None),
+                                 renderer=FakeRenderer())
+    converter.set_document(Document())
+    return converter
+
+
+def make_token(code):
+    token = MagicMock()
+    token.content = code
+    return token
+
+
+def make_converter(renderer, cache=None, workers=1, executor=None):
+    converter = BaseConverter()
+    converter.register_converter('mermaid', MermaidConverter(
+        converter, cache=cache or ImageCache(disk_dir=None), renderer=renderer,
+        executor=executor, workers=workers))
+    return converter
+
+
+def fence(code):
+    return f"```mermaid\n{code}\n```\n"
+
+
+def test_render_cache():
+    """测试未修改的图表不再调用渲染器"""
+    cache = ImageCache(disk_dir=None)
+    renderer = FakeRenderer()
+    for _ in range(3):
+        mermaid = MermaidConverter(MagicMock(debug=False), cache=cache, renderer=renderer)
+        mermaid.set_document(Document())
+        assert mermaid.convert(make_token('graph TD\n  A-->B')) is not None
+    mermaid.convert(make_token('graph TD\n  A-->C'))
+
+    assert len(renderer.batches) == 2
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 2
+
+
+def test_render_failure_not_cached(mermaid):
+    """测试渲染失败不写入图片缓存，而是记入失败缓存，不再重复渲染"""
+    mermaid.renderer.fail = {'graph TD\n  A-->B'}
+    assert mermaid.convert(make_token('graph TD\n  A-->B')) is None
+    assert mermaid.convert(make_token('graph TD\n  A-->B')) is None
+    assert len(mermaid.renderer.batches) == 1
+    assert mermaid.cache.stats()['memory_entries'] == 0
+
+
+def test_persistent_cache(tmp_path):
+    """测试磁盘缓存在新的转换器中依然有效"""
+    renderers = [FakeRenderer(), FakeRenderer()]
+    for renderer in renderers:
+        converter = MermaidConverter(MagicMock(debug=False),
+                                     cache=ImageCache(disk_dir=str(tmp_path)), renderer=renderer)
+        converter.set_document(Document())
+        converter.convert(make_token('graph LR\n  X-->Y'))
+    assert renderers[1].batches == []
+
+
+def test_batch_render_document():
+    """测试一个文档中的全部图表通过一次渲染器调用生成，并按原位置插入"""
+    renderer = FakeRenderer()
+    md_text = '\n'.join([
+        '# 标题', fence('graph TD\n  A-->B'),
+        '第一段', fence('graph TD\n  B-->C'),
+        '第二段', fence('graph TD\n  A-->B'),
+    ])
+    doc = make_converter(renderer).convert(md_text)
+
+    assert renderer.batches == [['graph TD\n  A-->B\n', 'graph TD\n  B-->C\n']]
+    assert len(doc.inline_shapes) == 3
+    texts = [p.text for p in doc.paragraphs]
+    assert texts.index('第一段') < texts.index('第二段')
+    # 每张图片紧跟在对应代码块所在的位置
+    body = [bool(p._p.xpath('.//w:drawing')) or p.text for p in doc.paragraphs]
+    assert body == ['标题', True, '第一段', True, '第二段', True]
+
+
+def test_batch_skips_cached_diagrams():
+    """测试批量渲染只包含未缓存的图表"""
+    cache = ImageCache(disk_dir=None)
+    make_converter(FakeRenderer(), cache).convert(fence('graph TD\n  A-->B'))
+
+    renderer = FakeRenderer()
+    make_converter(renderer, cache).convert(fence('graph TD\n  A-->B') + fence('graph TD\n  C-->D'))
+    assert renderer.batches == [['graph TD\n  C-->D\n']]
+
+
+def test_batch_failure_falls_back_to_single():
+    """测试整批失败时其余图表单独渲染"""
+    renderer = FakeRenderer(fail={'graph TD\n  bad\n'})
+    md_text = fence('graph TD\n  A-->B') + fence('graph TD\n  bad') + fence('graph TD\n  C-->D')
+    doc = make_converter(renderer).convert(md_text)
+
+    assert len(renderer.batches) == 4
+    assert len(doc.inline_shapes) == 2
+
+
+def test_renderer_error_not_retried_singly():
+    """测试渲染器抛出异常时整组图表保留为代码块，不逐个重试也不记入失败缓存"""
+    renderer = FakeRenderer()
+    renderer.render_batch = MagicMock(side_effect=RendererUnavailable('timeout'))
+    converter = make_converter(renderer)
+    mermaid = converter.converters['mermaid']
+    mermaid.breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    doc = converter.convert(fence('graph TD\n  A-->B') + fence('graph TD\n  C-->D'))
+
+    assert renderer.render_batch.call_count == 1
+    assert [p.text for p in doc.paragraphs] == ['graph TD\n  A-->B', 'graph TD\n  C-->D']
+    assert all(mermaid._key(code) not in mermaid.failures
+               for code in ('graph TD\n  A-->B\n', 'graph TD\n  C-->D\n'))
+
+
+class SlowRenderer(FakeRenderer):
+    """每次调用耗时固定的渲染器"""
+
+    def __init__(self, delay, fail=()):
+        super().__init__(fail)
+        self.delay = delay
+
+    def render_batch(self, codes, config, fmt='png'):
+        time.sleep(self.delay)
+        return super().render_batch(codes, config, fmt)
+
+
+def test_concurrent_render_overlaps_construction():
+    """测试图表并发渲染，总耗时接近最慢的一组而不是全部之和"""
+    renderer = SlowRenderer(0.3)
+    md_text = '\n'.join(f"段落{i}\n\n" + fence(f"graph TD\n  A{i}-->B{i}") for i in range(4))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        start = time.perf_counter()
+        doc = make_converter(renderer, workers=4, executor=executor).convert(md_text)
+        elapsed = time.perf_counter() - start
+
+    assert len(renderer.batches) == 4
+    assert elapsed < 0.3 * 2
+    # 图片放回各自代码块的位置
+    body = [bool(p._p.xpath('.//w:drawing')) or p.text for p in doc.paragraphs]
+    assert body == ['段落0', True, '段落1', True, '段落2', True, '段落3', True]
+
+
+def test_failed_reserved_diagram_falls_back_to_code():
+    """测试渲染失败的图表以代码块形式保留源码"""
+    renderer = FakeRenderer(fail={'graph TD\n  bad\n'})
+    doc = make_converter(renderer, workers=2).convert(
+        '前\n\n' + fence('graph TD\n  bad') + '\n后\n\n' + fence('graph TD\n  ok'))
+
+    texts = [p.text for p in doc.paragraphs]
+    assert texts[:3] == ['前', 'graph TD\n  bad', '后']
+    assert doc.paragraphs[1].style.name == 'Code'
+    assert len(doc.paragraphs) == 4
+    assert len(doc.inline_shapes) == 1
+
+
+def test_open_breaker_fails_fast():
+    """测试渲染器连续失败后熔断，之后的文档不再调用渲染器"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    renderer = FakeRenderer()
+    renderer.render_batch = MagicMock(side_effect=RuntimeError('mmdc missing'))
+
+    for i in range(3):
+        converter = make_converter(renderer)
+        converter.converters['mermaid'].breaker = breaker
+        doc = converter.convert(fence(f"graph TD\n  A{i}-->B{i}"))
+        assert doc.paragraphs[0].text == f"graph TD\n  A{i}-->B{i}"
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert renderer.render_batch.call_count == 2
+
+
+def test_syntax_errors_do_not_trip_breaker():
+    """测试图表的语法错误只记入失败缓存，不会使熔断器断开"""
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    renderer = FakeRenderer(fail={f'graph TD\n  bad{i}\n' for i in range(3)})
+
+    for i in range(3):
+        converter = make_converter(renderer)
+        converter.converters['mermaid'].breaker = breaker
+        converter.convert(fence(f"graph TD\n  bad{i}"))
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert len(make_converter(renderer).convert(fence('graph TD\n  ok')).inline_shapes) == 1
+
+
+def test_mmdc_failures(tmp_path):
+    """测试mmdc报告语法错误时不重试，超时重试后抛出 RendererUnavailable"""
+    log = tmp_path / 'calls.log'
+    script = tmp_path / 'mmdc'
+    script.write_text(f"""#!{sys.executable}
+import sys, time
+open({str(log)!r}, 'a').write('call\\n')
+if 'slow' in open(sys.argv[sys.argv.index('-i') + 1]).read():
+    time.sleep(5)
+sys.stderr.write('Error: Parse error on line 2')
+sys.exit(1)
+""")
+    script.chmod(0o755)
+
+    renderer = MmdcRenderer(executable=str(script), timeout=0.5, max_retries=2, retry_delay=0)
+    assert renderer.render_batch(['graph TD\n  A--'], DEFAULT_CONFIG) == [None]
+    assert len(log.read_text().splitlines()) == 1
+
+    with pytest.raises(RendererUnavailable):
+        renderer.render_batch(['graph TD\n  slow'], DEFAULT_CONFIG)
+    assert len(log.read_text().splitlines()) == 3
+
+    with pytest.raises(RendererUnavailable):
+        MmdcRenderer(executable=str(tmp_path / 'missing')).render_batch(['graph TD'], DEFAULT_CONFIG)
+
+
+def test_document_timeout_falls_back_to_code():
+    """测试超过文档的等待时间后图表以代码块形式保留，渲染结果仍写入缓存"""
+    cache = ImageCache(disk_dir=None)
+    renderer = SlowRenderer(0.5)
+    converter = make_converter(renderer, cache=cache)
+    converter.converters['mermaid'].timeout = 0.1
+
+    start = time.perf_counter()
+    doc = converter.convert(fence('graph TD\n  A-->B'))
+    assert time.perf_counter() - start < 0.4
+    assert len(doc.inline_shapes) == 0
+    assert doc.paragraphs[0].text == 'graph TD\n  A-->B'
+
+    time.sleep(0.6)
+    assert cache.stats()['memory_entries'] == 1
+
+
+def test_svg_embedding():
+    """测试svg格式的图表以原生SVG嵌入，并附带指定宽度的后备PNG"""
+    converter = BaseConverter()
+    converter.register_converter('mermaid', MermaidConverter(
+        converter, renderer=FakeRenderer(), workers=1, fmt='svg', fallback_width=96))
+    doc = converter.convert(fence('graph TD\n  A-->B'))
+
+    assert len(doc.inline_shapes) == 1
+    shape = doc.inline_shapes[0]
+    assert shape.width == Inches(2)  # 192 像素按 96 DPI
+    assert shape._inline.xpath('.//a:blip/a:extLst/a:ext/*[local-name()="svgBlip"]')
+    parts = {part.content_type: part for part in doc.part.package.image_parts}
+    assert parts['image/svg+xml'].blob == make_svg()
+    assert Image.open(BytesIO(parts['image/png'].blob)).size == (96, 48)
+
+
+def test_svg_format_requires_rasterizer(monkeypatch):
+    """测试没有SVG栅格化函数时不使用svg格式，避免后备图片为空白"""
+    monkeypatch.setenv('MD2DOCX_MERMAID_FORMAT', 'svg')
+    monkeypatch.setattr('src.converter.diagrams.renderer.cairosvg_rasterizer', lambda: None)
+    assert output_format() == 'png'
+    monkeypatch.setattr('src.converter.diagrams.renderer.cairosvg_rasterizer', lambda: lambda d, s: b'')
+    assert output_format() == 'svg'
+
+
+def test_mmdc_batch_invocation(tmp_path):
+    """测试批量渲染使用一次mmdc调用，输出按代码块顺序对应"""
+    log = tmp_path / 'calls.log'
+    script = tmp_path / 'mmdc'
+    script.write_text(f"""#!{sys.executable}
+import re, sys
+args = sys.argv[1:]
+opts = dict(zip(args[::2], args[1::2]))
+with open({str(log)!r}, 'a') as f:
+    f.write(' '.join(args) + '\\n')
+source = open(opts['-i'], encoding='utf-8').read()
+blocks = re.findall(r'```mermaid\\n(.*?)\\n```', source, re.S)
+base = opts['-o'][:-3]
+for i, block in enumerate(blocks, 1):
+    open(f'{{base}}-{{i}}.png', 'wb').write(block.encode())
+""")
+    script.chmod(0o755)
+
+    renderer = MmdcRenderer(executable=str(script), retry_delay=0)
+    results = renderer.render_batch(['graph TD\n  A-->B', 'graph LR\n  ```x'], DEFAULT_CONFIG)
+
+    assert results == [b'graph TD\n  A-->B', b'graph LR\n  ```x']
+    calls = log.read_text().splitlines()
+    assert len(calls) == 1
+    assert '-e png' in calls[0]
+
+
+def test_diagram_key():
+    """测试缓存键包含配置和渲染器版本"""
+    key = diagram_key('graph TD', DEFAULT_CONFIG, '10.0.0')
+    assert key == diagram_key('graph TD', dict(DEFAULT_CONFIG), '10.0.0')
+    assert key != diagram_key('graph TD', {**DEFAULT_CONFIG, 'theme': 'dark'}, '10.0.0')
+    assert key != diagram_key('graph TD', DEFAULT_CONFIG, '11.0.0')
+    assert key != diagram_key('graph TD', DEFAULT_CONFIG, '10.0.0', fmt='svg')
+
+
+def test_renderer_version_from_package(tmp_path):
+    """测试从npm包读取渲染器版本"""
+    package = tmp_path / 'node_modules' / '@mermaid-js' / 'mermaid-cli'
+    (package / 'src').mkdir(parents=True)
+    (package / 'package.json').write_text(json.dumps({
+        'name': '@mermaid-js/mermaid-cli', 'version': '10.9.1'
+    }))
+    executable = package / 'src' / 'cli.js'
+    executable.write_text('#!/usr/bin/env node\n')
+    executable.chmod(0o755)
+
+    renderer_version.cache_clear()
+    try:
+        assert renderer_version(str(executable)) == '@mermaid-js/mermaid-cli@10.9.1'
+        assert renderer_version(str(tmp_path / 'missing')) is None
+    finally:
+        renderer_version.cache_clear()
@@ -0,0 +1,113 @@
+"""
+测试准入控制
+"""
+import asyncio
+import threading
+import time
+import pytest
+
+from src.admission import AdmissionController, AdmissionRejected
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_queue_full_and_timeout():
+    """测试没有空闲名额时排队，队列已满返回503，等待超时返回503"""
+    controller = AdmissionController(1, max_queued=1, queue_timeout=0.05)
+    first = controller.acquire('a')
+
+    with pytest.raises(AdmissionRejected) as info:
+        controller.acquire('a')
+    assert info.value.status == 503 and info.value.reason == 'queue_timeout'
+
+    waiter = threading.Thread(target=lambda: controller.acquire('b'))
+    controller.queue_timeout = 5
+    waiter.start()
+    while controller.stats()['queued'] == 0:
+        time.sleep(0.01)
+    with pytest.raises(AdmissionRejected) as info:
+        controller.acquire('c')
+    assert info.value.status == 503 and info.value.reason == 'queue_full'
+    assert info.value.retry_after == 5
+
+    # 名额直接移交给排队的请求
+    first.release()
+    waiter.join()
+    stats = controller.stats()
+    assert (stats['running'], stats['queued'], stats['admitted']) == (1, 0, 2)
+    assert stats['rejected'] == {'rate_limited': 0, 'key_concurrency': 0,
+                                 'queue_full': 1, 'queue_timeout': 1}
+
+
+def test_per_key_limits():
+    """测试每个密钥的并发数和请求速率限额"""
+    clock = FakeClock()
+    controller = AdmissionController(10, key_concurrency=2, key_rate=1, key_burst=3, clock=clock)
+    held = [controller.acquire('batch'), controller.acquire('batch')]
+    with pytest.raises(AdmissionRejected) as info:
+        controller.acquire('batch')
+    assert (info.value.status, info.value.reason) == (429, 'key_concurrency')
+
+    # 其他密钥不受影响
+    controller.acquire('interactive').release()
+    for admission in held:
+        admission.release()
+
+    with pytest.raises(AdmissionRejected) as info:
+        controller.acquire('batch')
+    assert (info.value.status, info.value.reason, info.value.retry_after) == (429, 'rate_limited', 1)
+    clock.now = 1.0
+    controller.acquire('batch').release()
+    assert controller.stats()['running'] == 0
+
+
+def test_async_acquire():
+    """测试异步请求排队时不占用线程，名额归还后继续执行"""
+    controller = AdmissionController(1, queue_timeout=5)
+
+    async def main():
+        first = await controller.acquire_async('a')
+        second = asyncio.ensure_future(controller.acquire_async('b'))
+        await asyncio.sleep(0.01)
+        assert controller.stats()['queued'] == 1
+        first.release()
+        (await second).release()
+
+    asyncio.run(main())
+    stats = controller.stats()
+    assert (stats['running'], stats['queued'], stats['admitted']) == (0, 0, 2)
+
+
+def test_background_work_charged_to_key():
+    """测试异步任务和批量转换的文件计入密钥的并发数，等待时让位于排队的请求"""
+    controller = AdmissionController(2, key_concurrency=1, queue_timeout=5)
+    job = controller.hold('batch')
+    # 密钥的并发数已满：批量转换不再占用额外名额，交互式请求返回 429
+    assert controller.try_hold('batch') is None
+    with pytest.raises(AdmissionRejected) as info:
+        controller.acquire('batch')
+    assert info.value.reason == 'key_concurrency'
+
+    # 名额已满时后台工作等待，名额先交给排队的请求
+    other = controller.acquire('other')
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(controller.hold('batch')))
+    waiter.start()
+    queued = threading.Thread(target=lambda: controller.acquire('third').release())
+    queued.start()
+    while controller.stats()['queued'] == 0:
+        time.sleep(0.01)
+    job.release()
+    queued.join()
+    waiter.join(5)
+    assert len(granted) == 1
+    assert controller.stats()['held_waiting'] == 0
+    granted[0].release()
+    other.release()
+    assert controller.stats()['running'] == 0
@@ -0,0 +1,65 @@
+"""
+测试批量转换同时提交的文件数
+"""
+import asyncio
+import threading
+
+from src.batch import BatchItem, aiter_batch, iter_batch
+
+
+class CountingPool:
+    """记录同时进行的转换数的进程池替身"""
+
+    workers = 8
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    async def convert(self, markdown=None, debug=False, image_dpi=None, bundle=None, entry=None):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.02)
+        with self.lock:
+            self.active -= 1
+        return markdown.encode('utf-8')
+
+
+def make_items(count):
+    return [BatchItem(i, f'doc{i}.md', f'doc{i}.docx', markdown=f'# {i}') for i in range(count)]
+
+
+def test_iter_batch_window(monkeypatch):
+    """测试同步批量转换同时转换的文件数不超过窗口"""
+    monkeypatch.setenv('MD2DOCX_BATCH_WINDOW', '3')
+    pool = CountingPool()
+    chunks = list(iter_batch(make_items(10), pool))
+    assert chunks and pool.peak == 3
+
+
+def test_aiter_batch_window(monkeypatch):
+    """测试异步批量转换一个文件完成后才提交下一个"""
+    monkeypatch.setenv('MD2DOCX_BATCH_WINDOW', '2')
+    pool = CountingPool()
+
+    async def run():
+        return [chunk async for chunk in aiter_batch(make_items(10), pool)]
+
+    assert asyncio.run(run())
+    assert pool.peak == 2
+
+
+def test_extra_files_need_admission(monkeypatch):
+    """测试没有空闲的准入名额时批量转换一次只转换一个文件"""
+    monkeypatch.setenv('MD2DOCX_BATCH_WINDOW', '4')
+    pool = CountingPool()
+    requested = []
+
+    def extra_slot():
+        requested.append(1)
+        return None
+
+    chunks = list(iter_batch(make_items(5), pool, extra_slot=extra_slot))
+    assert chunks and pool.peak == 1 and requested
@@ -0,0 +1,114 @@
+"""
+测试异步转换任务队列
+"""
+import threading
+import time
+import pytest
+
+from src.jobs import CANCELLED, FAILED, QUEUED, SUCCEEDED, JobQueue, QueueFull
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+class BlockingRunner:
+    """记录执行顺序的任务执行函数，第一个任务阻塞到 release"""
+
+    def __init__(self):
+        self.order = []
+        self.gate = threading.Event()
+
+    def __call__(self, job):
+        if not self.order:
+            self.gate.wait()
+        self.order.append(job.params['markdown'])
+        if job.params['markdown'] == 'bad':
+            raise ValueError("转换失败")
+        return job.params['markdown'].encode()
+
+
+def test_priority_and_position():
+    """测试优先级高的任务先执行，相同优先级先提交先执行"""
+    runner = BlockingRunner()
+    queue = JobQueue(workers=1, run=runner)
+    first = queue.submit('first.docx', markdown='first')
+    wait_for(lambda: first.status != QUEUED)
+
+    a = queue.submit('a.docx', markdown='a')
+    b = queue.submit('b.docx', markdown='b')
+    c = queue.submit('c.docx', priority=5, markdown='c')
+    assert [queue.position(job) for job in (c, a, b)] == [0, 1, 2]
+    assert queue.describe(b)['position'] == 2
+    assert queue.stats()['queued'] == 3
+
+    runner.gate.set()
+    wait_for(lambda: b.finished)
+    queue.shutdown()
+    assert runner.order == ['first', 'c', 'a', 'b']
+    assert queue.get(b.id).result == b'b'
+    assert queue.describe(b)['bytes'] == 1
+
+
+def test_failure_cancel_and_queue_limit():
+    """测试失败的任务记录错误，排队中的任务可以取消，队列满时拒绝提交"""
+    runner = BlockingRunner()
+    queue = JobQueue(workers=1, max_queued=2, run=runner)
+    bad = queue.submit('bad.docx', markdown='bad')
+    wait_for(lambda: bad.status != QUEUED)
+    queued = queue.submit('x.docx', markdown='x')
+    queue.submit('y.docx', markdown='y')
+    with pytest.raises(QueueFull):
+        queue.submit('z.docx', markdown='z')
+
+    assert not queue.cancel(bad.id)  # 正在执行
+    assert queue.cancel(queued.id)
+    assert queued.status == CANCELLED and queue.get(queued.id) is None
+
+    runner.gate.set()
+    wait_for(lambda: queue.stats()['finished'] == 2)
+    queue.shutdown()
+    assert bad.status == FAILED and bad.error == "转换失败"
+    assert runner.order == ['bad', 'y']
+
+
+def test_queued_bytes_limit():
+    """测试排队任务的参数总大小超过上限时拒绝提交，任务开始执行后释放"""
+    runner = BlockingRunner()
+    queue = JobQueue(workers=1, max_queued_bytes=10, run=runner)
+    first = queue.submit('a.docx', markdown='a' * 8)
+    wait_for(lambda: first.status != QUEUED)
+    queue.submit('b.docx', markdown='b' * 6)
+    with pytest.raises(QueueFull):
+        queue.submit('c.docx', markdown='c', bundle=b'c' * 4)
+    assert queue.stats()['queued_bytes'] == 6
+
+    runner.gate.set()
+    wait_for(lambda: queue.stats()['finished'] == 2)
+    assert queue.stats()['queued_bytes'] == 0
+    queue.submit('d.docx', markdown='d' * 10)
+    queue.shutdown()
+
+
+def test_result_eviction():
+    """测试结果超过保留时间或总大小上限时被删除"""
+    now = [1000.0]
+    queue = JobQueue(workers=1, result_ttl=60, max_result_bytes=10,
+                     run=lambda job: job.params['markdown'].encode(), clock=lambda: now[0])
+    old = queue.submit('old.docx', markdown='12345')
+    wait_for(lambda: old.finished)
+    now[0] += 30
+    newer = queue.submit('new.docx', markdown='123456')
+    wait_for(lambda: newer.finished)
+    # 总大小超过上限，最早的结果被删除
+    assert queue.get(old.id) is None
+    assert queue.get(newer.id).status == SUCCEEDED
+
+    now[0] += 61
+    assert queue.get(newer.id) is None
+    stats = queue.stats()
+    queue.shutdown()
+    assert (stats['evicted'], stats['result_bytes']) == (2, 0)
@@ -0,0 +1,43 @@
+"""
+测试转换指标
+"""
+from markdown_it import MarkdownIt
+
+from src.converter.metrics import MetricsRegistry, count_elements
+
+
+def test_histogram_render():
+    """测试直方图按分桶累计输出，计数器按标签输出"""
+    metrics = MetricsRegistry()
+    metrics.observe('md2docx_stage_duration_seconds', 0.003, stage='parse')
+    metrics.observe('md2docx_stage_duration_seconds', 0.2, stage='parse')
+    metrics.inc('md2docx_elements_total', 2, type='table')
+
+    text = metrics.render([('md2docx_engine_in_flight', 'gauge', '转换数', {}, 3)])
+    assert 'md2docx_stage_duration_seconds_bucket{stage="parse",le="0.0025"} 0' in text
+    assert 'md2docx_stage_duration_seconds_bucket{stage="parse",le="0.005"} 1' in text
+    assert 'md2docx_stage_duration_seconds_bucket{stage="parse",le="+Inf"} 2' in text
+    assert 'md2docx_stage_duration_seconds_count{stage="parse"} 2' in text
+    assert 'md2docx_elements_total{type="table"} 2' in text
+    assert '# TYPE md2docx_engine_in_flight gauge\nmd2docx_engine_in_flight 3' in text
+
+
+def test_drain_and_merge():
+    """测试工作进程取出的增量合并到服务进程"""
+    worker, server = MetricsRegistry(), MetricsRegistry()
+    worker.observe('md2docx_stage_duration_seconds', 0.5, stage='save')
+    worker.inc('md2docx_elements_total', type='image')
+    server.merge(worker.drain())
+    server.merge(worker.drain())
+
+    assert server.value('md2docx_stage_duration_seconds', stage='save') == (0.5, 1)
+    assert server.value('md2docx_elements_total', type='image') == 1
+    assert worker.value('md2docx_elements_total', type='image') == 0
+
+
+def test_count_elements():
+    """测试按元素类型统计，Mermaid 代码块单独计数"""
+    tokens = MarkdownIt('commonmark').parse(
+        '# 标题\n\n正文 [链接](a) ![图](b.png)\n\n```mermaid\ngraph TD\n```\n\n```python\nx\n```\n')
+    assert count_elements(tokens) == {'heading': 1, 'paragraph': 1, 'link': 1, 'image': 1,
+                                      'mermaid': 1, 'code': 1}
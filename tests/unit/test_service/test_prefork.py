@@ -0,0 +1,92 @@
+"""
+测试预派生多进程服务的预热和就绪状态
+"""
+import gc
+import os
+import threading
+
+from src import api
+from src import prefork
+from src.converter.base import markdown_parser, template_bytes
+from src.converter.diagrams import get_mermaid_renderer, set_mermaid_renderer
+from src.converter.metrics import get_metrics
+from src.prefork import partition_resources, preload, server_options
+
+
+def test_preload_warms_shared_state():
+    """测试主进程预热后解析器和模板已缓存，预热不计入指标"""
+    try:
+        assert preload() is api.app
+    finally:
+        gc.unfreeze()
+    assert markdown_parser.cache_info().currsize == 1
+    assert template_bytes.cache_info().currsize == 1
+    assert get_metrics().value('md2docx_stage_duration_seconds', stage='parse') == 0
+
+
+def test_server_options(monkeypatch):
+    """测试工作进程数和线程数的配置"""
+    monkeypatch.setenv('MD2DOCX_WORKERS', '3')
+    monkeypatch.setenv('MD2DOCX_THREADS', 'x')
+    options = server_options('127.0.0.1', 8000)
+    assert options['bind'] == '127.0.0.1:8000'
+    assert (options['workers'], options['threads']) == (3, 4)
+    assert options['preload_app'] and options['worker_class'] == 'gthread'
+    assert server_options(workers=1, threads=8)['workers'] == 1
+
+
+def test_health_reports_ready_after_warmup(monkeypatch):
+    """测试预热完成前健康检查返回 503"""
+    gate = threading.Event()
+    monkeypatch.setattr(api, 'prewarm', gate.wait)
+    client = api.app.test_client()
+
+    thread = api.warm_in_background()
+    try:
+        response = client.get('/api/health')
+        assert response.status_code == 503
+        assert response.get_json()['ready'] is False
+    finally:
+        gate.set()
+        thread.join()
+
+    response = client.get('/api/health')
+    assert response.status_code == 200 and response.get_json()['ready'] is True
+
+
+def test_partition_resources(monkeypatch):
+    """测试转换进程池按工作进程数均分CPU，多个工作进程时关闭异步任务和指标接口"""
+    monkeypatch.delenv('MD2DOCX_ENGINE_WORKERS', raising=False)
+    monkeypatch.setattr(os, 'cpu_count', lambda: 8)
+    monkeypatch.setitem(api.app.config, 'JOBS_ENABLED', True)
+    monkeypatch.setitem(api.app.config, 'METRICS_ENABLED', True)
+    try:
+        partition_resources(4)
+        assert os.environ['MD2DOCX_ENGINE_WORKERS'] == '2'
+    finally:
+        os.environ.pop('MD2DOCX_ENGINE_WORKERS', None)
+
+    client = api.app.test_client()
+    response = client.post('/api/jobs', json={'markdown': '# 任务'},
+                           headers={'X-API-Key': api.API_KEY})
+    assert response.status_code == 501
+    assert client.get('/api/jobs/abc', headers={'X-API-Key': api.API_KEY}).status_code == 501
+    response = client.get('/metrics')
+    assert response.status_code == 501 and response.get_json()['status'] == 'metrics_disabled'
+
+    partition_resources(1)
+    assert api.app.config['JOBS_ENABLED'] and api.app.config['METRICS_ENABLED']
+    assert client.get('/metrics').status_code == 200
+    os.environ.pop('MD2DOCX_ENGINE_WORKERS', None)
+
+
+def test_worker_uses_own_renderer(monkeypatch):
+    """测试工作进程启动后重新创建渲染器，不沿用主进程的服务地址"""
+    inherited = object()
+    set_mermaid_renderer(inherited)
+    monkeypatch.setattr(api, 'warm_in_background', lambda: None)
+    try:
+        prefork._post_worker_init(None)
+        assert get_mermaid_renderer() is not inherited
+    finally:
+        set_mermaid_renderer(None)
@@ -0,0 +1,44 @@
+"""
+测试请求体的流式读取和解压
+"""
+import gzip
+import pytest
+
+from src.request_body import BodyError, decode_text, parse_content_type, read_body
+
+
+def chunked(data, size=7):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+def test_gzip_streaming():
+    """测试按块解压 gzip 请求体，连接在一起的多个成员依次解压"""
+    body = gzip.compress('# 标题\n'.encode('utf-8')) + gzip.compress(b'text')
+    assert read_body(chunked(body), 'gzip') == '# 标题\ntext'.encode('utf-8')
+    assert read_body(chunked(b'plain'), None) == b'plain'
+
+
+def test_zstd_streaming():
+    """测试按块解压 zstd 请求体"""
+    zstd = pytest.importorskip('backports.zstd')
+    assert read_body(chunked(zstd.compress(b'# a' * 100)), 'zstd') == b'# a' * 100
+
+
+def test_errors():
+    """测试解压后超过上限、数据不完整、压缩格式不支持和字符集错误"""
+    bomb = gzip.compress(b'\0' * (1024 * 1024))
+    with pytest.raises(BodyError) as e:
+        read_body(chunked(bomb, 1024), 'gzip', limit=1000)
+    assert e.value.status == 413
+
+    with pytest.raises(BodyError) as e:
+        read_body([gzip.compress(b'text')[:-4]], 'gzip')
+    assert e.value.status == 400
+    with pytest.raises(BodyError) as e:
+        read_body([b'text'], 'br')
+    assert e.value.status == 415
+
+    assert parse_content_type('Text/Markdown; charset="GBK"') == ('text/markdown', 'GBK')
+    assert decode_text('标题'.encode('gbk'), 'GBK') == '标题'
+    with pytest.raises(BodyError):
+        decode_text(b'\xff', None)
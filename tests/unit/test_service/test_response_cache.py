@@ -0,0 +1,52 @@
+"""
+测试转换结果缓存
+"""
+from src.converter.assets import ImageCache
+from src.response_cache import ResponseCache, etag_matches
+
+
+def make_cache(**kwargs):
+    return ResponseCache(ImageCache(disk_dir=None), **kwargs)
+
+
+def test_key_depends_on_content_and_options():
+    """测试缓存键随内容和选项变化，选项顺序不影响缓存键"""
+    cache = make_cache()
+    key = cache.key(b'# a', {'image_dpi': None, 'entry': None})
+    assert key == cache.key(b'# a', {'entry': None, 'image_dpi': None})
+    assert key != cache.key(b'# b', {'image_dpi': None, 'entry': None})
+    assert key != cache.key(b'# a', {'image_dpi': 150, 'entry': None})
+
+
+def test_hits_and_volatile_expiry():
+    """测试命中统计，依赖在线资源的结果超过有效期后按未命中处理"""
+    cache = make_cache(volatile_ttl=0)
+    source = b'![img](https://example.com/a.png)'
+    assert cache.volatile(source) and not cache.volatile(b'# a')
+    assert cache.volatile(b'# a', bundle=True)
+
+    cache.put('stable', b'docx')
+    cache.put('remote', b'docx')
+    assert cache.get('stable').data == b'docx'
+    assert cache.get('remote', volatile=True) is None
+    assert cache.get('missing') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['bytes_saved']) == (1, 2, 4)
+    assert stats['hit_ratio'] == round(1 / 3, 4)
+
+
+def test_oversized_results_not_cached():
+    """测试超过大小上限的结果不缓存，但仍然返回带有哈希的条目"""
+    cache = make_cache(max_entry_bytes=3)
+    assert cache.put('key', b'docx').meta.size == 4
+    assert cache.get('key') is None
+
+
+def test_etag_matches():
+    """测试 If-None-Match 的解析"""
+    assert etag_matches('"abc"', 'abc')
+    assert etag_matches('"x", W/"abc"', 'abc')
+    assert etag_matches('*', 'abc')
+    assert not etag_matches('"abcd"', 'abc')
+    assert not etag_matches(None, 'abc')
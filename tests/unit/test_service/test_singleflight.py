@@ -0,0 +1,94 @@
+"""
+测试并发相同请求的合并
+"""
+import asyncio
+import threading
+import time
+import pytest
+
+from src.singleflight import SingleFlight
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+def test_concurrent_calls_share_one_execution():
+    """测试相同键的并发调用只执行一次，全部得到同一个结果"""
+    flight = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def convert():
+        calls.append(1)
+        gate.wait()
+        return b'docx'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', convert)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.coalesced == 4)
+    gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == [b'docx'] * 5 and len(calls) == 1
+    assert flight.stats() == {'executed': 1, 'coalesced': 4, 'in_flight': 0}
+    # 完成后再次调用重新执行
+    assert flight.do('key', lambda: b'new') == b'new'
+
+
+def test_errors_shared_with_waiters():
+    """测试转换失败时等待的调用得到同一个异常"""
+    flight = SingleFlight()
+    gate = threading.Event()
+    errors = []
+
+    def convert():
+        gate.wait()
+        raise ValueError("转换失败")
+
+    def call():
+        try:
+            flight.do('key', convert)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: flight.coalesced == 2)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3 and len({id(e) for e in errors}) == 1
+
+
+def test_async_calls_survive_leader_cancellation():
+    """测试异步调用合并，第一个请求取消后其他请求仍然得到结果"""
+    flight = SingleFlight()
+    calls = []
+
+    async def convert():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return b'docx'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async('key', convert))
+        await asyncio.sleep(0)
+        others = [asyncio.ensure_future(flight.do_async('key', convert)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*others)
+
+    assert asyncio.run(main()) == [b'docx'] * 3
+    assert len(calls) == 1
+    assert flight.stats() == {'executed': 1, 'coalesced': 3, 'in_flight': 0}